@@ -423,7 +423,7 @@ def _save_inventory_tree(
     retentions: Retentions,
 ) -> Optional[StructuredDataNode]:
 
-    inventory_store = StructuredDataStore(cmk.utils.paths.inventory_output_dir)
+    inventory_store = StructuredDataStore(cmk.utils.paths.inventory_output_dir, indexed=True)
 
     if inventory_tree.is_empty():
         # Remove empty inventory files. Important for host inventory icon
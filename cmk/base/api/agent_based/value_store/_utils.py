@@ -10,7 +10,6 @@ from pathlib import Path
 from typing import (
     Any,
     Callable,
-    Container,
     Dict,
     Final,
     Hashable,
@@ -70,13 +69,20 @@ class _DynamicDiskSyncedMapping(Dict[_TKey, _TValue]):
         return super().pop(key, *args)
 
 
-class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
+class _StaticDiskSyncedMapping(Mapping[_ValueStoreKey, _TValue]):
     """Represents the values stored on disk
 
     This class provides a Mapping-interface for the values stored
     on disk.
 
     The only way to modify the values is the disksync method.
+
+    The file is a log of service records. Each line consists of the serialized
+    service ID and the serialized values of the service, separated by a tab. A later
+    record of a service replaces the earlier ones, a record without values removes the
+    service. The values of a service are only deserialized when they are accessed, and
+    only the records of services with changed values are appended. The log is compacted
+    when it contains more outdated than current records.
     """
 
     def __init__(
@@ -84,36 +90,58 @@ class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
         *,
         path: Path,
         log_debug: Callable[[str], None],
-        serializer: Callable[[Mapping[_TKey, _TValue]], str],
-        deserializer: Callable[[str], Mapping[_TKey, _TValue]],
+        serializer: Callable[[Any], str],
+        deserializer: Callable[[str], Any],
     ) -> None:
         self._path: Final = path
-        self._last_sync: Optional[float] = None
-        self._data: Mapping[_TKey, _TValue] = {}
+        # inode, size and modification time of the file when it was last synchronized
+        self._last_sync: Optional[Tuple[int, int, int]] = None
+        # The serialized values by the serialized service IDs
+        self._records: Dict[str, str] = {}
+        self._values: Dict[str, Mapping[_UserKey, _TValue]] = {}
+        self._num_lines = 0
+        # The end of the last complete line, a crash may leave a partial line behind
+        self._end = 0
+        self._legacy = False
         self._log_debug = log_debug
         self._serializer: Final = serializer
         self._deserializer: Final = deserializer
+        self._empty: Final = serializer({})
         self.disksync()
 
-    def __getitem__(self, key: _TKey) -> _TValue:
-        return self._data.__getitem__(key)
+    def _service_values(self, service: str) -> Mapping[_UserKey, _TValue]:
+        try:
+            return self._values[service]
+        except KeyError:
+            pass
+        record = self._records.get(service)
+        values = {} if record is None else self._deserializer(record)
+        self._values[service] = values
+        return values
+
+    def __getitem__(self, key: _ValueStoreKey) -> _TValue:
+        return self._service_values(self._serializer(key[:2]))[key[2]]
 
-    def __iter__(self) -> Iterator[_TKey]:
-        return self._data.__iter__()
+    def __iter__(self) -> Iterator[_ValueStoreKey]:
+        for service in list(self._records):
+            plugin_name, item = self._deserializer(service)
+            for user_key in self._service_values(service):
+                yield plugin_name, item, user_key
 
     def __len__(self) -> int:
-        return len(self._data)
+        return sum(len(self._service_values(service)) for service in self._records)
 
     def disksync(
         self,
         *,
-        removed: Container[_TKey] = (),
-        updated: Iterable[Tuple[_TKey, _TValue]] = (),
+        removed: Iterable[_ValueStoreKey] = (),
+        updated: Iterable[Tuple[_ValueStoreKey, _TValue]] = (),
     ) -> None:
         """Re-load and write the changes of the stored values
 
         This method will reload the values from disk, apply the changes (remove keys
-        and update values) as specified by the arguments, and then write the result to disk.
+        and update values) as specified by the arguments, and then write the records of
+        the changed services to disk.
 
         When this method returns, the data provided via the Mapping-interface and
         the data stored on disk must be in sync.
@@ -125,29 +153,139 @@ class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
         try:
             store.aquire_lock(self._path)
 
-            if self._path.stat().st_mtime == self._last_sync:
-                self._log_debug("already loaded")
-            else:
-                self._log_debug("loading from disk")
-                self._data = self._deserializer(
-                    store.load_text_from_file(self._path, default="{}", lock=False)
-                )
-
-            if removed or updated:
-                data = {k: v for k, v in self._data.items() if k not in removed}
-                data.update(updated)
-                self._log_debug("writing to disk")
-                store.save_text_to_file(self._path, self._serializer(data))
-                self._data = data
-
-            self._last_sync = self._path.stat().st_mtime
+            self._load()
+
+            changed = self._changed_services(removed, updated)
+            if changed:
+                self._write(changed)
+
+            self._last_sync = self._stat()
         except Exception as exc:
             raise MKGeneralException from exc
         finally:
             store.release_lock(self._path)
 
+    def _stat(self) -> Tuple[int, int, int]:
+        stat = self._path.stat()
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self) -> None:
+        stat = self._stat()
+        if stat == self._last_sync:
+            self._log_debug("already loaded")
+            return
+
+        if (
+            self._last_sync is not None
+            and not self._legacy
+            and stat[0] == self._last_sync[0]
+            and stat[1] > self._last_sync[1]
+        ):
+            # Other processes have only appended records since the last synchronization
+            self._log_debug("loading changes from disk")
+            with self._path.open("rb") as f:
+                f.seek(self._end)
+                self._parse(f.read().decode("utf-8"))
+            return
+
+        self._log_debug("loading from disk")
+        self._records = {}
+        self._values = {}
+        self._num_lines = 0
+        self._end = 0
+        self._legacy = False
+        self._parse(store.load_text_from_file(self._path, default="", lock=False))
+
+    def _parse(self, text: str) -> None:
+        if text.startswith("{"):
+            self._parse_legacy(text)
+            return
+
+        lines = text.split("\n")
+        # The last line is incomplete (or empty) if the text does not end with a newline
+        self._end += len(text.encode("utf-8")) - len(lines[-1].encode("utf-8"))
+        for line in lines[:-1]:
+            service, sep, record = line.partition("\t")
+            if not sep:
+                continue
+            self._num_lines += 1
+            self._values.pop(service, None)
+            if record == self._empty:
+                self._records.pop(service, None)
+            else:
+                self._records[service] = record
+
+    def _parse_legacy(self, text: str) -> None:
+        """Load all values of the whole host, as written by previous versions"""
+        values: Dict[str, Dict[_UserKey, _TValue]] = {}
+        for (plugin_name, item, user_key), value in self._deserializer(text).items():
+            values.setdefault(self._serializer((plugin_name, item)), {})[user_key] = value
+        self._values = dict(values)
+        self._records = {service: self._serializer(v) for service, v in values.items()}
+        self._end = len(text.encode("utf-8"))
+        # Rewritten in the current format with the first change
+        self._legacy = True
+
+    def _changed_services(
+        self,
+        removed: Iterable[_ValueStoreKey],
+        updated: Iterable[Tuple[_ValueStoreKey, _TValue]],
+    ) -> Dict[str, Dict[_UserKey, _TValue]]:
+        services: Dict[str, Dict[_UserKey, _TValue]] = {}
+
+        def values_of(plugin_name: _PluginName, item: Item) -> Dict[_UserKey, _TValue]:
+            service = self._serializer((plugin_name, item))
+            try:
+                return services[service]
+            except KeyError:
+                return services.setdefault(service, dict(self._service_values(service)))
+
+        for plugin_name, item, user_key in removed:
+            values_of(plugin_name, item).pop(user_key, None)
+        for (plugin_name, item, user_key), value in updated:
+            values_of(plugin_name, item)[user_key] = value
+
+        return {
+            service: values
+            for service, values in services.items()
+            if self._serializer(values) != self._records.get(service, self._empty)
+        }
 
-class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too-many-ancestors
+    def _write(self, changed: Mapping[str, Dict[_UserKey, _TValue]]) -> None:
+        lines = []
+        for service, values in changed.items():
+            record = self._serializer(values)
+            lines.append(f"{service}\t{record}\n")
+            if values:
+                self._records[service] = record
+                self._values[service] = values
+            else:
+                self._records.pop(service, None)
+                self._values.pop(service, None)
+        self._num_lines += len(lines)
+
+        if self._legacy or self._num_lines > 2 * len(self._records):
+            self._log_debug("compacting on disk")
+            text = "".join(f"{service}\t{record}\n" for service, record in self._records.items())
+            store.save_text_to_file(self._path, text)
+            self._num_lines = len(self._records)
+            self._end = len(text.encode("utf-8"))
+            self._legacy = False
+            return
+
+        self._log_debug("writing %d changed services to disk" % len(lines))
+        data = "".join(lines).encode("utf-8")
+        with self._path.open("r+b") as f:
+            # Overwrite a partial line a crashed process may have left behind
+            f.seek(self._end)
+            f.write(data)
+            f.truncate()
+        self._end += len(data)
+
+
+class _DiskSyncedMapping(
+    MutableMapping[_ValueStoreKey, _TValue]
+):  # pylint: disable=too-many-ancestors
     """Implements the overlay logic between dynamic and static value store"""
 
     @classmethod
@@ -156,8 +294,8 @@ class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too
         *,
         path: Path,
         log_debug: Callable[[str], None],
-        serializer: Callable[[Mapping[_TKey, _TValue]], str],
-        deserializer: Callable[[str], Mapping[_TKey, _TValue]],
+        serializer: Callable[[Any], str],
+        deserializer: Callable[[str], Any],
     ) -> "_DiskSyncedMapping":
         return cls(
             dynamic=_DynamicDiskSyncedMapping(),
@@ -172,20 +310,20 @@ class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too
     def __init__(
         self,
         *,
-        dynamic: _DynamicDiskSyncedMapping[_TKey, _TValue],
-        static: _StaticDiskSyncedMapping[_TKey, _TValue],
+        dynamic: _DynamicDiskSyncedMapping[_ValueStoreKey, _TValue],
+        static: _StaticDiskSyncedMapping[_TValue],
     ) -> None:
         self._dynamic = dynamic
         self.static = static
 
-    def _keys(self) -> Set[_TKey]:
+    def _keys(self) -> Set[_ValueStoreKey]:
         return {
             k
             for k in (set(self._dynamic) | set(self.static))
             if k not in self._dynamic.removed_keys
         }
 
-    def __getitem__(self, key: _TKey) -> _TValue:
+    def __getitem__(self, key: _ValueStoreKey) -> _TValue:
         if key in self._dynamic.removed_keys:
             raise KeyError(key)
         try:
@@ -193,7 +331,7 @@ class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too
         except KeyError:
             return self.static.__getitem__(key)
 
-    def __delitem__(self, key: _TKey) -> None:
+    def __delitem__(self, key: _ValueStoreKey) -> None:
         if key in self._dynamic.removed_keys:
             raise KeyError(key)
         try:
@@ -202,17 +340,19 @@ class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too
         except KeyError:
             _ = self.static[key]
 
-    def pop(self, key: _TKey, *args: Union[_TValue, _TDefault]) -> Union[_TValue, _TDefault]:
+    def pop(
+        self, key: _ValueStoreKey, *args: Union[_TValue, _TDefault]
+    ) -> Union[_TValue, _TDefault]:
         try:
             return self._dynamic.pop(key)
             # key is now marked as removed.
         except KeyError:
             return self.static[key] if key in self.static else args[0]
 
-    def __setitem__(self, key: _TKey, value: _TValue) -> None:
+    def __setitem__(self, key: _ValueStoreKey, value: _TValue) -> None:
         self._dynamic.__setitem__(key, value)
 
-    def __iter__(self) -> Iterator[_TKey]:
+    def __iter__(self) -> Iterator[_ValueStoreKey]:
         return iter(self._keys())
 
     def __len__(self) -> int:
@@ -284,7 +424,7 @@ class ValueStoreManager:
     STORAGE_PATH = Path(cmk.utils.paths.counters_dir)
 
     def __init__(self, host_name: HostName) -> None:
-        self._value_store: _DiskSyncedMapping[_ValueStoreKey, Any] = _DiskSyncedMapping.make(
+        self._value_store: _DiskSyncedMapping[Any] = _DiskSyncedMapping.make(
             path=self.STORAGE_PATH / str(host_name),
             log_debug=lambda x: logger.debug("value store: %s", x),
             serializer=repr,
@@ -22,6 +22,7 @@ from typing import Any, cast, Dict, List, Mapping, Optional, Sequence, Tuple, Un
 import cmk.utils.debug
 import cmk.utils.log as log
 import cmk.utils.man_pages as man_pages
+import cmk.utils.piggyback as piggyback
 from cmk.utils.diagnostics import deserialize_cl_parameters, DiagnosticsCLParameters
 from cmk.utils.encoding import ensure_str_with_fallback
 from cmk.utils.exceptions import MKBailOut, MKGeneralException, MKSNMPError, OnError
@@ -40,6 +41,7 @@ from cmk.utils.paths import (
     omd_root,
     precompiled_hostchecks_dir,
     snmpwalks_dir,
+    snmpwalks_index_dir,
     tcp_cache_dir,
     tmp_dir,
     var_dir,
@@ -436,15 +438,13 @@ class AutomationRenameHosts(Automation):
             if self._rename_host_file(tmp_dir + "/" + d + "/", oldname, newname):
                 actions.append(d)
 
-        if self._rename_host_dir(tmp_dir + "/piggyback/", oldname, newname):
+        # Rename the piggyback data of the host and the piggyback data *created* by the host
+        has_piggyback_data, num_piggybacked_hosts = piggyback.rename_piggyback_host(
+            HostName(oldname), HostName(newname)
+        )
+        if has_piggyback_data:
             actions.append("piggyback-load")
-
-        # Rename piggy files *created* by the host
-        piggybase = tmp_dir + "/piggyback/"
-        if os.path.exists(piggybase):
-            for piggydir in os.listdir(piggybase):
-                if self._rename_host_file(piggybase + piggydir, oldname, newname):
-                    actions.append("piggyback-pig")
+        actions += ["piggyback-pig"] * num_piggybacked_hosts
 
         # Logwatch
         if self._rename_host_dir(logwatch_dir, oldname, newname):
@@ -452,6 +452,7 @@ class AutomationRenameHosts(Automation):
 
         # SNMP walks
         if self._rename_host_file(snmpwalks_dir, oldname, newname):
+            self._rename_host_file(snmpwalks_index_dir, oldname, newname)
             actions.append("snmpwalk")
 
         # HW/SW-Inventory
@@ -876,16 +877,13 @@ class ABCDeleteHosts:
                 self._delete_if_exists("%s/%s" % (folder, hostname))
 
     def _delete_logwatch_and_piggyback_dirs(self, hostname: HostName) -> None:
-        # logwatch and piggyback folders
-        for what_dir in [
-            "%s/%s" % (logwatch_dir, hostname),
-            "%s/piggyback/%s" % (tmp_dir, hostname),
-        ]:
-            try:
-                shutil.rmtree(what_dir)
-            except OSError as e:
-                if e.errno != errno.ENOENT:
-                    raise
+        # logwatch folder
+        try:
+            shutil.rmtree("%s/%s" % (logwatch_dir, hostname))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        piggyback.remove_piggybacked_host_data(hostname)
 
     def _delete_if_exists(self, path: str) -> None:
         """Delete the given file or folder in case it exists"""
@@ -11,6 +11,7 @@ import inspect
 import ipaddress
 import itertools
 import marshal
+import mmap
 import os
 import pickle
 import py_compile
@@ -827,8 +828,98 @@ class PackedConfigGenerator:
         return helper_config
 
 
+_PackedSpan = Tuple[int, int]
+
+
+class PackedSection(Mapping[Any, Any]):
+    """Read only view of a packed dictionary, its values are unpickled on access"""
+
+    def __init__(self, data: memoryview, index: Mapping[Any, _PackedSpan]) -> None:
+        super().__init__()
+        self._data: Final = data
+        self._index: Final = index
+        self._values: Dict[Any, Any] = {}
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        offset, length = self._index[key]
+        value = self._values[key] = pickle.loads(self._data[offset : offset + length])
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return dict, (dict(self),)
+
+
+class PackedConfig(PackedSection):
+    """Read only view of a packed configuration
+
+    The variables are unpickled when they are accessed. The keyed variables
+    are returned as PackedSection, so only the hosts and check groups that are
+    looked up are unpickled.
+    """
+
+    def __init__(
+        self,
+        data: memoryview,
+        index: Mapping[str, _PackedSpan],
+        keyed_index: Mapping[str, Mapping[Any, _PackedSpan]],
+    ) -> None:
+        super().__init__(data, index)
+        self._keyed_index: Final = keyed_index
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self._keyed_index:
+            return self._values.setdefault(key, PackedSection(self._data, self._keyed_index[key]))
+        return super().__getitem__(key)
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self._index
+        yield from self._keyed_index
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._keyed_index)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index or key in self._keyed_index
+
+
 class PackedConfigStore:
-    """Caring about persistence of the packed configuration"""
+    """Caring about persistence of the packed configuration
+
+    Every variable is pickled on its own. The dictionaries that are keyed by
+    host name or check group are pickled per key. An index of the pickles is
+    stored at the beginning of the file. The file is memory mapped for reading,
+    so the helper processes share the pages of the file and only unpickle the
+    parts of the configuration they use.
+    """
+
+    _MAGIC = b"CMKPACK1"
+    _HEADER = struct.Struct("!Q")
+
+    # The values of these dictionaries are only needed for some of the keys in
+    # each helper.
+    _keyed_variable_names = {
+        "checkgroup_parameters",
+        "explicit_snmp_communities",
+        "host_attributes",
+        "ipaddresses",
+        "ipv6addresses",
+    }
 
     def __init__(self, path: Path) -> None:
         self.path: Final = path
@@ -842,15 +933,48 @@ class PackedConfigStore:
         return Path(config_path) / "precompiled_check_config.mk"
 
     def write(self, helper_config: Mapping[str, Any]) -> None:
+        pickles: List[bytes] = []
+        offset = 0
+
+        def add(value: Any) -> _PackedSpan:
+            nonlocal offset
+            pickles.append(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            span = offset, len(pickles[-1])
+            offset += span[1]
+            return span
+
+        index: Dict[str, _PackedSpan] = {}
+        keyed_index: Dict[str, Dict[Any, _PackedSpan]] = {}
+        for varname, value in helper_config.items():
+            if varname in self._keyed_variable_names and isinstance(value, dict):
+                keyed_index[varname] = {key: add(val) for key, val in value.items()}
+            else:
+                index[varname] = add(value)
+        raw_index = pickle.dumps((index, keyed_index), pickle.HIGHEST_PROTOCOL)
+
         self.path.parent.mkdir(parents=True, exist_ok=True)
         tmp_path = self.path.with_suffix(self.path.suffix + ".compiled")
         with tmp_path.open("wb") as compiled_file:
-            pickle.dump(helper_config, compiled_file)
+            compiled_file.write(self._MAGIC)
+            compiled_file.write(self._HEADER.pack(len(raw_index)))
+            compiled_file.write(raw_index)
+            compiled_file.writelines(pickles)
         tmp_path.rename(self.path)
 
     def read(self) -> Mapping[str, Any]:
         with self.path.open("rb") as f:
-            return pickle.load(f)
+            if f.read(len(self._MAGIC)) != self._MAGIC:
+                # Written by a version before the packed config was indexed
+                f.seek(0)
+                return pickle.load(f)
+            # The map stays valid after closing the file and after the file
+            # has been replaced by the next configuration.
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        start = len(self._MAGIC) + self._HEADER.size
+        (index_length,) = self._HEADER.unpack_from(data, len(self._MAGIC))
+        index, keyed_index = pickle.loads(data[start : start + index_length])
+        return PackedConfig(data[start + index_length :], index, keyed_index)
 
 
 @lru_cache
@@ -2752,8 +2876,14 @@ class HostConfig:
                 return SNMPBackendEnum.INLINE
             if host_backend == "classic":
                 return SNMPBackendEnum.CLASSIC
+            if host_backend == "bulk":
+                return SNMPBackendEnum.BULK
             raise MKGeneralException("Bad Host SNMP Backend configuration: %s" % host_backend)
 
+        # The bulk backend does not use netsnmp, it handles SNMP-v1 itself
+        if snmp_backend_default == "bulk":
+            return SNMPBackendEnum.BULK
+
         # TODO(sk): remove this when netsnmp is fixed
         # NOTE: Force usage of CLASSIC with SNMP-v1 to prevent memory leak in the netsnmp
         if self._is_host_snmp_v1():
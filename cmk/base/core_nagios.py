@@ -6,18 +6,40 @@
 """Code for support of Nagios (and compatible) cores"""
 
 import base64
+import functools
+import hashlib
+import multiprocessing
 import os
 import py_compile
 import socket
 import sys
 from io import StringIO
 from pathlib import Path
-from typing import Any, cast, Dict, IO, Iterable, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    Final,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import cmk.utils.config_path
+import cmk.utils.password_store as password_store
 import cmk.utils.paths
 import cmk.utils.store as store
 import cmk.utils.tty as tty
+import cmk.utils.version as cmk_version
 from cmk.utils.check_utils import section_name_of
 from cmk.utils.config_path import VersionedConfigPath
 from cmk.utils.exceptions import MKGeneralException
@@ -56,6 +78,11 @@ ActiveServiceID = Tuple[str, Item]  # TODO: I hope the str someday (tm) becomes
 CustomServiceID = Tuple[str, Item]  # #     at which point these will be the same as "ServiceID"
 AbstractServiceID = Union[ActiveServiceID, CustomServiceID, ServiceID]
 
+_T = TypeVar("_T")
+
+# Forking worker processes only pays off for larger configurations
+_HOSTS_PER_PROCESS = 200
+
 CHECK_INFO_BY_MIGRATED_NAME = {
     k: config.check_info[v] for k, v in config.legacy_check_plugin_names.items()
 }
@@ -148,6 +175,7 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
 
     config_cache = config.get_config_cache()
 
+    all_hosts = hostnames is None
     if hostnames is None:
         hostnames = list(config_cache.all_active_hosts())
 
@@ -155,8 +183,14 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
 
     _output_conf_header(cfg)
 
-    for hostname in sorted(hostnames):
-        _create_nagios_config_host(cfg, config_cache, hostname)
+    fragment_store = HostFragmentStore()
+    for fragment, is_cached in _map_hosts(
+        functools.partial(_get_host_fragment, fragment_store, _config_inputs_digest()),
+        sorted(hostnames),
+    ):
+        _add_host_fragment(cfg, fragment, is_cached)
+    if all_hosts:
+        fragment_store.cleanup(hostnames)
 
     _create_nagios_config_contacts(cfg, hostnames)
     _create_nagios_config_hostgroups(cfg)
@@ -180,18 +214,245 @@ def _output_conf_header(cfg: NagiosConfig) -> None:
     )
 
 
-def _create_nagios_config_host(
-    cfg: NagiosConfig, config_cache: ConfigCache, hostname: HostName
-) -> None:
-    cfg.write("\n# ----------------------------------------------------\n")
-    cfg.write("# %s\n" % hostname)
-    cfg.write("# ----------------------------------------------------\n")
+def _map_hosts(function: Callable[[HostName], _T], hostnames: Sequence[HostName]) -> Iterator[_T]:
+    """Apply the function to all hosts in worker processes, the results keep the order
+
+    The workers are forked, so they share the initialized config cache. Small
+    configurations are handled in this process.
+    """
+    processes = min(os.cpu_count() or 1, len(hostnames) // _HOSTS_PER_PROCESS)
+    if processes <= 1:
+        yield from map(function, hostnames)
+        return
+
+    # Do not let the workers output what has been buffered so far
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        yield from pool.imap(function, hostnames, chunksize=_HOSTS_PER_PROCESS // 4)
+
+
+class HostFragment(NamedTuple):
+    """The objects of one host and what they need to be defined globally
+
+    A fragment does not depend on the other hosts. The commands of the host
+    checks are numbered when the fragments are put together.
+    """
+
+    key: str
+    hostname: HostName
+    objects: str
+    hostgroups: Set[HostgroupName]
+    servicegroups: Set[ServicegroupName]
+    contactgroups: Set[ContactgroupName]
+    checknames: Set[CheckPluginName]
+    active_checks: Set[CheckPluginNameStr]
+    custom_commands: Set[CoreCommandName]
+    hostcheck_commands: List[Tuple[CoreCommand, str]]
+    warnings: List[str]
+
+
+class HostFragmentStore:
+    """Caring about persistence of the generated host fragments
+
+    The fragments of the last configuration are reused as long as the inputs
+    of their hosts do not change.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.directory: Final = Path(cmk.utils.paths.var_dir, "core", "nagios_host_fragments")
+
+    def _store(self, hostname: HostName) -> store.ObjectStore[Any]:
+        return store.ObjectStore(self.directory / hostname, serializer=store.PickleSerializer())
+
+    def load(self, hostname: HostName) -> Optional[HostFragment]:
+        try:
+            return HostFragment(*self._store(hostname).read_obj(default=None))
+        except Exception:
+            # Missing or written by another version
+            return None
+
+    def save(self, fragment: HostFragment) -> None:
+        store.makedirs(self.directory)
+        self._store(fragment.hostname).write_obj(tuple(fragment))
+
+    def cleanup(self, hostnames: Iterable[HostName]) -> None:
+        """Remove the fragments of all other hosts"""
+        keep = set(hostnames)
+        if not self.directory.exists():
+            return
+        for path in self.directory.iterdir():
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+
+
+# These variables are keyed by host name. Only the entries of a host are inputs of
+# its fragment, so changing a host does not invalidate the fragments of the others.
+_HOST_KEYED_VARIABLES = {
+    "all_hosts",
+    "explicit_host_conf",
+    "explicit_snmp_communities",
+    "host_attributes",
+    "host_labels",
+    "host_paths",
+    "host_tags",
+    "ipaddresses",
+    "ipv6addresses",
+}
+
+
+def _canonical_repr(value: Any) -> str:
+    """repr() that does not depend on the iteration order of sets"""
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join(
+            "%s: %s" % (_canonical_repr(k), _canonical_repr(v)) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(_canonical_repr(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return "{%s}" % ", ".join(sorted(_canonical_repr(v) for v in value))
+    return repr(value)
+
+
+def _config_inputs_digest() -> str:
+    """The inputs shared by the fragments of all hosts
+
+    These are the configuration variables that are not keyed by host name, the
+    stored passwords and the version of the check plugins.
+    """
+    digest = hashlib.sha256(cmk_version.__version__.encode())
+    for varname in config.get_variable_names():
+        if varname not in _HOST_KEYED_VARIABLES:
+            value = getattr(config, varname)
+            digest.update(f"{varname}={_canonical_repr(value)}\n".encode())
+    for varname, value in sorted(config.get_check_variables().items()):
+        digest.update(f"{varname}={_canonical_repr(value)}\n".encode())
+    # The command lines of the active checks only contain the length of the passwords
+    for ident, password in sorted(password_store.load().items()):
+        digest.update(f"password {ident} {len(password)}\n".encode())
+    for directory in [
+        Path(cmk.utils.paths.checks_dir),
+        cmk.utils.paths.local_checks_dir,
+        cmk.utils.paths.agent_based_plugins_dir,
+        cmk.utils.paths.local_agent_based_plugins_dir,
+    ]:
+        if directory.exists():
+            for path in sorted(directory.rglob("*")):
+                stat = path.stat()
+                digest.update(f"{path} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _host_inputs(config_cache: ConfigCache, hostname: HostName) -> str:
+    autochecks_file = Path(cmk.utils.paths.autochecks_dir, f"{hostname}.mk")
+    # The host specific values are created in a fixed order
+    return repr(
+        [
+            hostname,
+            core_config.get_host_attributes(hostname, config_cache),
+            [
+                getattr(config, varname).get(hostname)
+                for varname in sorted(_HOST_KEYED_VARIABLES)
+                if isinstance(getattr(config, varname), dict)
+            ],
+            {attr: values.get(hostname) for attr, values in config.explicit_host_conf.items()},
+            store.load_bytes_from_file(autochecks_file),
+        ]
+    )
+
+
+def _host_fragment_key(inputs_digest: str, config_cache: ConfigCache, hostname: HostName) -> str:
+    digest = hashlib.sha256(inputs_digest.encode())
+    digest.update(_host_inputs(config_cache, hostname).encode())
+    # The objects of a cluster contain the addresses and services of its nodes
+    for node in config_cache.get_host_config(hostname).nodes or []:
+        digest.update(_host_inputs(config_cache, node).encode())
+    return digest.hexdigest()
+
+
+def _get_host_fragment(
+    fragment_store: HostFragmentStore,
+    inputs_digest: str,
+    hostname: HostName,
+) -> Tuple[HostFragment, bool]:
+    """The fragment of the host and whether it has been reused"""
+    config_cache = config.get_config_cache()
+    key = _host_fragment_key(inputs_digest, config_cache, hostname)
+    fragment = fragment_store.load(hostname)
+    if fragment is not None and fragment.key == key:
+        return fragment, True
+
+    fragment = _create_host_fragment(config_cache, hostname, key)
+    fragment_store.save(fragment)
+    return fragment, False
+
+
+def _create_host_fragment(config_cache: ConfigCache, hostname: HostName, key: str) -> HostFragment:
+    num_warnings = len(core_config.g_configuration_warnings)
+    cfg = NagiosConfig(StringIO(), [hostname])
     host_attrs = core_config.get_host_attributes(hostname, config_cache)
     if config.generate_hostconf:
         host_spec = _create_nagios_host_spec(cfg, config_cache, hostname, host_attrs)
         cfg.write(_format_nagios_object("host", host_spec))
     _create_nagios_servicedefs(cfg, config_cache, hostname, host_attrs)
 
+    # The warnings are added when the fragment is added to the configuration
+    warnings = core_config.g_configuration_warnings[num_warnings:]
+    del core_config.g_configuration_warnings[num_warnings:]
+
+    assert isinstance(cfg._outfile, StringIO)
+    return HostFragment(
+        key=key,
+        hostname=hostname,
+        objects=cfg._outfile.getvalue(),
+        hostgroups=cfg.hostgroups_to_define,
+        servicegroups=cfg.servicegroups_to_define,
+        contactgroups=cfg.contactgroups_to_define,
+        checknames=cfg.checknames_to_define,
+        active_checks=cfg.active_checks_to_define,
+        custom_commands=cfg.custom_commands_to_define,
+        hostcheck_commands=cfg.hostcheck_commands_to_define,
+        warnings=warnings,
+    )
+
+
+def _add_host_fragment(cfg: NagiosConfig, fragment: HostFragment, is_cached: bool) -> None:
+    cfg.write("\n# ----------------------------------------------------\n")
+    cfg.write("# %s\n" % fragment.hostname)
+    cfg.write("# ----------------------------------------------------\n")
+
+    objects = fragment.objects
+    for command, command_line in fragment.hostcheck_commands:
+        command_name = _hostcheck_command_name(cfg)
+        objects = objects.replace(
+            _format_check_command(command), _format_check_command(command_name), 1
+        )
+        cfg.hostcheck_commands_to_define.append((command_name, command_line))
+    cfg.write(objects)
+
+    cfg.hostgroups_to_define.update(fragment.hostgroups)
+    cfg.servicegroups_to_define.update(fragment.servicegroups)
+    cfg.contactgroups_to_define.update(fragment.contactgroups)
+    cfg.checknames_to_define.update(fragment.checknames)
+    cfg.active_checks_to_define.update(fragment.active_checks)
+    cfg.custom_commands_to_define.update(fragment.custom_commands)
+    for text in fragment.warnings:
+        if is_cached:
+            core_config.warning(text)
+        else:
+            # Already shown while the fragment was created
+            core_config.g_configuration_warnings.append(text)
+
+
+def _hostcheck_command_name(cfg: NagiosConfig) -> CoreCommand:
+    return "check-mk-host-custom-%d" % (len(cfg.hostcheck_commands_to_define) + 1)
+
+
+def _format_check_command(command: CoreCommand) -> str:
+    """The line of the host object as written by _format_nagios_object()"""
+    return "\n  %-29s %s\n" % ("check_command", command)
+
 
 def _create_nagios_host_spec(
     cfg: NagiosConfig, config_cache: ConfigCache, hostname: HostName, attrs: ObjectAttributes
@@ -223,7 +484,7 @@ def _create_nagios_host_spec(
             host_spec[key] = value
 
     def host_check_via_service_status(service: ServiceName) -> CoreCommand:
-        command = "check-mk-host-custom-%d" % (len(cfg.hostcheck_commands_to_define) + 1)
+        command = _hostcheck_command_name(cfg)
         service_with_hostname = replace_macros_in_str(
             service,
             {"$HOSTNAME$": host_config.hostname},
@@ -1061,34 +1322,43 @@ def _precompile_hostchecks(config_path: VersionedConfigPath) -> None:
 
     console.verbose("Precompiling host checks...\n")
 
-    host_check_store = HostCheckStore()
-    for hostname in config_cache.all_active_hosts():
-        try:
-            console.verbose(
-                "%s%s%-16s%s:",
-                tty.bold,
-                tty.blue,
-                hostname,
-                tty.normal,
-                stream=sys.stderr,
-            )
-            host_check = _dump_precompiled_hostcheck(
-                config_cache,
-                config_path,
-                hostname,
-            )
-            if host_check is None:
-                console.verbose("(no Checkmk checks)\n")
-                continue
-
-            host_check_store.write(config_path, hostname, host_check)
-        except Exception as e:
-            if cmk.utils.debug.enabled():
-                raise
-            console.error("Error precompiling checks for host %s: %s\n" % (hostname, e))
+    for error in _map_hosts(
+        functools.partial(_precompile_hostcheck, config_path),
+        sorted(config_cache.all_active_hosts()),
+    ):
+        if error is not None:
+            console.error(error)
             sys.exit(5)
 
 
+def _precompile_hostcheck(config_path: VersionedConfigPath, hostname: HostName) -> Optional[str]:
+    """Returns the error of precompiling the host check, if any"""
+    try:
+        console.verbose(
+            "%s%s%-16s%s:",
+            tty.bold,
+            tty.blue,
+            hostname,
+            tty.normal,
+            stream=sys.stderr,
+        )
+        host_check = _dump_precompiled_hostcheck(
+            config.get_config_cache(),
+            config_path,
+            hostname,
+        )
+        if host_check is None:
+            console.verbose("(no Checkmk checks)\n")
+            return None
+
+        HostCheckStore().write(config_path, hostname, host_check)
+    except Exception as e:
+        if cmk.utils.debug.enabled():
+            raise
+        return "Error precompiling checks for host %s: %s\n" % (hostname, e)
+    return None
+
+
 def _dump_precompiled_hostcheck(
     config_cache: ConfigCache,
     config_path: VersionedConfigPath,
@@ -40,6 +40,8 @@ default_host_group = "check_mk"
 
 check_max_cachefile_age = 0  # per default do not use cache files when checking
 cluster_max_cachefile_age = 90  # secs.
+concurrent_fetchers = False  # run the fetchers of a host at the same time
+fetcher_timeouts: _Dict[str, int] = {}  # secs. per fetcher type, e.g. {"SNMP": 30}
 piggyback_max_cachefile_age = 3600  # secs
 # Ruleset for translating piggyback host names
 piggyback_translation: _List = []
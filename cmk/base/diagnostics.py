@@ -669,7 +669,10 @@ class CheckmkOverviewDiagnosticsElement(ABCDiagnosticsElementJSONDump):
 
         inventory_store = StructuredDataStore(Path(cmk.utils.paths.inventory_output_dir))
         try:
-            tree = inventory_store.load(host_name=checkmk_server_name)
+            tree = inventory_store.load(
+                host_name=checkmk_server_name,
+                paths=[("software", "applications", "check_mk")],
+            )
         except FileNotFoundError:
             raise DiagnosticsElementError(
                 "No HW/SW inventory tree of '%s' found" % checkmk_server_name
@@ -16,6 +16,8 @@
 #    => These already bear all information about the contact, the plugin
 #       to call and its parameters.
 
+import bisect
+import heapq
 import io
 import logging
 import os
@@ -30,7 +32,10 @@ from typing import (
     Any,
     cast,
     Dict,
+    Final,
     FrozenSet,
+    Iterable,
+    Iterator,
     List,
     Literal,
     Mapping,
@@ -68,6 +73,7 @@ from cmk.utils.type_defs import (
     EventContext,
     EventRule,
     NotifyAnalysisInfo,
+    NotifyBulk,
     NotifyBulkParameters,
     NotifyBulks,
     NotifyPluginInfo,
@@ -476,7 +482,20 @@ def notify_rulebased(raw_context: EventContext, analyse: bool = False) -> Notify
     num_rule_matches = 0
     rule_info = []
 
-    for rule in config.notification_rules + user_notification_rules():
+    rule_index = _get_notification_rule_index()
+    if analyse:
+        # The analysis shows why each of the rules does not match
+        rules: Sequence[EventRule] = rule_index.rules
+    else:
+        rules = rule_index.candidates(raw_context)
+        logger.log(
+            log.VERBOSE,
+            "%d of %d rules are candidates for this notification",
+            len(rules),
+            len(rule_index.rules),
+        )
+
+    for rule in rules:
         contact_info = _get_contact_info_text(rule)
 
         why_not = rbn_match_rule(rule, raw_context)
@@ -752,6 +771,132 @@ def user_notification_rules() -> List[EventRule]:
     return user_rules
 
 
+class NotificationRuleIndex:
+    """Finds the rules which may match a notification
+
+    The rules are partitioned by the conditions which can be looked up: the type of
+    the notification, the host names, the host tags and the contact groups. A
+    notification only needs to be matched against the rules of its partitions, all
+    other rules do not match it for sure. The candidates keep the order of the rules.
+    """
+
+    def __init__(self, rules: Sequence[EventRule]) -> None:
+        super().__init__()
+        self.rules: Final = rules
+
+        self._by_what: Dict[str, Set[int]] = {"HOST": set(), "SERVICE": set()}
+        self._by_host: Dict[HostName, Set[int]] = {}
+        self._any_host: Set[int] = set()
+        self._by_tag: Dict[str, Set[int]] = {}
+        self._any_tag: Set[int] = set()
+        self._by_contactgroup: Dict[str, Set[int]] = {}
+        self._with_contactgroups: Set[int] = set()
+        self._any_contactgroup: Set[int] = set()
+
+        for nr, rule in enumerate(rules):
+            if rule.get("disabled"):
+                continue
+
+            for what in _rule_notification_types(rule):
+                self._by_what[what].add(nr)
+
+            if "match_hosts" in rule:
+                for hostname in rule["match_hosts"]:
+                    self._by_host.setdefault(hostname, set()).add(nr)
+            else:
+                self._any_host.add(nr)
+
+            # One tag the host must have is enough to find the candidates
+            required_tags = [
+                tag
+                for tag in rule.get("match_hosttags") or []
+                if tag and tag[0] != "!" and tag[-1] != "+"
+            ]
+            if required_tags:
+                self._by_tag.setdefault(required_tags[0], set()).add(nr)
+            else:
+                self._any_tag.add(nr)
+
+            if rule.get("match_contactgroups") is not None:
+                self._with_contactgroups.add(nr)
+                for group in rule["match_contactgroups"]:
+                    self._by_contactgroup.setdefault(group, set()).add(nr)
+            else:
+                self._any_contactgroup.add(nr)
+
+    def candidates(self, context: EventContext) -> List[EventRule]:
+        what = context.get("WHAT")
+        if what not in self._by_what:
+            return [rule for rule in self.rules if not rule.get("disabled")]
+
+        candidates = self._by_what[what]
+        candidates = candidates.intersection(
+            self._any_host.union(self._by_host.get(context.get("HOSTNAME", ""), ()))
+        )
+        candidates.intersection_update(
+            self._any_tag.union(
+                *(self._by_tag.get(tag, ()) for tag in context.get("HOSTTAGS", "").split())
+            )
+        )
+
+        if what == "SERVICE":
+            contactgroup_names = context.get("SERVICECONTACTGROUPNAMES")
+        else:
+            contactgroup_names = context.get("HOSTCONTACTGROUPNAMES")
+        if contactgroup_names is None:
+            # The contact group conditions do not apply
+            pass
+        elif not contactgroup_names:
+            candidates.intersection_update(self._any_contactgroup)
+        else:
+            candidates.intersection_update(
+                self._any_contactgroup.union(
+                    *(
+                        self._by_contactgroup.get(group, ())
+                        for group in contactgroup_names.split(",")
+                    )
+                )
+            )
+
+        return [self.rules[nr] for nr in sorted(candidates)]
+
+
+def _rule_notification_types(rule: EventRule) -> List[str]:
+    """The types of notifications the rule may match, see rbn_match_rule()"""
+    host_events = "match_host_event" in rule
+    service_events = "match_service_event" in rule
+    service_only = (
+        (service_events and not host_events)
+        or "match_services" in rule
+        or "match_checktype" in rule
+        or bool(rule.get("match_servicegroups"))
+        or bool(rule.get("match_servicegroups_regex", (None, None))[1])
+    )
+    host_only = host_events and not service_events
+    return [
+        what for what, excluded in [("HOST", service_only), ("SERVICE", host_only)] if not excluded
+    ]
+
+
+_notification_rule_index: Optional[Tuple[object, object, NotificationRuleIndex]] = None
+
+
+def _get_notification_rule_index() -> NotificationRuleIndex:
+    """The index of the global and user rules, built once per loaded configuration"""
+    global _notification_rule_index
+    if (
+        _notification_rule_index is None
+        or _notification_rule_index[0] is not config.notification_rules
+        or _notification_rule_index[1] is not config.contacts
+    ):
+        _notification_rule_index = (
+            config.notification_rules,
+            config.contacts,
+            NotificationRuleIndex(config.notification_rules + user_notification_rules()),
+        )
+    return _notification_rule_index[2]
+
+
 def rbn_fake_email_contact(email: str) -> Contact:
     return {
         "name": "mailto:" + email,
@@ -1873,6 +2018,7 @@ def do_bulk_notify(
     filename_final = bulk_dir / notify_uuid
     filename_new.write_text("%r\n" % ((params, plugin_context),))
     filename_new.rename(filename_final)  # We need an atomic creation!
+    BulkIndex().add(str(bulk_dir), notify_uuid, filename_final.stat().st_mtime)
     logger.info("        - stored in %s", filename_final)
 
 
@@ -1946,89 +2092,235 @@ def remove_if_orphaned(bulk_dir: str, max_age: float, ref_time: Optional[float]
 def find_bulks(only_ripe: bool) -> NotifyBulks:
     if not os.path.exists(notification_bulkdir):
         return []
+    return BulkIndex().find(only_ripe, time.time())
 
-    def listdir_visible(path: str) -> List[str]:
-        return [x for x in os.listdir(path) if not x.startswith(".")]
-
-    bulks: NotifyBulks = []
-    now = time.time()
-    for contact in listdir_visible(notification_bulkdir):
-        contact_dir = os.path.join(notification_bulkdir, contact)
-        for method in listdir_visible(contact_dir):
-            method_dir = os.path.join(contact_dir, method)
-            for bulk in listdir_visible(method_dir):
-                bulk_dir = os.path.join(method_dir, bulk)
-
-                uuids, oldest = bulk_uuids(bulk_dir)
-                if not uuids:
-                    remove_if_orphaned(bulk_dir, max_age=60, ref_time=now)
-                    continue
-                age = now - oldest
 
-                # e.g. 60,10,host,localhost OR timeperiod:late_night,1000,host,localhost
-                parts = bulk_parts(method_dir, bulk)
-                if parts is None:
-                    continue
-                interval, timeperiod, count = parts
+# Seconds after which the bulk index is created from the bulk directories again
+_RESCAN_INTERVAL = 300
 
-                if interval is not None:
-                    if age >= interval:
-                        logger.info("Bulk %s is ripe: age %d >= %d", bulk_dir, age, interval)
-                    elif len(uuids) >= count:
-                        logger.info("Bulk %s is ripe: count %d >= %d", bulk_dir, len(uuids), count)
-                    else:
-                        logger.info(
-                            "Bulk %s is not ripe yet (age: %d, count: %d)!",
-                            bulk_dir,
-                            age,
-                            len(uuids),
-                        )
-                        if only_ripe:
-                            continue
 
-                    bulks.append((bulk_dir, age, interval, "n.a.", count, uuids))
-                else:
-                    try:
-                        active = cmk.base.core.timeperiod_active(str(timeperiod))
-                    except Exception:
-                        # This prevents sending bulk notifications if a
-                        # livestatus connection error appears. It also implies
-                        # that an ongoing connection error will hold back bulk
-                        # notifications.
-                        logger.info(
-                            "Error while checking activity of timeperiod %s: assuming active",
-                            timeperiod,
-                        )
-                        active = True
-
-                    if active is True and len(uuids) < count:
-                        # Only add a log entry every 10 minutes since timeperiods
-                        # can be very long (The default would be 10s).
-                        if now % 600 <= config.notification_bulk_interval:
-                            logger.info(
-                                "Bulk %s is not ripe yet (timeperiod %s: active, count: %d)",
-                                bulk_dir,
-                                timeperiod,
-                                len(uuids),
-                            )
-
-                        if only_ripe:
-                            continue
-                    elif active is False:
-                        logger.info(
-                            "Bulk %s is ripe: timeperiod %s has ended", bulk_dir, timeperiod
-                        )
-                    elif len(uuids) >= count:
-                        logger.info("Bulk %s is ripe: count %d >= %d", bulk_dir, len(uuids), count)
-                    else:
-                        logger.info(
-                            "Bulk %s is ripe: timeperiod %s is not known anymore",
-                            bulk_dir,
-                            timeperiod,
-                        )
+class BulkIndex:
+    """The notifications waiting in the bulks and when the bulks get ripe
+
+    Finding the ripe bulks neither scans the bulk directories nor asks for the state of a
+    time period per bulk. The index file lists the notification files of each bulk and
+    keeps the deadlines of the bulks in a heap: the time their interval ends or their
+    count is reached. Bulks waiting for the end of a time period are listed per time
+    period, the state of each time period is looked up once per run.
+
+    The index is created from the bulk directories if it does not exist. It is created
+    again every few minutes, which adds the notifications stored without updating the
+    index (e.g. when the process was killed in between) and removes orphaned bulk
+    directories.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._store: Final = store.ObjectStore(
+            Path(notification_bulkdir, ".index"),
+            serializer=store.PickleSerializer(),
+        )
+
+    def add(self, bulk_dir: str, notify_uuid: str, mtime: float) -> None:
+        with self._store.locked():
+            state = self._read()
+            bulk = state["bulks"].setdefault(bulk_dir, {"deadline": None, "uuids": []})
+            position = bisect.bisect_left(bulk["uuids"], (mtime, notify_uuid))
+            if bulk["uuids"][position : position + 1] == [(mtime, notify_uuid)]:
+                return  # Already found by a scan of the bulk directories
+            bulk["uuids"].insert(position, (mtime, notify_uuid))
+            self._update(state, bulk_dir)
+            self._store.write_obj(state)
+
+    def remove(self, bulk_dir: str, uuids: UUIDs) -> None:
+        with self._store.locked():
+            state = self._read()
+            bulk = state["bulks"].get(bulk_dir)
+            if bulk is None:
+                return
+            removed = set(uuids)
+            bulk["uuids"] = [entry for entry in bulk["uuids"] if entry not in removed]
+            self._update(state, bulk_dir)
+            self._store.write_obj(state)
+
+    def find(self, only_ripe: bool, now: float) -> NotifyBulks:
+        with self._store.locked():
+            state = self._store.read_obj(default=None)
+            if state is None or not 0 <= time.time() - state.get("scanned", 0) < _RESCAN_INTERVAL:
+                state = self._scan()
+                self._store.write_obj(state)
+
+        timeperiods_active = {
+            timeperiod: _bulk_timeperiod_active(timeperiod) for timeperiod in state["timeperiods"]
+        }
+        if not only_ripe:
+            bulk_dirs: Iterable[str] = sorted(state["bulks"])
+        else:
+            bulk_dirs = sorted(
+                set(_due_bulks(state["deadlines"], now)).union(
+                    *(
+                        bulk_dirs
+                        for timeperiod, bulk_dirs in state["timeperiods"].items()
+                        if timeperiods_active[timeperiod] is not True
+                    )
+                )
+            )
+
+        bulks: NotifyBulks = []
+        for bulk_dir in bulk_dirs:
+            bulk = state["bulks"].get(bulk_dir)
+            if bulk is None:
+                continue
+            found = _check_bulk(bulk_dir, bulk["uuids"], now, only_ripe, timeperiods_active)
+            if found is not None:
+                bulks.append(found)
+        return bulks
+
+    def _read(self) -> Dict[str, Any]:
+        state = self._store.read_obj(default=None)
+        if state is None:
+            state = self._scan()
+        return state
+
+    def _scan(self) -> Dict[str, Any]:
+        now = time.time()
+        state: Dict[str, Any] = {"bulks": {}, "deadlines": [], "timeperiods": {}, "scanned": now}
+
+        def listdir_visible(path: str) -> List[str]:
+            return [x for x in os.listdir(path) if not x.startswith(".")]
+
+        for contact in listdir_visible(notification_bulkdir):
+            contact_dir = os.path.join(notification_bulkdir, contact)
+            for method in listdir_visible(contact_dir):
+                method_dir = os.path.join(contact_dir, method)
+                for bulk in listdir_visible(method_dir):
+                    bulk_dir = os.path.join(method_dir, bulk)
+                    uuids, _oldest = bulk_uuids(bulk_dir)
+                    if not uuids:
+                        remove_if_orphaned(bulk_dir, max_age=60, ref_time=now)
+                        continue
+                    state["bulks"][bulk_dir] = {"deadline": None, "uuids": uuids}
+                    self._update(state, bulk_dir)
+        return state
+
+    @staticmethod
+    def _update(state: Dict[str, Any], bulk_dir: str) -> None:
+        bulk = state["bulks"][bulk_dir]
+        parts = bulk_parts(os.path.dirname(bulk_dir), os.path.basename(bulk_dir))
+        if parts is None or not bulk["uuids"]:
+            del state["bulks"][bulk_dir]
+            for bulk_dirs in state["timeperiods"].values():
+                bulk_dirs.discard(bulk_dir)
+        else:
+            interval, timeperiod, count = parts
+            deadlines = []
+            if interval is not None:
+                deadlines.append(bulk["uuids"][0][0] + interval)
+            else:
+                state["timeperiods"].setdefault(timeperiod, set()).add(bulk_dir)
+            if len(bulk["uuids"]) >= count:
+                deadlines.append(bulk["uuids"][count - 1][0])
+            deadline = min(deadlines, default=None)
+            if deadline is not None and deadline != bulk["deadline"]:
+                heapq.heappush(state["deadlines"], (deadline, bulk_dir))
+            bulk["deadline"] = deadline
+
+        # Drop the outdated deadlines of bulks that have been sent or changed
+        deadlines = state["deadlines"]
+        while deadlines and (
+            deadlines[0][1] not in state["bulks"]
+            or state["bulks"][deadlines[0][1]]["deadline"] != deadlines[0][0]
+        ):
+            heapq.heappop(deadlines)
+        for timeperiod in [tp for tp, bulk_dirs in state["timeperiods"].items() if not bulk_dirs]:
+            del state["timeperiods"][timeperiod]
+
+
+def _due_bulks(deadlines: List[Tuple[float, str]], now: float) -> Iterator[str]:
+    """The bulks of the deadlines which have passed, the heap is not changed"""
+    positions = [0] if deadlines else []
+    while positions:
+        position = positions.pop()
+        deadline, bulk_dir = deadlines[position]
+        if deadline > now:
+            continue
+        yield bulk_dir
+        positions.extend(p for p in (2 * position + 1, 2 * position + 2) if p < len(deadlines))
+
+
+def _bulk_timeperiod_active(timeperiod: str) -> Optional[bool]:
+    try:
+        return cmk.base.core.timeperiod_active(timeperiod)
+    except Exception:
+        # This prevents sending bulk notifications if a
+        # livestatus connection error appears. It also implies
+        # that an ongoing connection error will hold back bulk
+        # notifications.
+        logger.info(
+            "Error while checking activity of timeperiod %s: assuming active",
+            timeperiod,
+        )
+        return True
 
-                    bulks.append((bulk_dir, age, "n.a.", timeperiod, count, uuids))
-    return bulks
+
+def _check_bulk(
+    bulk_dir: str,
+    uuids: UUIDs,
+    now: float,
+    only_ripe: bool,
+    timeperiods_active: Mapping[str, Optional[bool]],
+) -> Optional[NotifyBulk]:
+    age = now - min(now, uuids[0][0])
+
+    # e.g. 60,10,host,localhost OR timeperiod:late_night,1000,host,localhost
+    parts = bulk_parts(os.path.dirname(bulk_dir), os.path.basename(bulk_dir))
+    if parts is None:
+        return None
+    interval, timeperiod, count = parts
+
+    if interval is not None:
+        if age >= interval:
+            logger.info("Bulk %s is ripe: age %d >= %d", bulk_dir, age, interval)
+        elif len(uuids) >= count:
+            logger.info("Bulk %s is ripe: count %d >= %d", bulk_dir, len(uuids), count)
+        else:
+            logger.info(
+                "Bulk %s is not ripe yet (age: %d, count: %d)!",
+                bulk_dir,
+                age,
+                len(uuids),
+            )
+            if only_ripe:
+                return None
+
+        return (bulk_dir, age, interval, "n.a.", count, uuids)
+
+    active = timeperiods_active[str(timeperiod)]
+    if active is True and len(uuids) < count:
+        # Only add a log entry every 10 minutes since timeperiods
+        # can be very long (The default would be 10s).
+        if now % 600 <= config.notification_bulk_interval:
+            logger.info(
+                "Bulk %s is not ripe yet (timeperiod %s: active, count: %d)",
+                bulk_dir,
+                timeperiod,
+                len(uuids),
+            )
+
+        if only_ripe:
+            return None
+    elif active is False:
+        logger.info("Bulk %s is ripe: timeperiod %s has ended", bulk_dir, timeperiod)
+    elif len(uuids) >= count:
+        logger.info("Bulk %s is ripe: count %d >= %d", bulk_dir, len(uuids), count)
+    else:
+        logger.info(
+            "Bulk %s is ripe: timeperiod %s is not known anymore",
+            bulk_dir,
+            timeperiod,
+        )
+
+    return (bulk_dir, age, "n.a.", timeperiod, count, uuids)
 
 
 def send_ripe_bulks() -> None:
@@ -2109,13 +2401,14 @@ def notify_bulk(dirname: str, uuids: UUIDs) -> None:
         logger.info("No valid notification file left. Skipping this bulk.")
 
     # Remove sent notifications
-    for mtime, notify_uuid in uuids:
-        if (mtime, notify_uuid) not in unhandled_uuids:
-            path = os.path.join(dirname, notify_uuid)
-            try:
-                os.remove(path)
-            except Exception as e:
-                logger.info("Cannot remove %s: %s", path, e)
+    sent_uuids = [entry for entry in uuids if entry not in unhandled_uuids]
+    for mtime, notify_uuid in sent_uuids:
+        path = os.path.join(dirname, notify_uuid)
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.info("Cannot remove %s: %s", path, e)
+    BulkIndex().remove(dirname, sent_uuids)
 
     # Repeat with unhandled uuids (due to different parameters)
     if unhandled_uuids:
@@ -43,6 +43,8 @@ class Fetcher(Generic[TRawData], abc.ABC):
         super().__init__()
         self.file_cache: Final = file_cache
         self._logger = logger
+        # Set by cancel(), possibly before the fetch has started
+        self._cancelled = False
 
     @final
     @classmethod
@@ -86,6 +88,15 @@ class Fetcher(Generic[TRawData], abc.ABC):
     def close(self) -> None:
         raise NotImplementedError()
 
+    def cancel(self) -> None:
+        """Abort a fetch running in another thread
+
+        The blocked IO of the fetch is interrupted if possible, the fetch then fails.
+        Implementations set `_cancelled`, a fetch which has not started yet then fails
+        without any IO. Fetchers which do not implement it (e.g. SNMP, whose IO cannot be
+        interrupted from another thread) are run in the main thread by the fetcher helper.
+        """
+
     @final
     def fetch(self, mode: Mode) -> result.Result[TRawData, Exception]:
         """Return the data from the source, either cached or from IO."""
@@ -99,6 +110,9 @@ class Fetcher(Generic[TRawData], abc.ABC):
         if raw_data is not None:
             return raw_data
 
+        if self._cancelled:
+            raise MKFetcherError("Fetch cancelled")
+
         self._logger.log(VERBOSE, "[%s] Execute data source", self.__class__.__name__)
 
         try:
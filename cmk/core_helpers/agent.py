@@ -120,14 +120,36 @@ class NoCacheFactory(FileCacheFactory[AgentRawData]):
 
 
 class SectionWithHeader(NamedTuple):
+    """A section and its content as chunks of the raw agent output
+
+    The chunks are slices of the raw data between two markers.  They are only
+    split into lines when the content of the section is actually needed.
+
+    """
+
     header: SectionMarker
-    section: List[AgentRawData]
+    chunks: List[memoryview]
+
+    def lines(self) -> Iterator[AgentRawData]:
+        for chunk in self.chunks:
+            for line in chunk.tobytes().split(b"\n"):
+                if line.strip():
+                    yield AgentRawData(line.rstrip(b"\r"))
 
 
 MutableSection = List[SectionWithHeader]
 ImmutableSection = Sequence[SectionWithHeader]
 
 
+def is_marker(line: bytes) -> bool:
+    return (
+        PiggybackMarker.is_header(line)
+        or PiggybackMarker.is_footer(line)
+        or SectionMarker.is_header(line)
+        or SectionMarker.is_footer(line)
+    )
+
+
 class ParserState(abc.ABC):
     """Base class for the state machine.
 
@@ -184,7 +206,7 @@ class ParserState(abc.ABC):
         self._logger: Final = logger
 
     @abc.abstractmethod
-    def do_action(self, line: bytes) -> "ParserState":
+    def do_action(self, chunk: memoryview) -> "ParserState":
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -310,9 +332,7 @@ class ParserState(abc.ABC):
 
     @final
     def __call__(self, line: bytes) -> "ParserState":
-        if not line.strip():
-            return self
-
+        """Handle a marker line, see `is_marker()`"""
         try:
             if PiggybackMarker.is_header(line):
                 return self.on_piggyback_header(line)
@@ -322,7 +342,6 @@ class ParserState(abc.ABC):
                 return self.on_section_header(line)
             if SectionMarker.is_footer(line):
                 return self.on_section_footer(line)
-            return self.do_action(line)
         except Exception:
             if cmk.utils.debug.enabled():
                 raise
@@ -332,7 +351,7 @@ class ParserState(abc.ABC):
 
 
 class NOOPParser(ParserState):
-    def do_action(self, line: bytes) -> "ParserState":
+    def do_action(self, chunk: memoryview) -> "ParserState":
         return self
 
     def on_piggyback_header(self, line: bytes) -> "ParserState":
@@ -379,8 +398,8 @@ class PiggybackParser(ParserState):
         )
         self.current_host: Final = current_host
 
-    def do_action(self, line: bytes) -> "ParserState":
-        # We are not in a section -> ignore line.
+    def do_action(self, chunk: memoryview) -> "ParserState":
+        # We are not in a section -> ignore data.
         return self
 
     def on_piggyback_header(self, line: bytes) -> "ParserState":
@@ -432,9 +451,9 @@ class PiggybackSectionParser(ParserState):
         self.current_host: Final = current_host
         self.current_section: Final = current_section
 
-    def do_action(self, line: bytes) -> "ParserState":
+    def do_action(self, chunk: memoryview) -> "ParserState":
         assert self.piggyback_sections[self.current_host][-1].header == self.current_section
-        self.piggyback_sections[self.current_host][-1].section.append(AgentRawData(line))
+        self.piggyback_sections[self.current_host][-1].chunks.append(chunk)
         return self
 
     def on_piggyback_header(self, line: bytes) -> "ParserState":
@@ -481,7 +500,7 @@ class PiggybackNOOPParser(ParserState):
         )
         self.current_host: Final = current_host
 
-    def do_action(self, line: bytes) -> "PiggybackNOOPParser":
+    def do_action(self, chunk: memoryview) -> "PiggybackNOOPParser":
         return self
 
     def on_piggyback_header(self, line: bytes) -> "ParserState":
@@ -531,12 +550,9 @@ class HostSectionParser(ParserState):
         )
         self.current_section: Final = current_section
 
-    def do_action(self, line: bytes) -> "ParserState":
-        if not self.current_section.nostrip:
-            line = line.strip()
-
+    def do_action(self, chunk: memoryview) -> "ParserState":
         assert self.sections[-1].header == self.current_section
-        self.sections[-1].section.append(AgentRawData(line))
+        self.sections[-1].chunks.append(chunk)
         return self
 
     def on_piggyback_header(self, line: bytes) -> "ParserState":
@@ -607,10 +623,18 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
 
         def decode_sections(
             sections: ImmutableSection,
+            *,
+            selection: SectionNameCollection,
         ) -> MutableMapping[SectionName, List[AgentRawDataSection]]:
             out: MutableMapping[SectionName, List[AgentRawDataSection]] = {}
-            for header, content in sections:
-                out.setdefault(header.name, []).extend(header.parse_line(line) for line in content)
+            for section in sections:
+                header = section.header
+                if not (selection is NO_SELECTION or header.name in selection):
+                    continue
+                out.setdefault(header.name, []).extend(
+                    header.parse_line(line if header.nostrip else line.strip())
+                    for line in section.lines()
+                )
             return out
 
         def flatten_piggyback_section(
@@ -620,7 +644,8 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
             cache_for: int,
             selection: SectionNameCollection,
         ) -> Iterator[bytes]:
-            for header, content in sections:
+            for section in sections:
+                header = section.header
                 if not (selection is NO_SELECTION or header.name in selection):
                     continue
 
@@ -638,13 +663,9 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
                             header.separator,
                         )
                     ).encode(header.encoding)
-                yield from (bytes(line) for line in content)
+                yield from section.lines()
 
-        sections = {
-            name: content
-            for name, content in decode_sections(raw_sections).items()
-            if selection is NO_SELECTION or name in selection
-        }
+        sections = decode_sections(raw_sections, selection=selection)
         piggybacked_raw_data = {
             header.hostname: list(
                 flatten_piggyback_section(
@@ -685,7 +706,13 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
         self,
         raw_data: AgentRawData,
     ) -> Tuple[ImmutableSection, Mapping[PiggybackMarker, ImmutableSection]]:
-        """Split agent output in chunks, splits lines by whitespaces."""
+        """Split agent output in chunks of sections and piggybacked hosts.
+
+        Only the lines that may be markers are looked at: The data in between
+        is handed to the parser as slices of the raw data without copying or
+        splitting it.
+
+        """
         parser: ParserState = NOOPParser(
             self.hostname,
             [],
@@ -694,8 +721,28 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
             encoding_fallback=self.encoding_fallback,
             logger=self._logger,
         )
-        for line in raw_data.split(b"\n"):
-            parser = parser(line.rstrip(b"\r"))
+        buffer = memoryview(raw_data)
+        # Start of the data that has not been handed to the parser yet.
+        data_start = 0
+        pos = 0
+        while (marker_start := raw_data.find(b"<<<", pos)) != -1:
+            line_start = raw_data.rfind(b"\n", 0, marker_start) + 1
+            line_end = raw_data.find(b"\n", marker_start)
+            if line_end == -1:
+                line_end = len(raw_data)
+            pos = line_end + 1
+            if raw_data[line_start:marker_start].strip():
+                continue
+            line = raw_data[line_start:line_end].rstrip(b"\r")
+            if not is_marker(line):
+                continue
+            if data_start < line_start:
+                parser = parser.do_action(buffer[data_start:line_start])
+            parser = parser(line)
+            data_start = pos
+
+        if data_start < len(raw_data):
+            parser = parser.do_action(buffer[data_start:])
 
         return parser.sections, parser.piggyback_sections
 
@@ -7,12 +7,15 @@
 import contextlib
 import json
 import logging
+import math
 import os
 import sys
+import threading
+import time
 import traceback
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Iterable, Iterator, List, Mapping, NamedTuple, Optional
+from typing import Any, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence
 
 import cmk.utils.cleanup
 from cmk.utils.config_path import ConfigPath, VersionedConfigPath
@@ -48,6 +51,8 @@ class GlobalConfig(NamedTuple):
     cmc_log_level: int
     cluster_max_cachefile_age: int
     snmp_plugin_store: SNMPPluginStore
+    concurrent_fetchers: bool = False
+    fetcher_timeouts: Mapping[str, int] = {}
 
     @property
     def log_level(self) -> int:
@@ -75,6 +80,8 @@ class GlobalConfig(NamedTuple):
             cmc_log_level=fetcher_config["cmc_log_level"],
             cluster_max_cachefile_age=fetcher_config["cluster_max_cachefile_age"],
             snmp_plugin_store=SNMPPluginStore.deserialize(fetcher_config["snmp_plugin_store"]),
+            concurrent_fetchers=fetcher_config.get("concurrent_fetchers", False),
+            fetcher_timeouts=fetcher_config.get("fetcher_timeouts", {}),
         )
 
     def serialize(self) -> Mapping[str, Any]:
@@ -83,6 +90,8 @@ class GlobalConfig(NamedTuple):
                 "cmc_log_level": self.cmc_log_level,
                 "cluster_max_cachefile_age": self.cluster_max_cachefile_age,
                 "snmp_plugin_store": self.snmp_plugin_store.serialize(),
+                "concurrent_fetchers": self.concurrent_fetchers,
+                "fetcher_timeouts": dict(self.fetcher_timeouts),
             },
         }
 
@@ -115,7 +124,11 @@ def process_command(raw_command: str, observer: ABCResourceObserver) -> None:
             global_config = load_global_config(make_global_config_path(command.config_path))
             logging.getLogger().setLevel(global_config.log_level)
             SNMPFetcher.plugin_store = global_config.snmp_plugin_store
-            run_fetchers(**command._asdict())
+            run_fetchers(
+                **command._asdict(),
+                concurrent=global_config.concurrent_fetchers,
+                fetcher_timeouts=global_config.fetcher_timeouts,
+            )
             observer.check_resources(raw_command)
         except Exception as e:
             crash_info = create_fetcher_crash_dump(
@@ -135,12 +148,25 @@ def _confirm_command_processed() -> Iterator[None]:
 
 
 def run_fetchers(
-    config_path: VersionedConfigPath, host_name: HostName, timeout: int, mode: Mode
+    config_path: VersionedConfigPath,
+    host_name: HostName,
+    timeout: int,
+    mode: Mode,
+    *,
+    concurrent: bool = False,
+    fetcher_timeouts: Optional[Mapping[str, int]] = None,
 ) -> None:
     """Entry point from bin/fetcher"""
     try:
         # Usually OMD_SITE/var/check_mk/core/fetcher-config/[config-serial]/[host].json
-        _run_fetchers_from_file(config_path, host_name, timeout, mode=mode)
+        _run_fetchers_from_file(
+            config_path,
+            host_name,
+            timeout,
+            mode=mode,
+            concurrent=concurrent,
+            fetcher_timeouts=fetcher_timeouts,
+        )
     except FileNotFoundError:
         # Not an error.
         logger.warning("fetcher file for host %r and %s is absent", host_name, config_path)
@@ -165,6 +191,7 @@ def load_global_config(path: Path) -> GlobalConfig:
 def _run_fetcher(fetcher: Fetcher, mode: Mode) -> protocol.FetcherMessage:
     """Entrypoint to obtain data from fetcher objects."""
     logger.debug("Fetch from %s", fetcher)
+    start = time.monotonic()
     with CPUTracker() as tracker:
         try:
             with fetcher:
@@ -176,9 +203,156 @@ def _run_fetcher(fetcher: Fetcher, mode: Mode) -> protocol.FetcherMessage:
         raw_data,
         tracker.duration,
         FetcherType.from_fetcher(fetcher),
+        wall_time=time.monotonic() - start,
     )
 
 
+def _run_fetchers_concurrently(
+    fetchers: Sequence[Fetcher],
+    mode: Mode,
+    *,
+    timeout: int,
+    timeout_message: str,
+    fetcher_timeouts: Optional[Mapping[str, int]] = None,
+) -> List[protocol.FetcherMessage]:
+    """Run the fetchers of a host at the same time, each one until its deadline
+
+    A fetcher has until its own timeout (by the name of its fetcher type) or the timeout
+    of the host, whichever ends first. The fetchers which can be cancelled run in their
+    own thread. The others, e.g. the SNMP fetcher, run one after the other in the main
+    thread under the alarm signal, like in the sequential mode.
+
+    Fetchers which are not done at their deadline are cancelled and reported as timed
+    out, the results of the others are kept.
+    """
+    start = time.monotonic()
+    timeouts = [
+        min(timeout, (fetcher_timeouts or {}).get(FetcherType.from_fetcher(fetcher).name, timeout))
+        for fetcher in fetchers
+    ]
+    timeout_messages = [
+        timeout_message
+        if fetcher_timeout == timeout
+        else f"{FetcherType.from_fetcher(fetcher).name} fetcher timed out after "
+        f"{fetcher_timeout} seconds"
+        for fetcher, fetcher_timeout in zip(fetchers, timeouts)
+    ]
+    results: List[Optional[protocol.FetcherMessage]] = [None] * len(fetchers)
+    done = threading.Condition()
+
+    def run(index: int, fetcher: Fetcher) -> None:
+        message = _run_fetcher(fetcher, mode)
+        with done:
+            results[index] = message
+            done.notify()
+
+    threaded = [index for index, fetcher in enumerate(fetchers) if _is_cancellable(fetcher)]
+    for index in threaded:
+        threading.Thread(
+            target=run,
+            args=(index, fetchers[index]),
+            name=f"fetcher-{FetcherType.from_fetcher(fetchers[index]).name.lower()}-{index}",
+            daemon=True,
+        ).start()
+
+    for index, fetcher in enumerate(fetchers):
+        if index in threaded:
+            continue
+        message = _run_fetcher_until(
+            fetcher,
+            mode,
+            timeout=timeouts[index] - (time.monotonic() - start),
+            timeout_message=timeout_messages[index],
+        )
+        with done:
+            results[index] = message
+
+    with done:
+        while True:
+            elapsed = time.monotonic() - start
+            pending = [
+                timeouts[index] - elapsed
+                for index in threaded
+                if results[index] is None and timeouts[index] > elapsed
+            ]
+            if not pending:
+                break
+            done.wait(min(pending))
+        messages = list(results)
+
+    wall_time = time.monotonic() - start
+    for fetcher, message in zip(fetchers, messages):
+        if message is None:
+            logger.debug("Cancel %s", fetcher)
+            fetcher.cancel()
+
+    return [
+        protocol.FetcherMessage.timeout(
+            FetcherType.from_fetcher(fetcher),
+            MKTimeout(fetcher_timeout_message),
+            Snapshot.null(),
+            wall_time=min(wall_time, fetcher_timeout),
+        )
+        if message is None
+        else message
+        for fetcher, message, fetcher_timeout, fetcher_timeout_message in zip(
+            fetchers, messages, timeouts, timeout_messages
+        )
+    ]
+
+
+def _is_cancellable(fetcher: Fetcher) -> bool:
+    """Whether a fetch can be aborted from another thread, see Fetcher.cancel()"""
+    return type(fetcher).cancel is not Fetcher.cancel
+
+
+def _run_fetcher_until(
+    fetcher: Fetcher, mode: Mode, *, timeout: float, timeout_message: str
+) -> protocol.FetcherMessage:
+    """Run the fetcher in the main thread, interrupted by the alarm signal at the deadline"""
+    if timeout <= 0:
+        return protocol.FetcherMessage.timeout(
+            FetcherType.from_fetcher(fetcher), MKTimeout(timeout_message), Snapshot.null()
+        )
+    with Timeout(math.ceil(timeout), message=timeout_message) as timeout_manager:
+        try:
+            message = _run_fetcher(fetcher, mode)
+        except MKTimeout as exc:
+            message = protocol.FetcherMessage.timeout(
+                FetcherType.from_fetcher(fetcher), exc, Snapshot.null()
+            )
+
+    if timeout_manager.signaled:
+        (message,) = _replace_netsnmp_obfuscated_timeout([message], timeout_manager.message)
+    return message
+
+
+def _run_fetchers_sequentially(
+    fetchers: Sequence[Fetcher], mode: Mode, *, timeout: int, timeout_message: str
+) -> List[protocol.FetcherMessage]:
+    """Run the fetchers one after the other, all of them have to be done until the deadline"""
+    messages: List[protocol.FetcherMessage] = []
+    with Timeout(timeout, message=timeout_message) as timeout_manager:
+        try:
+            # fill as many messages as possible before timeout exception raised
+            for fetcher in fetchers:
+                messages.append(_run_fetcher(fetcher, mode))
+        except MKTimeout as exc:
+            # fill missing entries with timeout errors
+            messages.extend(
+                protocol.FetcherMessage.timeout(
+                    FetcherType.from_fetcher(fetcher),
+                    exc,
+                    Snapshot.null(),
+                )
+                for fetcher in fetchers[len(messages) :]
+            )
+
+    if timeout_manager.signaled:
+        messages = _replace_netsnmp_obfuscated_timeout(messages, timeout_manager.message)
+    return messages
+
+
 def _parse_config(config_path: ConfigPath, host_name: HostName) -> Iterator[Fetcher]:
     with make_local_config_path(config_path, host_name).open() as f:
         data = json.load(f)
@@ -223,6 +397,9 @@ def _run_fetchers_from_file(
     host_name: HostName,
     timeout: int,
     mode: Mode,
+    *,
+    concurrent: bool = False,
+    fetcher_timeouts: Optional[Mapping[str, int]] = None,
 ) -> None:
     """Writes to the stdio next data:
     Count Answer        Content               Action
@@ -232,31 +409,27 @@ def _run_fetchers_from_file(
     1     End of reply  empty                 End IO
 
     """
-    messages: List[protocol.FetcherMessage] = []
-    with CPUTracker() as cpu_tracker, Timeout(
-        timeout,
-        message=f'Fetcher for host "{host_name}" timed out after {timeout} seconds',
-    ) as timeout_manager:
+    with CPUTracker() as cpu_tracker:
         fetchers = tuple(_parse_config(config_path, host_name))
-        try:
-            # fill as many messages as possible before timeout exception raised
-            for fetcher in fetchers:
-                messages.append(_run_fetcher(fetcher, mode))
-        except MKTimeout as exc:
-            # fill missing entries with timeout errors
-            messages.extend(
-                protocol.FetcherMessage.timeout(
-                    FetcherType.from_fetcher(fetcher),
-                    exc,
-                    Snapshot.null(),
-                )
-                for fetcher in fetchers[len(messages) :]
+        timeout_message = f'Fetcher for host "{host_name}" timed out after {timeout} seconds'
+        if concurrent:
+            messages = _run_fetchers_concurrently(
+                fetchers,
+                mode,
+                timeout=timeout,
+                timeout_message=timeout_message,
+                fetcher_timeouts=fetcher_timeouts,
+            )
+        else:
+            messages = _run_fetchers_sequentially(
+                fetchers, mode, timeout=timeout, timeout_message=timeout_message
             )
-
-    if timeout_manager.signaled:
-        messages = _replace_netsnmp_obfuscated_timeout(messages, timeout_manager.message)
 
     logger.debug("Produced %d messages", len(messages))
+    for msg in messages:
+        logger.debug(
+            "%s fetcher: %.3f seconds wall time", msg.header.fetcher_type.name, msg.stats.wall_time
+        )
     write(
         protocol.CMCMessage.result_answer(
             messages,
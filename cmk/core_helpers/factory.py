@@ -9,7 +9,7 @@ from typing import Optional
 
 from cmk.snmplib.type_defs import SNMPBackend, SNMPBackendEnum, SNMPHostConfig
 
-from .snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from .snmp_backend import BulkSNMPBackend, ClassicSNMPBackend, StoredWalkSNMPBackend
 
 try:
     from .cee.snmp_backend import inline  # type: ignore[import]
@@ -42,6 +42,12 @@ def backend(
     if inline and snmp_config.snmp_backend == SNMPBackendEnum.INLINE:
         return inline.InlineSNMPBackend(snmp_config, logger)
 
+    if snmp_config.snmp_backend == SNMPBackendEnum.BULK:
+        # SNMPv3 needs the USM, which is left to Net-SNMP
+        if snmp_config.is_snmpv3_host:
+            return ClassicSNMPBackend(snmp_config, logger)
+        return BulkSNMPBackend(snmp_config, logger)
+
     if snmp_config.snmp_backend == SNMPBackendEnum.CLASSIC:
         return ClassicSNMPBackend(snmp_config, logger)
 
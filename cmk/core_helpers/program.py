@@ -111,6 +111,9 @@ class ProgramFetcher(Fetcher[AgentRawData]):
                 stderr=subprocess.PIPE,
                 close_fds=True,
             )
+        if self._cancelled:
+            # Cancelled while the process was started
+            self.cancel()
 
     def close(self):
         if self._process is None:
@@ -141,6 +144,17 @@ class ProgramFetcher(Fetcher[AgentRawData]):
         self._process.stderr.close()
         self._process = None
 
+    def cancel(self) -> None:
+        self._cancelled = True
+        process = self._process
+        if process is None:
+            return
+        with suppress(OSError):
+            if self.is_cmc:
+                os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+            else:
+                process.kill()
+
     def _fetch_from_io(self, mode: Mode) -> AgentRawData:
         if self._process is None:
             raise MKFetcherError("No process")
@@ -61,7 +61,7 @@ import logging
 import math
 import pickle
 import struct
-from typing import Final, Generic, Iterator, Sequence, Type, Union
+from typing import Final, Generic, Iterator, Optional, Sequence, Type, Union
 
 import cmk.utils.log as log
 from cmk.utils.cpu_tracking import Snapshot
@@ -133,18 +133,30 @@ class ResultMessage(Serializer, Deserializer, Generic[TRawData]):
 
 
 class ResultStats(Serializer, Deserializer):
-    def __init__(self, duration: Snapshot) -> None:
+    """The resources used by a fetcher
+
+    The CPU times of fetchers running concurrently overlap, the wall time is the time from
+    the start of the fetcher until its result (or its timeout).
+    """
+
+    def __init__(self, duration: Snapshot, wall_time: Optional[float] = None) -> None:
         self.duration: Final = duration
+        self.wall_time: Final = duration.process.elapsed if wall_time is None else wall_time
 
     def __repr__(self) -> str:
-        return f"{type(self).__name__}({self.duration!r})"
+        return f"{type(self).__name__}({self.duration!r}, {self.wall_time!r})"
 
     def __iter__(self) -> Iterator[bytes]:
-        yield json.dumps({"duration": self.duration.serialize()}).encode("ascii")
+        yield json.dumps(
+            {"duration": self.duration.serialize(), "wall_time": self.wall_time}
+        ).encode("ascii")
 
     @classmethod
     def from_bytes(cls, data: bytes) -> ResultStats:
-        return ResultStats(Snapshot.deserialize(json.loads(data.decode("ascii"))["duration"]))
+        serialized = json.loads(data.decode("ascii"))
+        return ResultStats(
+            Snapshot.deserialize(serialized["duration"]), serialized.get("wall_time")
+        )
 
 
 class PayloadType(enum.Enum):
@@ -406,8 +418,10 @@ class FetcherMessage(Serializer, Deserializer):
         raw_data: result.Result[TRawData, Exception],
         duration: Snapshot,
         fetcher_type: FetcherType,
+        *,
+        wall_time: Optional[float] = None,
     ) -> FetcherMessage:
-        stats = ResultStats(duration)
+        stats = ResultStats(duration, wall_time)
         if raw_data.is_error():
             error_payload = ErrorResultMessage(raw_data.error)
             return cls(
@@ -454,8 +468,15 @@ class FetcherMessage(Serializer, Deserializer):
         )
 
     @classmethod
-    def error(cls, fetcher_type: FetcherType, exc: Exception, duration: Snapshot) -> FetcherMessage:
-        stats = ResultStats(duration)
+    def error(
+        cls,
+        fetcher_type: FetcherType,
+        exc: Exception,
+        duration: Snapshot,
+        *,
+        wall_time: Optional[float] = None,
+    ) -> FetcherMessage:
+        stats = ResultStats(duration, wall_time)
         payload = ErrorResultMessage(exc)
         return cls(
             FetcherHeader(
@@ -475,8 +496,10 @@ class FetcherMessage(Serializer, Deserializer):
         fetcher_type: FetcherType,
         exc: MKTimeout,
         duration: Snapshot,
+        *,
+        wall_time: Optional[float] = None,
     ) -> FetcherMessage:
-        stats = ResultStats(duration)
+        stats = ResultStats(duration, wall_time)
         payload = ErrorResultMessage(exc)
         return cls(
             FetcherHeader(
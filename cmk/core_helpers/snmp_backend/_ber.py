@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Basic encoding rules of the SNMP messages of version 1 and 2c
+
+Only the subset of BER used by SNMP is supported: Definite lengths, primitive values and
+the constructed sequences of messages, PDUs and variable bindings (RFC 1157, RFC 3416).
+"""
+
+import enum
+from typing import List, NamedTuple, Sequence, Tuple
+
+__all__ = [
+    "decode_message",
+    "decode_oid",
+    "encode_integer",
+    "encode_message",
+    "encode_oid",
+    "Message",
+    "OIDTuple",
+    "PDUType",
+    "SNMPBERError",
+    "Tag",
+    "VarBind",
+]
+
+OIDTuple = Tuple[int, ...]
+
+
+class SNMPBERError(Exception):
+    pass
+
+
+class Tag(enum.IntEnum):
+    INTEGER = 0x02
+    OCTET_STRING = 0x04
+    NULL = 0x05
+    OBJECT_IDENTIFIER = 0x06
+    SEQUENCE = 0x30
+    IP_ADDRESS = 0x40
+    COUNTER32 = 0x41
+    GAUGE32 = 0x42
+    TIMETICKS = 0x43
+    OPAQUE = 0x44
+    COUNTER64 = 0x46
+    NO_SUCH_OBJECT = 0x80
+    NO_SUCH_INSTANCE = 0x81
+    END_OF_MIB_VIEW = 0x82
+
+
+class PDUType(enum.IntEnum):
+    GET_REQUEST = 0xA0
+    GET_NEXT_REQUEST = 0xA1
+    RESPONSE = 0xA2
+    GET_BULK_REQUEST = 0xA5
+
+
+class VarBind(NamedTuple):
+    oid: OIDTuple
+    tag: int
+    value: bytes  # The contents octets
+
+
+class Message(NamedTuple):
+    version: int  # 0: SNMPv1, 1: SNMPv2c
+    community: bytes
+    pdu_type: int
+    request_id: int
+    # error-status and error-index, non-repeaters and max-repetitions of GETBULK
+    error_status: int
+    error_index: int
+    varbinds: Sequence[VarBind]
+
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    octets = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(octets)]) + octets
+
+
+def _encode_tlv(tag: int, contents: bytes) -> bytes:
+    return bytes([tag]) + _encode_length(len(contents)) + contents
+
+
+def encode_integer(value: int, signed: bool = True) -> bytes:
+    """The contents octets of an integer, the application types are unsigned"""
+    if signed:
+        return value.to_bytes(
+            (value if value >= 0 else ~value).bit_length() // 8 + 1, "big", signed=True
+        )
+    return value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big")
+
+
+def _encode_integer(value: int) -> bytes:
+    return _encode_tlv(Tag.INTEGER, encode_integer(value))
+
+
+def _encode_subid(subid: int) -> bytes:
+    octets = [subid & 0x7F]
+    subid >>= 7
+    while subid:
+        octets.append(0x80 | subid & 0x7F)
+        subid >>= 7
+    return bytes(reversed(octets))
+
+
+def encode_oid(oid: OIDTuple) -> bytes:
+    """The contents octets of an OID"""
+    if len(oid) < 2 or oid[0] > 2 or (oid[0] < 2 and oid[1] > 39):
+        raise SNMPBERError("Invalid OID %r" % (oid,))
+    return b"".join(_encode_subid(subid) for subid in (oid[0] * 40 + oid[1], *oid[2:]))
+
+
+def encode_message(message: Message) -> bytes:
+    varbinds = b"".join(
+        _encode_tlv(
+            Tag.SEQUENCE,
+            _encode_tlv(Tag.OBJECT_IDENTIFIER, encode_oid(varbind.oid))
+            + _encode_tlv(varbind.tag, varbind.value),
+        )
+        for varbind in message.varbinds
+    )
+    pdu = (
+        _encode_integer(message.request_id)
+        + _encode_integer(message.error_status)
+        + _encode_integer(message.error_index)
+        + _encode_tlv(Tag.SEQUENCE, varbinds)
+    )
+    return _encode_tlv(
+        Tag.SEQUENCE,
+        _encode_integer(message.version)
+        + _encode_tlv(Tag.OCTET_STRING, message.community)
+        + _encode_tlv(message.pdu_type, pdu),
+    )
+
+
+def _decode_tlv(data: bytes, offset: int, end: int) -> Tuple[int, int, int]:
+    """Tag, start and end of the contents of the TLV at the offset"""
+    if offset + 2 > end:
+        raise SNMPBERError("Truncated message")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        num_octets = length & 0x7F
+        if not 0 < num_octets <= 4 or offset + num_octets > end:
+            raise SNMPBERError("Invalid length")
+        length = int.from_bytes(data[offset : offset + num_octets], "big")
+        offset += num_octets
+    if offset + length > end:
+        raise SNMPBERError("Truncated message")
+    return tag, offset, offset + length
+
+
+def _decode_expected(data: bytes, offset: int, end: int, tag: int) -> Tuple[int, int]:
+    actual, start, stop = _decode_tlv(data, offset, end)
+    if actual != tag:
+        raise SNMPBERError("Expected tag 0x%02x, got 0x%02x" % (tag, actual))
+    return start, stop
+
+
+def _decode_integer(data: bytes, offset: int, end: int) -> Tuple[int, int]:
+    start, stop = _decode_expected(data, offset, end, Tag.INTEGER)
+    if start == stop:
+        raise SNMPBERError("Empty integer")
+    return int.from_bytes(data[start:stop], "big", signed=True), stop
+
+
+def decode_oid(contents: bytes) -> OIDTuple:
+    subids: List[int] = []
+    subid = 0
+    for octet in contents:
+        subid = subid << 7 | octet & 0x7F
+        if not octet & 0x80:
+            subids.append(subid)
+            subid = 0
+    if not subids or contents[-1] & 0x80:
+        raise SNMPBERError("Invalid OID")
+    first = min(subids[0] // 40, 2)
+    return (first, subids[0] - 40 * first, *subids[1:])
+
+
+def decode_message(data: bytes) -> Message:
+    start, end = _decode_expected(data, 0, len(data), Tag.SEQUENCE)
+    version, offset = _decode_integer(data, start, end)
+    community_start, offset = _decode_expected(data, offset, end, Tag.OCTET_STRING)
+    community = data[community_start:offset]
+    pdu_type, offset, pdu_end = _decode_tlv(data, offset, end)
+    request_id, offset = _decode_integer(data, offset, pdu_end)
+    error_status, offset = _decode_integer(data, offset, pdu_end)
+    error_index, offset = _decode_integer(data, offset, pdu_end)
+    offset, varbinds_end = _decode_expected(data, offset, pdu_end, Tag.SEQUENCE)
+
+    varbinds = []
+    while offset < varbinds_end:
+        varbind_start, offset = _decode_expected(data, offset, varbinds_end, Tag.SEQUENCE)
+        oid_start, value_offset = _decode_expected(
+            data, varbind_start, offset, Tag.OBJECT_IDENTIFIER
+        )
+        tag, value_start, value_end = _decode_tlv(data, value_offset, offset)
+        varbinds.append(
+            VarBind(decode_oid(data[oid_start:value_offset]), tag, data[value_start:value_end])
+        )
+    return Message(version, community, pdu_type, request_id, error_status, error_index, varbinds)
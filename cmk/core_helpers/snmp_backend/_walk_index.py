@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Binary index of stored SNMP walks
+
+A text walk is compiled once into a file which is memory mapped by all processes using
+it. The rows are sorted by their OIDs. After a header with the sizes of the sections and
+the modification time and size of the walk, an index file consists of the sections
+
+* start of each OID in the sub identifiers (unsigned 64 bit, one more than rows),
+* sub identifiers of all OIDs (unsigned 32 bit),
+* start of each OID in the OID texts (unsigned 64 bit, one more than rows),
+* start of each value in the values (unsigned 64 bit, one more than rows),
+* flags of the rows, 1 for values which have to be processed by the agent simulator,
+* OID texts as found in the walk, each one terminated by a newline,
+* values as returned by the backend, unprocessed texts for flagged rows.
+
+Each section starts at a multiple of 8 bytes, all numbers are in native byte order. The
+rows below an OID are found by two binary searches on the sub identifiers, no line of
+the walk has to be parsed for a lookup.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Iterable, Iterator, List, Sequence, Tuple, Union
+
+import cmk.utils.agent_simulator as agent_simulator
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.type_defs import AgentRawData
+
+from cmk.snmplib.type_defs import SNMPRowInfo
+
+from ._utils import strip_snmp_value
+
+__all__ = ["WalkIndex", "compile_walk", "iter_walk_lines", "load_walk_index", "parse_oid"]
+
+_MAGIC = b"CMKWALK\x01"
+# Written in native byte order, an index of another byte order is invalid
+_BYTE_ORDER_MARK = 0x0102030405060708
+# magic, byte order mark, rows, sub identifiers, size of OID texts, size of values,
+# walk mtime (ns), walk size
+_HEADER = struct.Struct("=8sQQQQQqQ")
+
+
+def iter_walk_lines(path: Union[str, Path]) -> Iterator[str]:
+    """The lines of a walk, continuation lines are appended to the line of their OID"""
+    with open(path) as f:
+        line = None
+        # Sometimes there are newlines in the data of snmpwalks.
+        # Append the data to the last OID rather than throwing it away/skipping it.
+        for text in f:
+            if text.startswith("."):
+                if line is not None:
+                    yield line
+                line = text
+            elif line is not None:
+                line += text
+        if line is not None:
+            yield line
+
+
+def parse_oid(oid: str) -> List[int]:
+    try:
+        return list(map(int, oid.strip(".").split(".")))
+    except Exception:
+        raise MKGeneralException("Invalid OID %s" % oid)
+
+
+def _sections(num_rows: int, num_subids: int, texts_size: int, values_size: int) -> List[slice]:
+    sections = []
+    offset = _HEADER.size
+    for size in [
+        8 * (num_rows + 1),
+        4 * num_subids,
+        8 * (num_rows + 1),
+        8 * (num_rows + 1),
+        num_rows,
+        texts_size,
+        values_size,
+    ]:
+        sections.append(slice(offset, offset + size))
+        offset += size + -size % 8
+    return sections
+
+
+class WalkIndex:
+    """Sorted rows of a walk in a buffer created by compile_walk()"""
+
+    def __init__(self, buf: Union[bytes, mmap.mmap]) -> None:
+        super().__init__()
+        if len(buf) < _HEADER.size:
+            raise MKGeneralException("Invalid SNMP walk index")
+        magic, mark, num_rows, *sizes, mtime_ns, size = _HEADER.unpack_from(buf)
+        sections = _sections(num_rows, *sizes)
+        if magic != _MAGIC or mark != _BYTE_ORDER_MARK or len(buf) != sections[-1].stop:
+            raise MKGeneralException("Invalid SNMP walk index")
+        self.source_stat = (mtime_ns, size)
+        self.num_rows = num_rows
+        self._buf = buf
+        self._view = memoryview(buf)
+        self._oid_starts = self._view[sections[0]].cast("Q")
+        self._subids = self._view[sections[1]].cast("I")
+        self._text_starts = self._view[sections[2]].cast("Q")
+        self._value_starts = self._view[sections[3]].cast("Q")
+        self._flags = self._view[sections[4]]
+        self._texts = self._view[sections[5]]
+        self._values = self._view[sections[6]]
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "WalkIndex":
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf)
+        except MKGeneralException:
+            buf.close()
+            raise
+
+    def close(self) -> None:
+        # The mapping can only be closed when no views of it are left
+        for view in [
+            self._oid_starts,
+            self._subids,
+            self._text_starts,
+            self._value_starts,
+            self._flags,
+            self._texts,
+            self._values,
+            self._view,
+        ]:
+            view.release()
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    def oid(self, row: int) -> List[int]:
+        return self._subids[self._oid_starts[row] : self._oid_starts[row + 1]].tolist()
+
+    def _bisect(self, oid: List[int]) -> int:
+        """The first row with an OID not lower than the given one"""
+        low, high = 0, self.num_rows
+        while low < high:
+            middle = (low + high) // 2
+            if self.oid(middle) < oid:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, prefix: List[int]) -> range:
+        """The rows with the given OID and the OIDs below it"""
+        if not prefix:
+            return range(self.num_rows)
+        start = self._bisect(prefix)
+        # All OIDs starting with the prefix are lower than the next OID on its level
+        return range(start, self._bisect(prefix[:-1] + [prefix[-1] + 1]))
+
+    def rows(self, rows: range) -> SNMPRowInfo:
+        """The OIDs and values of consecutive rows"""
+        if not rows:
+            return []
+        start, stop = rows.start, rows.stop
+        text_starts = self._text_starts
+        oids = self._texts[text_starts[start] : text_starts[stop] - 1].tobytes().decode()
+        value_starts = self._value_starts[start : stop + 1].tolist()
+        offset = value_starts[0]
+        values = self._values[offset : value_starts[-1]].tobytes()
+        rowinfo = list(
+            zip(
+                oids.split("\n"),
+                [
+                    values[begin - offset : end - offset]
+                    for begin, end in zip(value_starts, value_starts[1:])
+                ],
+            )
+        )
+        flags = self._flags[start:stop]
+        if any(flags):
+            for nr, flag in enumerate(flags):
+                if flag:
+                    # FIXME: This encoding ping-pong os horrible...
+                    value = agent_simulator.process(AgentRawData(rowinfo[nr][1])).decode()
+                    rowinfo[nr] = (rowinfo[nr][0], strip_snmp_value(value))
+        return rowinfo
+
+
+class _WalkBuilder:
+    """The sections of an index, filled row by row"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.oid_starts = array("Q", [0])
+        self.subids = array("I")
+        self.text_starts = array("Q", [0])
+        self.value_starts = array("Q", [0])
+        self.flags = bytearray()
+        self.texts = bytearray()
+        self.values = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def oid(self, row: int) -> List[int]:
+        return self.subids[self.oid_starts[row] : self.oid_starts[row + 1]].tolist()
+
+    def append(self, oid: Sequence[int], text: bytes, value: bytes, flag: int) -> None:
+        try:
+            self.subids.extend(oid)
+        except OverflowError:
+            raise MKGeneralException("Invalid OID %s" % text.decode().strip())
+        self.oid_starts.append(len(self.subids))
+        self.texts += text
+        self.text_starts.append(len(self.texts))
+        self.values += value
+        self.value_starts.append(len(self.values))
+        self.flags.append(flag)
+
+    def row(self, row: int) -> Tuple[List[int], bytes, bytes, int]:
+        return (
+            self.oid(row),
+            self.texts[self.text_starts[row] : self.text_starts[row + 1]],
+            self.values[self.value_starts[row] : self.value_starts[row + 1]],
+            self.flags[row],
+        )
+
+    def sorted(self) -> "_WalkBuilder":
+        builder = _WalkBuilder()
+        for row in sorted(range(len(self)), key=self.oid):
+            builder.append(*self.row(row))
+        return builder
+
+    def serialize(self, mtime_ns: int, size: int) -> Iterator[bytes]:
+        sizes = (len(self.subids), len(self.texts), len(self.values))
+        yield _HEADER.pack(_MAGIC, _BYTE_ORDER_MARK, len(self), *sizes, mtime_ns, size)
+        offset = _HEADER.size
+        for section in [
+            self.oid_starts,
+            self.subids,
+            self.text_starts,
+            self.value_starts,
+            self.flags,
+            self.texts,
+            self.values,
+        ]:
+            data = section if isinstance(section, bytearray) else section.tobytes()
+            yield b"\0" * (-offset % 8)
+            yield data
+            offset += -offset % 8 + len(data)
+
+
+def _read_walk(lines: Iterable[str]) -> _WalkBuilder:
+    builder = _WalkBuilder()
+    last_oid: List[int] = []
+    is_sorted = True
+    for line in lines:
+        parts = line.split(None, 1)
+        oid = parse_oid(parts[0])
+        text = parts[0].encode() + b"\n"
+        value = parts[1] if len(parts) > 1 else ""
+        if "%{" in value:
+            builder.append(oid, text, value.encode(), 1)
+        else:
+            builder.append(oid, text, strip_snmp_value(value), 0)
+        is_sorted = is_sorted and last_oid <= oid
+        last_oid = oid
+    return builder if is_sorted else builder.sorted()
+
+
+def compile_walk(walk_path: Union[str, Path], index_path: Union[str, Path, None]) -> WalkIndex:
+    """Convert a text walk to an index, which is written to the index path if given
+
+    The index file is replaced atomically, so other processes may still use the old one.
+    """
+    stat = os.stat(walk_path)
+    chunks = _read_walk(iter_walk_lines(walk_path)).serialize(stat.st_mtime_ns, stat.st_size)
+
+    if index_path is None:
+        return WalkIndex(b"".join(chunks))
+
+    index_path = Path(index_path)
+    with NamedTemporaryFile(
+        "wb", dir=str(index_path.parent), prefix=".%s.new" % index_path.name, delete=False
+    ) as tmp:
+        tmp_path = Path(tmp.name)
+        try:
+            tmp.writelines(chunks)
+        except BaseException:
+            tmp_path.unlink()
+            raise
+    tmp_path.rename(index_path)
+    return WalkIndex.open(index_path)
+
+
+def load_walk_index(walk_path: Union[str, Path], index_path: Union[str, Path]) -> WalkIndex:
+    """The index of a walk, which is (re)compiled if it is missing or outdated
+
+    Without permission to write the index it is only compiled in memory.
+    """
+    stat = os.stat(walk_path)
+    try:
+        index = WalkIndex.open(index_path)
+    except (OSError, ValueError, MKGeneralException):
+        pass
+    else:
+        if index.source_stat == (stat.st_mtime_ns, stat.st_size):
+            return index
+        index.close()
+
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        return compile_walk(walk_path, index_path)
+    except PermissionError:
+        return compile_walk(walk_path, None)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""In process SNMP backend for SNMP version 1 and 2c
+
+The requests are encoded in Python and sent over UDP, no Net-SNMP process is forked. All
+columns of a table are walked with common requests: Bulk walk hosts get GETBULK
+requests, the others GETNEXT requests with one variable binding per column. The
+requests of several hosts can be processed concurrently with walk_hosts().
+"""
+
+import itertools
+import random
+import selectors
+import socket
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.log import console
+from cmk.utils.type_defs import SectionName
+
+from cmk.snmplib.type_defs import (
+    OID,
+    SNMPBackend,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+from ._ber import (
+    decode_message,
+    decode_oid,
+    encode_message,
+    Message,
+    OIDTuple,
+    PDUType,
+    SNMPBERError,
+    Tag,
+    VarBind,
+)
+
+__all__ = ["BulkSNMPBackend", "walk_hosts"]
+
+# Defaults of the Net-SNMP tools
+_DEFAULT_TIMEOUT = 1.0
+_DEFAULT_RETRIES = 5
+_DEFAULT_MAX_REPETITIONS = 10
+
+_ERROR_TOO_BIG = 1
+_ERROR_NO_SUCH_NAME = 2
+
+_UNSIGNED_TAGS = {Tag.COUNTER32, Tag.GAUGE32, Tag.TIMETICKS, Tag.COUNTER64}
+_EXCEPTION_TAGS = {Tag.NO_SUCH_OBJECT, Tag.NO_SUCH_INSTANCE, Tag.END_OF_MIB_VIEW}
+
+_request_ids = itertools.count(random.randrange(1, 2**30))
+
+
+def _parse_oid(oid: OID) -> OIDTuple:
+    try:
+        return tuple(map(int, oid.strip(".").split(".")))
+    except ValueError:
+        raise MKGeneralException("Invalid OID %s" % oid)
+
+
+def _format_oid(oid: OIDTuple) -> OID:
+    return "." + ".".join(map(str, oid))
+
+
+def _raw_value(varbind: VarBind) -> SNMPRawValue:
+    """The value like it is returned by the other backends"""
+    if varbind.tag == Tag.INTEGER:
+        return b"%d" % int.from_bytes(varbind.value, "big", signed=True)
+    if varbind.tag in _UNSIGNED_TAGS:
+        return b"%d" % int.from_bytes(varbind.value, "big")
+    if varbind.tag == Tag.OBJECT_IDENTIFIER:
+        return _format_oid(decode_oid(varbind.value)).encode()
+    if varbind.tag == Tag.IP_ADDRESS:
+        return ".".join(map(str, varbind.value)).encode()
+    return varbind.value
+
+
+class _Session:
+    """The requests of one operation on one host, sent one after the other"""
+
+    def __init__(self, config: SNMPHostConfig) -> None:
+        super().__init__()
+        if not isinstance(config.credentials, str):
+            raise MKGeneralException(
+                "The bulk SNMP backend only supports SNMP v1 and v2c (host %s)" % config.hostname
+            )
+        if not config.ipaddress:
+            raise MKSNMPError("Host %s has no IP address configured" % config.hostname)
+        self.family = socket.AF_INET6 if config.is_ipv6_primary else socket.AF_INET
+        self.address = (config.ipaddress, config.port)
+        self.use_bulk = config.is_bulkwalk_host
+        self.version = (
+            1 if config.is_bulkwalk_host or config.is_snmpv2or3_without_bulkwalk_host else 0
+        )
+        self.community = config.credentials.encode("utf-8")
+        self.timeout = float(config.timing.get("timeout", _DEFAULT_TIMEOUT))
+        self.retries = int(config.timing.get("retries", _DEFAULT_RETRIES))
+        self.error: Optional[Exception] = None
+        self.done = False
+
+    def request(self, request_id: int) -> bytes:
+        pdu_type, varbinds, field1, field2 = self._next_request()
+        return encode_message(
+            Message(self.version, self.community, pdu_type, request_id, field1, field2, varbinds)
+        )
+
+    def _next_request(self) -> Tuple[int, Sequence[VarBind], int, int]:
+        raise NotImplementedError()
+
+    def handle(self, response: Message) -> None:
+        raise NotImplementedError()
+
+
+class _GetSession(_Session):
+    """A GET request, or a GETNEXT request for OIDs ending with .*"""
+
+    def __init__(self, config: SNMPHostConfig, oid: OID) -> None:
+        super().__init__(config)
+        self._next = oid.endswith(".*")
+        self._oid = _parse_oid(oid[:-2] if self._next else oid)
+        self.value: Optional[SNMPRawValue] = None
+
+    def _next_request(self) -> Tuple[int, Sequence[VarBind], int, int]:
+        pdu_type = PDUType.GET_NEXT_REQUEST if self._next else PDUType.GET_REQUEST
+        return pdu_type, [VarBind(self._oid, Tag.NULL, b"")], 0, 0
+
+    def handle(self, response: Message) -> None:
+        self.done = True
+        if response.error_status or len(response.varbinds) != 1:
+            return
+        varbind = response.varbinds[0]
+        console.vverbose("SNMP answer: ==> [%r]\n" % (varbind,))
+        if varbind.tag in _EXCEPTION_TAGS:
+            return
+        # In case of .*, check if prefix is the one we are looking for
+        if self._next and varbind.oid[: len(self._oid)] != self._oid:
+            return
+        self.value = _raw_value(varbind)
+
+
+class _WalkSession(_Session):
+    """Walks of several OIDs with common GETBULK or GETNEXT requests
+
+    Like snmpwalk, an OID without any OIDs below is fetched with a GET request.
+    """
+
+    def __init__(self, config: SNMPHostConfig, oids: Sequence[OID]) -> None:
+        super().__init__(config)
+        self._oids = [_parse_oid(oid) for oid in oids]
+        self._last = list(self._oids)
+        self._seen: List[Set[OIDTuple]] = [set() for _oid in oids]
+        self._active = list(range(len(oids)))
+        self._requested: List[int] = []
+        self._get = False
+        self._max_repetitions = config.bulk_walk_size_of or _DEFAULT_MAX_REPETITIONS
+        self.rows: List[SNMPRowInfo] = [[] for _oid in oids]
+        self.done = not oids
+
+    def _next_request(self) -> Tuple[int, Sequence[VarBind], int, int]:
+        self._requested = self._active
+        varbinds = [VarBind(self._last[column], Tag.NULL, b"") for column in self._active]
+        if self._get:
+            return PDUType.GET_REQUEST, varbinds, 0, 0
+        if self.use_bulk:
+            return PDUType.GET_BULK_REQUEST, varbinds, 0, self._max_repetitions
+        return PDUType.GET_NEXT_REQUEST, varbinds, 0, 0
+
+    def handle(self, response: Message) -> None:
+        if response.error_status:
+            self._handle_error(response)
+        elif self._get:
+            self._handle_get(response.varbinds)
+        else:
+            self._handle_walk(response.varbinds)
+
+        if not self._active and not self._get:
+            # Like snmpwalk: Try to get the OIDs which have nothing below them
+            self._active = [nr for nr, rows in enumerate(self.rows) if not rows]
+            self._last = list(self._oids)
+            self._get = True
+        self.done = not self._active
+
+    def _handle_error(self, response: Message) -> None:
+        if response.error_status == _ERROR_TOO_BIG and self.use_bulk and self._max_repetitions > 1:
+            self._max_repetitions //= 2
+            return
+        if response.error_status == _ERROR_NO_SUCH_NAME and 0 < response.error_index <= len(
+            self._requested
+        ):
+            # SNMPv1: The end of the MIB or no such object, the other OIDs are requested again
+            self._active = [
+                column
+                for nr, column in enumerate(self._requested)
+                if nr != response.error_index - 1
+            ]
+            return
+        raise MKSNMPError(
+            "SNMP error on %s: error status %d, error index %d"
+            % (self.address[0], response.error_status, response.error_index)
+        )
+
+    def _handle_get(self, varbinds: Sequence[VarBind]) -> None:
+        for column, varbind in zip(self._requested, varbinds):
+            if varbind.tag not in _EXCEPTION_TAGS:
+                self.rows[column].append((_format_oid(varbind.oid), _raw_value(varbind)))
+        self._active = []
+
+    def _handle_walk(self, varbinds: Sequence[VarBind]) -> None:
+        if not varbinds:
+            raise MKSNMPError("SNMP error on %s: Empty response" % self.address[0])
+        finished = set()
+        for nr, varbind in enumerate(varbinds):
+            column = self._requested[nr % len(self._requested)]
+            if column in finished:
+                continue
+            oid = self._oids[column]
+            if (
+                varbind.tag in _EXCEPTION_TAGS
+                or varbind.oid[: len(oid)] != oid
+                # Some agents return OIDs which are not increasing, do not walk in circles
+                or varbind.oid in self._seen[column]
+            ):
+                finished.add(column)
+                continue
+            self._seen[column].add(varbind.oid)
+            self._last[column] = varbind.oid
+            self.rows[column].append((_format_oid(varbind.oid), _raw_value(varbind)))
+        self._active = [column for column in self._requested if column not in finished]
+
+
+class _Request:
+    """A request in flight, retransmitted with the same request ID"""
+
+    def __init__(self, session: _Session) -> None:
+        super().__init__()
+        self.session = session
+        self.request_id = next(_request_ids) & 0x7FFFFFFF
+        self.packet = session.request(self.request_id)
+        self.retries = session.retries
+        self.deadline = 0.0
+
+
+def _run(sessions: Sequence[_Session]) -> None:
+    """Process the requests of all sessions concurrently until they are done"""
+    sockets: Dict[int, socket.socket] = {}
+    pending: Dict[int, _Request] = {}
+
+    with selectors.DefaultSelector() as selector:
+
+        def send(request: _Request) -> None:
+            session = request.session
+            if (sock := sockets.get(session.family)) is None:
+                sock = sockets[session.family] = socket.socket(session.family, socket.SOCK_DGRAM)
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ)
+            try:
+                sock.sendto(request.packet, session.address)
+            except OSError as e:
+                session.error = MKSNMPError("SNMP error on %s: %s" % (session.address[0], e))
+                session.done = True
+                return
+            request.deadline = time.monotonic() + session.timeout
+            pending[request.request_id] = request
+
+        def handle(response: Message) -> None:
+            request = pending.get(response.request_id)
+            if request is None or response.pdu_type != PDUType.RESPONSE:
+                return  # A late duplicate of an already answered request
+            if response.version != request.session.version:
+                return
+            del pending[response.request_id]
+            session = request.session
+            try:
+                session.handle(response)
+            except MKSNMPError as e:
+                session.error = e
+                session.done = True
+            if not session.done:
+                send(_Request(session))
+
+        try:
+            for session in sessions:
+                if not session.done:
+                    send(_Request(session))
+
+            while pending:
+                deadline = min(request.deadline for request in pending.values())
+                for key, _events in selector.select(max(0.0, deadline - time.monotonic())):
+                    for data in _receive_all(key.fileobj):  # type: ignore[arg-type]
+                        try:
+                            handle(decode_message(data))
+                        except SNMPBERError:
+                            continue  # Not a valid SNMP message
+
+                now = time.monotonic()
+                for request in [r for r in pending.values() if r.deadline <= now]:
+                    del pending[request.request_id]
+                    if request.retries > 0:
+                        request.retries -= 1
+                        send(request)
+                        continue
+                    request.session.error = MKSNMPError(
+                        "Timeout: No Response from %s" % request.session.address[0]
+                    )
+                    request.session.done = True
+        finally:
+            for sock in sockets.values():
+                sock.close()
+
+
+def _receive_all(sock: socket.socket) -> List[bytes]:
+    packets = []
+    while True:
+        try:
+            packets.append(sock.recv(65535))
+        except (BlockingIOError, InterruptedError):
+            return packets
+        except OSError:
+            # E.g. an ICMP port unreachable of a previous request
+            continue
+
+
+class BulkSNMPBackend(SNMPBackend):
+    def get(
+        self, oid: OID, context_name: Optional[SNMPContextName] = None
+    ) -> Optional[SNMPRawValue]:
+        _check_context(context_name)
+        session = _GetSession(self.config, oid)
+        _run([session])
+        if session.error:
+            console.verbose("SNMP error: %s\n" % session.error)
+        return session.value
+
+    def walk(
+        self,
+        oid: OID,
+        section_name: Optional[SectionName] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> SNMPRowInfo:
+        return self.walk_columns(
+            [oid],
+            section_name=section_name,
+            table_base_oid=table_base_oid,
+            context_name=context_name,
+        )[0]
+
+    def walk_columns(
+        self,
+        oids: Sequence[OID],
+        *,
+        section_name: Optional[SectionName] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> Sequence[SNMPRowInfo]:
+        _check_context(context_name)
+        console.vverbose("Walking %s on %s\n" % (", ".join(oids), self.config.hostname))
+        session = _WalkSession(self.config, oids)
+        _run([session])
+        if session.error:
+            raise session.error
+        return session.rows
+
+
+def _check_context(context_name: Optional[SNMPContextName]) -> None:
+    if context_name is not None:
+        raise MKGeneralException("SNMP contexts are not supported by the bulk SNMP backend")
+
+
+def walk_hosts(
+    jobs: Sequence[Tuple[SNMPHostConfig, Sequence[OID]]]
+) -> Sequence[Union[Sequence[SNMPRowInfo], Exception]]:
+    """Walk the OIDs of many hosts concurrently
+
+    The result of each host is either the walks of its OIDs or the error of its walk.
+    """
+    sessions: List[Union[_WalkSession, MKSNMPError]] = []
+    for config, oids in jobs:
+        try:
+            sessions.append(_WalkSession(config, oids))
+        except MKSNMPError as e:
+            sessions.append(e)
+    _run([session for session in sessions if isinstance(session, _WalkSession)])
+    return [
+        session if isinstance(session, MKSNMPError) else session.error or session.rows
+        for session in sessions
+    ]
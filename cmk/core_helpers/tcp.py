@@ -8,6 +8,7 @@ import copy
 import logging
 import socket
 import ssl
+from contextlib import suppress
 from typing import Any, Final, List, Mapping, Optional, Tuple
 from uuid import UUID
 
@@ -100,6 +101,9 @@ class TCPFetcher(Fetcher[AgentRawData]):
             self._socket.settimeout(self.timeout)
             self._socket.connect(self.address)
             self._socket.settimeout(None)
+            if self._cancelled:
+                # Cancelled while connecting
+                self.cancel()
         except socket.error as e:
             self._close_socket()
 
@@ -110,6 +114,14 @@ class TCPFetcher(Fetcher[AgentRawData]):
     def close(self) -> None:
         self._close_socket()
 
+    def cancel(self) -> None:
+        self._cancelled = True
+        sock = self._opt_socket
+        if sock is None:
+            return
+        with suppress(OSError):
+            sock.shutdown(socket.SHUT_RDWR)
+
     def _close_socket(self) -> None:
         if self._opt_socket is None:
             return
@@ -192,7 +204,9 @@ class TCPFetcher(Fetcher[AgentRawData]):
         try:
             ctx = ssl.create_default_context(cafile=str(paths.root_cert_file))
             ctx.load_cert_chain(certfile=paths.site_cert_file)
-            return ctx.wrap_socket(self._socket, server_hostname=str(controller_uuid))
+            # The wrapped socket replaces the detached one, so it can be cancelled
+            self._opt_socket = ctx.wrap_socket(self._socket, server_hostname=str(controller_uuid))
+            return self._opt_socket
         except ssl.SSLError as e:
             raise MKFetcherError("Error establishing TLS connection") from e
 
@@ -3,7 +3,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from typing import Any, Iterable, Literal, Mapping, Optional, Sequence, TypedDict, Union
+from typing import Any, Iterable, Literal, Mapping, Optional, Pattern, Sequence, TypedDict, Union
 
 from cmk.utils.type_defs import Seconds
 
@@ -132,6 +132,10 @@ State = Union[
 ]
 
 
+# The compiled form of the text patterns of a rule, see EventServer.compile_rules()
+TextPattern = Union[None, str, Pattern[str]]
+
+
 # TODO: This is only a rough approximation.
 class Rule(TypedDict, total=False):
     actions: Iterable[str]
@@ -211,7 +215,7 @@ class SNMPCredential(SNMPCredentialBase, total=False):
 # This is what we get from the outside.
 class ConfigFromWATO(TypedDict):
     actions: Sequence[Action]
-    archive_mode: Literal["file", "mongodb"]
+    archive_mode: Literal["file", "file_indexed", "mongodb"]
     archive_orphans: bool
     debug_rules: bool
     event_limit: EventLimits
@@ -224,6 +228,7 @@ class ConfigFromWATO(TypedDict):
     log_messages: bool
     log_rulehits: bool
     mkp_rule_packs: Mapping[Any, Any]  # TODO: Move to Config (not from WATO!). TypedDict
+    pipeline_workers: int
     remote_status: Optional[tuple[int, bool, Optional[Sequence[str]]]]
     replication: Optional[Replication]
     retention_interval: int
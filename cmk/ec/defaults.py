@@ -35,6 +35,7 @@ def default_config() -> ConfigFromWATO:
         "actions": [],
         "debug_rules": False,
         "rule_optimizer": True,
+        "pipeline_workers": 0,  # worker processes for parsing and rule matching, 0: disabled
         "log_level": {
             "cmk.mkeventd": logging.INFO,
             "cmk.mkeventd.EventServer": logging.INFO,
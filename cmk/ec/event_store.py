@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Storage of the open events of the Event Console
+
+The open events are needed in the order of their creation (the oldest events are
+removed first when an event limit is reached) and are looked up by their ID, by the
+rule which created them and by their host. Keeping them in a plain list made each of
+these lookups a scan over all open events, which hurts during event storms.
+"""
+
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from cmk.utils.type_defs import HostName
+
+from .event import Event
+
+HostKey = tuple[str, Optional[HostName]]
+_Bucket = OrderedDict[int, Event]
+
+
+class EventStore:
+    """The open events in order of creation, indexed by ID, rule ID and (host, core host)
+
+    Each index maps its key to the events having this key, again in order of creation.
+    The index keys of an event are remembered when it is added, so an event which is
+    changed in place has to be re-indexed, see reindex().
+    """
+
+    def __init__(self, events: Iterable[Event] = ()) -> None:
+        super().__init__()
+        self._events: _Bucket = OrderedDict()
+        self._by_rule: dict[Optional[str], _Bucket] = {}
+        self._by_host: dict[HostKey, _Bucket] = {}
+        self._core_hosts: dict[str, set[Optional[HostName]]] = {}
+        self._keys: dict[int, tuple[Optional[str], HostKey]] = {}
+        for event in events:
+            self.add(event)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(self._events.values())
+
+    def get(self, event_id: int) -> Optional[Event]:
+        return self._events.get(event_id)
+
+    def add(self, event: Event) -> None:
+        if event["id"] in self._events:
+            self.remove(event)
+        self._events[event["id"]] = event
+        self._index(event)
+
+    def remove(self, event: Event) -> None:
+        """Remove the event, raises a KeyError if it is not present"""
+        del self._events[event["id"]]
+        self._unindex(event["id"])
+
+    def reindex(self, event: Event) -> None:
+        """Update the indexes after the rule or host of a stored event have been changed"""
+        event_id = event["id"]
+        if event_id in self._keys and self._keys[event_id] != _keys_of(event):
+            self._unindex(event_id)
+            self._index(event)
+
+    def _index(self, event: Event) -> None:
+        event_id = event["id"]
+        rule_id, host_key = self._keys[event_id] = _keys_of(event)
+        _insert(self._by_rule.setdefault(rule_id, OrderedDict()), event_id, event)
+        _insert(self._by_host.setdefault(host_key, OrderedDict()), event_id, event)
+        self._core_hosts.setdefault(host_key[0], set()).add(host_key[1])
+
+    def _unindex(self, event_id: int) -> None:
+        rule_id, host_key = self._keys.pop(event_id)
+        _discard(self._by_rule, rule_id, event_id)
+        if _discard(self._by_host, host_key, event_id):
+            core_hosts = self._core_hosts[host_key[0]]
+            core_hosts.discard(host_key[1])
+            if not core_hosts:
+                del self._core_hosts[host_key[0]]
+
+    def oldest(self) -> Optional[Event]:
+        return next(iter(self._events.values()), None)
+
+    def oldest_of_rule(self, rule_id: Optional[str]) -> Optional[Event]:
+        return next(iter(self._by_rule.get(rule_id, {}).values()), None)
+
+    def oldest_of_host(self, hostname: str) -> Optional[Event]:
+        """The oldest event of the host, regardless of its core host"""
+        oldest: Optional[Event] = None
+        for core_host in self._core_hosts.get(hostname, ()):
+            event = next(iter(self._by_host[(hostname, core_host)].values()))
+            if oldest is None or event["id"] < oldest["id"]:
+                oldest = event
+        return oldest
+
+    def of_rule(self, rule_id: Optional[str]) -> list[Event]:
+        return list(self._by_rule.get(rule_id, {}).values())
+
+    def num_of_rule(self, rule_id: Optional[str]) -> int:
+        return len(self._by_rule.get(rule_id, ()))
+
+    def num_of_host(self, host_key: HostKey) -> int:
+        return len(self._by_host.get(host_key, ()))
+
+    def num_by_rule(self) -> dict[Optional[str], int]:
+        return {rule_id: len(bucket) for rule_id, bucket in self._by_rule.items()}
+
+    def num_by_host(self) -> dict[HostKey, int]:
+        return {host_key: len(bucket) for host_key, bucket in self._by_host.items()}
+
+
+def _keys_of(event: Event) -> tuple[Optional[str], HostKey]:
+    return event["rule_id"], (event["host"], event["core_host"])
+
+
+def _insert(bucket: _Bucket, event_id: int, event: Event) -> None:
+    last_id = next(reversed(bucket), None)
+    bucket[event_id] = event
+    # Only an event which has been re-indexed can be older than the last one of the bucket
+    if last_id is None or last_id < event_id:
+        return
+    younger = sorted(other_id for other_id in bucket if other_id > event_id)
+    for other_id in younger:
+        bucket.move_to_end(other_id)
+
+
+def _discard(index: dict, key: object, event_id: int) -> bool:
+    """Remove the event from the bucket of the key, returns whether the bucket is gone"""
+    bucket = index[key]
+    del bucket[event_id]
+    if bucket:
+        return False
+    del index[key]
+    return True
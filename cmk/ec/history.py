@@ -18,6 +18,7 @@ from cmk.utils.render import date_and_time
 
 from .config import Config
 from .event import Event
+from .history_index import HistoryIndex, INDEXED_COLUMNS
 from .query import QueryGET
 from .settings import Settings
 
@@ -42,6 +43,7 @@ class History:
         self._lock = threading.Lock()
         self._mongodb = MongoDB()
         self._active_history_period = ActiveHistoryPeriod()
+        self._index = HistoryIndex(event_columns, logger)
         self.reload_configuration(config)
 
     def reload_configuration(self, config: Config) -> None:
@@ -66,6 +68,8 @@ class History:
     def get(self, query: QueryGET) -> Iterable[Any]:
         if self._config["archive_mode"] == "mongodb":
             return _get_mongodb(self, query)
+        if self._config["archive_mode"] == "file_indexed":
+            return _get_files_indexed(self, self._logger, query)
         return _get_files(self, self._logger, query)
 
     def housekeeping(self) -> None:
@@ -302,11 +306,15 @@ def _reload_configuration_files(history: History) -> None:
 
 
 def _flush_files(history: History) -> None:
-    _expire_logfiles(history._settings, history._config, history._logger, history._lock, True)
+    _expire_logfiles(
+        history._settings, history._config, history._logger, history._lock, history._index, True
+    )
 
 
 def _housekeeping_files(history: History) -> None:
-    _expire_logfiles(history._settings, history._config, history._logger, history._lock, False)
+    _expire_logfiles(
+        history._settings, history._config, history._logger, history._lock, history._index, False
+    )
 
 
 # Make a new entry in the event history. Each entry is tab-separated line
@@ -330,12 +338,18 @@ def _add_files(history: History, event: Event, what: str, who: str, addinfo: str
             for colname, defval in history._event_columns
         ]
 
-        with get_logfile(
+        path = get_logfile(
             history._config,
             history._settings.paths.history_dir.value,
             history._active_history_period,
-        ).open(mode="ab") as f:
-            f.write(b"\t".join(columns) + b"\n")
+        )
+        line = b"\t".join(columns) + b"\n"
+        with path.open(mode="ab") as f:
+            offset = f.tell()
+            f.write(line)
+
+        if history._config["archive_mode"] == "file_indexed":
+            history._index.add(path, offset, line)
 
 
 def quote_tab(col: Any) -> bytes:
@@ -411,7 +425,12 @@ def _current_history_period(config: Config) -> int:
 
 # Delete old log files
 def _expire_logfiles(
-    settings: Settings, config: Config, logger: Logger, lock_history: threading.Lock, flush: bool
+    settings: Settings,
+    config: Config,
+    logger: Logger,
+    lock_history: threading.Lock,
+    index: HistoryIndex,
+    flush: bool,
 ) -> None:
     with lock_history:
         try:
@@ -430,6 +449,7 @@ def _expire_logfiles(
                         % (path, date_and_time(path.stat().st_mtime))
                     )
                     path.unlink()
+                    index.forget(path)
         except Exception as e:
             if settings.options.debug:
                 raise
@@ -524,6 +544,98 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
     return history_entries
 
 
+def _get_files_indexed(history: History, logger: Logger, query: QueryGET) -> Iterable[Any]:
+    """Same as _get_files, but uses the sidecar indexes instead of grep to find the lines"""
+    filters, limit = query.filters, query.limit
+    history_entries: list[Any] = []
+    if not history._settings.paths.history_dir.value.exists():
+        return []
+
+    index_filters = _index_filters(filters)
+    logger.debug("Index filters: %r", index_filters)
+
+    time_filters = [
+        (operator_name, argument)
+        for column_name, operator_name, _predicate, argument in filters
+        if column_name.split("_")[-1] == "time"
+    ]
+    time_range = (
+        _greatest_lower_bound_for_filters(time_filters),
+        _least_upper_bound_for_filters(time_filters),
+    )
+    logger.debug("time range: %r", time_range)
+
+    if not index_filters and time_range == (None, None):
+        # The index can not reduce the lines to read, grep is faster here
+        return _get_files(history, logger, query)
+
+    for path in sorted(history._settings.paths.history_dir.value.glob("*.log"), reverse=True):
+        if limit is not None and limit <= 0:
+            logger.debug("query limit reached")
+            break
+        if not _intersects(time_range, _get_logfile_timespan(path)):
+            logger.debug("skipping history file %s because of time filters", path)
+            continue
+
+        with history._lock:
+            line_nrs = history._index.lookup(path, time_range, index_filters)
+            lines = history._index.read_lines(path, line_nrs)
+        logger.debug("reading %d indexed lines of history file %s", len(line_nrs), path)
+
+        new_entries = _read_indexed_history_file(history, path, lines, query, limit, logger)
+        history_entries += new_entries
+        if limit is not None:
+            limit -= len(new_entries)
+    return history_entries
+
+
+def _index_filters(filters: Iterable[tuple[str, str, Any, Any]]) -> dict[str, set[str]]:
+    """Extract the filters which can be answered by the postings of the indexed columns
+
+    The postings are case insensitive, so "=" and "=~" can be handled the same way. "in"
+    is also case insensitive, see filter_operator_in."""
+    index_filters: dict[str, set[str]] = {}
+    for column_name, operator_name, _predicate, argument in filters:
+        if column_name not in INDEXED_COLUMNS:
+            continue
+        if operator_name in ("=", "=~"):
+            accepted = {str(argument)}
+        elif operator_name == "in":
+            accepted = {str(a) for a in argument}
+        else:
+            continue
+        if column_name in index_filters:
+            index_filters[column_name] &= accepted
+        else:
+            index_filters[column_name] = accepted
+    return index_filters
+
+
+def _read_indexed_history_file(
+    history: History,
+    path: Path,
+    lines: Iterable[tuple[int, bytes]],
+    query: Any,
+    limit: Optional[int],
+    logger: Logger,
+) -> list[Any]:
+    entries: list[Any] = []
+    for line_no, line in lines:
+        if limit is not None and len(entries) > limit:
+            break
+
+        try:
+            parts: list[Any] = line.decode("utf-8").rstrip("\n").split("\t")
+            _convert_history_line(history, parts)
+            values = [line_no] + parts
+            if query.filter_row(values):
+                entries.append(values)
+        except Exception as e:
+            logger.exception(f"Invalid line '{line!r}' in history file {path}: {e}")
+
+    return entries
+
+
 def _greatest_lower_bound_for_filters(filters: Iterable[tuple[str, float]]) -> Optional[float]:
     result: Optional[float] = None
     for operator, value in filters:
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Sidecar indexes for the file based event history
+
+Each history period file "<timestamp>.log" gets two index files next to it. The
+history files themselves are left untouched, so they can still be read without
+the index (e.g. by the archive_mode "file" or with grep).
+
+"<timestamp>.idx" contains one fixed size record per history line:
+
+    <offset:Q> <time:d> <length:I> <event_host:I> <event_application:I> <event_rule_id:I>
+
+The columns are stored as numbers referencing the values in "<timestamp>.idv",
+which is a sequence of records <column:B> <length:I> <value>. A value is
+always written before the first line record referencing it.
+
+Both files are append-only. Index files which don't cover the whole history file
+(e.g. after switching the archive mode or after a crash) are completed from the
+history file.
+"""
+
+import bisect
+import os
+import struct
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from logging import Logger
+from pathlib import Path
+from typing import Any, Optional
+
+INDEXED_COLUMNS = ("event_host", "event_application", "event_rule_id")
+
+_VALUE_HEADER = struct.Struct("<BI")
+_ENTRY = struct.Struct("<QdIIII")
+# Positions of the fields in the entry record, in units of the field size
+_ENTRY_QWORDS = _ENTRY.size // 8
+_ENTRY_DWORDS = _ENTRY.size // 4
+
+TimeRange = tuple[Optional[float], Optional[float]]
+
+
+def index_path_of(log_path: Path) -> Path:
+    return log_path.with_suffix(".idx")
+
+
+def values_path_of(log_path: Path) -> Path:
+    return log_path.with_suffix(".idv")
+
+
+def _strided(data: memoryview, typecode: str, start: int, step: int) -> array:
+    result = array(typecode)
+    result.frombytes(data.cast(typecode)[start::step].tobytes())
+    return result
+
+
+class _PeriodIndex:
+    """In-memory representation of the index of a single history period file"""
+
+    def __init__(self, log_path: Path) -> None:
+        super().__init__()
+        self.log_path = log_path
+        # Number of bytes of the history file / the index files covered by this object
+        self.covered = 0
+        self.index_size = 0
+        self.values_size = 0
+
+        self.offsets = array("Q")
+        self.times = array("d")
+        self.lengths = array("I")
+        self.value_ids = [array("I") for _c in INDEXED_COLUMNS]
+        self.values: list[list[str]] = [[] for _c in INDEXED_COLUMNS]
+        self.ids_of_value: list[dict[str, int]] = [{} for _c in INDEXED_COLUMNS]
+        self.times_ascending = True
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add_value(self, column: int, value: str) -> int:
+        value_id = len(self.values[column])
+        self.values[column].append(value)
+        self.ids_of_value[column][value] = value_id
+        return value_id
+
+    def add_entry(self, offset: int, time: float, length: int, ids: Sequence[int]) -> None:
+        if self.times and time < self.times[-1]:
+            self.times_ascending = False
+        self.offsets.append(offset)
+        self.times.append(time)
+        self.lengths.append(length)
+        for column, value_id in enumerate(ids):
+            self.value_ids[column].append(value_id)
+        self.covered = offset + length
+
+    def add_entries(self, data: bytes) -> bool:
+        """Add a block of entry records as read from the index file
+
+        Returns False in case the entries reference unknown values."""
+        view = memoryview(data)
+        value_ids = [
+            _strided(view, "I", 5 + column, _ENTRY_DWORDS) for column in range(len(INDEXED_COLUMNS))
+        ]
+        if any(max(ids) >= len(values) for ids, values in zip(value_ids, self.values)):
+            return False
+
+        times = _strided(view, "d", 1, _ENTRY_QWORDS)
+        if (self.times and times and times[0] < self.times[-1]) or any(
+            map(float.__gt__, times, times[1:])
+        ):
+            self.times_ascending = False
+        self.offsets.extend(_strided(view, "Q", 0, _ENTRY_QWORDS))
+        self.times.extend(times)
+        self.lengths.extend(_strided(view, "I", 4, _ENTRY_DWORDS))
+        for all_ids, new_ids in zip(self.value_ids, value_ids):
+            all_ids.extend(new_ids)
+        if self.offsets:
+            self.covered = self.offsets[-1] + self.lengths[-1]
+        return True
+
+    def line_range(self, time_range: TimeRange) -> range:
+        if not self.times_ascending:
+            return range(len(self))
+        lo, hi = time_range
+        start = 0 if lo is None else bisect.bisect_left(self.times, lo)
+        end = len(self) if hi is None else bisect.bisect_right(self.times, hi)
+        return range(start, max(start, end))
+
+
+class HistoryIndex:
+    """Maintains and queries the sidecar indexes of the history period files
+
+    Callers have to serialize the access (History._lock)."""
+
+    def __init__(self, event_columns: list[tuple[str, Any]], logger: Logger) -> None:
+        super().__init__()
+        self._logger = logger
+        # The first 4 fields of a history line are time, what, who and addinfo
+        event_column_names = [name for name, _default in event_columns]
+        self._field_nrs = [4 + event_column_names.index(name) for name in INDEXED_COLUMNS]
+        self._max_split = max(self._field_nrs) + 1
+        self._indexes: dict[Path, _PeriodIndex] = {}
+
+    def add(self, log_path: Path, offset: int, line: bytes) -> None:
+        """Add a line which has just been appended to the history file at the given offset"""
+        index = self._indexes.get(log_path)
+        if index is None or index.covered != offset:
+            # Unknown or outdated index: updating it will also index the new line
+            self._update(log_path)
+            return
+        self._write_records(index, [(offset, line)])
+
+    def forget(self, log_path: Path) -> None:
+        """Drop the index of a deleted history file"""
+        self._indexes.pop(log_path, None)
+        index_path_of(log_path).unlink(missing_ok=True)
+        values_path_of(log_path).unlink(missing_ok=True)
+
+    def lookup(
+        self, log_path: Path, time_range: TimeRange, filters: dict[str, set[str]]
+    ) -> Sequence[int]:
+        """Find the history lines which may match the given time range and column filters
+
+        The filters map the indexed columns to the accepted values (case insensitive). The
+        result contains the numbers of the candidate lines in file order. The candidates
+        still need to be filtered by the query, this only avoids reading most of the
+        non-matching lines."""
+        index = self._update(log_path)
+        line_nrs: Sequence[int] = index.line_range(time_range)
+
+        for column_name, accepted in filters.items():
+            column = INDEXED_COLUMNS.index(column_name)
+            accepted_lower = {value.lower() for value in accepted}
+            accepted_ids = {
+                value_id
+                for value_id, value in enumerate(index.values[column])
+                if value.lower() in accepted_lower
+            }
+            value_ids = index.value_ids[column]
+            if isinstance(line_nrs, range):
+                line_nrs = [
+                    nr
+                    for nr in _positions_of(value_ids, accepted_ids)
+                    if line_nrs.start <= nr < line_nrs.stop
+                ]
+            else:
+                line_nrs = [nr for nr in line_nrs if value_ids[nr] in accepted_ids]
+        return line_nrs
+
+    def read_lines(
+        self, log_path: Path, line_nrs: Sequence[int], chunk_size: int = 1024 * 1024
+    ) -> Iterable[tuple[int, bytes]]:
+        """Read the given lines of a history file, last line first
+
+        Yields the lines together with their position counted from the end of the file
+        (1 = last line). Adjacent lines are read together in chunks of up to chunk_size
+        bytes. Only line numbers returned by lookup() are valid here, so this has to be
+        called while still holding the lock of the lookup(). The lines themselves are read
+        later, without the lock."""
+        return _read_lines(log_path, self._indexes[log_path], line_nrs, chunk_size)
+
+    def _update(self, log_path: Path) -> _PeriodIndex:
+        """Bring the index of the given file up to date with the index files and the history file"""
+        try:
+            log_size = log_path.stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+
+        index = self._indexes.get(log_path)
+        if index is None or index.covered > log_size:
+            # Not loaded yet or the history file has been replaced in the meantime
+            index = self._indexes[log_path] = _PeriodIndex(log_path)
+
+        if not self._read_index_files(index) or index.covered > log_size:
+            self._logger.warning("Rebuilding outdated history index of %s", log_path)
+            index = self._indexes[log_path] = _PeriodIndex(log_path)
+            index_path_of(log_path).unlink(missing_ok=True)
+            values_path_of(log_path).unlink(missing_ok=True)
+
+        if index.covered < log_size:
+            self._index_history_file(index)
+        return index
+
+    def _read_index_files(self, index: _PeriodIndex) -> bool:
+        values = _read_from(values_path_of(index.log_path), index.values_size)
+        pos = 0
+        while pos + _VALUE_HEADER.size <= len(values):
+            column, length = _VALUE_HEADER.unpack_from(values, pos)
+            end = pos + _VALUE_HEADER.size + length
+            if end > len(values):
+                break
+            index.add_value(column, values[pos + _VALUE_HEADER.size : end].decode("utf-8"))
+            pos = end
+        # A truncated record (e.g. crash while writing) is overwritten by the next write
+        index.values_size += pos
+
+        entries = _read_from(index_path_of(index.log_path), index.index_size)
+        usable = len(entries) - len(entries) % _ENTRY.size
+        if usable and not index.add_entries(entries[:usable]):
+            return False
+        index.index_size += usable
+        return True
+
+    def _index_history_file(self, index: _PeriodIndex) -> None:
+        self._logger.debug("Indexing %s from offset %d", index.log_path, index.covered)
+        lines = []
+        with index.log_path.open("rb") as log_file:
+            log_file.seek(index.covered)
+            offset = index.covered
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    break  # Incomplete line, will be indexed when completed
+                lines.append((offset, line))
+                offset += len(line)
+        self._write_records(index, lines)
+
+    def _write_records(self, index: _PeriodIndex, lines: Iterable[tuple[int, bytes]]) -> None:
+        value_records = []
+        entry_records = []
+        for offset, line in lines:
+            fields = line.rstrip(b"\n").split(b"\t", self._max_split)
+            try:
+                time = float(fields[0])
+            except ValueError:
+                time = index.times[-1] if index.times else 0.0
+
+            ids = []
+            for column, field_nr in enumerate(self._field_nrs):
+                value = (
+                    fields[field_nr].decode("utf-8", "replace") if field_nr < len(fields) else ""
+                )
+                value_id = index.ids_of_value[column].get(value)
+                if value_id is None:
+                    value_id = index.add_value(column, value)
+                    encoded = value.encode("utf-8")
+                    value_records.append(_VALUE_HEADER.pack(column, len(encoded)) + encoded)
+                ids.append(value_id)
+
+            index.add_entry(offset, time, len(line), ids)
+            entry_records.append(_ENTRY.pack(offset, time, len(line), *ids))
+
+        # Values first: A line record must never reference a value which is not stored
+        index.values_size = _write_at(
+            values_path_of(index.log_path), index.values_size, b"".join(value_records)
+        )
+        index.index_size = _write_at(
+            index_path_of(index.log_path), index.index_size, b"".join(entry_records)
+        )
+
+
+def _read_lines(
+    log_path: Path, index: _PeriodIndex, line_nrs: Sequence[int], chunk_size: int
+) -> Iterator[tuple[int, bytes]]:
+    offsets, lengths = index.offsets, index.lengths
+    num_lines = len(index)
+    fd = os.open(log_path, os.O_RDONLY)
+    try:
+        idx = len(line_nrs)
+        while idx > 0:
+            # Collect a run of adjacent lines ending at line_nrs[idx - 1]
+            last = line_nrs[idx - 1]
+            end_offset = offsets[last] + lengths[last]
+            start = idx - 1
+            while (
+                start > 0
+                and line_nrs[start - 1] == line_nrs[start] - 1
+                and end_offset - offsets[line_nrs[start - 1]] <= chunk_size
+            ):
+                start -= 1
+            start_offset = offsets[line_nrs[start]]
+            chunk = os.pread(fd, end_offset - start_offset, start_offset)
+            for nr in reversed(line_nrs[start:idx]):
+                begin = offsets[nr] - start_offset
+                yield num_lines - nr, chunk[begin : begin + lengths[nr]]
+            idx = start
+    finally:
+        os.close(fd)
+
+
+def _positions_of(value_ids: array, accepted_ids: set[int]) -> list[int]:
+    """Positions of the accepted ids in the array, in ascending order
+
+    Searching the packed bytes is much faster than comparing the ids one by one."""
+    data = value_ids.tobytes()
+    positions: list[int] = []
+    for value_id in accepted_ids:
+        needle = array(value_ids.typecode, [value_id]).tobytes()
+        pos = data.find(needle)
+        while pos != -1:
+            if pos % value_ids.itemsize == 0:
+                positions.append(pos // value_ids.itemsize)
+                pos = data.find(needle, pos + value_ids.itemsize)
+            else:
+                pos = data.find(needle, pos + 1)
+    if len(accepted_ids) > 1:
+        positions.sort()
+    return positions
+
+
+def _read_from(path: Path, offset: int) -> bytes:
+    try:
+        with path.open("rb") as f:
+            f.seek(offset)
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _write_at(path: Path, offset: int, data: bytes) -> int:
+    """Write data at the given offset, dropping everything behind it. Returns the new size"""
+    if not data:
+        return offset
+    with path.open("r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+    return offset + len(data)
@@ -14,6 +14,7 @@ import abc
 import ast
 import errno
 import json
+import multiprocessing
 import os
 import pprint
 import re
@@ -24,6 +25,9 @@ import sys
 import threading
 import time
 import traceback
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from logging import getLogger, Logger
 from pathlib import Path
 from types import FrameType, TracebackType
@@ -37,7 +41,6 @@ from typing import (
     Mapping,
     NamedTuple,
     Optional,
-    Pattern,
     Protocol,
     Sequence,
     Type,
@@ -63,12 +66,14 @@ from cmk.utils.site import omd_site
 from cmk.utils.type_defs import HostName, TimeperiodName, Timestamp
 
 from .actions import do_event_action, do_event_actions, do_notify, event_has_opened
-from .config import Config, ConfigFromWATO, Rule
+from .config import Config, ConfigFromWATO, HostnameTranslation, Rule, TextPattern
 from .core_queries import query_hosts_scheduled_downtime_depth, query_timeperiods_in
 from .crash_reporting import CrashReportStore, ECCrashReport
 from .event import create_event_from_line, Event
+from .event_store import EventStore, HostKey
 from .history import ActiveHistoryPeriod, get_logfile, History, quote_tab, scrub_string
 from .host_config import HostConfig, HostInfo
+from .prefilter import RulePrefilter
 from .query import filter_operator_in, MKClientError, Query, QueryCOMMAND, QueryGET, QueryREPLICATE
 from .rule_packs import load_config as load_config_using
 from .settings import FileDescriptor, PortNumber, Settings
@@ -297,7 +302,6 @@ def drain_pipe(pipe: FileDescr) -> None:
             break  # No data available
 
 
-TextPattern = Union[None, str, Pattern[str]]
 TextMatchResult = Union[bool, Sequence[str]]
 MatchGroups = dict[str, TextMatchResult]
 
@@ -465,8 +469,16 @@ class Perfcounters:
         "processing": 0.99,  # event processing
         "sync": 0.95,  # Replication sync
         "request": 0.95,  # Client requests
+        "pipeline_worker": 0.99,  # pipeline: submission until parsed and matched by a worker
+        "pipeline_state": 0.99,  # pipeline: matched until processed by the EventServer
     }
 
+    # Current number of messages in the queues of the pipeline stages
+    _queue_names = [
+        "pipeline_worker",
+        "pipeline_state",
+    ]
+
     # TODO: Why aren't self._times / self._rates / ... not initialized with their defaults?
     def __init__(self, logger: Logger) -> None:
         super().__init__()
@@ -478,13 +490,14 @@ class Perfcounters:
         self._rates: dict[str, float] = {}
         self._average_rates: dict[str, float] = {}
         self._times: dict[str, float] = {}
+        self._queue_lengths = {n: 0 for n in self._queue_names}
         self._last_statistics: Optional[float] = None
 
         self._logger = logger.getChild("Perfcounters")
 
-    def count(self, counter: str) -> None:
+    def count(self, counter: str, increment: int = 1) -> None:
         with self._lock:
-            self._counters[counter] += 1
+            self._counters[counter] += increment
 
     def count_time(self, counter: str, ptime: float) -> None:
         with self._lock:
@@ -493,6 +506,10 @@ class Perfcounters:
             else:
                 self._times[counter] = ptime
 
+    def set_queue_length(self, queue: str, length: int) -> None:
+        with self._lock:
+            self._queue_lengths[queue] = length
+
     def do_statistics(self) -> None:
         with self._lock:
             now = time.time()
@@ -526,6 +543,9 @@ class Perfcounters:
         for name in cls._weights:
             columns.append(("status_average_%s_time" % name, 0.0))
 
+        for name in cls._queue_names:
+            columns.append(("status_%s_queue_length" % name, 0))
+
         return columns
 
     def get_status(self) -> list[float]:
@@ -540,6 +560,9 @@ class Perfcounters:
             for name in self._weights:
                 row.append(self._times.get(name, 0.0))
 
+            for name in self._queue_names:
+                row.append(self._queue_lengths[name])
+
             return row
 
 
@@ -567,6 +590,109 @@ class MatchSuccess(NamedTuple):
 
 MatchResult = Union[MatchFailure, MatchSuccess]
 
+RuleHits = list[tuple[Rule, MatchSuccess]]
+
+
+# Translate a hostname if this is configured. We are
+# *really* sorry: this code snipped is copied from modules/check_mk_base.py.
+# There is still no common library. Please keep this in sync with the
+# original code
+def translate_hostname(translation: HostnameTranslation, backedhost: str) -> str:
+    # Here comes the original code from modules/check_mk_base.py
+    if translation:
+        # 1. Case conversion
+        caseconf = translation.get("case")
+        if caseconf == "upper":
+            backedhost = backedhost.upper()
+        elif caseconf == "lower":
+            backedhost = backedhost.lower()
+
+        # 2. Drop domain part (not applied to IP addresses!)
+        if translation.get("drop_domain") and backedhost:
+            # only apply if first part does not convert successfully into an int
+            firstpart = backedhost.split(".", 1)[0]
+            try:
+                int(firstpart)
+            except Exception:
+                backedhost = firstpart
+
+        # 3. Regular expression conversion
+        if "regex" in translation:
+            for regex, subst in translation["regex"]:
+                if not regex.endswith("$"):
+                    regex += "$"
+                rcomp = cmk.utils.regex.regex(regex)
+                mo = rcomp.match(backedhost)
+                if mo:
+                    backedhost = subst
+                    for nr, text in enumerate(mo.groups()):
+                        backedhost = backedhost.replace("\\%d" % (nr + 1), text)
+                    break
+
+        # 4. Explicit mapping
+        for from_host, to_host in translation.get("mapping", []):
+            if from_host == backedhost:
+                backedhost = to_host
+                break
+
+    return backedhost
+
+
+def do_translate_hostname(config: Config, logger: Logger, event: Event) -> None:
+    try:
+        event["host"] = translate_hostname(config["hostname_translation"], event["host"])
+    except Exception as e:
+        if config["debug_rules"]:
+            logger.exception('Unable to parse host "{}" ({})'.format(event.get("host"), e))
+        event["host"] = ""
+
+
+def rule_candidates(
+    config: Config,
+    rules: Sequence[Rule],
+    rule_hash: Mapping[int, Mapping[int, Sequence[Rule]]],
+    prefilter: Optional[RulePrefilter],
+    event: Event,
+) -> Sequence[Rule]:
+    # Rule optimizer
+    if config["rule_optimizer"]:
+        candidates = rule_hash.get(event["facility"], {}).get(event["priority"], [])
+        return candidates if prefilter is None else prefilter.filter(candidates, event)
+    return rules
+
+
+def find_rule_hits(
+    rules: Iterable[Rule],
+    event: Event,
+    rule_matches: Callable[[Rule, Event], MatchResult],
+    logger: Logger,
+) -> RuleHits:
+    """Find the rules hit by the event
+
+    The first hit ends the search, unless the rule skips the rest of its rule pack.
+    Matching does not depend on the state of the Event Console, so this can be done
+    separately from processing the hits.
+    """
+    hits: RuleHits = []
+    skip_pack = None
+    for rule in rules:
+        if skip_pack and rule["pack"] == skip_pack:
+            continue  # still in the rule pack that we want to skip
+        skip_pack = None  # new pack, reset skipping
+
+        try:
+            result = rule_matches(rule, event)
+        except Exception as e:
+            logger.exception("  Exception during matching:\n%s" % e)
+            continue
+
+        if isinstance(result, MatchSuccess):
+            hits.append((rule, result))
+            if rule.get("drop") != "skip_pack":
+                break
+            skip_pack = rule["pack"]
+    return hits
+
 
 class EventServer(ECServerThread):
     def __init__(
@@ -597,9 +723,14 @@ class EventServer(ECServerThread):
 
         # TODO: Improve type!
         self._rules: list[Any] = []
+        self._rule_hash: dict[int, dict[int, Any]] = {}
+        self._prefilter: Optional[RulePrefilter] = None
         self._hash_stats = []
         for _unused_facility in range(32):
             self._hash_stats.append([0] * 8)
+        # Sum of the rule candidates of all messages: all rules, after hashing by facility
+        # and priority, after the literal prefilter
+        self._candidate_stats = [0, 0, 0]
 
         self.host_config = HostConfig(self._logger)
         self._perfcounters = perfcounters
@@ -609,6 +740,9 @@ class EventServer(ECServerThread):
         self._event_columns = event_columns
         self._message_period = ActiveHistoryPeriod()
         self._rule_matcher = RuleMatcher(self._logger, config)
+        self._pipeline: Optional[EventPipeline] = None
+        # The pipelines of previous configurations, which may still process messages
+        self._retired_pipelines: list[EventPipeline] = []
 
         # HACK for testing: The real fix would involve breaking up these huge
         # class monsters.
@@ -815,7 +949,10 @@ class EventServer(ECServerThread):
         while not self._terminate_event.is_set():
             try:
                 readable = select.select(
-                    listen_list + list(client_sockets.keys()), [], [], select_timeout
+                    listen_list + list(client_sockets.keys()) + self._pipelines(),
+                    [],
+                    [],
+                    select_timeout,
                 )[0]
             except OSError as e:
                 if e.args[0] != errno.EINTR:
@@ -921,18 +1058,25 @@ class EventServer(ECServerThread):
 
             # Read events from builtin syslog server
             if self._syslog_udp is not None and self._syslog_udp in readable:
-                message, address = self._syslog_udp.recvfrom(4096)
-                # We have an AF_INET socket, so the remote address is a pair (host: str, port: int),
-                # where host can be the domain name or an IPv4 address.
-                if not (
-                    isinstance(address, tuple)
-                    and isinstance(address[0], str)  #
-                    and isinstance(address[1], int)  #
-                ):
-                    raise ValueError(
-                        f"Invalid remote address '{address!r}' for syslog socket (UDP)"
-                    )
-                self.process_raw_lines(message, address)
+                # The pipeline is fed with all messages waiting in the socket at once
+                for nr in range(1 if self._pipeline is None else _PIPELINE_BATCH_SIZE):
+                    try:
+                        message, address = self._syslog_udp.recvfrom(
+                            4096, socket.MSG_DONTWAIT if nr else 0
+                        )
+                    except BlockingIOError:
+                        break
+                    # We have an AF_INET socket, so the remote address is a pair (host: str, port: int),
+                    # where host can be the domain name or an IPv4 address.
+                    if not (
+                        isinstance(address, tuple)
+                        and isinstance(address[0], str)  #
+                        and isinstance(address[1], int)  #
+                    ):
+                        raise ValueError(
+                            f"Invalid remote address '{address!r}' for syslog socket (UDP)"
+                        )
+                    self.process_raw_lines(message, address)
 
             # Read events from builtin snmptrap server
             if self._snmptrap is not None and self._snmptrap in readable:
@@ -947,6 +1091,8 @@ class EventServer(ECServerThread):
                     ):
                         raise ValueError(f"Invalid remote address '{address!r}' for SNMP trap")
                     addr: tuple[str, int] = address  # for mypy's sake (bug!)
+                    # Keep the order of arrival
+                    self.process_pipeline_results(drain=True)
                     self.process_raw_data(
                         lambda: self._snmp_trap_engine.process_snmptrap(message, addr)
                     )
@@ -964,6 +1110,12 @@ class EventServer(ECServerThread):
             except StopIteration:
                 select_timeout = 1  # restore default select timeout
 
+            self.process_pipeline_results()
+
+        self.process_pipeline_results(drain=True)
+        for pipeline in self._pipelines():
+            pipeline.close()
+
     # Processes incoming data, just a wrapper between the real data and the
     # handler function to record some statistics etc.
     def process_raw_data(self, handler: Callable[[], None]) -> None:
@@ -979,6 +1131,16 @@ class EventServer(ECServerThread):
 
     # Takes several lines of messages, handles encoding and processes them separated
     def process_raw_lines(self, data: bytes, address: Optional[tuple[str, int]]) -> None:
+        # A reload retires the pipeline while holding the lock, the lines have to be added to
+        # the pipeline before that or to the new one
+        with self._lock_configuration:
+            if (pipeline := self._pipeline) is not None:
+                pipeline.add(data.splitlines(), address)
+        if pipeline is not None:
+            if pipeline.full:
+                self.process_pipeline_results(wait=True)
+            return
+
         for line_bytes in data.splitlines():
             if line := scrub_and_decode(line_bytes.rstrip()):
                 try:
@@ -992,6 +1154,42 @@ class EventServer(ECServerThread):
                         "Exception handling a log line (skipping this one): %s" % e
                     )
 
+    def _pipelines(self) -> list["EventPipeline"]:
+        with self._lock_configuration:
+            return self._retired_pipelines + ([self._pipeline] if self._pipeline else [])
+
+    def process_pipeline_results(self, wait: bool = False, drain: bool = False) -> None:
+        """Process the messages which have been parsed and matched by the pipeline workers
+
+        With wait, this waits for the oldest message in the pipeline to be matched. With
+        drain, all messages received until now are processed.
+        """
+        for pipeline in self._pipelines():
+            pipeline.flush()
+            while True:
+                for event, hits, num_tries, num_candidates in pipeline.results(wait=wait or drain):
+                    self._perfcounters.count("rule_tries", num_tries)
+                    try:
+                        self.process_raw_data(
+                            lambda event=event, hits=hits, num_candidates=num_candidates: (
+                                self.process_rule_hits(event, hits, num_candidates)
+                            )
+                        )
+                    except Exception as e:
+                        self._logger.exception(
+                            "Exception handling a log line (skipping this one): %s" % e
+                        )
+                if not (drain and pipeline.busy):
+                    break
+
+            if pipeline.busy:
+                return  # Younger messages have to wait for the ones in this pipeline
+            with self._lock_configuration:
+                if retired := pipeline is not self._pipeline:
+                    self._retired_pipelines.remove(pipeline)
+            if retired:
+                pipeline.close()
+
     def do_housekeeping(self) -> None:
         with self._event_status.lock:
             with self._lock_configuration:
@@ -1194,9 +1392,9 @@ class EventServer(ECServerThread):
                 # First look for case 1: rule that already have at least one hit
                 # and this events in the state "counting" exist.
                 events_to_delete = []
-                events = self._event_status.events()
+                events = self._event_status.events_of_rule(rule["id"])
                 for nr, event in enumerate(events):
-                    if event["rule_id"] == rule["id"] and event["phase"] == "counting":
+                    if event["phase"] == "counting":
                         # time has elapsed. Now lets see if we have reached
                         # the necessary count:
                         if event["count"] < expected_count:  # no -> trigger alarm
@@ -1248,10 +1446,8 @@ class EventServer(ECServerThread):
             merge, reset_ack = merge
 
         if merge != "never":
-            for event in self._event_status.events():
-                if event["rule_id"] == rule["id"] and (
-                    event["phase"] == "open" or (event["phase"] == "ack" and merge == "acked")
-                ):
+            for event in self._event_status.events_of_rule(rule["id"]):
+                if event["phase"] == "open" or (event["phase"] == "ack" and merge == "acked"):
                     merge_event = event
                     break
 
@@ -1326,7 +1522,7 @@ class EventServer(ECServerThread):
         self._rules = []
         self._rule_by_id = {}
         # Speedup-Hash for rule execution
-        self._rule_hash: dict[int, dict[int, Any]] = {}
+        self._rule_hash = {}
         count_disabled = 0
         count_rules = 0
         count_unspecific = 0
@@ -1415,6 +1611,32 @@ class EventServer(ECServerThread):
                         stats.append("%s(%d)" % (SyslogPriority(prio), len(entries)))
                     self._logger.info(" %-12s: %s" % (SyslogFacility(facility), " ".join(stats)))
 
+            self._prefilter = RulePrefilter(self._rules)
+            self._logger.info(
+                "Literal prefilter: %d literals, %d rules without literals"
+                % (self._prefilter.num_literals, self._prefilter.num_unfiltered)
+            )
+        else:
+            self._prefilter = None
+
+        # Messages received until now are processed with the rules they have been matched with
+        if self._pipeline is not None:
+            self._retired_pipelines.append(self._pipeline)
+            self._pipeline = None
+        if self._config["pipeline_workers"] > 0:
+            self._pipeline = EventPipeline(
+                self._logger,
+                self.settings,
+                self._config,
+                self._rules,
+                self._rule_hash,
+                self._perfcounters,
+            )
+            self._logger.info(
+                "Parsing and matching messages in %d worker processes"
+                % self._config["pipeline_workers"]
+            )
+
     @staticmethod
     def _compile_matching_value(key: str, val: str) -> TextPattern:
         value = val.strip()
@@ -1486,6 +1708,22 @@ class EventServer(ECServerThread):
                 )
             )
 
+        num_rules, num_hashed, num_prefiltered = self._candidate_stats
+        if num_rules:
+            self._logger.info("Rule candidates eliminated per message:")
+            for title, before, after in [
+                ("facility/priority", num_rules, num_hashed),
+                ("literal prefilter", num_hashed, num_prefiltered),
+            ]:
+                self._logger.info(
+                    "  %s - %.1f (%.2f%%)"
+                    % (
+                        title,
+                        (before - after) / float(total_count),
+                        (100.0 * (before - after) / float(before)) if before else 0.0,
+                    )
+                )
+
     def process_line(self, line: str, address: Optional[tuple[str, int]]) -> None:
         self.process_event(
             create_event_from_line(line, address, self._logger, verbose=self._config["debug_rules"])
@@ -1493,155 +1731,148 @@ class EventServer(ECServerThread):
 
     def process_event(self, event: Event) -> None:
         self.do_translate_hostname(event)
+        candidates = rule_candidates(
+            self._config, self._rules, self._rule_hash, self._prefilter, event
+        )
+        hits = find_rule_hits(candidates, event, self.event_rule_matches, self._logger)
+        self.process_rule_hits(event, hits, len(candidates))
 
+    def process_rule_hits(self, event: Event, hits: RuleHits, num_candidates: int) -> None:
+        """Process a translated event and the rules it hit, this changes the state of the EC"""
         # Log all incoming messages into a syslog-like text file if that is enabled
         if self._config["log_messages"]:
             self.log_message(event)
 
-        # Rule optimizer
         if self._config["rule_optimizer"]:
             self._hash_stats[event["facility"]][event["priority"]] += 1
-            rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
-        else:
-            rule_candidates = self._rules
-
-        skip_pack = None
-        for rule in rule_candidates:
-            if skip_pack and rule["pack"] == skip_pack:
-                continue  # still in the rule pack that we want to skip
-            skip_pack = None  # new pack, reset skipping
-
-            try:
-                result = self.event_rule_matches(rule, event)
-            except Exception as e:
-                self._logger.exception("  Exception during matching:\n%s" % e)
-                result = MatchFailure()
+            self._candidate_stats[0] += len(self._rules)
+            self._candidate_stats[1] += len(
+                self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
+            )
+            self._candidate_stats[2] += num_candidates
 
-            if isinstance(result, MatchSuccess):
-                self._perfcounters.count("rule_hits")
-                if self._config["debug_rules"]:
-                    self._logger.info(
-                        "  matching groups:\n%s" % pprint.pformat(result.match_groups)
-                    )
+        for rule, result in hits:
+            self._perfcounters.count("rule_hits")
+            if self._config["debug_rules"]:
+                self._logger.info("  matching groups:\n%s" % pprint.pformat(result.match_groups))
 
-                self._event_status.count_rule_match(rule["id"])
-                if self._config["log_rulehits"]:
-                    self._logger.info(
-                        "Rule '%s/%s' hit by message %s/%s - '%s'."
-                        % (
-                            rule["pack"],
-                            rule["id"],
-                            SyslogFacility(event["facility"]),
-                            SyslogPriority(event["priority"]),
-                            event["text"],
-                        )
+            self._event_status.count_rule_match(rule["id"])
+            if self._config["log_rulehits"]:
+                self._logger.info(
+                    "Rule '%s/%s' hit by message %s/%s - '%s'."
+                    % (
+                        rule["pack"],
+                        rule["id"],
+                        SyslogFacility(event["facility"]),
+                        SyslogPriority(event["priority"]),
+                        event["text"],
                     )
+                )
 
-                if rule.get("drop"):
-                    if rule["drop"] == "skip_pack":
-                        skip_pack = rule["pack"]
-                        if self._config["debug_rules"]:
-                            self._logger.info("  skipping this rule pack (%s)" % skip_pack)
-                        continue
-                    self._perfcounters.count("drops")
-                    return
-
-                if result.cancelling:
-                    self._event_status.cancel_events(
-                        self, self._event_columns, event, result.match_groups, rule
-                    )
-                    return
+            if rule.get("drop"):
+                if rule["drop"] == "skip_pack":
+                    if self._config["debug_rules"]:
+                        self._logger.info("  skipping this rule pack (%s)" % rule["pack"])
+                    continue
+                self._perfcounters.count("drops")
+                return
 
-                # Remember the rule id that this event originated from
-                event["rule_id"] = rule["id"]
+            if result.cancelling:
+                self._event_status.cancel_events(
+                    self, self._event_columns, event, result.match_groups, rule
+                )
+                return
 
-                # Attach optional contact group information for visibility
-                # and eventually for notifications
-                self._add_rule_contact_groups_to_event(rule, event)
+            # Remember the rule id that this event originated from
+            event["rule_id"] = rule["id"]
 
-                # Store groups from matching this event. In order to make
-                # persistence easier, we do not safe them as list but join
-                # them on ASCII-1.
-                event["match_groups"] = result.match_groups.get("match_groups_message", ())
-                event["match_groups_syslog_application"] = result.match_groups.get(
-                    "match_groups_syslog_application", ()
-                )
-                self.rewrite_event(rule, event, result.match_groups)
-
-                # Lookup the monitoring core hosts and add the core host
-                # name to the event when one can be matched.
-                #
-                # Needs to be done AFTER event rewriting, because the rewriting
-                # may change the "host" field.
-                #
-                # For the moment we have no rule/condition matching on this
-                # field. So we only add the core host info for matched events.
-                self._add_core_host_to_new_event(event)
-
-                if "count" in rule:
-                    count = rule["count"]
-                    # Check if a matching event already exists that we need to
-                    # count up. If the count reaches the limit, the event will
-                    # be opened and its rule actions performed.
-                    existing_event = self._event_status.count_event(self, event, rule, count)
-                    if existing_event:
-                        if "delay" in rule:
-                            if self._config["debug_rules"]:
-                                self._logger.info(
-                                    "Event opening will be delayed for %d seconds" % rule["delay"]
-                                )
-                            existing_event["delay_until"] = time.time() + rule["delay"]
-                            existing_event["phase"] = "delayed"
-                        else:
-                            event_has_opened(
-                                self._history,
-                                self.settings,
-                                self._config,
-                                self._logger,
-                                self.host_config,
-                                self._event_columns,
-                                rule,
-                                existing_event,
-                            )
+            # Attach optional contact group information for visibility
+            # and eventually for notifications
+            self._add_rule_contact_groups_to_event(rule, event)
 
-                        self._history.add(existing_event, "COUNTREACHED")
+            # Store groups from matching this event. In order to make
+            # persistence easier, we do not safe them as list but join
+            # them on ASCII-1.
+            event["match_groups"] = result.match_groups.get("match_groups_message", ())
+            event["match_groups_syslog_application"] = result.match_groups.get(
+                "match_groups_syslog_application", ()
+            )
+            self.rewrite_event(rule, event, result.match_groups)
 
-                        if "delay" not in rule and rule.get("autodelete"):
-                            existing_event["phase"] = "closed"
-                            self._history.add(existing_event, "AUTODELETE")
-                            with self._event_status.lock:
-                                self._event_status.remove_event(existing_event)
-                elif "expect" in rule:
-                    self._event_status.count_expected_event(self, event)
-                else:
+            # Lookup the monitoring core hosts and add the core host
+            # name to the event when one can be matched.
+            #
+            # Needs to be done AFTER event rewriting, because the rewriting
+            # may change the "host" field.
+            #
+            # For the moment we have no rule/condition matching on this
+            # field. So we only add the core host info for matched events.
+            self._add_core_host_to_new_event(event)
+
+            if "count" in rule:
+                count = rule["count"]
+                # Check if a matching event already exists that we need to
+                # count up. If the count reaches the limit, the event will
+                # be opened and its rule actions performed.
+                existing_event = self._event_status.count_event(self, event, rule, count)
+                if existing_event:
                     if "delay" in rule:
                         if self._config["debug_rules"]:
                             self._logger.info(
                                 "Event opening will be delayed for %d seconds" % rule["delay"]
                             )
-                        event["delay_until"] = time.time() + rule["delay"]
-                        event["phase"] = "delayed"
+                        existing_event["delay_until"] = time.time() + rule["delay"]
+                        existing_event["phase"] = "delayed"
                     else:
-                        event["phase"] = "open"
+                        event_has_opened(
+                            self._history,
+                            self.settings,
+                            self._config,
+                            self._logger,
+                            self.host_config,
+                            self._event_columns,
+                            rule,
+                            existing_event,
+                        )
 
-                    if self.new_event_respecting_limits(event):
-                        if event["phase"] == "open":
-                            event_has_opened(
-                                self._history,
-                                self.settings,
-                                self._config,
-                                self._logger,
-                                self.host_config,
-                                self._event_columns,
-                                rule,
-                                event,
-                            )
-                            if rule.get("autodelete"):
-                                event["phase"] = "closed"
-                                self._history.add(event, "AUTODELETE")
-                                with self._event_status.lock:
-                                    self._event_status.remove_event(event)
-                return
+                    self._history.add(existing_event, "COUNTREACHED")
+
+                    if "delay" not in rule and rule.get("autodelete"):
+                        existing_event["phase"] = "closed"
+                        self._history.add(existing_event, "AUTODELETE")
+                        with self._event_status.lock:
+                            self._event_status.remove_event(existing_event)
+            elif "expect" in rule:
+                self._event_status.count_expected_event(self, event)
+            else:
+                if "delay" in rule:
+                    if self._config["debug_rules"]:
+                        self._logger.info(
+                            "Event opening will be delayed for %d seconds" % rule["delay"]
+                        )
+                    event["delay_until"] = time.time() + rule["delay"]
+                    event["phase"] = "delayed"
+                else:
+                    event["phase"] = "open"
+
+                if self.new_event_respecting_limits(event):
+                    if event["phase"] == "open":
+                        event_has_opened(
+                            self._history,
+                            self.settings,
+                            self._config,
+                            self._logger,
+                            self.host_config,
+                            self._event_columns,
+                            rule,
+                            event,
+                        )
+                        if rule.get("autodelete"):
+                            event["phase"] = "closed"
+                            self._history.add(event, "AUTODELETE")
+                            with self._event_status.lock:
+                                self._event_status.remove_event(event)
+            return
 
         # End of loop over rules.
         if self._config["archive_orphans"]:
@@ -1690,21 +1921,7 @@ class EventServer(ECServerThread):
     def event_rule_matches(self, rule: Rule, event: Event) -> MatchResult:
         self._perfcounters.count("rule_tries")
         with self._lock_configuration:
-            result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
-            if rule.get("invert_matching"):
-                if isinstance(result, MatchFailure):
-                    result = MatchSuccess(cancelling=False, match_groups={})
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would not match, but due to inverted matching does."
-                        )
-                else:
-                    result = MatchFailure()
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would match, but due to inverted matching does not."
-                        )
-            return result
+            return self._rule_matcher.event_rule_matches(rule, event)
 
     # Rewrite texts and compute other fields in the event
     def rewrite_event(
@@ -1751,61 +1968,8 @@ class EventServer(ECServerThread):
         if "set_contact" in rule and "contact" not in event:
             event["contact"] = replace_groups(rule["set_contact"], event.get("contact", ""), groups)
 
-    # Translate a hostname if this is configured. We are
-    # *really* sorry: this code snipped is copied from modules/check_mk_base.py.
-    # There is still no common library. Please keep this in sync with the
-    # original code
-    def translate_hostname(self, backedhost: str) -> str:
-        translation = self._config["hostname_translation"]
-
-        # Here comes the original code from modules/check_mk_base.py
-        if translation:
-            # 1. Case conversion
-            caseconf = translation.get("case")
-            if caseconf == "upper":
-                backedhost = backedhost.upper()
-            elif caseconf == "lower":
-                backedhost = backedhost.lower()
-
-            # 2. Drop domain part (not applied to IP addresses!)
-            if translation.get("drop_domain") and backedhost:
-                # only apply if first part does not convert successfully into an int
-                firstpart = backedhost.split(".", 1)[0]
-                try:
-                    int(firstpart)
-                except Exception:
-                    backedhost = firstpart
-
-            # 3. Regular expression conversion
-            if "regex" in translation:
-                for regex, subst in translation["regex"]:
-                    if not regex.endswith("$"):
-                        regex += "$"
-                    rcomp = cmk.utils.regex.regex(regex)
-                    mo = rcomp.match(backedhost)
-                    if mo:
-                        backedhost = subst
-                        for nr, text in enumerate(mo.groups()):
-                            backedhost = backedhost.replace("\\%d" % (nr + 1), text)
-                        break
-
-            # 4. Explicit mapping
-            for from_host, to_host in translation.get("mapping", []):
-                if from_host == backedhost:
-                    backedhost = to_host
-                    break
-
-        return backedhost
-
     def do_translate_hostname(self, event: Event) -> None:
-        try:
-            event["host"] = self.translate_hostname(event["host"])
-        except Exception as e:
-            if self._config["debug_rules"]:
-                self._logger.exception(
-                    'Unable to parse host "{}" ({})'.format(event.get("host"), e)
-                )
-            event["host"] = ""
+        do_translate_hostname(self._config, self._logger, event)
 
     def log_message(self, event: Event) -> None:
         try:
@@ -2079,6 +2243,19 @@ class RuleMatcher:
     def _debug_rules(self) -> bool:
         return self._config["debug_rules"]
 
+    def event_rule_matches(self, rule: Rule, event: Event) -> MatchResult:
+        result = self.event_rule_matches_non_inverted(rule, event)
+        if rule.get("invert_matching"):
+            if isinstance(result, MatchFailure):
+                result = MatchSuccess(cancelling=False, match_groups={})
+                if self._debug_rules:
+                    self._logger.info("  Rule would not match, but due to inverted matching does.")
+            else:
+                result = MatchFailure()
+                if self._debug_rules:
+                    self._logger.info("  Rule would match, but due to inverted matching does not.")
+        return result
+
     def event_rule_matches_non_inverted(self, rule: Rule, event: Event) -> MatchResult:
         if self._debug_rules:
             self._logger.info("Trying rule {}/{}...".format(rule["pack"], rule["id"]))
@@ -2327,6 +2504,245 @@ class RuleMatcher:
         return True
 
 
+# Chunks of received lines together with the address they have been received from
+PipelineBatch = list[tuple[list[bytes], Optional[tuple[str, int]]]]
+# The parsed event, the numbers of the rules it hit, the number of tried rules and the
+# number of rule candidates
+PipelineResult = tuple[Event, list[tuple[int, MatchSuccess]], int, int]
+
+# Number of lines which are handed over to a worker at once
+_PIPELINE_BATCH_SIZE = 500
+
+
+class _PipelineWorker:
+    """The part of the event processing done by the worker processes of the EventPipeline"""
+
+    def __init__(
+        self,
+        config: Config,
+        rules: Sequence[Rule],
+        rule_hash: Mapping[int, Mapping[int, Sequence[Rule]]],
+    ) -> None:
+        super().__init__()
+        self._config = config
+        self._rules = rules
+        self._rule_hash = rule_hash
+        # Built here, the worker has its own copy of the rules
+        self._prefilter = RulePrefilter(rules) if config["rule_optimizer"] else None
+        self._rule_nrs = {id(rule): nr for nr, rule in enumerate(rules)}
+        self._logger = getLogger("cmk.mkeventd.EventServer")
+        self._rule_matcher = RuleMatcher(self._logger, config)
+        self._rule_tries = 0
+
+    def process(self, batch: PipelineBatch) -> tuple[list[PipelineResult], float]:
+        results = []
+        for lines, address in batch:
+            for line_bytes in lines:
+                if not (line := scrub_and_decode(line_bytes.rstrip())):
+                    continue
+                try:
+                    results.append(self._process_line(line, address))
+                except Exception as e:
+                    self._logger.exception(
+                        "Exception handling a log line (skipping this one): %s" % e
+                    )
+        return results, time.time()
+
+    def _process_line(self, line: str, address: Optional[tuple[str, int]]) -> PipelineResult:
+        event = create_event_from_line(
+            line, address, self._logger, verbose=self._config["debug_rules"]
+        )
+        do_translate_hostname(self._config, self._logger, event)
+
+        self._rule_tries = 0
+        candidates = rule_candidates(
+            self._config, self._rules, self._rule_hash, self._prefilter, event
+        )
+        hits = find_rule_hits(candidates, event, self._event_rule_matches, self._logger)
+        return (
+            event,
+            [(self._rule_nrs[id(rule)], result) for rule, result in hits],
+            self._rule_tries,
+            len(candidates),
+        )
+
+    def _event_rule_matches(self, rule: Rule, event: Event) -> MatchResult:
+        self._rule_tries += 1
+        return self._rule_matcher.event_rule_matches(rule, event)
+
+
+_pipeline_worker: Optional[_PipelineWorker] = None
+
+
+def _initialize_pipeline_worker(
+    config: Config,
+    rules: Sequence[Rule],
+    rule_hash: Mapping[int, Mapping[int, Sequence[Rule]]],
+    log_file: Optional[str],
+    log_level: int,
+) -> None:
+    global _pipeline_worker
+    # Terminating is up to the EventServer
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if log_file is None:
+        log.setup_logging_handler(sys.stderr)
+    else:
+        log.open_log(log_file)
+    getLogger("cmk.mkeventd.EventServer").setLevel(log_level)
+    _pipeline_worker = _PipelineWorker(config, rules, rule_hash)
+
+
+def _process_pipeline_batch(batch: PipelineBatch) -> tuple[list[PipelineResult], float]:
+    assert _pipeline_worker is not None
+    return _pipeline_worker.process(batch)
+
+
+class EventPipeline:
+    """Parse and match the incoming messages in a pool of worker processes
+
+    Parsing, hostname translation and rule matching do not depend on the state of the
+    Event Console, so they are spread over worker processes. The results are handed back
+    in order of arrival of the messages, everything else (counting, cancelling, event
+    limits, actions...) is done by the EventServer thread, see process_rule_hits().
+
+    The read end of a pipe is used to wake up the select() of the EventServer whenever a
+    worker has finished a batch of messages.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        settings: Settings,
+        config: Config,
+        rules: Sequence[Rule],
+        rule_hash: Mapping[int, Mapping[int, Sequence[Rule]]],
+        perfcounters: Perfcounters,
+    ) -> None:
+        super().__init__()
+        self._logger = logger
+        self._perfcounters = perfcounters
+        self._num_workers = config["pipeline_workers"]
+        self._rules = rules
+        self._initargs = (
+            config,
+            rules,
+            rule_hash,
+            None if settings.options.foreground else str(settings.paths.log_file.value),
+            logger.getEffectiveLevel(),
+        )
+        # Started with the first batch, i.e. after the Event Console has been daemonized
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self._batch: PipelineBatch = []
+        self._batch_lines = 0
+        # Time of submission, number of lines and result of the batches in the workers
+        self._pending: deque[tuple[float, int, Future]] = deque()
+
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+
+    def fileno(self) -> int:
+        return self._wakeup_read
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._batch or self._pending)
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= 2 * self._num_workers
+
+    def add(self, lines: list[bytes], address: Optional[tuple[str, int]]) -> None:
+        self._batch.append((lines, address))
+        self._batch_lines += len(lines)
+        if self._batch_lines >= _PIPELINE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        try:
+            future = self._get_executor().submit(_process_pipeline_batch, self._batch)
+        except BrokenProcessPool:
+            self._logger.error("Worker process died unexpectedly, restarting the workers")
+            self._executor = None
+            future = self._get_executor().submit(_process_pipeline_batch, self._batch)
+        future.add_done_callback(self._wake_up)
+        self._pending.append((time.time(), self._batch_lines, future))
+        self._batch = []
+        self._batch_lines = 0
+        self._update_queue_lengths()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking the threaded EC is no good idea, start fresh interpreters instead
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize_pipeline_worker,
+                initargs=self._initargs,
+            )
+        return self._executor
+
+    def _wake_up(self, future: Future) -> None:
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            pass  # There are enough wake ups pending
+
+    def results(self, wait: bool = False) -> Iterator[tuple[Event, RuleHits, int, int]]:
+        """The results of the finished batches in order of arrival of the messages
+
+        With wait, this waits for the oldest batch if it has not been finished yet.
+        """
+        try:
+            while os.read(self._wakeup_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._pending and (wait or self._pending[0][2].done()):
+            wait = False
+            submitted, num_lines, future = self._pending.popleft()
+            try:
+                results, finished = future.result()
+            except Exception as e:
+                self._logger.exception(
+                    "Exception in worker process (skipping %d lines): %s" % (num_lines, e)
+                )
+                continue
+
+            self._perfcounters.count_time("pipeline_worker", finished - submitted)
+            self._update_queue_lengths()
+            for event, hits, num_tries, num_candidates in results:
+                yield (
+                    event,
+                    [(self._rules[nr], result) for nr, result in hits],
+                    num_tries,
+                    num_candidates,
+                )
+            self._perfcounters.count_time("pipeline_state", time.time() - finished)
+
+        self._update_queue_lengths()
+
+    def _update_queue_lengths(self) -> None:
+        in_workers = 0
+        finished = 0
+        for _submitted, num_lines, future in self._pending:
+            if future.done():
+                finished += num_lines
+            else:
+                in_workers += num_lines
+        self._perfcounters.set_queue_length("pipeline_worker", in_workers)
+        self._perfcounters.set_queue_length("pipeline_state", finished)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+
+
 # .
 #   .--Status Queries------------------------------------------------------.
 #   |  ____  _        _                ___                  _              |
@@ -3123,13 +3539,11 @@ class EventStatus:
         self._config = config
 
     def flush(self) -> None:
-        # TODO: Improve types!
-        self._events: list[Any] = []
+        self._events = EventStore()
         self._next_event_id = 1
         self._rule_stats: dict[str, int] = {}
         # needed for expecting rules
         self._interval_starts: dict[str, int] = {}
-        self._initialize_event_limit_status()
 
         # TODO: might introduce some performance counters, like:
         # - number of received messages
@@ -3138,13 +3552,13 @@ class EventStatus:
 
     def events(self) -> list[Any]:
         # TODO: Improve type!
-        return self._events
+        return list(self._events)
+
+    def events_of_rule(self, rule_id: str) -> list[Event]:
+        return self._events.of_rule(rule_id)
 
     def event(self, eid: int) -> Optional[Event]:
-        for event in self._events:
-            if event["id"] == eid:
-                return event
-        return None
+        return self._events.get(eid)
 
     def interval_start(self, rule_id: str, interval: int) -> int:
         """
@@ -3191,14 +3605,14 @@ class EventStatus:
     def pack_status(self) -> dict[str, Any]:
         return {
             "next_event_id": self._next_event_id,
-            "events": self._events,
+            "events": list(self._events),
             "rule_stats": self._rule_stats,
             "interval_starts": self._interval_starts,
         }
 
     def unpack_status(self, status: Mapping[str, Any]) -> None:
         self._next_event_id = status["next_event_id"]
-        self._events = status["events"]
+        self._events = EventStore(status["events"])
         self._rule_stats = status["rule_stats"]
         self._interval_starts = status["interval_starts"]
 
@@ -3226,11 +3640,12 @@ class EventStatus:
 
     def load_status(self, event_server: EventServer) -> None:
         path = self.settings.paths.status_file.value
+        events = list(self._events)
         if path.exists():
             try:
                 status = ast.literal_eval(path.read_text(encoding="utf-8"))
                 self._next_event_id = status["next_event_id"]
-                self._events = status["events"]
+                events = status["events"]
                 self._rule_stats = status["rule_stats"]
                 self._interval_starts = status.get("interval_starts", {})
                 self._logger.info("Loaded event state from %s." % path)
@@ -3239,7 +3654,7 @@ class EventStatus:
                 raise
 
         # Add new columns and fix broken events
-        for event in self._events:
+        for event in events:
             event.setdefault("ipaddress", "")
             event.setdefault("host", "")
             event.setdefault("application", "")
@@ -3249,46 +3664,27 @@ class EventStatus:
                 event_server.add_core_host_to_event(event)
                 event["host_in_downtime"] = False
 
-        # core_host is needed to initialize the status
-        self._initialize_event_limit_status()
-
-    # Called on Event Console initialization from status file to initialize
-    # the current event limit state -> Sets internal counters which are
-    # updated during runtime.
-    def _initialize_event_limit_status(self) -> None:
-        self.num_existing_events = len(self._events)
-
-        self.num_existing_events_by_host: dict[tuple[str, Optional[HostName]], int] = {}
-        self.num_existing_events_by_rule: dict[Any, int] = {}
-        for event in self._events:
-            self._count_event_add(event)
-
-    def _count_event_add(self, event: Event) -> None:
-        host_key = (event["host"], event["core_host"])
-        if host_key not in self.num_existing_events_by_host:
-            self.num_existing_events_by_host[host_key] = 1
-        else:
-            self.num_existing_events_by_host[host_key] += 1
+        # core_host is needed to index the events
+        self._events = EventStore(events)
 
-        if event["rule_id"] not in self.num_existing_events_by_rule:
-            self.num_existing_events_by_rule[event["rule_id"]] = 1
-        else:
-            self.num_existing_events_by_rule[event["rule_id"]] += 1
+    # The current event limit state is derived from the indexes of the event store
+    @property
+    def num_existing_events(self) -> int:
+        return len(self._events)
 
-    def _count_event_remove(self, event: Event) -> None:
-        host_key = (event["host"], event["core_host"])
+    @property
+    def num_existing_events_by_host(self) -> dict[HostKey, int]:
+        return self._events.num_by_host()
 
-        self.num_existing_events -= 1
-        self.num_existing_events_by_host[host_key] -= 1
-        self.num_existing_events_by_rule[event["rule_id"]] -= 1
+    @property
+    def num_existing_events_by_rule(self) -> dict[Any, int]:
+        return self._events.num_by_rule()
 
     def new_event(self, event: Event) -> None:
         self._perfcounters.count("events")
         event["id"] = self._next_event_id
         self._next_event_id += 1
-        self._events.append(event)
-        self.num_existing_events += 1
-        self._count_event_add(event)
+        self._events.add(event)
         self._history.add(event, "NEW")
 
     def archive_event(self, event: Event) -> None:
@@ -3301,49 +3697,33 @@ class EventStatus:
     def remove_event(self, event: Event) -> None:
         try:
             self._events.remove(event)
-            self._count_event_remove(event)
-        except ValueError:
+        except KeyError:
             self._logger.exception("Cannot remove event %d: not present" % event["id"])
 
-    # protected by self.lock
-    def _remove_event_by_nr(self, index: int) -> None:
-        event = self._events.pop(index)
-        self._count_event_remove(event)
-
     # protected by self.lock
     def remove_oldest_event(self, ty: str, event: Event) -> None:
+        oldest: Optional[Event] = None
         if ty == "overall":
             self._logger.log(VERBOSE, "  Removing oldest event")
-            self._remove_event_by_nr(0)
+            oldest = self._events.oldest()
         elif ty == "by_rule" and event["rule_id"] is not None:
             self._logger.log(VERBOSE, '  Removing oldest event of rule "%s"', event["rule_id"])
-            self._remove_oldest_event_of_rule(event["rule_id"])
+            oldest = self._events.oldest_of_rule(event["rule_id"])
         elif ty == "by_host" and event["host"] is not None:
             self._logger.log(VERBOSE, '  Removing oldest event of host "%s"', event["host"])
-            self._remove_oldest_event_of_host(event["host"])
-
-    # protected by self.lock
-    def _remove_oldest_event_of_rule(self, rule_id: str) -> None:
-        for event in self._events:
-            if event["rule_id"] == rule_id:
-                self.remove_event(event)
-                return
+            oldest = self._events.oldest_of_host(event["host"])
 
-    # protected by self.lock
-    def _remove_oldest_event_of_host(self, hostname: str) -> None:
-        for event in self._events:
-            if event["host"] == hostname:
-                self.remove_event(event)
-                return
+        if oldest is not None:
+            self._events.remove(oldest)
 
     # protected by self.lock
     def get_num_existing_events_by(self, ty: str, event: Event) -> int:
         if ty == "overall":
-            return self.num_existing_events
+            return len(self._events)
         if ty == "by_rule":
-            return self.num_existing_events_by_rule.get(event["rule_id"], 0)
+            return self._events.num_of_rule(event["rule_id"])
         if ty == "by_host":
-            return self.num_existing_events_by_host.get((event["host"], event["core_host"]), 0)
+            return self._events.num_of_host((event["host"], event["core_host"]))
         raise NotImplementedError()
 
     def cancel_events(
@@ -3360,53 +3740,52 @@ class EventStatus:
         """
         with self.lock:
             to_delete = []
-            for nr, event in enumerate(self._events):
-                if event["rule_id"] == rule["id"]:
-                    if self.cancelling_match(match_groups, new_event, event, rule):
-                        # Fill a few fields of the cancelled event with data from
-                        # the cancelling event so that action scripts have useful
-                        # values and the logfile entry if more relevant.
-                        previous_phase = event["phase"]
-                        event["phase"] = "closed"
-                        # TODO: Why do we use OK below and not new_event["state"]???
-                        event["state"] = 0  # OK
-                        event["text"] = new_event["text"]
-                        # TODO: This is a hack and partial copy-n-paste from rewrite_events...
-                        if "set_text" in rule:
-                            event["text"] = replace_groups(
-                                rule["set_text"], event["text"], match_groups
+            for event in self._events.of_rule(rule["id"]):
+                if self.cancelling_match(match_groups, new_event, event, rule):
+                    # Fill a few fields of the cancelled event with data from
+                    # the cancelling event so that action scripts have useful
+                    # values and the logfile entry if more relevant.
+                    previous_phase = event["phase"]
+                    event["phase"] = "closed"
+                    # TODO: Why do we use OK below and not new_event["state"]???
+                    event["state"] = 0  # OK
+                    event["text"] = new_event["text"]
+                    # TODO: This is a hack and partial copy-n-paste from rewrite_events...
+                    if "set_text" in rule:
+                        event["text"] = replace_groups(
+                            rule["set_text"], event["text"], match_groups
+                        )
+                    event["time"] = new_event["time"]
+                    event["last"] = new_event["time"]
+                    event["priority"] = new_event["priority"]
+                    self._history.add(event, "CANCELLED")
+                    actions = rule.get("cancel_actions", [])
+                    if actions:
+                        if (
+                            previous_phase != "open"
+                            and rule.get("cancel_action_phases", "always") == "open"
+                        ):
+                            self._logger.info(
+                                "Do not execute cancelling actions, event %s's phase "
+                                "is not 'open' but '%s'" % (event["id"], previous_phase)
+                            )
+                        else:
+                            do_event_actions(
+                                self._history,
+                                self.settings,
+                                self._config,
+                                self._logger,
+                                event_server.host_config,
+                                event_columns,
+                                actions,
+                                event,
+                                is_cancelling=True,
                             )
-                        event["time"] = new_event["time"]
-                        event["last"] = new_event["time"]
-                        event["priority"] = new_event["priority"]
-                        self._history.add(event, "CANCELLED")
-                        actions = rule.get("cancel_actions", [])
-                        if actions:
-                            if (
-                                previous_phase != "open"
-                                and rule.get("cancel_action_phases", "always") == "open"
-                            ):
-                                self._logger.info(
-                                    "Do not execute cancelling actions, event %s's phase "
-                                    "is not 'open' but '%s'" % (event["id"], previous_phase)
-                                )
-                            else:
-                                do_event_actions(
-                                    self._history,
-                                    self.settings,
-                                    self._config,
-                                    self._logger,
-                                    event_server.host_config,
-                                    event_columns,
-                                    actions,
-                                    event,
-                                    is_cancelling=True,
-                                )
 
-                        to_delete.append(nr)
+                    to_delete.append(event)
 
-            for nr in to_delete[::-1]:
-                self._remove_event_by_nr(nr)
+            for event in to_delete:
+                self._events.remove(event)
 
     def cancelling_match(
         self, match_groups: dict, new_event: Event, event: Event, rule: Rule
@@ -3516,10 +3895,11 @@ class EventStatus:
                 preserve["contact"] = found["contact"]
         found.update(event)
         found.update(preserve)
+        self._events.reindex(found)
 
     def count_expected_event(self, event_server: EventServer, event: Event) -> None:
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"] and ev["phase"] == "counting":
+        for ev in self._events.of_rule(event["rule_id"]):
+            if ev["phase"] == "counting":
                 self.count_event_up(ev, event)
                 return
 
@@ -3538,33 +3918,32 @@ class EventStatus:
         since the event has been created because the count was too
         low in the specified period of time.
         """
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"]:
-                if ev["phase"] == "ack" and not count["count_ack"]:
-                    continue  # skip acknowledged events
+        for ev in self._events.of_rule(event["rule_id"]):
+            if ev["phase"] == "ack" and not count["count_ack"]:
+                continue  # skip acknowledged events
 
-                if count["separate_host"] and ev["host"] != event["host"]:
-                    continue  # treat events with separated hosts separately
+            if count["separate_host"] and ev["host"] != event["host"]:
+                continue  # treat events with separated hosts separately
 
-                if count["separate_application"] and ev["application"] != event["application"]:
-                    continue  # same for application
+            if count["separate_application"] and ev["application"] != event["application"]:
+                continue  # same for application
 
-                if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
-                    continue
+            if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
+                continue
 
-                if (
-                    count.get("count_duration") is not None
-                    and ev["first"] + count["count_duration"] < event["time"]
-                ):
-                    # Counting has been discontinued on this event after a certain time
-                    continue
+            if (
+                count.get("count_duration") is not None
+                and ev["first"] + count["count_duration"] < event["time"]
+            ):
+                # Counting has been discontinued on this event after a certain time
+                continue
 
-                if ev["host_in_downtime"] != event["host_in_downtime"]:
-                    continue  # treat events with different downtime states separately
+            if ev["host_in_downtime"] != event["host_in_downtime"]:
+                continue  # treat events with different downtime states separately
 
-                found = ev
-                self.count_event_up(found, event)
-                break
+            found = ev
+            self.count_event_up(found, event)
+            break
         else:
             event["count"] = 1
             event["phase"] = "counting"
@@ -3579,18 +3958,17 @@ class EventStatus:
 
     # locked with self.lock
     def delete_event(self, event_id: int, user: str) -> None:
-        for nr, event in enumerate(self._events):
-            if event["id"] == event_id:
-                event["phase"] = "closed"
-                if user:
-                    event["owner"] = user
-                self._history.add(event, "DELETE", user)
-                self._remove_event_by_nr(nr)
-                return
-        raise MKClientError("No event with id %s" % event_id)
+        event = self._events.get(event_id)
+        if event is None:
+            raise MKClientError("No event with id %s" % event_id)
+        event["phase"] = "closed"
+        if user:
+            event["owner"] = user
+        self._history.add(event, "DELETE", user)
+        self._events.remove(event)
 
     def get_events(self) -> list[Any]:
-        return self._events
+        return list(self._events)
 
     def get_rule_stats(self) -> Iterable[Any]:
         return sorted(self._rule_stats.items(), key=lambda x: x[0])
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Literal prefilter for the rules of the Event Console
+
+Most of the text patterns of the rules contain literal strings which have to occur in a
+text matched by the pattern, e.g. "sshd" and "failed" in "sshd.*failed for (.*)". All
+required literals of the message, application and host patterns are compiled into one
+Aho-Corasick automaton per field, so a single pass over the fields of an event finds all
+rules which may match it. Only those have to be matched with their regular expressions.
+
+The prefilter may keep rules which do not match, but it never drops a matching one: All
+texts and literals are compared in lower case, because the patterns are case insensitive.
+"""
+
+import re
+from collections import deque
+from typing import Iterable, Mapping, Optional, Sequence
+
+from .config import Rule, TextPattern
+from .event import Event
+
+try:
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # Python < 3.11
+    import sre_parse  # type: ignore[no-redef]
+
+# Shorter literals occur in too many texts to be worth the effort
+_MIN_LITERAL_LENGTH = 2
+
+# Non ASCII characters which are matched by ASCII letters of case insensitive patterns
+# (KELVIN SIGN and the Turkish dotted and dotless i are lowered to ASCII by str.lower(),
+# except that the dotted i gets a combining dot above, LATIN SMALL LETTER LONG S is no
+# upper or lower case letter of anything)
+_CASE_EQUIVALENTS = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+
+# A set of literals of which at least one occurs in every text matched by a pattern
+Requirement = frozenset[str]
+
+
+def normalize(text: str) -> str:
+    """The text in the form the literals are searched in"""
+    if text.isascii():
+        return text.lower()
+    return text.translate(_CASE_EQUIVALENTS).lower()
+
+
+def required_literals(pattern: TextPattern) -> Optional[Requirement]:
+    """Literals one of which occurs in each text matched by the pattern, None if unknown"""
+    if pattern is None:
+        return None
+    if isinstance(pattern, str):
+        # Plain texts are matched as sub string or as whole text, both contain the text
+        return _best_requirement(
+            [frozenset([part]) for part in re.split(r"[^\x00-\x7f]+", pattern.lower())]
+        )
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    return _sequence_requirement(parsed)
+
+
+def _sequence_requirement(items: Iterable) -> Optional[Requirement]:
+    requirements = []
+    run: list[str] = []
+    for op, av in items:
+        if op is sre_parse.LITERAL and av < 0x80:
+            run.append(chr(av).lower())
+            continue
+
+        requirements.append(frozenset(["".join(run)]))
+        run = []
+        if op is sre_parse.SUBPATTERN:
+            requirements.append(_sequence_requirement(av[-1]))
+        elif op is getattr(sre_parse, "ATOMIC_GROUP", None):  # Python >= 3.11
+            requirements.append(_sequence_requirement(av))
+        elif op in _REPEATS and av[0] > 0:
+            requirements.append(_sequence_requirement(av[2]))
+        elif op is sre_parse.BRANCH:
+            requirements.append(_branch_requirement(av[1]))
+    requirements.append(frozenset(["".join(run)]))
+    return _best_requirement(requirements)
+
+
+def _branch_requirement(branches: Iterable) -> Optional[Requirement]:
+    literals: set[str] = set()
+    for branch in branches:
+        if (requirement := _sequence_requirement(branch)) is None:
+            return None
+        literals |= requirement
+    return frozenset(literals)
+
+
+def _best_requirement(requirements: Iterable[Optional[Requirement]]) -> Optional[Requirement]:
+    """Any of the requirements of a sequence will do, prefer the most selective one"""
+    best: Optional[Requirement] = None
+    best_key = (0, 0)
+    for requirement in requirements:
+        if not requirement or (shortest := min(map(len, requirement))) < _MIN_LITERAL_LENGTH:
+            continue
+        key = (shortest, -len(requirement))
+        if key > best_key:
+            best, best_key = requirement, key
+    return best
+
+
+_REPEATS = {
+    sre_parse.MAX_REPEAT,
+    sre_parse.MIN_REPEAT,
+    *([sre_parse.POSSESSIVE_REPEAT] if hasattr(sre_parse, "POSSESSIVE_REPEAT") else []),
+}
+
+
+class LiteralAutomaton:
+    """Aho-Corasick automaton finding the literals occurring in a text
+
+    Each literal is associated with a bit mask, search() returns the union of the masks
+    of all literals found. The transitions of the deterministic automaton are only stored
+    where they differ from the transitions of the initial state.
+    """
+
+    def __init__(self, literals: Mapping[str, int]) -> None:
+        super().__init__()
+        goto: list[dict[str, int]] = [{}]
+        self._output: list[int] = [0]
+        for literal, mask in literals.items():
+            state = 0
+            for char in literal:
+                if (next_state := goto[state].get(char)) is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    self._output.append(0)
+                state = next_state
+            self._output[state] |= mask
+
+        self._initial = goto[0]
+        self._delta: list[dict[str, int]] = [{} for _state in goto]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            self._output[state] |= self._output[fail[state]]
+            self._delta[state] = {
+                char: next_state
+                for char, next_state in {**self._delta[fail[state]], **goto[state]}.items()
+                if self._initial.get(char) != next_state
+            }
+            for char, next_state in goto[state].items():
+                fail[next_state] = self._next(fail[state], char)
+                queue.append(next_state)
+
+    def _next(self, state: int, char: str) -> int:
+        return self._delta[state].get(char) or self._initial.get(char, 0)
+
+    @property
+    def num_states(self) -> int:
+        return len(self._output)
+
+    def search(self, text: str) -> int:
+        delta = self._delta
+        initial = self._initial
+        output = self._output
+        found = 0
+        state = 0
+        for char in text:
+            state = delta[state].get(char) or initial.get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class _FieldFilter:
+    """The rules which may match the value of one field of an event"""
+
+    def __init__(self, requirements: Sequence[Optional[Requirement]]) -> None:
+        super().__init__()
+        self.unconditional = 0
+        literals: dict[str, int] = {}
+        for nr, requirement in enumerate(requirements):
+            if requirement is None:
+                self.unconditional |= 1 << nr
+                continue
+            for literal in requirement:
+                literals[literal] = literals.get(literal, 0) | 1 << nr
+        self.num_literals = len(literals)
+        self._automaton = LiteralAutomaton(literals) if literals else None
+
+    def possible(self, value: str) -> int:
+        if self._automaton is None:
+            return self.unconditional
+        return self.unconditional | self._automaton.search(normalize(value))
+
+
+class RulePrefilter:
+    """Drops the rules which cannot match an event because of their text patterns"""
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        super().__init__()
+        self._rule_nrs = {id(rule): nr for nr, rule in enumerate(rules)}
+        self._all = (1 << len(rules)) - 1
+        self._fields = {
+            "text": _FieldFilter([_message_requirement(rule) for rule in rules]),
+            "application": _FieldFilter([_application_requirement(rule) for rule in rules]),
+            "host": _FieldFilter([_host_requirement(rule) for rule in rules]),
+        }
+
+    @property
+    def num_literals(self) -> int:
+        return sum(field.num_literals for field in self._fields.values())
+
+    @property
+    def num_unfiltered(self) -> int:
+        """Number of rules which are always kept"""
+        unconditional = self._all
+        for field in self._fields.values():
+            unconditional &= field.unconditional
+        return bin(unconditional).count("1")
+
+    def filter(self, rules: Sequence[Rule], event: Event) -> Sequence[Rule]:
+        """The rules which may match the event, in their original order"""
+        possible = self._all
+        for key, field in self._fields.items():
+            if not (possible := possible & field.possible(event[key])):
+                return []
+        if possible == self._all:
+            return rules
+        rule_nrs = self._rule_nrs
+        return [rule for rule in rules if possible >> rule_nrs[id(rule)] & 1]
+
+
+def _either(*requirements: Optional[Requirement]) -> Optional[Requirement]:
+    """The requirement of a field which has to match one of several patterns"""
+    literals: set[str] = set()
+    for requirement in requirements:
+        if requirement is None:
+            return None
+        literals |= requirement
+    return frozenset(literals)
+
+
+def _message_requirement(rule: Rule) -> Optional[Requirement]:
+    if rule.get("invert_matching"):
+        return None
+    if "match_ok" in rule:
+        return _either(required_literals(rule.get("match")), required_literals(rule["match_ok"]))
+    return required_literals(rule.get("match"))
+
+
+def _application_requirement(rule: Rule) -> Optional[Requirement]:
+    if rule.get("invert_matching"):
+        return None
+    patterns = [rule[key] for key in ["match_application", "cancel_application"] if key in rule]
+    if not patterns:
+        return None
+    return _either(*map(required_literals, patterns))
+
+
+def _host_requirement(rule: Rule) -> Optional[Requirement]:
+    if rule.get("invert_matching"):
+        return None
+    return required_literals(rule.get("match_host"))
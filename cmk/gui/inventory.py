@@ -125,11 +125,17 @@ class InventoryPath:
         return self.path[-1] if self.path else ""
 
 
-def load_filtered_and_merged_tree(row: Row) -> Optional[StructuredDataNode]:
+def load_filtered_and_merged_tree(
+    row: Row, paths: Optional[Sequence[SDPath]] = None
+) -> Optional[StructuredDataNode]:
     """Load inventory tree from file, status data tree from row,
-    merge these trees and returns the filtered tree"""
+    merge these trees and returns the filtered tree
+
+    If paths are given, only the nodes below these paths are loaded from the inventory tree."""
     hostname = row.get("host_name")
-    inventory_tree = _load_structured_data_tree("inventory", hostname)
+    inventory_tree = _load_structured_data_tree(
+        "inventory", hostname, None if paths is None else tuple(paths)
+    )
     status_data_tree = _load_status_data_tree(hostname, row)
 
     merged_tree = _merge_inventory_and_status_data_tree(inventory_tree, status_data_tree)
@@ -487,7 +493,9 @@ class LoadStructuredDataError(MKException):
 
 @request_memoize(maxsize=None)
 def _load_structured_data_tree(
-    tree_type: Literal["inventory", "status_data"], hostname: Optional[HostName]
+    tree_type: Literal["inventory", "status_data"],
+    hostname: Optional[HostName],
+    paths: Optional[Tuple[SDPath, ...]] = None,
 ) -> Optional[StructuredDataNode]:
     """Load data of a host, cache it in the current HTTP request"""
     if not hostname:
@@ -504,7 +512,7 @@ def _load_structured_data_tree(
     )
 
     try:
-        return tree_store.load(host_name=hostname)
+        return tree_store.load(host_name=hostname, paths=paths)
     except Exception as e:
         if active_config.debug:
             html.show_warning("%s" % e)
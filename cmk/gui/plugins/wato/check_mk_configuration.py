@@ -2736,6 +2736,63 @@ class ConfigVariableClusterMaxCachefileAge(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableConcurrentFetchers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupCheckExecution
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "concurrent_fetchers"
+
+    def valuespec(self):
+        return Checkbox(
+            title=_("Fetch the data of a host concurrently"),
+            label=_("run the data sources of a host at the same time"),
+            help=_(
+                "If you enable this option, the fetcher helpers of the Microcore query the "
+                "data sources of a host (e.g. the Checkmk agent, SNMP and special agents) at "
+                "the same time instead of one after the other. A slow data source then no "
+                "longer delays the others. The results of the data sources which are done "
+                "when the host's check timeout is reached are kept."
+            ),
+        )
+
+
+@config_variable_registry.register
+class ConfigVariableFetcherTimeouts(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupCheckExecution
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "fetcher_timeouts"
+
+    def valuespec(self):
+        return Dictionary(
+            title=_("Timeouts of the data sources"),
+            help=_(
+                "The maximum time the data of a host may be fetched from each type of data "
+                "source. The timeout of the host's check still applies. This only has an "
+                "effect if the data of a host is fetched concurrently."
+            ),
+            elements=[
+                (fetcher_type, Age(title=title, minvalue=1))
+                for fetcher_type, title in [
+                    ("TCP", _("Checkmk agent")),
+                    ("PROGRAM", _("Individual program call and special agents")),
+                    ("SNMP", _("SNMP")),
+                    ("IPMI", _("IPMI")),
+                    ("PIGGYBACK", _("Piggyback")),
+                ]
+            ],
+        )
+
+
 @config_variable_registry.register
 class ConfigVariablePiggybackMaxCachefileAge(ConfigVariable):
     def group(self):
@@ -2819,6 +2876,8 @@ def transform_snmp_backend_default_forth(backend):
         # We dropped pysnmp during the 2.1 beta because it is currently slow
         # and unreliable.
         return SNMPBackendEnum.CLASSIC
+    if backend == "bulk":
+        return SNMPBackendEnum.BULK
     raise MKConfigError("SNMPBackendEnum %r not implemented" % backend)
 
 
@@ -2827,6 +2886,8 @@ def transform_snmp_backend_back(backend):
         return "classic"
     if backend is SNMPBackendEnum.INLINE:
         return "inline"
+    if backend is SNMPBackendEnum.BULK:
+        return "bulk"
     raise MKConfigError("SNMPBackendEnum %r not implemented" % backend)
 
 
@@ -2848,6 +2909,7 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                 choices=[
                     (SNMPBackendEnum.CLASSIC, _("Use Classic SNMP Backend")),
                     (SNMPBackendEnum.INLINE, _("Use Inline SNMP Backend")),
+                    (SNMPBackendEnum.BULK, _("Use Bulk SNMP Backend")),
                 ],
                 help=_(
                     "By default Checkmk uses command line calls of Net-SNMP tools like snmpget or "
@@ -2856,7 +2918,9 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                     "which calls the respective libraries directly via its python bindings. This "
                     "should increase the performance of SNMP checks in a significant way. Both "
                     "SNMP modes are features which improve the performance for large installations and are "
-                    "only available via our subscription."
+                    "only available via our subscription. The Bulk SNMP backend fetches all columns "
+                    "of a table with common GETBULK requests without executing any program. It "
+                    "supports SNMP v1 and v2c, SNMPv3 hosts are queried with the Classic backend."
                 ),
             ),
             forth=transform_snmp_backend_default_forth,
@@ -5087,6 +5151,8 @@ def transform_snmp_backend_hosts_forth(backend):
         # We dropped pysnmp during the 2.1 beta because it is currently slow
         # and unreliable.
         return SNMPBackendEnum.CLASSIC
+    if backend == "bulk":
+        return SNMPBackendEnum.BULK
     raise MKConfigError("SNMPBackendEnum %r not implemented" % backend)
 
 
@@ -5097,6 +5163,7 @@ def _valuespec_snmp_backend():
             choices=[
                 (SNMPBackendEnum.INLINE, _("Use Inline SNMP Backend")),
                 (SNMPBackendEnum.CLASSIC, _("Use Classic Backend")),
+                (SNMPBackendEnum.BULK, _("Use Bulk SNMP Backend")),
             ],
         ),
         forth=transform_snmp_backend_hosts_forth,
@@ -1207,7 +1207,9 @@ class RowTableInventory(ABCRowTable):
 
     def _get_inv_data(self, hostrow: Row) -> inventory.InventoryRows:
         try:
-            merged_tree = inventory.load_filtered_and_merged_tree(hostrow)
+            merged_tree = inventory.load_filtered_and_merged_tree(
+                hostrow, [inventory.InventoryPath.parse(self._inventory_path).path]
+            )
         except inventory.LoadStructuredDataError:
             user_errors.add(
                 MKUserError(
@@ -1310,7 +1312,13 @@ class RowMultiTableInventory(ABCRowTable):
 
     def _get_inv_data(self, hostrow: Row) -> List[InventorySourceRows]:
         try:
-            merged_tree = inventory.load_filtered_and_merged_tree(hostrow)
+            merged_tree = inventory.load_filtered_and_merged_tree(
+                hostrow,
+                [
+                    inventory.InventoryPath.parse(inventory_path).path
+                    for _info_name, inventory_path in self._sources
+                ],
+            )
         except inventory.LoadStructuredDataError:
             user_errors.add(
                 MKUserError(
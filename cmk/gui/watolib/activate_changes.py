@@ -19,19 +19,35 @@ import abc
 import ast
 import errno
 import hashlib
-import io
 import logging
 import multiprocessing
 import os
 import re
 import shutil
+import stat
 import subprocess
+import tempfile
 import time
 import traceback
 from dataclasses import asdict
 from itertools import filterfalse
+from multiprocessing.pool import ThreadPool
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Final,
+    IO,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import psutil  # type: ignore[import]
 import werkzeug.urls
@@ -86,7 +102,15 @@ from cmk.gui.utils.ntop import is_ntop_configured
 from cmk.gui.watolib.audit_log import log_audit
 from cmk.gui.watolib.automation_commands import automation_command_registry, AutomationCommand
 from cmk.gui.watolib.config_domains import ConfigDomainOMD
-from cmk.gui.watolib.config_sync import ReplicationPath, SnapshotCreator
+from cmk.gui.watolib.config_sync import (
+    apply_block_deltas,
+    BLOCK_DELTA_MIN_SIZE,
+    get_block_signatures,
+    get_site_file_path,
+    ReplicationPath,
+    SnapshotCreator,
+    write_block_delta,
+)
 from cmk.gui.watolib.global_settings import save_site_global_settings
 from cmk.gui.watolib.hosts_and_folders import (
     collect_all_hosts,
@@ -1739,14 +1763,16 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
         self._set_sync_state(_("Fetching sync state"))
         self._logger.debug("Starting config sync with >1.7 site")
         replication_paths = self._snapshot_settings.snapshot_components
-        remote_file_infos, remote_config_generation = self._get_config_sync_state(replication_paths)
+        remote_file_infos, remote_config_generation, remote_features = self._get_config_sync_state(
+            replication_paths
+        )
         self._logger.debug("Received %d file infos from remote", len(remote_file_infos))
 
-        # In case we experience performance issues here, we could postpone the hashing of the
-        # central files to only be done ad-hoc in get_file_names_to_sync when the other attributes
-        # are not enough to detect a differing file.
+        # Only the files changed since the last sync to this site are hashed
         site_config_dir = Path(self._snapshot_settings.work_dir)
-        central_file_infos = _get_config_sync_file_infos(replication_paths, site_config_dir)
+        central_file_infos = _get_config_sync_file_infos(
+            replication_paths, site_config_dir, ConfigSyncFileHashes(self._site_id)
+        )
         self._logger.debug("Got %d file infos from %s", len(remote_file_infos), site_config_dir)
 
         self._set_sync_state(_("Computing differences"))
@@ -1766,8 +1792,19 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
             _("Transfering: %d new, %d changed and %d vanished files")
             % (len(to_sync_new), len(to_sync_changed), len(to_delete))
         )
+        block_deltas = (
+            _get_block_delta_candidates(to_sync_changed, central_file_infos, remote_file_infos)
+            if _CONFIG_SYNC_FEATURE_BLOCK_DELTAS in remote_features
+            else []
+        )
         self._synchronize_files(
-            to_sync_new + to_sync_changed, to_delete, remote_config_generation, site_config_dir
+            to_sync_new + to_sync_changed,
+            to_delete,
+            remote_config_generation,
+            site_config_dir,
+            central_file_infos,
+            compress=_CONFIG_SYNC_FEATURE_GZIP in remote_features,
+            block_signatures=self._get_block_signatures(block_deltas) if block_deltas else {},
         )
         self._logger.debug("Finished config sync")
 
@@ -1776,11 +1813,12 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
 
     def _get_config_sync_state(
         self, replication_paths: List[ReplicationPath]
-    ) -> "Tuple[Dict[str, ConfigSyncFileInfo], int]":
+    ) -> "Tuple[Dict[str, ConfigSyncFileInfo], int, List[str]]":
         """Get the config file states from the remote sites
 
         Calls the automation call "get-config-sync-state" on the remote site,
-        which is handled by AutomationGetConfigSyncState."""
+        which is handled by AutomationGetConfigSyncState. Older remote sites do not
+        announce the config sync features they support."""
         site = get_site_config(self._site_id)
         response = cmk.gui.watolib.automations.do_remote_automation(
             site,
@@ -1788,7 +1826,23 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
             [("replication_paths", repr([tuple(r) for r in replication_paths]))],
         )
 
-        return {k: ConfigSyncFileInfo(*v) for k, v in response[0].items()}, response[1]
+        return (
+            {k: ConfigSyncFileInfo(*v) for k, v in response[0].items()},
+            response[1],
+            response[2] if len(response) > 2 else [],
+        )
+
+    def _get_block_signatures(self, site_paths: List[str]) -> Dict[str, List[str]]:
+        """Get the block signatures of the given files from the remote site
+
+        Calls the automation call "get-config-sync-signatures" on the remote site,
+        which is handled by AutomationGetConfigSyncSignatures."""
+        site = get_site_config(self._site_id)
+        return cmk.gui.watolib.automations.do_remote_automation(
+            site,
+            "get-config-sync-signatures",
+            [("site_paths", repr(site_paths))],
+        )
 
     def _synchronize_files(
         self,
@@ -1796,29 +1850,67 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
         files_to_delete: List[str],
         remote_config_generation: int,
         site_config_dir: Path,
+        central_file_infos: "Dict[str, ConfigSyncFileInfo]",
+        compress: bool = False,
+        block_signatures: Optional[Dict[str, List[str]]] = None,
     ) -> None:
         """Pack the files in a simple tar archive and send it to the remote site
 
         We build a simple tar archive containing all files to be synchronized.  The list of file to
         be deleted and the current config generation is handed over using dedicated HTTP parameters.
-        """
 
-        sync_archive = _get_sync_archive(files_to_sync, site_config_dir)
+        Files the remote site sent block signatures for are sent as block deltas if most of their
+        blocks are unchanged. The archive and the deltas are written to files which are read while
+        they are sent.
+        """
+        with tempfile.TemporaryFile() as block_deltas:
+            delta_files = set()
+            for site_path, signatures in (block_signatures or {}).items():
+                file_info = central_file_infos[site_path]
+                assert file_info.file_hash is not None
+                if write_block_delta(
+                    block_deltas,
+                    site_path,
+                    site_config_dir / site_path,
+                    signatures,
+                    file_info.st_mode,
+                    file_info.file_hash,
+                ):
+                    delta_files.add(site_path)
+            block_deltas.seek(0)
+
+            sync_archive_path = _get_sync_archive(
+                [f for f in files_to_sync if f not in delta_files],
+                site_config_dir,
+                central_file_infos,
+                # The activation directory, shared by the sites of the activation
+                site_config_dir.parent / ".sync_archives",
+                compress,
+            )
+            self._logger.debug(
+                "Sending %s (%d bytes) and block deltas of %d files (%d bytes)",
+                sync_archive_path,
+                sync_archive_path.stat().st_size,
+                len(delta_files),
+                os.fstat(block_deltas.fileno()).st_size,
+            )
 
-        site = get_site_config(self._site_id)
-        response = cmk.gui.watolib.automations.do_remote_automation(
-            site,
-            "receive-config-sync",
-            [
-                ("site_id", self._site_id),
-                ("sync_archive", sync_archive),
-                ("to_delete", repr(files_to_delete)),
-                ("config_generation", "%d" % remote_config_generation),
-            ],
-            files={
-                "sync_archive": io.BytesIO(sync_archive),
-            },
-        )
+            site = get_site_config(self._site_id)
+            with sync_archive_path.open("rb") as sync_archive:
+                files: Dict[str, IO[bytes]] = {"sync_archive": sync_archive}
+                if delta_files:
+                    files["block_deltas"] = block_deltas
+                response = cmk.gui.watolib.automations.do_remote_automation(
+                    site,
+                    "receive-config-sync",
+                    [
+                        ("site_id", self._site_id),
+                        ("to_delete", repr(files_to_delete)),
+                        ("config_generation", "%d" % remote_config_generation),
+                        ("compressed", "1" if compress else ""),
+                    ],
+                    files=files,
+                )
 
         if response is not True:
             raise MKGeneralException(_("Failed to synchronize with site: %s") % response)
@@ -2389,8 +2481,46 @@ def get_file_names_to_sync(
     return to_sync_new, to_sync_changed, to_delete
 
 
-def _get_sync_archive(to_sync: List[str], base_dir: Path) -> bytes:
+def _get_block_delta_candidates(
+    to_sync_changed: List[str],
+    central_file_infos: "Dict[str, ConfigSyncFileInfo]",
+    remote_file_infos: "Dict[str, ConfigSyncFileInfo]",
+) -> List[str]:
+    """The large changed files which are regular files on both sites"""
+    return [
+        site_path
+        for site_path in to_sync_changed
+        if central_file_infos[site_path].st_size >= BLOCK_DELTA_MIN_SIZE
+        and stat.S_ISREG(central_file_infos[site_path].st_mode)
+        and stat.S_ISREG(remote_file_infos[site_path].st_mode)
+    ]
+
+
+def _get_sync_archive(
+    to_sync: List[str],
+    base_dir: Path,
+    file_infos: "Dict[str, ConfigSyncFileInfo]",
+    archive_dir: Path,
+    compress: bool,
+) -> Path:
+    """Get the sync archive of the given files, it is created once for all sites needing it
+
+    The archives are identified by the sync file infos of their files, so the sites can share an
+    archive although their files are in different site_config directories.
+    """
+    archive_id = hashlib.sha256(
+        repr((compress, sorted((f, tuple(file_infos[f])) for f in to_sync))).encode("utf-8")
+    ).hexdigest()
+    archive_path = archive_dir / ("%s.tar%s" % (archive_id, ".gz" if compress else ""))
+    with store.locked(archive_dir / ("%s.lock" % archive_id)):
+        if not archive_path.exists():
+            _create_sync_archive(to_sync, base_dir, archive_path, compress)
+    return archive_path
+
+
+def _create_sync_archive(to_sync: List[str], base_dir: Path, path: Path, compress: bool) -> None:
     # Use native tar instead of python tarfile for performance reasons
+    new_path = path.with_name(path.name + ".new")
     completed_process = subprocess.run(
         [
             "tar",
@@ -2398,12 +2528,13 @@ def _get_sync_archive(to_sync: List[str], base_dir: Path) -> bytes:
             "-C",
             str(base_dir),
             "-f",
-            "-",
+            str(new_path),
             "--null",
             "-T",
             "-",
             "--preserve-permissions",
-        ],
+        ]
+        + (["--gzip"] if compress else []),
         input=b"\0".join(f.encode() for f in to_sync),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -2412,44 +2543,50 @@ def _get_sync_archive(to_sync: List[str], base_dir: Path) -> bytes:
         check=False,
     )
 
-    # Since we don't stream the archive to the remote site (we could probably do this) it should be
-    # no problem to buffer it in memory for the moment
-
     if completed_process.returncode:
         raise MKGeneralException(
             _("Failed to create sync archive [%d]: %s")
             % (completed_process.returncode, completed_process.stderr.decode())
         )
 
-    return completed_process.stdout
+    os.replace(new_path, path)
 
 
-def _unpack_sync_archive(sync_archive: bytes, base_dir: Path) -> None:
-    completed_process = subprocess.run(
-        [
-            "tar",
-            "-x",
-            "-C",
-            str(base_dir),
-            "-f",
-            "-",
-            "-U",
-            "--recursive-unlink",
-            "--preserve-permissions",
-        ],
-        input=sync_archive,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        close_fds=True,
-        shell=False,
-        check=False,
-    )
-
-    if completed_process.returncode:
-        raise MKGeneralException(
-            _("Failed to create sync archive [%d]: %s")
-            % (completed_process.returncode, completed_process.stderr.decode())
-        )
+def _unpack_sync_archive(sync_archive: IO[bytes], base_dir: Path, compressed: bool) -> None:
+    """Unpack the archive while it is read, the received archive may be large"""
+    with tempfile.TemporaryFile() as stderr:
+        with subprocess.Popen(
+            [
+                "tar",
+                "-x",
+                "-C",
+                str(base_dir),
+                "-f",
+                "-",
+                "-U",
+                "--recursive-unlink",
+                "--preserve-permissions",
+            ]
+            + (["--gzip"] if compressed else []),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            close_fds=True,
+            shell=False,
+        ) as p:
+            assert p.stdin is not None
+            try:
+                shutil.copyfileobj(sync_archive, p.stdin)
+            except BrokenPipeError:
+                pass  # tar failed, the reason is reported below
+            finally:
+                p.stdin.close()
+
+        if p.returncode:
+            stderr.seek(0)
+            raise MKGeneralException(
+                _("Failed to create sync archive [%d]: %s") % (p.returncode, stderr.read().decode())
+            )
 
 
 class ConfigSyncFileInfo(NamedTuple):
@@ -2465,7 +2602,15 @@ class ConfigSyncFileInfo(NamedTuple):
 #    ("file_infos", Dict[str, ConfigSyncFileInfo]),
 #    ("config_generation", int),
 # ])
-GetConfigSyncStateResponse = Tuple[Dict[str, Tuple[int, int, Optional[str], Optional[str]]], int]
+GetConfigSyncStateResponse = Tuple[
+    Dict[str, Tuple[int, int, Optional[str], Optional[str]]], int, List[str]
+]
+
+# The optional features of the config sync the remote site supports. They are announced to the
+# central site with the config sync state.
+_CONFIG_SYNC_FEATURE_GZIP = "gzip"  # The sync archive may be compressed
+_CONFIG_SYNC_FEATURE_BLOCK_DELTAS = "block_deltas"  # Large files may be sent as block deltas
+_CONFIG_SYNC_FEATURES = [_CONFIG_SYNC_FEATURE_GZIP, _CONFIG_SYNC_FEATURE_BLOCK_DELTAS]
 
 
 @automation_command_registry.register
@@ -2489,22 +2634,55 @@ class AutomationGetConfigSyncState(AutomationCommand):
 
     def execute(self, api_request: List[ReplicationPath]) -> GetConfigSyncStateResponse:
         with store.lock_checkmk_configuration():
-            file_infos = _get_config_sync_file_infos(api_request, base_dir=cmk.utils.paths.omd_root)
+            file_infos = _get_config_sync_file_infos(
+                api_request,
+                base_dir=cmk.utils.paths.omd_root,
+                file_hashes=ConfigSyncFileHashes(omd_site()),
+            )
             transport_file_infos = {
                 k: (v.st_mode, v.st_size, v.link_target, v.file_hash) for k, v in file_infos.items()
             }
-            return (transport_file_infos, _get_current_config_generation())
+            return (transport_file_infos, _get_current_config_generation(), _CONFIG_SYNC_FEATURES)
+
+
+@automation_command_registry.register
+class AutomationGetConfigSyncSignatures(AutomationCommand):
+    """Called on remote site from a central site to get the block signatures of changed files
+
+    The central site uses them to only send the changed blocks of large files.
+    """
+
+    def command_name(self):
+        return "get-config-sync-signatures"
+
+    def get_request(self) -> List[str]:
+        return ast.literal_eval(_request.get_str_input_mandatory("site_paths"))
+
+    def execute(self, api_request: List[str]) -> Dict[str, List[str]]:
+        with store.lock_checkmk_configuration():
+            file_paths = {
+                site_path: get_site_file_path(cmk.utils.paths.omd_root, site_path)
+                for site_path in api_request
+            }
+            return {
+                site_path: get_block_signatures(file_path)
+                for site_path, file_path in file_paths.items()
+                if file_path.is_file()
+            }
 
 
 def _get_config_sync_file_infos(
-    replication_paths: List[ReplicationPath], base_dir: Path
+    replication_paths: List[ReplicationPath],
+    base_dir: Path,
+    file_hashes: Optional["ConfigSyncFileHashes"] = None,
 ) -> Dict[str, ConfigSyncFileInfo]:
     """Scans the given replication paths for the information needed for the config sync
 
     It produces a dictionary of sync file infos. One entry is created for each file.  Directories
-    are not added to the dictionary.
+    are not added to the dictionary. The files are hashed after the scan, using the hashes of the
+    last scan for the unchanged files if file_hashes are given.
     """
-    infos = {}
+    files: Dict[str, Tuple[str, os.stat_result]] = {}
     general_dir_excludes = ["__pycache__"]
 
     for replication_path in replication_paths:
@@ -2514,37 +2692,111 @@ def _get_config_sync_file_infos(
             continue  # Only report back existing things
 
         if replication_path.ty == "file":
-            infos[replication_path.site_path] = _get_config_sync_file_info(path)
+            files[replication_path.site_path] = str(path), path.lstat()
 
         elif replication_path.ty == "dir":
-            for entry in path.glob("**/*"):
-                if entry.is_dir() and not entry.is_symlink():
-                    continue  # Do not add directories at all
-
-                if (
-                    entry.parent.name in general_dir_excludes
-                    or entry.parent.name in replication_path.excludes
-                    or entry.name in replication_path.excludes
-                ):
-                    continue
-
-                entry_site_path = entry.relative_to(base_dir)
-                infos[str(entry_site_path)] = _get_config_sync_file_info(entry)
+            # The stats of the directory entries are cheap compared to the Path objects of a
+            # glob, which matters for the many files of large configurations
+            site_dir = path.relative_to(base_dir)
+            dirs = [(str(path), str(site_dir) if site_dir.parts else "")]
+            while dirs:
+                dir_path, dir_site_path = dirs.pop()
+                dir_name = os.path.basename(dir_path)
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        entry_site_path = os.path.join(dir_site_path, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append((entry.path, entry_site_path))
+                            continue  # Do not add directories at all
+
+                        if (
+                            dir_name in general_dir_excludes
+                            or dir_name in replication_path.excludes
+                            or entry.name in replication_path.excludes
+                        ):
+                            continue
+
+                        files[entry_site_path] = entry.path, entry.stat(follow_symlinks=False)
 
         else:
             raise NotImplementedError()
+
+    to_hash = [
+        (file_path, file_stat)
+        for file_path, file_stat in files.values()
+        if not stat.S_ISLNK(file_stat.st_mode)
+    ]
+    hashes = iter(
+        _create_config_sync_file_hashes([Path(file_path) for file_path, _file_stat in to_hash])
+        if file_hashes is None
+        else file_hashes.get(to_hash)
+    )
+
+    infos = {}
+    for site_path, (file_path, file_stat) in files.items():
+        is_symlink = stat.S_ISLNK(file_stat.st_mode)
+        infos[site_path] = ConfigSyncFileInfo(
+            file_stat.st_mode,
+            file_stat.st_size,
+            os.readlink(file_path) if is_symlink else None,
+            next(hashes) if not is_symlink else None,
+        )
     return infos
 
 
-def _get_config_sync_file_info(file_path: Path) -> ConfigSyncFileInfo:
-    stat = file_path.lstat()
-    is_symlink = file_path.is_symlink()
-    return ConfigSyncFileInfo(
-        stat.st_mode,
-        stat.st_size,
-        os.readlink(str(file_path)) if is_symlink else None,
-        _create_config_sync_file_hash(file_path) if not is_symlink else None,
-    )
+class ConfigSyncFileHashes:
+    """The hashes of the files of the config sync of a site, remembered between the syncs
+
+    A file is identified by its inode, size and modification time, only new and changed files are
+    hashed. The site_config directories of the activations are hard links to the original files,
+    so the files keep their identity between the activations.
+    """
+
+    def __init__(self, site_id: SiteId) -> None:
+        self._store: Final = store.ObjectStore(
+            Path(cmk.utils.paths.var_dir, "wato", "config_sync_file_hashes", site_id),
+            serializer=store.PickleSerializer(),
+        )
+
+    def get(self, files: Sequence[Tuple[str, os.stat_result]]) -> List[str]:
+        keys = [
+            (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+            for _file_path, file_stat in files
+        ]
+
+        try:
+            cached: Dict[Tuple[int, int, int, int], str] = self._store.read_obj(default={})
+        except Exception:
+            # Start over with a corrupted cache, it will be replaced below
+            cached = {}
+
+        changed = {
+            key: Path(file_path)
+            for key, (file_path, _file_stat) in zip(keys, files)
+            if key not in cached
+        }
+        hashes = dict(zip(changed, _create_config_sync_file_hashes(list(changed.values()))))
+
+        # Only the hashes of the current files are kept
+        for key in keys:
+            if key not in hashes:
+                hashes[key] = cached[key]
+        store.makedirs(self._store.path.parent)
+        self._store.write_obj(hashes)
+
+        return [hashes[key] for key in keys]
+
+
+# Hashing more files is done in threads, reading the files and hashing do not hold the GIL
+_PARALLEL_HASHING_MIN_FILES = 100
+
+
+def _create_config_sync_file_hashes(file_paths: Sequence[Path]) -> List[str]:
+    if len(file_paths) < _PARALLEL_HASHING_MIN_FILES:
+        return [_create_config_sync_file_hash(file_path) for file_path in file_paths]
+
+    with ThreadPool(min(8, os.cpu_count() or 1)) as pool:
+        return pool.map(_create_config_sync_file_hash, file_paths, chunksize=32)
 
 
 def _create_config_sync_file_hash(file_path: Path) -> str:
@@ -2580,9 +2832,11 @@ def _config_generation_path():
 
 class ReceiveConfigSyncRequest(NamedTuple):
     site_id: SiteId
-    sync_archive: bytes
+    sync_archive: IO[bytes]
     to_delete: List[str]
     config_generation: int
+    compressed: bool = False
+    block_deltas: Optional[IO[bytes]] = None
 
 
 @automation_command_registry.register
@@ -2601,11 +2855,19 @@ class AutomationReceiveConfigSync(AutomationCommand):
         site_id = SiteId(_request.get_ascii_input_mandatory("site_id"))
         verify_remote_site_config(site_id)
 
+        # The uploaded files are not read into memory, werkzeug spools large files to disk
+        sync_archive = _request.files.get("sync_archive")
+        if sync_archive is None:
+            raise MKUserError("sync_archive", _("Please choose a file to upload."))
+        block_deltas = _request.files.get("block_deltas")
+
         return ReceiveConfigSyncRequest(
             site_id,
-            _request.uploaded_file("sync_archive")[2],
+            sync_archive.stream,
             ast.literal_eval(_request.get_str_input_mandatory("to_delete")),
             _request.get_integer_input_mandatory("config_generation"),
+            compressed=bool(_request.var("compressed")),
+            block_deltas=None if block_deltas is None else block_deltas.stream,
         )
 
     def execute(self, api_request: ReceiveConfigSyncRequest) -> bool:
@@ -2620,7 +2882,7 @@ class AutomationReceiveConfigSync(AutomationCommand):
                 )
 
             logger.debug("Updating configuration from sync snapshot")
-            self._update_config_on_remote_site(api_request.sync_archive, api_request.to_delete)
+            self._update_config_on_remote_site(api_request)
 
             logger.debug("Executing post sync actions")
             _execute_post_config_sync_actions(api_request.site_id)
@@ -2628,11 +2890,12 @@ class AutomationReceiveConfigSync(AutomationCommand):
             logger.debug("Done")
             return True
 
-    def _update_config_on_remote_site(self, sync_archive: bytes, to_delete: List[str]) -> None:
-        """Use the given tar archive and list of files to be deleted to update the local files"""
+    def _update_config_on_remote_site(self, api_request: ReceiveConfigSyncRequest) -> None:
+        """Use the given tar archive, block deltas and list of files to be deleted to update the
+        local files"""
         base_dir = cmk.utils.paths.omd_root
 
-        for site_path in to_delete:
+        for site_path in api_request.to_delete:
             site_file = base_dir.joinpath(site_path)
             try:
                 site_file.unlink()
@@ -2642,7 +2905,10 @@ class AutomationReceiveConfigSync(AutomationCommand):
                 if e.errno not in [errno.ENOENT, errno.ENOTDIR]:
                     raise
 
-        _unpack_sync_archive(sync_archive, base_dir)
+        if api_request.block_deltas is not None:
+            apply_block_deltas(api_request.block_deltas, base_dir)
+
+        _unpack_sync_archive(api_request.sync_archive, base_dir, api_request.compressed)
 
 
 def activate_changes_start(
@@ -8,12 +8,27 @@ used for doing inventory, showing the services of a host, deletion of a host
 and similar things."""
 
 import ast
+import io
 import logging
 import re
 import subprocess
 import uuid
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import requests
 import urllib3
@@ -325,17 +340,21 @@ def do_remote_automation(site, command, vars_, files=None, timeout=None) -> Any:
 
 
 def get_url_raw(url, insecure, auth=None, data=None, files=None, timeout=None):
+    headers = {
+        "x-checkmk-version": cmk_version.__version__,
+        "x-checkmk-edition": cmk_version.edition().short,
+    }
+    if files:
+        data = _MultipartFormData(data or {}, files)
+        headers["Content-Type"] = data.content_type
+
     response = requests.post(
         url,
         data=data,
         verify=not insecure,
         auth=auth,
-        files=files,
         timeout=timeout,
-        headers={
-            "x-checkmk-version": cmk_version.__version__,
-            "x-checkmk-edition": cmk_version.edition().short,
-        },
+        headers=headers,
     )
 
     response.encoding = "utf-8"  # Always decode with utf-8
@@ -354,6 +373,64 @@ def get_url_raw(url, insecure, auth=None, data=None, files=None, timeout=None):
     return response
 
 
+class _MultipartFormData:
+    """A multipart/form-data request body which reads the files while the request is sent
+
+    requests reads the uploaded files into memory to encode the request body, which does not work
+    well for large files like the archives of the config sync.
+    """
+
+    def __init__(self, fields: Mapping[str, Any], files: Mapping[str, IO[bytes]]) -> None:
+        boundary = uuid.uuid4().hex.encode("ascii")
+        self.content_type = "multipart/form-data; boundary=%s" % boundary.decode("ascii")
+
+        parts: List[Union[bytes, IO[bytes]]] = [
+            b'--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+            % (boundary, name.encode("utf-8"), str(value).encode("utf-8"))
+            for name, value in fields.items()
+        ]
+        for name, f in files.items():
+            parts += [
+                b'--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                b"Content-Type: application/octet-stream\r\n\r\n"
+                % (boundary, name.encode("utf-8"), name.encode("utf-8")),
+                f,
+                b"\r\n",
+            ]
+        parts.append(b"--%s--\r\n" % boundary)
+
+        self._parts: List[IO[bytes]] = [
+            io.BytesIO(part) if isinstance(part, bytes) else part for part in parts
+        ]
+        self._length = sum(_remaining_size(part) for part in self._parts)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.read(65536):
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                del self._parts[0]
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+
+def _remaining_size(f: IO[bytes]) -> int:
+    position = f.tell()
+    size = f.seek(0, io.SEEK_END) - position
+    f.seek(position)
+    return size
+
+
 def _verify_compatibility(response: requests.Response) -> None:
     """Ensure we are compatible with the remote site
 
@@ -10,9 +10,12 @@ import errno
 import hashlib
 import io
 import itertools
+import json
 import multiprocessing
 import os
 import shutil
+import stat
+import struct
 import subprocess
 import tarfile
 import time
@@ -20,7 +23,7 @@ import traceback
 from pathlib import Path
 from tarfile import TarFile, TarInfo
 from types import TracebackType
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+from typing import Any, Dict, IO, List, NamedTuple, Optional, Sequence, Tuple, Type
 
 import cmk.utils.paths
 import cmk.utils.store as store
@@ -600,3 +603,149 @@ def _update_contacts_dict(master: Dict, site: Dict) -> Dict:
         site_contacts.update({user_id: settings})
 
     return site_contacts
+
+
+# Large changed files are synchronized with block deltas: The remote site sends the hashes of the
+# blocks of its version of a file and the central site only sends the blocks the remote site does
+# not have. The blocks are aligned, which covers appended data and changes in place.
+BLOCK_DELTA_MIN_SIZE = 1024 * 1024
+_BLOCK_SIZE = 64 * 1024
+
+_DELTA_FILE = b"F"
+_DELTA_COPY = b"C"
+_DELTA_DATA = b"D"
+_LENGTH = struct.Struct("!I")
+_BLOCK_INDEX = struct.Struct("!Q")
+
+
+def get_site_file_path(base_dir: Path, site_path: str) -> Path:
+    """The path of a file of the site, site paths leading out of the site are rejected"""
+    file_path = Path(os.path.normpath(base_dir.joinpath(site_path)))
+    if Path(os.path.normpath(base_dir)) not in file_path.parents:
+        raise MKGeneralException(_("Invalid site path: %s") % site_path)
+    return file_path
+
+
+def get_block_signatures(file_path: Path) -> List[str]:
+    signatures = []
+    with file_path.open("rb") as f:
+        while block := f.read(_BLOCK_SIZE):
+            signatures.append(hashlib.sha256(block).hexdigest())
+    return signatures
+
+
+def write_block_delta(
+    delta_file: IO[bytes],
+    site_path: str,
+    file_path: Path,
+    signatures: Sequence[str],
+    st_mode: int,
+    file_hash: str,
+) -> bool:
+    """Write the delta of a file to the version of the remote site with the given block signatures
+
+    Nothing is written if most of the blocks differ, the file is better sent as a whole then.
+    """
+    remote_blocks = {signature: index for index, signature in enumerate(signatures)}
+    with file_path.open("rb") as f:
+        blocks = []
+        while block := f.read(_BLOCK_SIZE):
+            blocks.append(remote_blocks.get(hashlib.sha256(block).hexdigest()))
+
+        if blocks.count(None) * 2 > len(blocks):
+            return False
+
+        header = json.dumps({"site_path": site_path, "st_mode": st_mode, "file_hash": file_hash})
+        delta_file.write(_DELTA_FILE + _LENGTH.pack(len(header)) + header.encode("utf-8"))
+        for nr, index in enumerate(blocks):
+            if index is not None:
+                delta_file.write(_DELTA_COPY + _BLOCK_INDEX.pack(index))
+                continue
+            f.seek(nr * _BLOCK_SIZE)
+            block = f.read(_BLOCK_SIZE)
+            delta_file.write(_DELTA_DATA + _LENGTH.pack(len(block)) + block)
+    return True
+
+
+def apply_block_deltas(delta_file: IO[bytes], base_dir: Path) -> None:
+    """Recreate the files of the block deltas from the blocks of the existing files
+
+    The new version of a file is written next to the existing one. It replaces the existing one
+    after its hash has been verified.
+    """
+    target: Optional[_DeltaTarget] = None
+    try:
+        while record_type := delta_file.read(1):
+            if record_type == _DELTA_FILE:
+                if target is not None:
+                    target.commit()
+                header = json.loads(_read_data(delta_file))
+                target = _DeltaTarget(
+                    base_dir, header["site_path"], header["st_mode"], header["file_hash"]
+                )
+            elif target is None:
+                raise MKGeneralException(_("Invalid block delta: Missing file header"))
+            elif record_type == _DELTA_COPY:
+                target.copy_block(_read_exactly(delta_file, _BLOCK_INDEX)[0])
+            elif record_type == _DELTA_DATA:
+                target.write(_read_data(delta_file))
+            else:
+                raise MKGeneralException(_("Invalid block delta: Unknown record %r") % record_type)
+
+        if target is not None:
+            target.commit()
+            target = None
+    finally:
+        if target is not None:
+            target.discard()
+
+
+def _read_data(delta_file: IO[bytes]) -> bytes:
+    length = _read_exactly(delta_file, _LENGTH)[0]
+    data = delta_file.read(length)
+    if len(data) != length:
+        raise MKGeneralException(_("Invalid block delta: Truncated record"))
+    return data
+
+
+def _read_exactly(delta_file: IO[bytes], record: struct.Struct) -> Tuple[int, ...]:
+    data = delta_file.read(record.size)
+    if len(data) != record.size:
+        raise MKGeneralException(_("Invalid block delta: Truncated record"))
+    return record.unpack(data)
+
+
+class _DeltaTarget:
+    def __init__(self, base_dir: Path, site_path: str, st_mode: int, file_hash: str) -> None:
+        self._path = get_site_file_path(base_dir, site_path)
+        # The name matches the exclude of the temporary files of the replication paths
+        self._new_path = self._path.with_name(".%s.new" % self._path.name)
+        self._st_mode = st_mode
+        self._file_hash = file_hash
+        self._sha256 = hashlib.sha256()
+        self._existing = self._path.open("rb")
+        self._new = self._new_path.open("wb")
+
+    def copy_block(self, index: int) -> None:
+        self._existing.seek(index * _BLOCK_SIZE)
+        self.write(self._existing.read(_BLOCK_SIZE))
+
+    def write(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self._new.write(data)
+
+    def commit(self) -> None:
+        self._existing.close()
+        self._new.close()
+        if self._sha256.hexdigest() != self._file_hash:
+            self._new_path.unlink()
+            raise MKGeneralException(
+                _("Failed to apply the block delta of %s: The file has changed") % self._path
+            )
+        os.chmod(self._new_path, stat.S_IMODE(self._st_mode))
+        os.replace(self._new_path, self._path)
+
+    def discard(self) -> None:
+        self._existing.close()
+        self._new.close()
+        self._new_path.unlink(missing_ok=True)
@@ -6,7 +6,7 @@
 """SNMP caching"""
 
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
 import cmk.utils.cleanup
 import cmk.utils.paths
@@ -19,8 +19,6 @@ from .type_defs import OID, SNMPDecodedString, SNMPHostConfig
 _g_single_oid_hostname: Optional[HostName] = None
 _g_single_oid_ipaddress: Optional[HostAddress] = None
 _g_single_oid_cache: Optional[Dict[OID, Optional[SNMPDecodedString]]] = None
-# TODO: Move to StoredWalkSNMPBackend?
-_g_walk_cache: Dict[HostName, List[str]] = {}
 
 
 def initialize_single_oid_cache(snmp_config: SNMPHostConfig, from_disk: bool = False) -> None:
@@ -66,12 +64,7 @@ def single_oid_cache() -> Dict[OID, Optional[SNMPDecodedString]]:
     return _g_single_oid_cache
 
 
-def host_cache() -> Dict[HostName, List[str]]:
-    return _g_walk_cache
-
-
 def cleanup_host_caches() -> None:
-    host_cache().clear()
     _clear_other_hosts_oid_cache(None)
 
 
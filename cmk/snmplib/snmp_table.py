@@ -11,6 +11,7 @@ from typing import (
     Iterable,
     Iterator,
     List,
+    Mapping,
     MutableMapping,
     Optional,
     Sequence,
@@ -161,6 +162,19 @@ def get_snmp_table(
     max_len = 0
     max_len_col = -1
 
+    # All columns are walked at once, backends may fetch them with common requests
+    walks = _get_snmpwalks(
+        section_name,
+        tree.base,
+        {
+            "%s.%s" % (tree.base, oid.column): oid.save_to_cache
+            for oid in tree.oids
+            if not isinstance(oid.column, SpecialColumn)
+        },
+        walk_cache=walk_cache,
+        backend=backend,
+    )
+
     for oid in tree.oids:
         fetchoid: OID = "%s.%s" % (tree.base, oid.column)
         # column may be integer or string like "1.5.4.2.3"
@@ -181,14 +195,7 @@ def get_snmp_table(
             index_column = len(columns)
             index_format = oid.column
         else:
-            rowinfo = _get_snmpwalk(
-                section_name,
-                tree.base,
-                fetchoid,
-                walk_cache=walk_cache,
-                save_walk_cache=oid.save_to_cache,
-                backend=backend,
-            )
+            rowinfo = walks[fetchoid]
             if len(rowinfo) > max_len:
                 max_len_col = len(columns)
 
@@ -273,63 +280,70 @@ def _key_oid_pairs(pair1: Tuple[OID, SNMPRawValue]) -> List[int]:
     return _oid_to_intlist(pair1[0].lstrip("."))
 
 
-def _get_snmpwalk(
+def _get_snmpwalks(
     section_name: Optional[SectionName],
     base: str,
-    fetchoid: OID,
+    fetchoids: Mapping[OID, bool],
     *,
     walk_cache: MutableMapping[str, Tuple[bool, SNMPRowInfo]],
-    save_walk_cache: bool,
     backend: SNMPBackend,
-) -> SNMPRowInfo:
-    try:
-        rowinfo = walk_cache[fetchoid][1]
-        console.vverbose(f"Already fetched OID: {fetchoid}\n")
-        return rowinfo
-    except KeyError:
-        pass
-
-    rowinfo = _perform_snmpwalk(section_name, base, fetchoid, backend=backend)
-    walk_cache[fetchoid] = (save_walk_cache, rowinfo)
-    return rowinfo
-
-
-def _perform_snmpwalk(
+) -> Mapping[OID, SNMPRowInfo]:
+    """The walks of the fetch OIDs, which are saved to the cache if their flag is set"""
+    walks = {}
+    missing = []
+    for fetchoid in fetchoids:
+        try:
+            walks[fetchoid] = walk_cache[fetchoid][1]
+            console.vverbose(f"Already fetched OID: {fetchoid}\n")
+        except KeyError:
+            missing.append(fetchoid)
+
+    if missing:
+        for fetchoid, rowinfo in zip(
+            missing, _perform_snmpwalks(section_name, base, missing, backend=backend)
+        ):
+            walks[fetchoid] = rowinfo
+            walk_cache[fetchoid] = (fetchoids[fetchoid], rowinfo)
+    return walks
+
+
+def _perform_snmpwalks(
     section_name: Optional[SectionName],
     base_oid: str,
-    fetchoid: OID,
+    fetchoids: Sequence[OID],
     *,
     backend: SNMPBackend,
-) -> SNMPRowInfo:
-    added_oids: Set[OID] = set([])
-    rowinfo: SNMPRowInfo = []
+) -> Sequence[SNMPRowInfo]:
+    added_oids: List[Set[OID]] = [set() for _fetchoid in fetchoids]
+    rowinfos: List[SNMPRowInfo] = [[] for _fetchoid in fetchoids]
 
     for context_name in backend.config.snmpv3_contexts_of(section_name):
-        rows = backend.walk(
-            oid=fetchoid,
+        walks = backend.walk_columns(
+            fetchoids,
             section_name=section_name,
             table_base_oid=base_oid,
             context_name=context_name,
         )
 
-        # I've seen a broken device (Mikrotik Router), that broke after an
-        # update to RouterOS v6.22. It would return 9 time the same OID when
-        # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
-        # by removing any duplicate OID information
-        if len(rows) > 1 and rows[0][0] == rows[1][0]:
-            console.vverbose(
-                "Detected broken SNMP agent. Ignoring duplicate OID %s.\n" % rows[0][0]
-            )
-            rows = rows[:1]
-
-        for row_oid, val in rows:
-            if row_oid in added_oids:
-                console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
-            else:
-                rowinfo.append((row_oid, val))
-                added_oids.add(row_oid)
-
-    return rowinfo
+        for rows, rowinfo, added in zip(walks, rowinfos, added_oids):
+            # I've seen a broken device (Mikrotik Router), that broke after an
+            # update to RouterOS v6.22. It would return 9 time the same OID when
+            # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
+            # by removing any duplicate OID information
+            if len(rows) > 1 and rows[0][0] == rows[1][0]:
+                console.vverbose(
+                    "Detected broken SNMP agent. Ignoring duplicate OID %s.\n" % rows[0][0]
+                )
+                rows = rows[:1]
+
+            for row_oid, val in rows:
+                if row_oid in added:
+                    console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
+                else:
+                    rowinfo.append((row_oid, val))
+                    added.add(row_oid)
+
+    return rowinfos
 
 
 def _sanitize_snmp_encoding(
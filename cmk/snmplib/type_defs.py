@@ -93,6 +93,7 @@ TRawData = TypeVar("TRawData", bound=AbstractRawData)
 class SNMPBackendEnum(enum.Enum):
     INLINE = "Inline"
     CLASSIC = "Classic"
+    BULK = "Bulk"
 
     def serialize(self) -> str:
         return self.name
@@ -238,6 +239,25 @@ class SNMPBackend(abc.ABC):
     ) -> SNMPRowInfo:
         return []
 
+    def walk_columns(
+        self,
+        oids: Sequence[OID],
+        *,
+        section_name: Optional[_SectionName] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> Sequence[SNMPRowInfo]:
+        """Walk several OIDs, backends may fetch them with common requests"""
+        return [
+            self.walk(
+                oid,
+                section_name=section_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            )
+            for oid in oids
+        ]
+
 
 class SpecialColumn(enum.IntEnum):
     # Until we remove all but the first, its worth having an enum
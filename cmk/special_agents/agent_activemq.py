@@ -12,6 +12,7 @@ from requests.auth import HTTPBasicAuth
 
 from cmk.special_agents.utils.agent_common import special_agent_main
 from cmk.special_agents.utils.argument_parsing import Args, create_default_argument_parser
+from cmk.special_agents.utils.http_cache import add_http_cache_arguments, http_cache_from_arguments
 from cmk.special_agents.utils.request_helper import create_api_connect_session, parse_api_url
 
 
@@ -54,6 +55,7 @@ def parse_arguments(args: Optional[Sequence[str]]) -> Args:
         metavar="PASSWORD",
         help="Password for authenticating at the server",
     )
+    add_http_cache_arguments(parser)
     return parser.parse_args(args)
 
 
@@ -69,7 +71,7 @@ def agent_activemq_main(args: Args) -> None:
     if args.username:
         auth = HTTPBasicAuth(args.username, args.password)
 
-    session = create_api_connect_session(api_url, auth=auth)
+    session = create_api_connect_session(api_url, auth=auth, cache=http_cache_from_arguments(args))
 
     try:
         response = session.get("queues.jsp")
@@ -81,6 +83,9 @@ def agent_activemq_main(args: Args) -> None:
     except Exception as e:
         sys.stderr.write("Unable to connect. Credentials might be incorrect: %s\n" % e)
         return
+    finally:
+        if session.cache is not None:
+            session.cache.write_section()
 
     attributes = ["size", "consumerCount", "enqueueCount", "dequeueCount"]
     count = 0
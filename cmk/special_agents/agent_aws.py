@@ -15,6 +15,9 @@ import itertools
 import json
 import logging
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from pathlib import Path
 from time import sleep
@@ -30,6 +33,7 @@ from typing import (
     Set,
     Tuple,
     TypedDict,
+    TypeVar,
     Union,
 )
 
@@ -412,6 +416,10 @@ class ResultDistributor:
     def add(self, colleague) -> None:
         self._colleagues.append(colleague)
 
+    @property
+    def colleagues(self) -> Sequence:
+        return self._colleagues
+
     def distribute(self, sender, result) -> None:
         for colleague in self._colleagues:
             if colleague.name != sender.name:
@@ -518,6 +526,10 @@ class AWSSection(DataCache):
     def region(self):
         return self._region
 
+    @property
+    def distributor(self) -> ResultDistributor:
+        return self._distributor
+
     @property
     def granularity(self) -> int:
         """
@@ -761,11 +773,11 @@ class AWSSectionCloudwatch(AWSSection):
         if not metric_specs:
             return []
 
-        # A single GetMetricData call can include up to 100 MetricDataQuery structures
+        # A single GetMetricData call can include up to 500 MetricDataQuery structures
         # There's no pagination for this operation:
         # self._client.can_paginate('get_metric_data') = False
         raw_content = []
-        for chunk in _chunks(metric_specs):
+        for chunk in _chunks(metric_specs, length=CloudwatchMetricDataBatcher.max_queries):
             if not chunk:
                 continue
             response = self._client.get_metric_data(
@@ -813,6 +825,126 @@ class AWSSectionCloudwatch(AWSSection):
             metric_contents["Values"] = [(v, period) for v in metric_contents["Values"]]
 
 
+class _MetricDataBatch:
+    def __init__(self, start_time: float, end_time: float, deadline: float) -> None:
+        self.start_time = start_time
+        self.end_time = end_time
+        self.deadline = deadline
+        self.queries: List[Dict[str, Any]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[Exception] = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class CloudwatchMetricDataBatcher:
+    """
+    Packs the GetMetricData queries of the CloudWatch sections of a region into as few calls
+    as possible. It is used by the sections instead of the CloudWatch client.
+
+    Queries with the same time range are sent together, up to 500 queries per call. The
+    first query of a batch waits up to 'linger' seconds for the queries of sections
+    running concurrently. The IDs of the queries only have to be unique within a call,
+    they are replaced for the call and restored in the results. If a call with the queries
+    of other sections fails, each section sends its own queries again, so that the error
+    only affects the section which caused it.
+    """
+
+    max_queries = 500
+
+    def __init__(self, client, linger: float = 0.0) -> None:
+        self._client = client
+        self._linger = linger
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[float, float], _MetricDataBatch] = {}
+        self.calls = 0
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime):
+        # Each chunk is a batch and the positions of the queries in it
+        batches: List[Tuple[_MetricDataBatch, range, bool]] = []
+        with self._lock:
+            for chunk in _chunks(list(MetricDataQueries), length=self.max_queries):
+                batches.append(self._add(chunk, StartTime, EndTime))
+
+        results = []
+        for batch, positions, leads in batches:
+            if leads:
+                batch.full.wait(max(0.0, batch.deadline - time.monotonic()))
+                self._send(batch)
+            else:
+                batch.done.wait()
+            if batch.error is not None:
+                if len(positions) == len(batch.queries):
+                    raise batch.error
+                results.extend(
+                    self._send_alone(
+                        batch.queries[positions.start : positions.stop],
+                        batch.start_time,
+                        batch.end_time,
+                    )
+                )
+                continue
+            for position in positions:
+                result = batch.results.get(self._batch_id(position))
+                if result is not None:
+                    results.append({**result, "Id": batch.queries[position]["Id"]})
+        return {"MetricDataResults": results}
+
+    def _add(
+        self, queries: List[Dict[str, Any]], start_time: float, end_time: float
+    ) -> Tuple[_MetricDataBatch, range, bool]:
+        key = (start_time, end_time)
+        batch = self._pending.get(key)
+        leads = batch is None or len(batch.queries) + len(queries) > self.max_queries
+        if leads:
+            if batch is not None:
+                # Does not fit anymore, the batch is sent right away
+                batch.full.set()
+            batch = _MetricDataBatch(start_time, end_time, time.monotonic() + self._linger)
+            self._pending[key] = batch
+        assert batch is not None
+
+        positions = range(len(batch.queries), len(batch.queries) + len(queries))
+        batch.queries.extend(queries)
+        if len(batch.queries) >= self.max_queries:
+            batch.full.set()
+        return batch, positions, leads
+
+    @staticmethod
+    def _batch_id(position: int) -> str:
+        return "q%d" % position
+
+    def _send_alone(
+        self, queries: List[Dict[str, Any]], start_time: float, end_time: float
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.calls += 1
+        response = self._client.get_metric_data(
+            MetricDataQueries=queries, StartTime=start_time, EndTime=end_time
+        )
+        return response.get("MetricDataResults", [])
+
+    def _send(self, batch: _MetricDataBatch) -> None:
+        with self._lock:
+            if self._pending.get((batch.start_time, batch.end_time)) is batch:
+                del self._pending[(batch.start_time, batch.end_time)]
+            self.calls += 1
+        try:
+            response = self._client.get_metric_data(
+                MetricDataQueries=[
+                    {**query, "Id": self._batch_id(position)}
+                    for position, query in enumerate(batch.queries)
+                ],
+                StartTime=batch.start_time,
+                EndTime=batch.end_time,
+            )
+            batch.results = {r["Id"]: r for r in response.get("MetricDataResults", [])}
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+
 # .
 #   .--costs/usage---------------------------------------------------------.
 #   |                      _          __                                   |
@@ -4636,13 +4768,73 @@ class Route53Cloudwatch(AWSSectionCloudwatch):
 #   '----------------------------------------------------------------------'
 
 
+_T = TypeVar("_T")
+
+# Time the first GetMetricData query of a batch waits for queries of concurrent sections
+METRIC_DATA_LINGER = 0.1
+
+
+def _run_in_dependency_order(
+    sections: Sequence[AWSSection], run_section: Callable[[int], _T], max_workers: int
+) -> List[_T]:
+    """
+    Run the sections in threads, each section after the sections it receives results from.
+    The results are returned in the order of the sections.
+    """
+    positions = {id(section): nr for nr, section in enumerate(sections)}
+    senders: List[Set[int]] = [set() for _section in sections]
+    for nr, sender in enumerate(sections):
+        for colleague in sender.distributor.colleagues:
+            if (receiver := positions.get(id(colleague))) is not None and receiver != nr:
+                senders[receiver].add(nr)
+
+    results: Dict[int, _T] = {}
+    waiting = set(range(len(sections)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: Dict[Future, int] = {}
+        while waiting or running:
+            ready = sorted(nr for nr in waiting if senders[nr].issubset(results))
+            if not ready and not running:
+                # Circular dependencies: run them in the given order
+                ready = [min(waiting)]
+            for nr in ready:
+                waiting.remove(nr)
+                running[executor.submit(run_section, nr)] = nr
+            finished, _not_finished = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+    return [results[nr] for nr in range(len(sections))]
+
+
+def run_aws_sections(aws_sections: Sequence["AWSSections"], use_cache: bool, max_workers: int):
+    """
+    Run the sections of all regions concurrently, the sections of one region may depend on the
+    results of another region (see ResultDistributorS3Limits). The results are written region
+    by region.
+    """
+    runs = [(sections, section) for sections in aws_sections for section in sections.sections]
+    outcomes = _run_in_dependency_order(
+        [section for _sections, section in runs],
+        lambda nr: runs[nr][0].run_section(runs[nr][1], use_cache),
+        max_workers,
+    )
+    for sections in aws_sections:
+        sections.write_outcomes(outcomes[: len(sections.sections)])
+        outcomes = outcomes[len(sections.sections) :]
+
+
 class AWSSections(abc.ABC):
-    def __init__(self, hostname, session, debug=False, config=None):
+    def __init__(self, hostname, session, debug=False, config=None, max_workers=1):
         self._hostname = hostname
         self._session = session
         self._debug = debug
         self._sections = []
         self.config = config
+        self._max_workers = max_workers
+
+    @property
+    def sections(self) -> Sequence[AWSSection]:
+        return self._sections
 
     @abc.abstractmethod
     def init_sections(self, services, region, config, s3_limits_distributor=None):
@@ -4666,25 +4858,40 @@ class AWSSections(abc.ABC):
             logging.info("Invalid region name or client key %s: %s", client_key, e)
             raise
 
+    def _init_metric_data_client(self, cloudwatch_client) -> CloudwatchMetricDataBatcher:
+        return CloudwatchMetricDataBatcher(
+            cloudwatch_client, linger=METRIC_DATA_LINGER if self._max_workers > 1 else 0.0
+        )
+
     def run(self, use_cache=True):
+        run_aws_sections([self], use_cache, self._max_workers)
+
+    def run_section(
+        self, section: AWSSection, use_cache: bool
+    ) -> Union[None, AWSSectionResults, Exception]:
+        try:
+            return section.run(use_cache=use_cache)
+        except AssertionError as e:
+            logging.info(e)
+            if self._debug:
+                raise
+        except Exception as e:
+            logging.info("%s: %s", section.__class__.__name__, e)
+            if self._debug:
+                raise
+            return e
+        return None
+
+    def write_outcomes(self, outcomes: Sequence[Union[None, AWSSectionResults, Exception]]) -> None:
         exceptions = []
         results: Dict[Tuple[str, float, float], str] = {}
-        for section in self._sections:
-            try:
-                section_result = section.run(use_cache=use_cache)
-            except AssertionError as e:
-                logging.info(e)
-                if self._debug:
-                    raise
-            except Exception as e:
-                logging.info("%s: %s", section.__class__.__name__, e)
-                if self._debug:
-                    raise
-                exceptions.append(e)
-            else:
+        for section, outcome in zip(self._sections, outcomes):
+            if isinstance(outcome, Exception):
+                exceptions.append(outcome)
+            elif outcome is not None:
                 results.setdefault(
-                    (section.name, section_result.cache_timestamp, section.cache_interval),
-                    section_result.results,
+                    (section.name, outcome.cache_timestamp, section.cache_interval),
+                    outcome.results,
                 )
 
         self._write_exceptions(exceptions)
@@ -4754,7 +4961,7 @@ class AWSSectionsUSEast(AWSSections):
         if "ce" in services:
             self._sections.append(CostsAndUsage(self._init_client("ce"), region, config))
 
-        cloudwatch_client = self._init_client("cloudwatch")
+        metric_data_client = self._init_metric_data_client(self._init_client("cloudwatch"))
         if "wafv2" in services and config.service_config["wafv2_cloudfront"]:
             wafv2_client = self._init_client("wafv2")
             wafv2_limits_distributor = ResultDistributor()
@@ -4766,7 +4973,7 @@ class AWSSectionsUSEast(AWSSections):
                 wafv2_client, region, config, "CLOUDFRONT", distributor=wafv2_summary_distributor
             )
             wafv2_limits_distributor.add(wafv2_summary)
-            wafv2_web_acl = WAFV2WebACL(cloudwatch_client, region, config, False)
+            wafv2_web_acl = WAFV2WebACL(metric_data_client, region, config, False)
             wafv2_summary_distributor.add(wafv2_web_acl)
             if config.service_config.get("wafv2_limits"):
                 self._sections.append(wafv2_limits)
@@ -4777,7 +4984,7 @@ class AWSSectionsUSEast(AWSSections):
             route53_client = self._init_client("route53")
             route53_health_checks, route53_cloudwatch = _create_route53_sections(
                 route53_client,
-                cloudwatch_client,
+                metric_data_client,
                 region,
                 config,
             )
@@ -4860,6 +5067,7 @@ class AWSSectionsGeneric(AWSSections):
         ), "AWSSectionsGeneric.init_sections: s3_limits_distributor should be an instance of ResultDistributorS3Limits"
 
         cloudwatch_client = self._init_client("cloudwatch")
+        metric_data_client = self._init_metric_data_client(cloudwatch_client)
         ec2_client = self._init_client("ec2")
         ebs_summary_distributor = ResultDistributor()
         ebs_summary = EBSSummary(ec2_client, region, config, ebs_summary_distributor)
@@ -4869,7 +5077,7 @@ class AWSSectionsGeneric(AWSSections):
             ec2_summary = EC2Summary(ec2_client, region, config, ec2_summary_distributor)
             ec2_labels = EC2Labels(ec2_client, region, config)
             ec2_security_groups = EC2SecurityGroups(ec2_client, region, config)
-            ec2 = EC2(cloudwatch_client, region, config)
+            ec2 = EC2(metric_data_client, region, config)
             ec2_limits_distributor = ResultDistributor()
             ec2_limits_distributor.add(ec2_summary)
             ec2_summary_distributor.add(ec2_labels)
@@ -4892,7 +5100,7 @@ class AWSSectionsGeneric(AWSSections):
             self._sections.append(ec2)
 
         if "ebs" in services:
-            ebs = EBS(cloudwatch_client, region, config)
+            ebs = EBS(metric_data_client, region, config)
             ebs_limits_distributor = ResultDistributor()
             ebs_limits_distributor.add(ebs_summary)
             ebs_summary_distributor.add(ebs)
@@ -4906,7 +5114,7 @@ class AWSSectionsGeneric(AWSSections):
             elb_limits_distributor = ResultDistributor()
             elb_labels = ELBLabelsGeneric(elb_client, region, config, resource="elb")
             elb_health = ELBHealth(elb_client, region, config)
-            elb = ELB(cloudwatch_client, region, config)
+            elb = ELB(metric_data_client, region, config)
             elb_summary_distributor = ResultDistributor()
             elb_summary = ELBSummaryGeneric(
                 elb_client, region, config, elb_summary_distributor, resource="elb"
@@ -4932,14 +5140,14 @@ class AWSSectionsGeneric(AWSSections):
             )
             elbv2_labels = ELBLabelsGeneric(elbv2_client, region, config, resource="elbv2")
             elbv2_target_groups = ELBv2TargetGroups(elbv2_client, region, config)
-            elbv2_application = ELBv2Application(cloudwatch_client, region, config)
+            elbv2_application = ELBv2Application(metric_data_client, region, config)
             elbv2_application_target_groups_http = ELBv2ApplicationTargetGroupsHTTP(
-                cloudwatch_client, region, config
+                metric_data_client, region, config
             )
             elbv2_application_target_groups_lambda = ELBv2ApplicationTargetGroupsLambda(
-                cloudwatch_client, region, config
+                metric_data_client, region, config
             )
-            elbv2_network = ELBv2Network(cloudwatch_client, region, config)
+            elbv2_network = ELBv2Network(metric_data_client, region, config)
             elbv2_limits_distributor.add(elbv2_summary)
             elbv2_summary_distributor.add(elbv2_labels)
             elbv2_summary_distributor.add(elbv2_target_groups)
@@ -4975,9 +5183,9 @@ class AWSSectionsGeneric(AWSSections):
             s3_summary = S3Summary(s3_client, region, config, s3_summary_distributor)
 
             s3_limits_distributor.add(s3_summary)
-            s3 = S3(cloudwatch_client, region, config)
+            s3 = S3(metric_data_client, region, config)
             s3_summary_distributor.add(s3)
-            s3_requests = S3Requests(cloudwatch_client, region, config)
+            s3_requests = S3Requests(metric_data_client, region, config)
             s3_summary_distributor.add(s3_requests)
             if config.service_config.get("s3_limits") and s3_limits:
                 self._sections.append(s3_limits)
@@ -4987,7 +5195,7 @@ class AWSSectionsGeneric(AWSSections):
                 self._sections.append(s3_requests)
 
         if "glacier" in services:
-            glacier = Glacier(cloudwatch_client, region, config)
+            glacier = Glacier(metric_data_client, region, config)
             glacier_client = self._init_client("glacier")
             glacier_limits_distributor = ResultDistributor()
             glacier_limits = GlacierLimits(
@@ -5009,7 +5217,7 @@ class AWSSectionsGeneric(AWSSections):
             rds_summary_distributor = ResultDistributor()
             rds_summary = RDSSummary(rds_client, region, config, rds_summary_distributor)
             rds_limits = RDSLimits(rds_client, region, config)
-            rds = RDS(cloudwatch_client, region, config)
+            rds = RDS(metric_data_client, region, config)
             rds_summary_distributor.add(rds)
             if config.service_config.get("rds_limits"):
                 self._sections.append(rds_limits)
@@ -5038,7 +5246,7 @@ class AWSSectionsGeneric(AWSSections):
             dynamodb_summary = DynamoDBSummary(
                 dynamodb_client, region, config, dynamodb_summary_distributor
             )
-            dynamodb_table = DynamoDBTable(cloudwatch_client, region, config)
+            dynamodb_table = DynamoDBTable(metric_data_client, region, config)
             dynamodb_limits_distributor.add(dynamodb_summary)
             dynamodb_summary_distributor.add(dynamodb_table)
             if config.service_config.get("dynamodb_limits"):
@@ -5057,7 +5265,7 @@ class AWSSectionsGeneric(AWSSections):
                 wafv2_client, region, config, "REGIONAL", distributor=wafv2_summary_distributor
             )
             wafv2_limits_distributor.add(wafv2_summary)
-            wafv2_web_acl = WAFV2WebACL(cloudwatch_client, region, config, True)
+            wafv2_web_acl = WAFV2WebACL(metric_data_client, region, config, True)
             wafv2_summary_distributor.add(wafv2_web_acl)
             if config.service_config.get("wafv2_limits"):
                 self._sections.append(wafv2_limits)
@@ -5073,7 +5281,7 @@ class AWSSectionsGeneric(AWSSections):
                 lambda_cloudwatch_insights,
             ) = _create_lamdba_sections(
                 self._init_client("lambda"),
-                cloudwatch_client,
+                metric_data_client,
                 self._init_client("logs"),
                 region,
                 config,
@@ -5292,6 +5500,12 @@ def parse_arguments(argv):
         help="Also monitor global WAFs in front of CloudFront resources.",
     )
     parser.add_argument("--hostname", required=True)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=10,
+        help="Number of sections queried concurrently, across all regions (default: 10).",
+    )
 
     for service in AWSServices:
         if service.filter_by_names:
@@ -5524,6 +5738,9 @@ def main(sys_argv=None):
             ", ".join(regional_services),
         )
 
+    # The sections of all regions are created first: the S3 limits are only queried for the
+    # first region, then all sections are run concurrently.
+    all_sections = []
     for aws_services, aws_regions, aws_sections in [
         (global_services, ["us-east-1"], AWSSectionsUSEast),
         (regional_services, args.regions, AWSSectionsGeneric),
@@ -5548,11 +5765,17 @@ def main(sys_argv=None):
                         region,
                     )
 
-                sections = aws_sections(hostname, session, debug=args.debug, config=proxy_config)
+                sections = aws_sections(
+                    hostname,
+                    session,
+                    debug=args.debug,
+                    config=proxy_config,
+                    max_workers=args.workers,
+                )
                 sections.init_sections(
                     aws_services, region, aws_config, s3_limits_distributor=s3_limits_distributor
                 )
-                sections.run(use_cache=use_cache)
+                all_sections.append(sections)
             except AwsAccessError as ae:
                 # can not access AWS, retreat
                 sys.stdout.write("<<<aws_exceptions>>>\n")
@@ -5566,6 +5789,18 @@ def main(sys_argv=None):
                 has_exceptions = True
                 if args.debug:
                     raise
+
+    try:
+        run_aws_sections(all_sections, use_cache=use_cache, max_workers=args.workers)
+    except AssertionError:
+        if args.debug:
+            raise
+    except Exception as e:
+        logging.info(e)
+        has_exceptions = True
+        if args.debug:
+            raise
+
     if has_exceptions:
         return 1
     return 0
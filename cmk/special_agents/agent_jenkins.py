@@ -14,6 +14,8 @@ import requests
 from cmk.utils.password_store import replace_passwords
 
 from cmk.special_agents.utils import vcrtrace
+from cmk.special_agents.utils.http_cache import add_http_cache_arguments, http_cache_from_arguments
+from cmk.special_agents.utils.request_helper import ApiSession
 
 
 class Section(NamedTuple):
@@ -64,6 +66,7 @@ def main(argv=None):
 
 def handle_request(args, sections):
     url_base = "%s://%s:%s" % (args.proto, args.hostname, args.port)
+    session = ApiSession(url_base, ssl_verify=True, cache=http_cache_from_arguments(args))
     # labels = {}
 
     for section in sections:
@@ -72,9 +75,8 @@ def handle_request(args, sections):
 
         sys.stdout.write("<<<jenkins_%s:sep(0)>>>\n" % section.name)
 
-        url = url_base + section.uri
         try:
-            response = requests.get(url, auth=(args.user, args.password))
+            response = session.get(section.uri, auth=(args.user, args.password))
         except requests.exceptions.RequestException as e:
             sys.stderr.write("Error: %s\n" % e)
             if args.debug:
@@ -109,6 +111,9 @@ def handle_request(args, sections):
 
         sys.stdout.write("%s\n" % json.dumps(value))
 
+    if session.cache is not None:
+        session.cache.write_section()
+
     # if labels:
     #    sys.stdout.write("<<<labels:sep(0)>>>\n")
     #    sys.stdout.write("%s\n" % json.dumps(labels))
@@ -143,6 +148,7 @@ def parse_arguments(argv):
     parser.add_argument(
         "--debug", action="store_true", help="Debug mode: let Python exceptions come through"
     )
+    add_http_cache_arguments(parser)
 
     parser.add_argument(
         "hostname", metavar="HOSTNAME", help="Name of the jenkins instance to query."
@@ -17,8 +17,10 @@ import argparse
 import contextlib
 import enum
 import functools
+import io
 import json
 import logging
+import multiprocessing
 import os
 import re
 import sys
@@ -31,6 +33,7 @@ from typing import (
     Collection,
     DefaultDict,
     Dict,
+    Iterable,
     Iterator,
     List,
     Literal,
@@ -61,6 +64,7 @@ from cmk.special_agents.utils import vcrtrace
 from cmk.special_agents.utils.agent_common import ConditionalPiggybackSection, SectionWriter
 from cmk.special_agents.utils.request_helper import get_requests_ca
 from cmk.special_agents.utils_kubernetes.api_server import APIServer
+from cmk.special_agents.utils_kubernetes.informer import read_snapshot, run_collector
 from cmk.special_agents.utils_kubernetes.schemata import api, section
 
 LOGGER = logging.getLogger()
@@ -294,6 +298,34 @@ def parse_arguments(args: List[str]) -> argparse.Namespace:
         help="The timeout in seconds the special agent will wait for a "
         "response from the Kubernetes API.",
     )
+    p.add_argument(
+        "--informer-cache",
+        type=Path,
+        metavar="FILE",
+        help="Read the API objects from the snapshot written by a collector running with "
+        "--run-informer. If the snapshot is missing or outdated, the objects are queried from "
+        "the Kubernetes API.",
+    )
+    p.add_argument(
+        "--informer-cache-max-age",
+        type=int,
+        default=60,
+        help="The age in seconds up to which the snapshot of --informer-cache is used.",
+    )
+    p.add_argument(
+        "--run-informer",
+        action="store_true",
+        help="Run as long-lived collector: list the API objects once, keep them up to date by "
+        "watching their changes and regularly write them to the snapshot file given by "
+        "--informer-cache.",
+    )
+    p.add_argument(
+        "--render-processes",
+        type=int,
+        default=1,
+        help="The number of processes rendering the piggyback sections of the pods, nodes, "
+        "namespaces and workloads. The output is the same as with a single process.",
+    )
     group = p.add_mutually_exclusive_group()
     group.add_argument(
         "--cluster-aggregation-exclude-node-roles",
@@ -337,6 +369,8 @@ def parse_arguments(args: List[str]) -> argparse.Namespace:
     group_host_labels.set_defaults(annotation_key_pattern=AnnotationNonPatternOption.ignore_all)
 
     arguments = p.parse_args(args)
+    if arguments.run_informer and arguments.informer_cache is None:
+        p.error("--run-informer requires --informer-cache")
     return arguments
 
 
@@ -356,9 +390,12 @@ def setup_logging(verbosity: int) -> None:
 class PodOwner(abc.ABC):
     def __init__(self) -> None:
         self._pods: List[Pod] = []
+        # The sections of the performance data only use the running pods
+        self._pods_by_phase: DefaultDict[api.Phase, List[Pod]] = defaultdict(list)
 
     def add_pod(self, pod: Pod) -> None:
         self._pods.append(pod)
+        self._pods_by_phase[pod.phase].append(pod)
 
 
 class PodNamespacedOwner(PodOwner, abc.ABC):
@@ -577,7 +614,7 @@ class Deployment(PodNamespacedOwner):
     def pods(self, phase: Optional[api.Phase] = None) -> Sequence[Pod]:
         if phase is None:
             return self._pods
-        return [pod for pod in self._pods if pod.phase == phase]
+        return self._pods_by_phase.get(phase, [])
 
     def info(
         self,
@@ -657,7 +694,7 @@ class DaemonSet(PodNamespacedOwner):
     def pods(self, phase: Optional[api.Phase] = None) -> Sequence[Pod]:
         if phase is None:
             return self._pods
-        return [pod for pod in self._pods if pod.phase == phase]
+        return self._pods_by_phase.get(phase, [])
 
     def add_pod(self, pod: Pod) -> None:
         super().add_pod(pod)
@@ -725,7 +762,7 @@ class StatefulSet(PodNamespacedOwner):
     def pods(self, phase: Optional[api.Phase] = None) -> Sequence[Pod]:
         if phase is None:
             return self._pods
-        return [pod for pod in self._pods if pod.phase == phase]
+        return self._pods_by_phase.get(phase, [])
 
     def add_pod(self, pod: Pod) -> None:
         super().add_pod(pod)
@@ -794,7 +831,7 @@ class Node(PodOwner):
     def pods(self, phase: Optional[api.Phase] = None) -> Sequence[Pod]:
         if phase is None:
             return self._pods
-        return [pod for pod in self._pods if pod.phase == phase]
+        return self._pods_by_phase.get(phase, [])
 
     def pod_resources(self) -> section.PodResources:
         return _pod_resources(self.pods())
@@ -1039,7 +1076,9 @@ class Cluster:
         self._deployments: List[Deployment] = []
         self._nodes: Dict[api.NodeName, Node] = {}
         self._pods: Dict[str, Pod] = {}
+        self._pods_by_phase: DefaultDict[api.Phase, List[Pod]] = defaultdict(list)
         self._cluster_aggregation_node_names: List[api.NodeName] = []
+        self._cluster_aggregation_node_names_set: Set[api.NodeName] = set()
         self._cluster_aggregation_pods: List[Pod] = []
 
     def add_node(self, node: Node) -> None:
@@ -1048,6 +1087,7 @@ class Cluster:
             for role in node.roles
         ):
             self._cluster_aggregation_node_names.append(node.name)
+            self._cluster_aggregation_node_names_set.add(node.name)
         self._nodes[node.name] = node
 
     def add_cron_job(self, cron_job: CronJob) -> None:
@@ -1063,9 +1103,10 @@ class Cluster:
         self._statefulsets.append(statefulset)
 
     def add_pod(self, pod: Pod) -> None:
-        if pod.node in self._cluster_aggregation_node_names or pod.node is None:
+        if pod.node is None or pod.node in self._cluster_aggregation_node_names_set:
             self._cluster_aggregation_pods.append(pod)
         self._pods[pod.uid] = pod
+        self._pods_by_phase[pod.phase].append(pod)
 
     def pod_resources(self) -> section.PodResources:
         return _pod_resources(self._cluster_aggregation_pods)
@@ -1090,12 +1131,13 @@ class Cluster:
     def pods(
         self, phase: Optional[api.Phase] = None, for_cluster_aggregation_only: bool = False
     ) -> Sequence[Pod]:
-        pods = (
-            self._cluster_aggregation_pods if for_cluster_aggregation_only else self._pods.values()
-        )
+        if for_cluster_aggregation_only:
+            if phase is None:
+                return list(self._cluster_aggregation_pods)
+            return [pod for pod in self._cluster_aggregation_pods if pod.phase == phase]
         if phase is None:
-            return list(pods)
-        return [pod for pod in pods if pod.phase == phase]
+            return list(self._pods.values())
+        return list(self._pods_by_phase.get(phase, []))
 
     def nodes(self) -> Sequence[Node]:
         return list(self._nodes.values())
@@ -1221,6 +1263,18 @@ def filter_matching_namespace_resource_quota(
     return None
 
 
+def resource_quotas_by_namespace(
+    resource_quotas: Sequence[api.ResourceQuota],
+) -> Mapping[api.NamespaceName, api.ResourceQuota]:
+    """The resource quota of each namespace, the same as filter_matching_namespace_resource_quota
+    returns for it"""
+    result: Dict[api.NamespaceName, api.ResourceQuota] = {}
+    for resource_quota in resource_quotas:
+        if resource_quota.metadata.namespace is not None:
+            result.setdefault(resource_quota.metadata.namespace, resource_quota)
+    return result
+
+
 def filter_pods_by_resource_quota_criteria(
     pods: Sequence[api.Pod], resource_quota: api.ResourceQuota
 ) -> Sequence[api.Pod]:
@@ -1387,6 +1441,47 @@ def filter_pods_by_phase(pods: Sequence[api.Pod], phase: api.Phase) -> Sequence[
     return [pod for pod in pods if pod.status.phase == phase]
 
 
+class PodIndex:
+    """The API pods grouped by namespace and phase
+
+    The index is built once per run, so the namespace sections do not filter all pods of the
+    cluster again for each namespace. Nodes and workloads keep their own pods grouped by phase
+    (see PodOwner).
+
+    >>> pods = [
+    ...     api.Pod.construct(metadata=api.PodMetaData.construct(namespace=namespace),
+    ...                       status=api.PodStatus.construct(phase=phase))
+    ...     for namespace, phase in [("a", api.Phase.RUNNING), ("b", api.Phase.PENDING),
+    ...                              ("a", api.Phase.PENDING)]
+    ... ]
+    >>> pod_index = PodIndex(pods)
+    >>> pod_index.pods() == pods
+    True
+    >>> pod_index.pods(namespace=api.NamespaceName("a")) == [pods[0], pods[2]]
+    True
+    >>> pod_index.pods(phase=api.Phase.PENDING) == pods[1:]
+    True
+    >>> pod_index.pods(namespace=api.NamespaceName("b"), phase=api.Phase.RUNNING)
+    []
+    """
+
+    def __init__(self, pods: Iterable[api.Pod]) -> None:
+        self._pods: DefaultDict[
+            Optional[api.NamespaceName], DefaultDict[Optional[api.Phase], List[api.Pod]]
+        ] = defaultdict(lambda: defaultdict(list))
+        for pod in pods:
+            for namespace in (None, pod_namespace(pod)):
+                self._pods[namespace][None].append(pod)
+                self._pods[namespace][pod.status.phase].append(pod)
+
+    def pods(
+        self, namespace: Optional[api.NamespaceName] = None, phase: Optional[api.Phase] = None
+    ) -> Sequence[api.Pod]:
+        if (pods_by_phase := self._pods.get(namespace)) is None:
+            return []
+        return pods_by_phase.get(phase, [])
+
+
 def filter_annotations_by_key_pattern(
     annotations: api.Annotations,
     annotation_key_pattern: AnnotationOption,
@@ -1433,6 +1528,46 @@ class JsonProtocol(Protocol):
         ...
 
 
+# Rendering the sections in worker processes only pays off for many objects
+MIN_OBJECTS_PER_PROCESS = 100
+
+# The jobs rendered by the worker processes of write_object_sections. The workers are forked and
+# inherit them, so the jobs do not have to be pickled.
+_RENDER_JOBS: Sequence[Callable[[], None]] = ()
+
+
+def _render_job(nr: int) -> str:
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        _RENDER_JOBS[nr]()
+    return output.getvalue()
+
+
+def write_object_sections(jobs: Sequence[Callable[[], None]], processes: int) -> None:
+    """Run the jobs, each one writing the piggyback sections of one object
+
+    With several processes, the output of the jobs is rendered by worker processes. It is
+    written in the order of the jobs, so the output is the same as running them one after the
+    other.
+    """
+    global _RENDER_JOBS
+    processes = min(processes, len(jobs) // MIN_OBJECTS_PER_PROCESS)
+    if processes <= 1:
+        for job in jobs:
+            job()
+        return
+
+    sys.stdout.flush()
+    _RENDER_JOBS = jobs
+    try:
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            for output in pool.imap(
+                _render_job, range(len(jobs)), chunksize=max(1, len(jobs) // (8 * processes))
+            ):
+                sys.stdout.write(output)
+    finally:
+        _RENDER_JOBS = ()
+
+
 def _write_sections(sections: Mapping[str, Callable[[], Optional[JsonProtocol]]]) -> None:
     for section_name, section_call in sections.items():
         if section_output := section_call():
@@ -1463,8 +1598,9 @@ def write_namespaces_api_sections(
     annotation_key_pattern: AnnotationOption,
     api_namespaces: Sequence[api.Namespace],
     api_resource_quotas: Sequence[api.ResourceQuota],
-    api_pods: Sequence[api.Pod],
+    pod_index: PodIndex,
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ):
     def output_namespace_sections(
         namespace: api.Namespace, namespaced_api_pods: Sequence[api.Pod]
@@ -1494,25 +1630,28 @@ def write_namespaces_api_sections(
         }
         _write_sections(sections)
 
-    for api_namespace in api_namespaces:
-        with ConditionalPiggybackSection(piggyback_formatter(namespace_name(api_namespace))):
-            output_namespace_sections(
-                api_namespace, filter_pods_by_namespace(api_pods, namespace_name(api_namespace))
-            )
+    resource_quotas = resource_quotas_by_namespace(api_resource_quotas)
 
-            if (
-                api_resource_quota := filter_matching_namespace_resource_quota(
-                    namespace_name(api_namespace), api_resource_quotas
-                )
-            ) is not None:
+    def output_sections(api_namespace: api.Namespace) -> None:
+        name = namespace_name(api_namespace)
+        with ConditionalPiggybackSection(piggyback_formatter(name)):
+            output_namespace_sections(api_namespace, pod_index.pods(namespace=name))
+
+            if (api_resource_quota := resource_quotas.get(name)) is not None:
                 output_resource_quota_sections(api_resource_quota)
 
+    write_object_sections(
+        [functools.partial(output_sections, api_namespace) for api_namespace in api_namespaces],
+        processes,
+    )
+
 
 def write_nodes_api_sections(
     cluster_name: str,
     annotation_key_pattern: AnnotationOption,
     api_nodes: Sequence[Node],
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ) -> None:
     def output_sections(cluster_node: Node) -> None:
         sections = {
@@ -1530,16 +1669,21 @@ def write_nodes_api_sections(
         }
         _write_sections(sections)
 
-    for node in api_nodes:
+    def output_node_sections(node: Node) -> None:
         with ConditionalPiggybackSection(piggyback_formatter(node.name)):
             output_sections(node)
 
+    write_object_sections(
+        [functools.partial(output_node_sections, node) for node in api_nodes], processes
+    )
+
 
 def write_deployments_api_sections(
     cluster_name: str,
     annotation_key_pattern: AnnotationOption,
     api_deployments: Sequence[Deployment],
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ) -> None:
     """Write the deployment relevant sections based on k8 API information"""
 
@@ -1557,18 +1701,27 @@ def write_deployments_api_sections(
         }
         _write_sections(sections)
 
-    for deployment in api_deployments:
+    def output_deployment_sections(deployment: Deployment) -> None:
         with ConditionalPiggybackSection(
             piggyback_formatter(deployment.name(prepend_namespace=True))
         ):
             output_sections(deployment)
 
+    write_object_sections(
+        [
+            functools.partial(output_deployment_sections, deployment)
+            for deployment in api_deployments
+        ],
+        processes,
+    )
+
 
 def write_daemon_sets_api_sections(
     cluster_name: str,
     annotation_key_pattern: AnnotationOption,
     api_daemon_sets: Sequence[DaemonSet],
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ) -> None:
     """Write the daemon set relevant sections based on k8 API information"""
 
@@ -1585,18 +1738,27 @@ def write_daemon_sets_api_sections(
         }
         _write_sections(sections)
 
-    for daemon_set in api_daemon_sets:
+    def output_daemon_set_sections(daemon_set: DaemonSet) -> None:
         with ConditionalPiggybackSection(
             piggyback_formatter(daemon_set.name(prepend_namespace=True))
         ):
             output_sections(daemon_set)
 
+    write_object_sections(
+        [
+            functools.partial(output_daemon_set_sections, daemon_set)
+            for daemon_set in api_daemon_sets
+        ],
+        processes,
+    )
+
 
 def write_statefulsets_api_sections(
     cluster_name: str,
     annotation_key_pattern: AnnotationOption,
     api_statefulsets: Sequence[StatefulSet],
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ) -> None:
     """Write the StatefulSet relevant sections based on k8 API information"""
 
@@ -1613,20 +1775,29 @@ def write_statefulsets_api_sections(
         }
         _write_sections(sections)
 
-    for statefulset in api_statefulsets:
+    def output_statefulset_sections(statefulset: StatefulSet) -> None:
         with ConditionalPiggybackSection(
             piggyback_formatter(statefulset.name(prepend_namespace=True))
         ):
             output_sections(statefulset)
 
+    write_object_sections(
+        [
+            functools.partial(output_statefulset_sections, statefulset)
+            for statefulset in api_statefulsets
+        ],
+        processes,
+    )
+
 
 def write_pods_api_sections(
     cluster_name: str,
     annotation_key_pattern: AnnotationOption,
     api_pods: Sequence[Pod],
     piggyback_formatter: ObjectSpecificPBFormatter,
+    processes: int = 1,
 ) -> None:
-    for pod in api_pods:
+    def output_sections(pod: Pod) -> None:
         with ConditionalPiggybackSection(piggyback_formatter(pod.name(prepend_namespace=True))):
             for section_name, section_content in pod_api_based_checkmk_sections(
                 cluster_name, annotation_key_pattern, pod
@@ -1636,6 +1807,8 @@ def write_pods_api_sections(
                 with SectionWriter(section_name) as writer:
                     writer.append(section_content.json())
 
+    write_object_sections([functools.partial(output_sections, pod) for pod in api_pods], processes)
+
 
 def write_machine_sections(
     cluster: Cluster,
@@ -2520,13 +2693,22 @@ def main(args: Optional[List[str]] = None) -> int:
             enabled=bool(arguments.profile), profile_file=arguments.profile
         ):
             api_client = make_api_client(arguments)
+            api_timeout = (arguments.k8s_api_connect_timeout, arguments.k8s_api_read_timeout)
+
+            if arguments.run_informer:
+                LOGGER.info("Running informer cache, writing to %s", arguments.informer_cache)
+                run_collector(api_client, api_timeout, arguments.informer_cache)
+                return 0
+
             LOGGER.info("Collecting API data")
+            snapshot = (
+                read_snapshot(arguments.informer_cache, arguments.informer_cache_max_age)
+                if arguments.informer_cache is not None
+                else None
+            )
 
             try:
-                api_server = APIServer.from_kubernetes(
-                    api_client,
-                    timeout=(arguments.k8s_api_connect_timeout, arguments.k8s_api_read_timeout),
-                )
+                api_server = APIServer.from_kubernetes(api_client, api_timeout, snapshot)
             except urllib3.exceptions.MaxRetryError as e:
                 raise ClusterConnectionError(
                     f"Failed to establish a connection to {e.pool.host}:{e.pool.port} "
@@ -2536,6 +2718,7 @@ def main(args: Optional[List[str]] = None) -> int:
                 raise CustomKubernetesApiException(e) from e
 
             api_pods = api_server.pods()
+            pod_index = PodIndex(api_pods)
 
             # Namespaces are handled independently from the cluster object in order to improve
             # testability. The long term goal is to remove all objects from the cluster object
@@ -2571,6 +2754,7 @@ def main(args: Optional[List[str]] = None) -> int:
                     arguments.annotation_key_pattern,
                     cluster.nodes(),
                     piggyback_formatter=piggyback_formatter_node,
+                    processes=arguments.render_processes,
                 )
 
             if MonitoredObject.deployments in arguments.monitored_objects:
@@ -2580,6 +2764,7 @@ def main(args: Optional[List[str]] = None) -> int:
                     arguments.annotation_key_pattern,
                     kube_objects_from_namespaces(cluster.deployments(), monitored_namespace_names),
                     piggyback_formatter=functools.partial(piggyback_formatter, "deployment"),
+                    processes=arguments.render_processes,
                 )
 
             resource_quotas = api_server.resource_quotas()
@@ -2589,13 +2774,10 @@ def main(args: Optional[List[str]] = None) -> int:
                 # Namespaces are handled differently to other objects. Namespace piggyback hosts
                 # should only be created if at least one running or pending pod is found in the
                 # namespace.
-                running_pending_pods = [
-                    pod
-                    for pod in api_pods
-                    if pod.status.phase in [api.Phase.RUNNING, api.Phase.PENDING]
-                ]
                 namespacenames_running_pending_pods = {
-                    pod_namespace(pod) for pod in running_pending_pods
+                    pod_namespace(pod)
+                    for phase in [api.Phase.RUNNING, api.Phase.PENDING]
+                    for pod in pod_index.pods(phase=phase)
                 }
                 monitored_api_namespaces = namespaces_from_namespacenames(
                     api_server.namespaces(),
@@ -2606,8 +2788,9 @@ def main(args: Optional[List[str]] = None) -> int:
                     arguments.annotation_key_pattern,
                     monitored_api_namespaces,
                     resource_quotas,
-                    api_pods,
+                    pod_index,
                     piggyback_formatter=functools.partial(piggyback_formatter, "namespace"),
+                    processes=arguments.render_processes,
                 )
 
             if MonitoredObject.daemonsets in arguments.monitored_objects:
@@ -2617,6 +2800,7 @@ def main(args: Optional[List[str]] = None) -> int:
                     arguments.annotation_key_pattern,
                     kube_objects_from_namespaces(cluster.daemon_sets(), monitored_namespace_names),
                     piggyback_formatter=functools.partial(piggyback_formatter, "daemonset"),
+                    processes=arguments.render_processes,
                 )
 
             if MonitoredObject.statefulsets in arguments.monitored_objects:
@@ -2626,6 +2810,7 @@ def main(args: Optional[List[str]] = None) -> int:
                     arguments.annotation_key_pattern,
                     kube_objects_from_namespaces(cluster.statefulsets(), monitored_namespace_names),
                     piggyback_formatter=functools.partial(piggyback_formatter, "statefulset"),
+                    processes=arguments.render_processes,
                 )
 
             monitored_pods: Set[PodLookupName] = {
@@ -2654,6 +2839,7 @@ def main(args: Optional[List[str]] = None) -> int:
                         if pod_lookup_from_agent_pod(pod) in monitored_pods
                     ],
                     piggyback_formatter=functools.partial(piggyback_formatter, "pod"),
+                    processes=arguments.render_processes,
                 )
 
             # Skip machine & container sections when cluster agent endpoint not configured
@@ -2766,10 +2952,10 @@ def main(args: Optional[List[str]] = None) -> int:
                     )
 
                     if MonitoredObject.namespaces in arguments.monitored_objects:
+                        resource_quota_of_namespace = resource_quotas_by_namespace(resource_quotas)
                         for api_namespace in monitored_api_namespaces:
-                            namespace_api_pods = filter_pods_by_phase(
-                                filter_pods_by_namespace(api_pods, namespace_name(api_namespace)),
-                                api.Phase.RUNNING,
+                            namespace_api_pods = pod_index.pods(
+                                namespace=namespace_name(api_namespace), phase=api.Phase.RUNNING
                             )
                             namespace_sections = kube_object_performance_sections(
                                 performance_pods=filter_associating_performance_pods_from_api_pods(
@@ -2777,8 +2963,8 @@ def main(args: Optional[List[str]] = None) -> int:
                                 ),
                             )
                             if (
-                                resource_quota := filter_matching_namespace_resource_quota(
-                                    namespace_name(api_namespace), resource_quotas
+                                resource_quota := resource_quota_of_namespace.get(
+                                    namespace_name(api_namespace)
                                 )
                             ) is not None:
                                 namespace_sections.extend(
@@ -8,14 +8,31 @@ Special agent for monitoring Prometheus with Checkmk.
 """
 import argparse
 import ast
+import codecs
+import contextlib
 import json
 import logging
 import math
+import re
 import sys
 import time
 import traceback
 from collections import defaultdict, OrderedDict
-from typing import Any, Callable, DefaultDict, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from urllib.parse import quote
 
 import requests
@@ -26,6 +43,12 @@ PromQLMetric = Dict[str, Any]
 
 LOGGER = logging.getLogger()  # root logger for now
 
+# Instant queries are combined into batches of at most this many queries
+MAX_BATCH_SIZE = 10
+# The label telling the queries of a batch apart
+BATCH_LABEL = "__cmk_batch"
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
 
 def parse_arguments(argv):
     parser = argparse.ArgumentParser(description=__doc__)
@@ -45,6 +68,13 @@ def parse_arguments(argv):
         type=int,
         help="""Timeout for individual processes in seconds (default 10)""",
     )
+    parser.add_argument(
+        "--max-connections",
+        default=8,
+        type=int,
+        help="""Number of PromQL queries performed concurrently, each one using its own
+        connection to the Prometheus server (default 8)""",
+    )
 
     args = parser.parse_args(argv)
     return args
@@ -135,19 +165,22 @@ class NodeExporter:
     ) -> Dict[str, Dict[str, FilesystemInfo]]:
         result: Dict[str, Dict[str, FilesystemInfo]] = {}
 
-        for entity_name, promql_query in promql_list:
-            for mountpoint_info in self.api_client.perform_multi_result_promql(
-                promql_query
-            ).promql_metrics:
-                labels = mountpoint_info["labels"]
-                node = result.setdefault(labels["instance"], {})
-                if labels["device"] not in node:
-                    node[labels["device"]] = FilesystemInfo(
-                        labels["device"], labels["fstype"], labels["mountpoint"]
-                    )
+        with self.api_client.prefetched_promql(
+            promql_query for _entity_name, promql_query in promql_list
+        ):
+            for entity_name, promql_query in promql_list:
+                for mountpoint_info in self.api_client.perform_multi_result_promql(
+                    promql_query
+                ).promql_metrics:
+                    labels = mountpoint_info["labels"]
+                    node = result.setdefault(labels["instance"], {})
+                    if labels["device"] not in node:
+                        node[labels["device"]] = FilesystemInfo(
+                            labels["device"], labels["fstype"], labels["mountpoint"]
+                        )
 
-                device = node[labels["device"]]
-                device.set_entity(entity_name, int(float(mountpoint_info["value"])))
+                    device = node[labels["device"]]
+                    device.set_entity(entity_name, int(float(mountpoint_info["value"])))
         return result
 
     def diskstat_summary(self) -> Dict[str, List[str]]:
@@ -202,15 +235,18 @@ class NodeExporter:
         self, diskstat_list: List[Tuple[str, str]]
     ) -> Dict[str, Dict[str, Dict[str, Union[int, str]]]]:
         result: Dict[str, Dict[str, Dict[str, Union[int, str]]]] = {}
-        for entity_name, promql_query in diskstat_list:
-            for node_info in self.api_client.perform_multi_result_promql(
-                promql_query
-            ).promql_metrics:
-                node = result.setdefault(node_info["labels"]["instance"], {})
-                device = node.setdefault(node_info["labels"]["device"], {})
-                if "device" not in device:
-                    device["device"] = node_info["labels"]["device"]
-                device[entity_name] = int(float(node_info["value"]))
+        with self.api_client.prefetched_promql(
+            promql_query for _entity_name, promql_query in diskstat_list
+        ):
+            for entity_name, promql_query in diskstat_list:
+                for node_info in self.api_client.perform_multi_result_promql(
+                    promql_query
+                ).promql_metrics:
+                    node = result.setdefault(node_info["labels"]["instance"], {})
+                    device = node.setdefault(node_info["labels"]["device"], {})
+                    if "device" not in device:
+                        device["device"] = node_info["labels"]["device"]
+                    device[entity_name] = int(float(node_info["value"]))
         return result
 
     def memory_summary(self) -> Dict[str, List[str]]:
@@ -271,11 +307,16 @@ class NodeExporter:
 
     def _generate_memory_stats(self, promql_list: List[Tuple[str, str]]) -> Dict[str, List[str]]:
         result: Dict[str, List[str]] = {}
-        for entity_name, promql_query in promql_list:
-            promql_result = self.api_client.perform_multi_result_promql(promql_query).promql_metrics
-            for node_element in promql_result:
-                node_mem = result.setdefault(node_element["labels"]["instance"], [])
-                node_mem.append("{}: {} kB".format(entity_name, node_element["value"]))
+        with self.api_client.prefetched_promql(
+            promql_query for _entity_name, promql_query in promql_list
+        ):
+            for entity_name, promql_query in promql_list:
+                promql_result = self.api_client.perform_multi_result_promql(
+                    promql_query
+                ).promql_metrics
+                for node_element in promql_result:
+                    node_mem = result.setdefault(node_element["labels"]["instance"], [])
+                    node_mem.append("{}: {} kB".format(entity_name, node_element["value"]))
         return result
 
     def kernel_summary(self) -> Dict[str, List[str]]:
@@ -318,23 +359,26 @@ class NodeExporter:
     ) -> Dict[str, Dict[str, Dict[str, int]]]:
         result: Dict[str, Dict[str, Dict[str, int]]] = {}
 
-        for entity_name, promql_query in kernel_list:
-            for device_info in self.api_client.perform_multi_result_promql(
-                promql_query
-            ).promql_metrics:
-                metric_value = int(float(device_info["value"]))
-                labels = device_info["labels"]
-                node = result.setdefault(labels["instance"], {})
-                if entity_name in ("cpu", "guest"):
-                    cpu_name = "cpu{}".format(labels["cpu"]) if "cpu" in labels else "cpu"
-                    mode_name = (
-                        "guest_{}".format(labels["mode"])
-                        if entity_name == "guest"
-                        else labels["mode"]
-                    )
-                    node.setdefault(cpu_name, {})[mode_name] = metric_value
-                else:
-                    node[entity_name] = {"value": metric_value}
+        with self.api_client.prefetched_promql(
+            promql_query for _entity_name, promql_query in kernel_list
+        ):
+            for entity_name, promql_query in kernel_list:
+                for device_info in self.api_client.perform_multi_result_promql(
+                    promql_query
+                ).promql_metrics:
+                    metric_value = int(float(device_info["value"]))
+                    labels = device_info["labels"]
+                    node = result.setdefault(labels["instance"], {})
+                    if entity_name in ("cpu", "guest"):
+                        cpu_name = "cpu{}".format(labels["cpu"]) if "cpu" in labels else "cpu"
+                        mode_name = (
+                            "guest_{}".format(labels["mode"])
+                            if entity_name == "guest"
+                            else labels["mode"]
+                        )
+                        node.setdefault(cpu_name, {})[mode_name] = metric_value
+                    else:
+                        node[entity_name] = {"value": metric_value}
         return result
 
 
@@ -454,17 +498,23 @@ class CAdvisorExporter:
 
         result: Dict[str, Dict[str, Union[str, Dict[str, str]]]] = {}
         associations = {}
-        for memory_stat, promql_query in memory_info:
-            promql_query = promql_query.replace("{namespace_filter}", self._namespace_query_part())
-            for pod_memory_info in self.api_client.query_promql(promql_query):
-                pod_name = self._pod_name(pod_memory_info.labels)
-                pod = result.setdefault(pod_name, {})
-                pod[memory_stat] = {
-                    "value": pod_memory_info.value(),
-                    "labels": pod_memory_info.labels,
-                }
-                if pod_name not in associations:
-                    associations[pod_name] = pod_memory_info.label_value("instance")
+        with self.api_client.prefetched_promql(
+            promql_query.replace("{namespace_filter}", self._namespace_query_part())
+            for _memory_stat, promql_query in memory_info
+        ):
+            for memory_stat, promql_query in memory_info:
+                promql_query = promql_query.replace(
+                    "{namespace_filter}", self._namespace_query_part()
+                )
+                for pod_memory_info in self.api_client.query_promql(promql_query):
+                    pod_name = self._pod_name(pod_memory_info.labels)
+                    pod = result.setdefault(pod_name, {})
+                    pod[memory_stat] = {
+                        "value": pod_memory_info.value(),
+                        "labels": pod_memory_info.labels,
+                    }
+                    if pod_name not in associations:
+                        associations[pod_name] = pod_memory_info.label_value("instance")
 
         return result, associations
 
@@ -582,25 +632,33 @@ class CAdvisorExporter:
 
         result = []
         group_element = "name" if group_element in ("name", "container") else "pod, namespace"
-        for entity_name, entity_promql in entity_info.items():
-            promql_result = self.api_client.query_promql(
-                self._prepare_query(entity_promql, group_element)
-            )
-
-            if group_element in ("container", "name"):
-                piggybacked_services = parse_piggybacked_services(
-                    promql_result,
-                    metric_description=entity_name,
-                    label_as_piggyback_host=group_element,
-                )
-                if self.container_name_option in ("short", "long"):
-                    piggybacked_services = self._apply_container_name_option(piggybacked_services)
-            else:
-                piggybacked_services = parse_piggybacked_services(
-                    promql_result, metric_description=entity_name, piggyback_parser=self._pod_name
+        with self.api_client.prefetched_promql(
+            self._prepare_query(entity_promql, group_element)
+            for entity_promql in entity_info.values()
+        ):
+            for entity_name, entity_promql in entity_info.items():
+                promql_result = self.api_client.query_promql(
+                    self._prepare_query(entity_promql, group_element)
                 )
 
-            result.append(piggybacked_services)
+                if group_element in ("container", "name"):
+                    piggybacked_services = parse_piggybacked_services(
+                        promql_result,
+                        metric_description=entity_name,
+                        label_as_piggyback_host=group_element,
+                    )
+                    if self.container_name_option in ("short", "long"):
+                        piggybacked_services = self._apply_container_name_option(
+                            piggybacked_services
+                        )
+                else:
+                    piggybacked_services = parse_piggybacked_services(
+                        promql_result,
+                        metric_description=entity_name,
+                        piggyback_parser=self._pod_name,
+                    )
+
+                result.append(piggybacked_services)
         return result
 
     def _prepare_query(self, entity_promql, group_element):
@@ -648,16 +706,19 @@ class KubeStateExporter:
             ("requests", "memory", "sum(kube_pod_container_resource_requests_memory_bytes)"),
         ]
         result: Dict[str, Dict[str, Any]] = {}
-        for resource_family, resource_type, promql_query in resources_list:
-            for cluster_info in self.api_client.query_promql(promql_query):
-                cluster_value = (
-                    int(cluster_info.value())
-                    if resource_type == "pods"
-                    else float(cluster_info.value())
-                )
-                result.setdefault(self.cluster_name, {}).setdefault(resource_family, {})[
-                    resource_type
-                ] = cluster_value
+        with self.api_client.prefetched_promql(
+            promql_query for _family, _type, promql_query in resources_list
+        ):
+            for resource_family, resource_type, promql_query in resources_list:
+                for cluster_info in self.api_client.query_promql(promql_query):
+                    cluster_value = (
+                        int(cluster_info.value())
+                        if resource_type == "pods"
+                        else float(cluster_info.value())
+                    )
+                    result.setdefault(self.cluster_name, {}).setdefault(resource_family, {})[
+                        resource_type
+                    ] = cluster_value
 
         # Adding the limits seperately
         if self.cluster_name in result:
@@ -740,17 +801,18 @@ class KubeStateExporter:
             "Ready": 'kube_node_status_condition{condition="Ready"}',
         }
         result: Dict[str, Dict[str, Any]] = {}
-        for entity_name, promql_query in node_conditions_info.items():
-            # node_result: Dict[str, Dict[str, Any]] = {}
-            for node_condition_info in self.api_client.query_promql(promql_query):
-                if not node_condition_info.has_labels(["node", "status"]):
-                    continue
+        with self.api_client.prefetched_promql(node_conditions_info.values()):
+            for entity_name, promql_query in node_conditions_info.items():
+                # node_result: Dict[str, Dict[str, Any]] = {}
+                for node_condition_info in self.api_client.query_promql(promql_query):
+                    if not node_condition_info.has_labels(["node", "status"]):
+                        continue
 
-                if int(node_condition_info.value()):
-                    node_result = result.setdefault(node_condition_info.label_value("node"), {})
-                    node_result[entity_name] = node_condition_info.label_value(
-                        "status"
-                    ).capitalize()
+                    if int(node_condition_info.value()):
+                        node_result = result.setdefault(node_condition_info.label_value("node"), {})
+                        node_result[entity_name] = node_condition_info.label_value(
+                            "status"
+                        ).capitalize()
         return [result]
 
     def node_resources(self) -> List[Dict[str, Dict[str, Any]]]:
@@ -775,25 +837,28 @@ class KubeStateExporter:
 
         node_valid_limits = self._nodes_limits()
         result: Dict[str, Dict[str, Any]] = {}
-        for resource_family, resource_type, promql_query in resources_list:
-            for node_info in self.api_client.query_promql(promql_query):
-                if not node_info.has_labels(["node"]):
-                    continue
+        with self.api_client.prefetched_promql(
+            promql_query for _family, _type, promql_query in resources_list
+        ):
+            for resource_family, resource_type, promql_query in resources_list:
+                for node_info in self.api_client.query_promql(promql_query):
+                    if not node_info.has_labels(["node"]):
+                        continue
 
-                if (
-                    resource_family == "limits"
-                    and node_info.label_value("node") not in node_valid_limits[resource_type]
-                ):
-                    value = float("inf")
-                else:
-                    value = (
-                        int(node_info.value())
-                        if resource_type == "pods"
-                        else float(node_info.value())
-                    )
-                result.setdefault(node_info.label_value("node"), {}).setdefault(
-                    resource_family, {}
-                )[resource_type] = value
+                    if (
+                        resource_family == "limits"
+                        and node_info.label_value("node") not in node_valid_limits[resource_type]
+                    ):
+                        value = float("inf")
+                    else:
+                        value = (
+                            int(node_info.value())
+                            if resource_type == "pods"
+                            else float(node_info.value())
+                        )
+                    result.setdefault(node_info.label_value("node"), {}).setdefault(
+                        resource_family, {}
+                    )[resource_type] = value
         return [result]
 
     def _nodes_limits(self) -> Dict[str, List[str]]:
@@ -811,15 +876,18 @@ class KubeStateExporter:
         ]
 
         node_pods: Dict[str, Dict[str, str]] = {}
-        for pod_count_type, promql_query in pods_count_expressions:
-            for count_result in self.api_client.query_promql(promql_query):
-                if not count_result.has_labels(["node"]):
-                    continue
-                limit_value = count_result.value(default_value=0)
-                if limit_value:
-                    node_pods.setdefault(count_result.label_value("node"), {})[
-                        pod_count_type
-                    ] = count_result.value()
+        with self.api_client.prefetched_promql(
+            promql_query for _count_type, promql_query in pods_count_expressions
+        ):
+            for pod_count_type, promql_query in pods_count_expressions:
+                for count_result in self.api_client.query_promql(promql_query):
+                    if not count_result.has_labels(["node"]):
+                        continue
+                    limit_value = count_result.value(default_value=0)
+                    if limit_value:
+                        node_pods.setdefault(count_result.label_value("node"), {})[
+                            pod_count_type
+                        ] = count_result.value()
 
         nodes_with_limits: Dict[str, List[str]] = {"memory": [], "cpu": []}
 
@@ -847,26 +915,31 @@ class KubeStateExporter:
             ),
         ]
         result = []
-        for promql_metric, promql_query in pod_conditions_info:
-            promql_result = self._perform_query(promql_query)
-            if promql_metric == "ContainersReady":
-                for node_result in promql_result:
-                    if not node_result.has_labels(["pod", "namespace"]):
-                        continue
-                    ready_result = {}
-                    ready_status = "True" if int(node_result.value()) == 1 else "False"
-                    ready_result[self._pod_name(node_result.labels)] = {promql_metric: ready_status}
-                    result.append(ready_result)
-            else:
-                schedule_result: Dict[str, Dict[str, Any]] = {}
-                for node_result in promql_result:
-                    if not node_result.has_labels(["pod", "condition", "namespace"]):
-                        continue
-                    if int(node_result.value()):
-                        schedule_result.setdefault(self._pod_name(node_result.labels), {})[
-                            promql_metric
-                        ] = node_result.label_value("condition").capitalize()
-                result.append(schedule_result)
+        with self.api_client.prefetched_promql(
+            self._format_query(promql_query) for _metric, promql_query in pod_conditions_info
+        ):
+            for promql_metric, promql_query in pod_conditions_info:
+                promql_result = self._perform_query(promql_query)
+                if promql_metric == "ContainersReady":
+                    for node_result in promql_result:
+                        if not node_result.has_labels(["pod", "namespace"]):
+                            continue
+                        ready_result = {}
+                        ready_status = "True" if int(node_result.value()) == 1 else "False"
+                        ready_result[self._pod_name(node_result.labels)] = {
+                            promql_metric: ready_status
+                        }
+                        result.append(ready_result)
+                else:
+                    schedule_result: Dict[str, Dict[str, Any]] = {}
+                    for node_result in promql_result:
+                        if not node_result.has_labels(["pod", "condition", "namespace"]):
+                            continue
+                        if int(node_result.value()):
+                            schedule_result.setdefault(self._pod_name(node_result.labels), {})[
+                                promql_metric
+                            ] = node_result.label_value("condition").capitalize()
+                    result.append(schedule_result)
         return result
 
     def pod_container_summary(self) -> List[Dict[str, Dict[str, Any]]]:
@@ -879,28 +952,31 @@ class KubeStateExporter:
             ("terminated", "kube_pod_container_status_terminated{namespace_filter}"),
         ]
         pod_container_result = []
-        for condition, promql_query in info:
-            temp_result: Dict[str, Dict[str, Any]] = {}
-            for container_info in self._perform_query(promql_query):
-                if not container_info.has_labels(["pod", "container", "namespace"]):
-                    continue
-                query_value = int(container_info.value())
-                metric_dict = temp_result.setdefault(
-                    self._pod_name(container_info.labels), {}
-                ).setdefault(container_info.label_value("container"), {})
-
-                if condition == "ready":
-                    metric_dict["ready"] = bool(query_value)
-                elif condition == "terminated":
-                    metric_dict["state_exit_code"] = query_value
-                    if query_value:
-                        metric_dict["state"] = "terminated"
-                else:
-                    if query_value:
-                        metric_dict["state"] = condition
+        with self.api_client.prefetched_promql(
+            self._format_query(promql_query) for _condition, promql_query in info
+        ):
+            for condition, promql_query in info:
+                temp_result: Dict[str, Dict[str, Any]] = {}
+                for container_info in self._perform_query(promql_query):
+                    if not container_info.has_labels(["pod", "container", "namespace"]):
+                        continue
+                    query_value = int(container_info.value())
+                    metric_dict = temp_result.setdefault(
+                        self._pod_name(container_info.labels), {}
+                    ).setdefault(container_info.label_value("container"), {})
+
+                    if condition == "ready":
+                        metric_dict["ready"] = bool(query_value)
+                    elif condition == "terminated":
+                        metric_dict["state_exit_code"] = query_value
+                        if query_value:
+                            metric_dict["state"] = "terminated"
+                    else:
+                        if query_value:
+                            metric_dict["state"] = condition
 
-                if temp_result:
-                    pod_container_result.append(temp_result)
+                    if temp_result:
+                        pod_container_result.append(temp_result)
 
         return pod_container_result
 
@@ -965,13 +1041,28 @@ class KubeStateExporter:
                 pod_limits.setdefault(pod, {}).setdefault("limits", {})[resource] = limit_value
             return pod_limits
 
+        pod_resources_queries = [
+            query
+            for resource_family, _type, promql_query in resources_list
+            for query in (
+                [promql_query]
+                if resource_family == "requests"
+                else [
+                    "sum by (pod, namespace)(%s)" % promql_query,
+                    "count by (pod, namespace)(%s)" % promql_query,
+                ]
+            )
+        ]
         result = []
-        for resource_family, resource_type, promql_query in resources_list:
-            if resource_family == "requests":
-                resource_results = _process_resources(resource_type, promql_query)
-            else:
-                resource_results = _process_limits(resource_type, promql_query)
-            result.append(resource_results)
+        with self.api_client.prefetched_promql(
+            self._format_query(query) for query in pod_resources_queries
+        ):
+            for resource_family, resource_type, promql_query in resources_list:
+                if resource_family == "requests":
+                    resource_results = _process_resources(resource_type, promql_query)
+                else:
+                    resource_results = _process_limits(resource_type, promql_query)
+                result.append(resource_results)
 
         return result
 
@@ -987,14 +1078,17 @@ class KubeStateExporter:
             "number_unavailable": "kube_daemonset_status_number_unavailable{namespace_filter}",
         }
         result = []
-        for entity_name, promql_query in daemon_pods_info.items():
-            piggybacked_services = parse_piggybacked_values(
-                self._perform_query(promql_query),
-                metric_description=entity_name,
-                label_as_piggyback_host="daemonset",
-                values_as_int=True,
-            )
-            result.append(piggybacked_services)
+        with self.api_client.prefetched_promql(
+            self._format_query(promql_query) for promql_query in daemon_pods_info.values()
+        ):
+            for entity_name, promql_query in daemon_pods_info.items():
+                piggybacked_services = parse_piggybacked_values(
+                    self._perform_query(promql_query),
+                    metric_description=entity_name,
+                    label_as_piggyback_host="daemonset",
+                    values_as_int=True,
+                )
+                result.append(piggybacked_services)
         return result
 
     def services_selector(self) -> List[Dict[str, Dict[str, Any]]]:
@@ -1044,13 +1138,16 @@ class KubeStateExporter:
         return [result]
 
     def _perform_query(self, promql_query):
+        return self.api_client.query_promql(self._format_query(promql_query))
+
+    def _format_query(self, promql_query: str) -> str:
         if "namespace_filter" in promql_query:
             if self.namespace_include_patterns:
                 namespace_detail = f"{{namespace=~'{'|'.join(self.namespace_include_patterns)}'}}"
                 promql_query = promql_query.format(namespace_filter=namespace_detail)
             else:
                 promql_query = promql_query.format(namespace_filter="")
-        return self.api_client.query_promql(promql_query)
+        return promql_query
 
     @staticmethod
     def _retrieve_promql_specific(metrics, entries):
@@ -1517,13 +1614,99 @@ class PrometheusServer:
         return json.loads(endpoint_result.content)["data"]
 
 
+_RESULT_START = re.compile(r'"result"\s*:\s*\[')
+_STREAMABLE_RESULT = re.compile(
+    r'^\s*\{\s*"status"\s*:\s*"success"\s*,\s*"data"\s*:\s*\{\s*"resultType"\s*:\s*"(vector|matrix)"\s*,\s*$'
+)
+_RESULT_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def parse_promql_result(chunks: Iterable[bytes]) -> Iterator[PromQLMetric]:
+    """The elements of data.result of a query response, parsed while the response is read
+
+    Prometheus writes the status and the result type before the result, so the elements of
+    vectors and matrices are parsed one after the other, without keeping the whole response in
+    memory. Other responses (errors, scalars) are parsed as a whole.
+
+    >>> list(parse_promql_result([b'{"status":"success","data":{"resultType":"vector","res',
+    ...                           b'ult":[{"metric":{"a":"1"},"value":[1,"2"]},{"metri',
+    ...                           b'c":{},"value":[1,"3"]}]}}']))
+    [{'metric': {'a': '1'}, 'value': [1, '2']}, {'metric': {}, 'value': [1, '3']}]
+    >>> list(parse_promql_result([b'{"status":"success","data":{"resultType":"scalar",',
+    ...                           b'"result":[1,"2"]}}']))
+    [1, '2']
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+
+    text = ""
+    while (result_start := _RESULT_START.search(text)) is None:
+        if (chunk := next(chunks, None)) is None:
+            yield from json.loads(text)["data"]["result"]
+            return
+        text += text_decoder.decode(chunk)
+
+    if not _STREAMABLE_RESULT.match(text[: result_start.start()]):
+        text += "".join(text_decoder.decode(chunk) for chunk in chunks)
+        yield from json.loads(text)["data"]["result"]
+        return
+
+    text = text[result_start.end() :]
+    pos = 0
+    while True:
+        pos = _RESULT_SEPARATOR.match(text, pos).end()  # type: ignore[union-attr]
+        if text[pos : pos + 1] == "]":
+            # Read the rest of the response, the connection can only be reused afterwards
+            for _chunk in chunks:
+                pass
+            return
+        try:
+            element, pos = json_decoder.raw_decode(text, pos)
+        except ValueError:
+            # The element is not complete yet
+            if (chunk := next(chunks, None)) is None:
+                raise
+            text = text[pos:] + text_decoder.decode(chunk)
+            pos = 0
+            continue
+        yield element
+
+
+def _batch_expression(promql_expressions: Sequence[str]) -> str:
+    """Combine the instant queries into one query, the results of each query are labeled with
+    its position
+
+    >>> _batch_expression(["up", "sum(up)"])
+    'label_replace((up), "__cmk_batch", "0", "", "") or label_replace((sum(up)), "__cmk_batch", "1", "", "")'
+    """
+    return " or ".join(
+        'label_replace((%s), "%s", "%d", "", "")' % (promql_expression, BATCH_LABEL, nr)
+        for nr, promql_expression in enumerate(promql_expressions)
+    )
+
+
+def _split_batch_result(result: Sequence[PromQLMetric], size: int) -> List[List[PromQLMetric]]:
+    results: List[List[PromQLMetric]] = [[] for _nr in range(size)]
+    for element in result:
+        # A result without the label is not a vector, the queries cannot be combined
+        results[int(element["metric"].pop(BATCH_LABEL))].append(element)
+    return results
+
+
 class PrometheusAPI:
     """
     Realizes communication with the Prometheus API
+
+    The queries of prefetched_promql are performed concurrently, each one using its own
+    connection of the session.
     """
 
-    def __init__(self, session) -> None:
+    def __init__(self, session, max_connections: int = 1) -> None:
         self.session = session
+        self._max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+        self._prefetched: Dict[str, Union[List[PromQLMetric], Exception]] = {}
         self.scrape_targets_dict = self._connected_scrape_targets()
 
     def scrape_targets_attributes(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
@@ -1556,6 +1739,16 @@ class PrometheusAPI:
                  contains the information of one service including the service metrics
 
         """
+        with self.prefetched_promql(
+            metric["promql_query"]
+            for service in custom_services
+            for metric in service["metric_components"]
+        ):
+            return self._specified_promql_queries(custom_services)
+
+    def _specified_promql_queries(
+        self, custom_services: List[Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
         result: Dict[str, Dict[str, Any]] = {}
         for service in custom_services:
             # Per default assign resulting service to Prometheus Host
@@ -1616,10 +1809,63 @@ class PrometheusAPI:
             logging.exception(exc)
             return []
 
+    @contextlib.contextmanager
+    def prefetched_promql(self, promql_expressions: Iterable[str]) -> Iterator[None]:
+        """Perform the queries concurrently, combined into batches where possible
+
+        Within the context, the queries of these expressions use the prefetched results.
+        """
+        expressions = [
+            promql_expression
+            for promql_expression in dict.fromkeys(promql_expressions)
+            if promql_expression not in self._prefetched
+        ]
+        # Enough batches to keep all connections busy
+        batch_size = max(1, min(MAX_BATCH_SIZE, -(-len(expressions) // self._max_connections)))
+        batches = [
+            expressions[start : start + batch_size]
+            for start in range(0, len(expressions), batch_size)
+        ]
+        for batch, results in zip(batches, self._executor.map(self._query_batch, batches)):
+            self._prefetched.update(zip(batch, results))
+        try:
+            yield
+        finally:
+            for promql_expression in expressions:
+                self._prefetched.pop(promql_expression, None)
+
+    def _query_batch(
+        self, promql_expressions: Sequence[str]
+    ) -> Sequence[Union[List[PromQLMetric], Exception]]:
+        if len(promql_expressions) > 1:
+            try:
+                return _split_batch_result(
+                    self._query(_batch_expression(promql_expressions)), len(promql_expressions)
+                )
+            except (KeyError, ValueError, requests.exceptions.RequestException) as exc:
+                LOGGER.debug("Cannot combine the queries, performing them one by one: %s", exc)
+        return [self._try_query(promql_expression) for promql_expression in promql_expressions]
+
+    def _try_query(self, promql: str) -> Union[List[PromQLMetric], Exception]:
+        try:
+            return self._query(promql)
+        except Exception as exc:  # pylint: disable=broad-except
+            # Raised again when the result is used, like without prefetching
+            return exc
+
     def _perform_promql_query(self, promql: str) -> List[Dict[str, Any]]:
-        api_query_expression = "query?query=%s" % quote(promql)
-        result = self._process_json_request(api_query_expression)["data"]["result"]
-        return result
+        if promql in self._prefetched:
+            result = self._prefetched[promql]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return self._query(promql)
+
+    def _query(self, promql: str) -> List[PromQLMetric]:
+        response = self.session.get("query?query=%s" % quote(promql), stream=True)
+        with contextlib.closing(response):
+            response.raise_for_status()
+            return list(parse_promql_result(response.iter_content(RESPONSE_CHUNK_SIZE)))
 
     def _query_json_endpoint(self, endpoint: str) -> Dict[str, Any]:
         """Query the given endpoint of the Prometheus API expecting a json response"""
@@ -2083,10 +2329,12 @@ def main(argv=None):
     try:
         config = ast.literal_eval(sys.stdin.read())
         config_args = _extract_config_args(config)
-        session = generate_api_session(extract_connection_args(config))
+        session = generate_api_session(
+            extract_connection_args(config), max_connections=args.max_connections
+        )
         exporter_options = config_args["exporter_options"]
         # default cases always must be there
-        api_client = PrometheusAPI(session)
+        api_client = PrometheusAPI(session, max_connections=args.max_connections)
         api_data = ApiData(api_client, exporter_options)
         print(api_data.prometheus_build_section())
         print(api_data.promql_section(config_args["custom_services"]))
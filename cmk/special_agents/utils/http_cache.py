@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""
+Cache of the HTTP responses of the special agents
+
+The special agents of several hosts often query the same endpoints. The responses of their GET
+requests are kept in one directory shared by all special agents:
+
+* A response is used without sending a request for the TTL of its URL.
+* After that, it is revalidated with a conditional request (If-None-Match with its ETag,
+  If-Modified-Since with its Last-Modified date). On "304 Not Modified" the cached response is
+  used again.
+* Concurrent requests of the same URL, of threads or of the special agents of other hosts, are
+  coalesced: the first one sends the request, the others wait for it and use its response.
+* The least recently used responses are removed as soon as the cache grows beyond its size.
+
+The cache is used by the sessions of request_helper.ApiSession.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import cmk.utils.store as store
+from cmk.utils.paths import tmp_dir
+
+from cmk.special_agents.utils.agent_common import SectionWriter
+
+LOGGER = logging.getLogger("agent_http_cache")
+
+HTTP_CACHE_DIR = Path(tmp_dir) / "agents" / "http_cache"
+
+UrlTTLs = Sequence[Tuple[str, float]]
+
+_CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+# The headers of a "304 Not Modified" response updating the cached response
+_REVALIDATED_HEADERS = ("Cache-Control", "Date", "ETag", "Expires", "Last-Modified")
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    url: str
+    status_code: int
+    reason: str
+    headers: Mapping[str, str]
+    stored: float
+    content: bytes
+
+    def serialize(self) -> bytes:
+        meta = {
+            "url": self.url,
+            "status_code": self.status_code,
+            "reason": self.reason,
+            "headers": dict(self.headers),
+            "stored": self.stored,
+        }
+        return b"%s\n%s" % (json.dumps(meta).encode("utf-8"), self.content)
+
+    @classmethod
+    def deserialize(cls, raw: bytes) -> "CacheEntry":
+        raw_meta, content = raw.split(b"\n", 1)
+        meta = json.loads(raw_meta)
+        return cls(
+            url=meta["url"],
+            status_code=meta["status_code"],
+            reason=meta["reason"],
+            headers=meta["headers"],
+            stored=meta["stored"],
+            content=content,
+        )
+
+    def response(self, request: requests.PreparedRequest) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.url = self.url
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.request = request
+        response._content = self.content  # pylint: disable=protected-access
+        return response
+
+
+class HTTPCache:
+    """
+    The responses are cached for the default TTL, or the TTL of the first URL pattern
+    (a regular expression) matching the URL
+
+    The responses are kept by the method, URL and headers of their request, so the responses of
+    different credentials are never mixed up.
+
+    stats counts the requests answered from the cache ("hits"), with a conditional request
+    ("revalidated"), with the response of a concurrent request ("coalesced") and by sending the
+    request ("misses").
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ttl: float = 0.0,
+        url_ttls: UrlTTLs = (),
+        max_size: int = 100 * 1024 * 1024,
+    ) -> None:
+        self._directory = directory
+        self._ttl = ttl
+        self._url_ttls = [(re.compile(pattern), url_ttl) for pattern, url_ttl in url_ttls]
+        self._max_size = max_size
+        # The size of the cached responses, determined with the first stored response
+        self._size: Optional[int] = None
+        self.stats: Counter = Counter({"hits": 0, "revalidated": 0, "coalesced": 0, "misses": 0})
+
+    def ttl(self, url: str) -> float:
+        for pattern, url_ttl in self._url_ttls:
+            if pattern.search(url):
+                return url_ttl
+        return self._ttl
+
+    def send(
+        self,
+        send: Callable[..., requests.Response],
+        request: requests.PreparedRequest,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send the request with the send method of a requests session, unless it is cached"""
+        if request.method != "GET" or request.body or kwargs.get("stream"):
+            return send(request, **kwargs)
+
+        key = _cache_key(request)
+        waiting_since = time.time()
+        with store.locked(self._directory / f"{key}.lock"):
+            entry = self._load(key)
+            if entry is not None and time.time() - entry.stored < self.ttl(entry.url):
+                self._hit(key, "hits")
+                return entry.response(request)
+            if entry is not None and entry.stored >= waiting_since:
+                # Sent by the concurrent request we were waiting for
+                self._hit(key, "coalesced")
+                return entry.response(request)
+
+            if entry is not None:
+                cached_headers = CaseInsensitiveDict(entry.headers)
+                if etag := cached_headers.get("ETag"):
+                    request.headers["If-None-Match"] = etag
+                if last_modified := cached_headers.get("Last-Modified"):
+                    request.headers["If-Modified-Since"] = last_modified
+
+            response = send(request, **kwargs)
+            for header in _CONDITIONAL_HEADERS:
+                request.headers.pop(header, None)
+
+            if entry is not None and response.status_code == 304:
+                self.stats["revalidated"] += 1
+                cached_headers.update(
+                    (name, response.headers[name])
+                    for name in _REVALIDATED_HEADERS
+                    if name in response.headers
+                )
+                entry = CacheEntry(
+                    url=entry.url,
+                    status_code=entry.status_code,
+                    reason=entry.reason,
+                    headers=dict(cached_headers),
+                    stored=time.time(),
+                    content=entry.content,
+                )
+                self._store(key, entry)
+                return entry.response(request)
+
+            self.stats["misses"] += 1
+            if response.status_code == 200 and "no-store" not in response.headers.get(
+                "Cache-Control", ""
+            ):
+                self._store(
+                    key,
+                    CacheEntry(
+                        url=response.url,
+                        status_code=response.status_code,
+                        reason=response.reason,
+                        headers=dict(response.headers),
+                        stored=time.time(),
+                        content=response.content,
+                    ),
+                )
+            return response
+
+    def write_section(self) -> None:
+        with SectionWriter("special_agent_http_cache") as writer:
+            writer.append_json(dict(self.stats))
+
+    def _hit(self, key: str, counter: str) -> None:
+        self.stats[counter] += 1
+        try:
+            # The modification time tells the least recently used responses
+            os.utime(self._directory / key)
+        except OSError:
+            pass
+
+    def _load(self, key: str) -> Optional[CacheEntry]:
+        try:
+            return CacheEntry.deserialize((self._directory / key).read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            LOGGER.info("Cannot read cached response %s: %s", key, exc)
+            return None
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        """Store the entry, the caller has to hold the lock of the key"""
+        path = self._directory / key
+        tmp_path = path.with_name(f".{key}.new")
+        raw = entry.serialize()
+        try:
+            try:
+                replaced_size = path.stat().st_size
+            except FileNotFoundError:
+                replaced_size = 0
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, path)
+            if self._size is None:
+                self._size = sum(size for _mtime, size, _path in self._entries())
+            else:
+                # The responses stored by other processes in the meantime are only noticed
+                # when the cache is full
+                self._size += len(raw) - replaced_size
+            if self._size > self._max_size:
+                self._evict(key)
+        except OSError as exc:
+            LOGGER.info("Failed to write response to cache: %s", exc)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for path in self._directory.iterdir():
+            if path.name.startswith(".") or path.suffix == ".lock":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self, stored_key: str) -> None:
+        entries = self._entries()
+        size = sum(entry_size for _mtime, entry_size, _path in entries)
+        for _mtime, entry_size, path in sorted(entries):
+            if size <= self._max_size:
+                break
+            if path.name == stored_key:
+                continue
+            lock_path = path.with_suffix(".lock")
+            with store.try_locked(lock_path) as is_locked:
+                if not is_locked:
+                    continue  # The response is being used right now
+                LOGGER.debug("Removing cached response %s", path.name)
+                path.unlink(missing_ok=True)
+                # Only removed while locked: the requests waiting for the lock notice that the
+                # file has been removed and lock the one created by the next request instead
+                lock_path.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+
+def _cache_key(request: requests.PreparedRequest) -> str:
+    headers = sorted(
+        (name.lower(), value)
+        for name, value in request.headers.items()
+        if name not in _CONDITIONAL_HEADERS
+    )
+    return hashlib.sha256(json.dumps([request.method, request.url, headers]).encode()).hexdigest()
+
+
+def _url_ttl(value: str) -> Tuple[str, float]:
+    pattern, _sep, url_ttl = value.rpartition("=")
+    try:
+        return pattern, float(url_ttl)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected REGEX=SECONDS, got %r" % value)
+
+
+def add_http_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--http-cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="Cache the HTTP responses in the cache shared by the special agents and use them "
+        "for SECONDS without sending a request. After that, they are revalidated with "
+        "conditional requests. The cache is not used if this option is not given.",
+    )
+    parser.add_argument(
+        "--http-cache-url-ttl",
+        type=_url_ttl,
+        action="append",
+        default=[],
+        metavar="REGEX=SECONDS",
+        help="The TTL of the cached responses of the URLs matching REGEX. Can be given "
+        "multiple times, the first matching REGEX is used.",
+    )
+    parser.add_argument(
+        "--http-cache-max-size",
+        type=int,
+        default=100,
+        metavar="MB",
+        help="The size of the shared HTTP cache, the least recently used responses are "
+        "removed beyond it (default: 100).",
+    )
+
+
+def http_cache_from_arguments(args: argparse.Namespace) -> Optional[HTTPCache]:
+    if args.http_cache_ttl is None:
+        return None
+    return HTTPCache(
+        HTTP_CACHE_DIR,
+        ttl=args.http_cache_ttl,
+        url_ttls=args.http_cache_url_ttl,
+        max_size=args.http_cache_max_size * 1024 * 1024,
+    )
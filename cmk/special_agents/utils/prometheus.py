@@ -7,6 +7,10 @@
 Common functions used in Prometheus related Special agents
 """
 
+from typing import Optional
+
+from requests.adapters import HTTPAdapter
+
 from cmk.utils import password_store
 
 from cmk.special_agents.utils.request_helper import (
@@ -51,7 +55,12 @@ def extract_connection_args(config):
     return connection_args
 
 
-def generate_api_session(connection_options):
+def generate_api_session(connection_options, max_connections: Optional[int] = None):
+    """The session to the Prometheus API
+
+    With max_connections, the session keeps at most that many connections to the server, so it
+    can be used by as many threads. Further threads wait for a free connection.
+    """
     if "url_custom" in connection_options:
         api_url = parse_api_custom_url(
             url_custom=connection_options["url_custom"],
@@ -65,9 +74,14 @@ def generate_api_session(connection_options):
             protocol=connection_options["protocol"],
             port=connection_options["port"],
         )
-    return create_api_connect_session(
+    session = create_api_connect_session(
         api_url,
         auth=connection_options.get("auth"),
         token=connection_options.get("token"),
         no_cert_check=not connection_options["verify-cert"],
     )
+    if max_connections is not None:
+        adapter = HTTPAdapter(pool_maxsize=max_connections, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
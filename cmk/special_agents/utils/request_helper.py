@@ -15,7 +15,9 @@ from http.client import HTTPConnection, HTTPResponse, HTTPSConnection
 from typing import Any, Dict, Optional, TypedDict, Union
 from urllib.request import build_opener, HTTPSHandler, Request
 
-from requests import Session
+from requests import PreparedRequest, Response, Session
+
+from cmk.special_agents.utils.http_cache import HTTPCache
 
 StringMap = Dict[str, str]  # should be Mapping[] but we're not ready yet..
 
@@ -119,6 +121,7 @@ def create_api_connect_session(
     no_cert_check: bool = False,
     auth: Any = None,
     token: Optional[str] = None,
+    cache: Optional[HTTPCache] = None,
 ) -> "ApiSession":
     """Create a custom requests Session
 
@@ -135,12 +138,15 @@ def create_api_connect_session(
 
         token:
             token for Bearer token request
+
+        cache:
+            cache of the responses of the GET requests
     """
     ssl_verify = None
     if not no_cert_check:
         ssl_verify = get_requests_ca()
 
-    session = ApiSession(api_url, ssl_verify)
+    session = ApiSession(api_url, ssl_verify, cache)
 
     if auth:
         session.auth = auth
@@ -157,19 +163,29 @@ class ApiSession(Session):
     with the exception that a base url is provided and persisted
     all requests forms use the base url and append the actual request
 
+    If a cache is given, the responses of the GET requests are taken from it if possible.
     """
 
     def __init__(
-        self, base_url: Optional[str] = None, ssl_verify: Optional[Union[str, bool]] = None
+        self,
+        base_url: Optional[str] = None,
+        ssl_verify: Optional[Union[str, bool]] = None,
+        cache: Optional[HTTPCache] = None,
     ):
         super().__init__()
         self._base_url = base_url if base_url else ""
         self.ssl_verify = ssl_verify if ssl_verify else False
+        self.cache = cache
 
     def request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
         url = urljoin(self._base_url, url)
         return super().request(method, url, verify=self.ssl_verify, **kwargs)
 
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        if self.cache is None:
+            return super().send(request, **kwargs)
+        return self.cache.send(super().send, request, **kwargs)
+
 
 def parse_api_url(
     server_address,
@@ -13,6 +13,7 @@ from typing import Dict, Iterable, List, Literal, Mapping, Optional, Sequence, T
 
 from kubernetes import client  # type: ignore[import]
 
+from cmk.special_agents.utils_kubernetes.informer import Snapshot
 from cmk.special_agents.utils_kubernetes.schemata import api
 from cmk.special_agents.utils_kubernetes.transform import (
     cron_job_from_client,
@@ -33,11 +34,17 @@ SUPPORTED_VERSIONS_DISPLAY = ", ".join(f"v{major}.{minor}" for major, minor in S
 
 
 class BatchAPI:
-    def __init__(self, api_client: client.ApiClient, timeout) -> None:
+    def __init__(
+        self, api_client: client.ApiClient, timeout, snapshot: Optional[Snapshot] = None
+    ) -> None:
         self.connection = client.BatchV1Api(api_client)
         self.timeout = timeout
-        self.raw_jobs = self._query_raw_jobs()
-        self.raw_cron_jobs = self._query_raw_cron_jobs()
+        if snapshot is None:
+            self.raw_jobs = self._query_raw_jobs()
+            self.raw_cron_jobs = self._query_raw_cron_jobs()
+        else:
+            self.raw_jobs = snapshot.deserialize(api_client, "jobs")
+            self.raw_cron_jobs = snapshot.deserialize(api_client, "cron_jobs")
 
     def _query_raw_cron_jobs(self) -> Sequence[client.V1CronJob]:
         return self.connection.list_cron_job_for_all_namespaces(_request_timeout=self.timeout).items
@@ -51,13 +58,21 @@ class CoreAPI:
     Wrapper around CoreV1Api; Implementation detail of APIServer
     """
 
-    def __init__(self, api_client: client.ApiClient, timeout) -> None:
+    def __init__(
+        self, api_client: client.ApiClient, timeout, snapshot: Optional[Snapshot] = None
+    ) -> None:
         self.connection = client.CoreV1Api(api_client)
         self.timeout = timeout
-        self.raw_pods = self._query_raw_pods()
-        self.raw_nodes = self._query_raw_nodes()
-        self.raw_namespaces = self._query_raw_namespaces()
-        self.raw_resource_quotas = self._query_raw_resource_quotas()
+        if snapshot is None:
+            self.raw_pods = self._query_raw_pods()
+            self.raw_nodes = self._query_raw_nodes()
+            self.raw_namespaces = self._query_raw_namespaces()
+            self.raw_resource_quotas = self._query_raw_resource_quotas()
+        else:
+            self.raw_pods = snapshot.deserialize(api_client, "pods")
+            self.raw_nodes = snapshot.deserialize(api_client, "nodes")
+            self.raw_namespaces = snapshot.deserialize(api_client, "namespaces")
+            self.raw_resource_quotas = snapshot.deserialize(api_client, "resource_quotas")
 
     def _query_raw_nodes(self) -> Sequence[client.V1Node]:
         return self.connection.list_node(_request_timeout=self.timeout).items
@@ -77,13 +92,21 @@ class AppsAPI:
     Wrapper around ExternalV1APi; Implementation detail of APIServer
     """
 
-    def __init__(self, api_client: client.ApiClient, timeout) -> None:
+    def __init__(
+        self, api_client: client.ApiClient, timeout, snapshot: Optional[Snapshot] = None
+    ) -> None:
         self.connection = client.AppsV1Api(api_client)
         self.timeout = timeout
-        self.raw_deployments = self._query_raw_deployments()
-        self.raw_daemon_sets = self._query_raw_daemon_sets()
-        self.raw_statefulsets = self._query_raw_statefulsets()
-        self.raw_replica_sets = self._query_raw_replica_sets()
+        if snapshot is None:
+            self.raw_deployments = self._query_raw_deployments()
+            self.raw_daemon_sets = self._query_raw_daemon_sets()
+            self.raw_statefulsets = self._query_raw_statefulsets()
+            self.raw_replica_sets = self._query_raw_replica_sets()
+        else:
+            self.raw_deployments = snapshot.deserialize(api_client, "deployments")
+            self.raw_daemon_sets = snapshot.deserialize(api_client, "daemon_sets")
+            self.raw_statefulsets = snapshot.deserialize(api_client, "statefulsets")
+            self.raw_replica_sets = snapshot.deserialize(api_client, "replica_sets")
 
     def _query_raw_deployments(self) -> Sequence[client.V1Deployment]:
         return self.connection.list_deployment_for_all_namespaces(
@@ -342,17 +365,21 @@ class APIServer:
     """
 
     @classmethod
-    def from_kubernetes(cls, api_client, timeout):
+    def from_kubernetes(cls, api_client, timeout, snapshot: Optional[Snapshot] = None):
+        """
+        The objects are taken from the snapshot of the informer cache, if given. The version and
+        the health of the API server and the kubelets are always queried.
+        """
         raw_api = RawAPI(api_client, timeout)
 
         raw_version = raw_api.query_raw_version()
         version = version_from_json(raw_version)
         _verify_version_support(version)
         return cls(
-            BatchAPI(api_client, timeout),
-            CoreAPI(api_client, timeout),
+            BatchAPI(api_client, timeout, snapshot),
+            CoreAPI(api_client, timeout, snapshot),
             raw_api,
-            AppsAPI(api_client, timeout),
+            AppsAPI(api_client, timeout, snapshot),
             version.git_version,
         )
 
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""
+Informer cache of the API objects, used by the long-lived collector mode of agent_kube.
+
+Listing all objects of a large cluster on every run of the special agent puts a lot of load on
+the API server. Instead, a collector lists the objects of every resource once and then keeps
+them up to date by watching the changes, starting at the resourceVersion of the list (like the
+informers of client-go do). The collector regularly writes a snapshot of the objects to a file,
+which the special agent reads instead of listing the objects.
+
+The objects are kept as the raw JSON of the API server. They are only deserialized into the
+objects of the kubernetes python library when the special agent reads the snapshot.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from kubernetes import client  # type: ignore[import]
+from kubernetes.watch.watch import iter_resp_lines  # type: ignore[import]
+
+LOGGER = logging.getLogger()
+
+RawObject = Mapping[str, Any]
+Timeout = Tuple[int, int]
+
+HTTP_STATUS_GONE = 410
+
+# Interval in seconds in which the collector writes the snapshot
+SNAPSHOT_INTERVAL = 10
+
+
+class Resource(NamedTuple):
+    api: Callable[[client.ApiClient], Any]
+    list_method: str
+    model: str
+
+
+RESOURCES: Mapping[str, Resource] = {
+    "pods": Resource(client.CoreV1Api, "list_pod_for_all_namespaces", "V1Pod"),
+    "nodes": Resource(client.CoreV1Api, "list_node", "V1Node"),
+    "namespaces": Resource(client.CoreV1Api, "list_namespace", "V1Namespace"),
+    "resource_quotas": Resource(
+        client.CoreV1Api, "list_resource_quota_for_all_namespaces", "V1ResourceQuota"
+    ),
+    "deployments": Resource(client.AppsV1Api, "list_deployment_for_all_namespaces", "V1Deployment"),
+    "daemon_sets": Resource(client.AppsV1Api, "list_daemon_set_for_all_namespaces", "V1DaemonSet"),
+    "statefulsets": Resource(
+        client.AppsV1Api, "list_stateful_set_for_all_namespaces", "V1StatefulSet"
+    ),
+    "replica_sets": Resource(
+        client.AppsV1Api, "list_replica_set_for_all_namespaces", "V1ReplicaSet"
+    ),
+    "jobs": Resource(client.BatchV1Api, "list_job_for_all_namespaces", "V1Job"),
+    "cron_jobs": Resource(client.BatchV1Api, "list_cron_job_for_all_namespaces", "V1CronJob"),
+}
+
+
+class ResourceVersionExpired(Exception):
+    """The resource version is too old to watch the changes from, the objects have to be listed
+    again"""
+
+
+class Informer:
+    """
+    Keeps the objects of one resource up to date
+
+    The objects are listed in pages, then the changes since the resource version of the list are
+    watched. Every watch ends after watch_timeout seconds and is continued at the resource
+    version of the last event. BOOKMARK events keep this resource version recent, even if the
+    objects do not change.
+    """
+
+    def __init__(
+        self,
+        list_func: Callable[..., Any],
+        timeout: Timeout,
+        page_size: int = 500,
+        watch_timeout: int = 300,
+    ) -> None:
+        self._list_func = list_func
+        self._timeout = timeout
+        self._page_size = page_size
+        self._watch_timeout = watch_timeout
+        self._lock = threading.Lock()
+        self._objects: Dict[str, RawObject] = {}
+        self.resource_version: Optional[str] = None
+        # Set while the objects are up to date, i.e. after a successful list or while watching
+        self.synced = threading.Event()
+
+    def objects(self) -> Sequence[RawObject]:
+        with self._lock:
+            return list(self._objects.values())
+
+    def list(self) -> None:
+        objects: Dict[str, RawObject] = {}
+        kwargs: Dict[str, Any] = {}
+        while True:
+            response = self._list_func(
+                limit=self._page_size,
+                _preload_content=False,
+                _request_timeout=self._timeout,
+                **kwargs,
+            )
+            raw_list = json.loads(response.data)
+            for raw_object in raw_list["items"]:
+                objects[_object_key(raw_object)] = raw_object
+            if not (continue_token := raw_list["metadata"].get("continue")):
+                break
+            kwargs["_continue"] = continue_token
+
+        with self._lock:
+            self._objects = objects
+            self.resource_version = raw_list["metadata"]["resourceVersion"]
+        self.synced.set()
+
+    def watch(self, stop: threading.Event) -> None:
+        response = self._list_func(
+            watch=True,
+            resource_version=self.resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=self._watch_timeout,
+            _preload_content=False,
+            _request_timeout=(self._timeout[0], self._watch_timeout + self._timeout[1]),
+        )
+        self.synced.set()
+        try:
+            for line in iter_resp_lines(response):
+                if stop.is_set():
+                    return
+                if line:
+                    self._apply(json.loads(line))
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _apply(self, event: Mapping[str, Any]) -> None:
+        raw_object = event["object"]
+        if event["type"] == "ERROR":
+            if raw_object.get("code") == HTTP_STATUS_GONE:
+                raise ResourceVersionExpired(raw_object.get("message"))
+            raise client.ApiException(
+                status=raw_object.get("code"),
+                reason=f"{raw_object.get('reason')}: {raw_object.get('message')}",
+            )
+
+        with self._lock:
+            if event["type"] in ("ADDED", "MODIFIED"):
+                self._objects[_object_key(raw_object)] = raw_object
+            elif event["type"] == "DELETED":
+                self._objects.pop(_object_key(raw_object), None)
+            self.resource_version = raw_object["metadata"]["resourceVersion"]
+
+    def run(self, stop: threading.Event, retry_interval: float = 5.0) -> None:
+        while not stop.is_set():
+            try:
+                if self.resource_version is None:
+                    self.list()
+                self.watch(stop)
+            except ResourceVersionExpired:
+                self._expired()
+            except client.ApiException as e:
+                if e.status == HTTP_STATUS_GONE:
+                    self._expired()
+                else:
+                    self._failed(stop, retry_interval)
+            except Exception:
+                self._failed(stop, retry_interval)
+
+    def _expired(self) -> None:
+        LOGGER.info("Resource version %s expired, listing again", self.resource_version)
+        self.resource_version = None
+
+    def _failed(self, stop: threading.Event, retry_interval: float) -> None:
+        # The watch is continued at the same resource version, if it is still available
+        LOGGER.exception("Failed to watch %s", getattr(self._list_func, "__name__", "objects"))
+        self.synced.clear()
+        stop.wait(retry_interval)
+
+
+def _object_key(raw_object: RawObject) -> str:
+    return raw_object["metadata"]["uid"]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    timestamp: float
+    resource_versions: Mapping[str, Optional[str]]
+    objects: Mapping[str, Sequence[RawObject]]
+
+    def deserialize(self, api_client: client.ApiClient, resource: str) -> Sequence[Any]:
+        """The objects of the resource like the list methods of the kubernetes client return
+        them"""
+        return api_client.deserialize(
+            SimpleNamespace(data=json.dumps(self.objects[resource])),
+            "list[%s]" % RESOURCES[resource].model,
+        )
+
+
+class InformerCache:
+    """The informers of all resources used by APIServer, each one running in its own thread"""
+
+    def __init__(self, api_client: client.ApiClient, timeout: Timeout) -> None:
+        self._informers = {
+            name: Informer(getattr(resource.api(api_client), resource.list_method), timeout)
+            for name, resource in RESOURCES.items()
+        }
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=informer.run, args=(self._stop,), name=name, daemon=True)
+            for name, informer in self._informers.items()
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def synced(self) -> bool:
+        return all(informer.synced.is_set() for informer in self._informers.values())
+
+    def snapshot(self) -> Snapshot:
+        # Without a lock across all informers, the objects of different resources may be of
+        # different resource versions. This is the same as with the separate lists of the
+        # special agent.
+        resource_versions = {}
+        objects = {}
+        for name, informer in self._informers.items():
+            resource_versions[name] = informer.resource_version
+            objects[name] = informer.objects()
+        return Snapshot(time.time(), resource_versions, objects)
+
+
+def write_snapshot(path: Path, snapshot: Snapshot) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.new")
+    with tmp_path.open("w") as f:
+        json.dump(
+            {
+                "timestamp": snapshot.timestamp,
+                "resource_versions": snapshot.resource_versions,
+                "objects": snapshot.objects,
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path, max_age: float) -> Optional[Snapshot]:
+    """The snapshot written by the collector, if it is up to date"""
+    try:
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        LOGGER.info("No informer snapshot found at %s", path)
+        return None
+    if age > max_age:
+        LOGGER.info("Informer snapshot %s is outdated (%d seconds old)", path, age)
+        return None
+
+    try:
+        raw_snapshot = json.loads(path.read_text())
+        snapshot = Snapshot(
+            raw_snapshot["timestamp"], raw_snapshot["resource_versions"], raw_snapshot["objects"]
+        )
+    except (ValueError, KeyError):
+        LOGGER.exception("Could not parse the informer snapshot %s", path)
+        return None
+    if set(snapshot.objects) != set(RESOURCES):
+        LOGGER.info("Informer snapshot %s is incomplete", path)
+        return None
+    return snapshot
+
+
+def run_collector(
+    api_client: client.ApiClient,
+    timeout: Timeout,
+    path: Path,
+    interval: float = SNAPSHOT_INTERVAL,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Keep the informer cache up to date and write its snapshot every interval seconds
+
+    The snapshot is only written while all informers are up to date. If nothing changed, only
+    the modification time of the file is updated, so the special agent can tell whether the
+    collector is still working.
+    """
+    stop = stop or threading.Event()
+    cache = InformerCache(api_client, timeout)
+    cache.start()
+    written_versions: Optional[Mapping[str, Optional[str]]] = None
+    try:
+        while not stop.wait(interval):
+            if not cache.synced():
+                LOGGER.info("Informers are not up to date, snapshot not written")
+                continue
+            snapshot = cache.snapshot()
+            if snapshot.resource_versions == written_versions:
+                os.utime(path)
+                continue
+            LOGGER.debug("Writing informer snapshot to %s", path)
+            write_snapshot(path, snapshot)
+            written_versions = snapshot.resource_versions
+    finally:
+        cache.stop()
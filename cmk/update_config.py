@@ -55,6 +55,7 @@ from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import VERBOSE
 from cmk.utils.regex import unescape
 from cmk.utils.store import load_from_mk_file, save_mk_file
+from cmk.utils.structured_data import StructuredDataStore
 from cmk.utils.type_defs import (
     CheckPluginName,
     ContactgroupName,
@@ -271,6 +272,7 @@ class UpdateConfig:
             (self._rewrite_bi_configuration, "Rewrite BI Configuration"),
             (self._adjust_user_attributes, "Set version specific user attributes"),
             (self._rewrite_py2_inventory_data, "Rewriting inventory data"),
+            (self._migrate_inventory_trees, "Migrate inventory trees to indexed files"),
             (self._migrate_pre_2_0_audit_log, "Migrate audit log"),
             (self._sanitize_audit_log, "Sanitize audit log (Werk #13330)"),
             (self._rename_discovered_host_label_files, "Rename discovered host label files"),
@@ -1298,6 +1300,8 @@ class UpdateConfig:
         return completed_process.returncode
 
     def _needs_to_be_converted(self, filepath: Path) -> Optional[Path]:
+        if StructuredDataStore.is_indexed_file(filepath):
+            return None
         with filepath.open(encoding="utf-8") as f:
             # Try to evaluate data with ast.literal_eval
             try:
@@ -1317,6 +1321,27 @@ class UpdateConfig:
             elif f.is_dir():
                 self._find_files_recursively(files, f)
 
+    def _migrate_inventory_trees(self) -> None:
+        # The current trees are provided by Livestatus, they get an indexed file next to them
+        migrations = [
+            (f, StructuredDataStore.write_index_file)
+            for f in Path(cmk.utils.paths.inventory_output_dir).glob("*")
+            if f.is_file() and not f.name.endswith(".gz") and not f.name.startswith(".")
+        ]
+        migrations += [
+            (f, StructuredDataStore.migrate_file)
+            for f in Path(cmk.utils.paths.inventory_archive_dir).glob("*/*")
+            if f.is_file()
+        ]
+
+        migrated = 0
+        for filepath, migrate in migrations:
+            try:
+                migrated += migrate(filepath)
+            except MKGeneralException as e:
+                self._logger.error("Failed to migrate inventory tree %s: %s", filepath, e)
+        self._logger.log(VERBOSE, "Migrated %d of %d inventory trees", migrated, len(migrations))
+
     def _migrate_pre_2_0_audit_log(self) -> None:
         old_path = Path(cmk.utils.paths.var_dir, "wato", "log", "audit.log")
         new_path = Path(cmk.utils.paths.var_dir, "wato", "log", "wato_audit.log")
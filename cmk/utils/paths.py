@@ -54,6 +54,7 @@ core_helper_config_dir = _omd_path("var/check_mk/core/helper_config")
 autochecks_dir = base_autochecks_dir
 precompiled_hostchecks_dir = _omd_path_str("var/check_mk/precompiled")
 snmpwalks_dir = _omd_path_str("var/check_mk/snmpwalks")
+snmpwalks_index_dir = _omd_path_str("var/check_mk/snmpwalks_index")
 counters_dir = _omd_path_str("tmp/check_mk/counters")
 tcp_cache_dir = _omd_path_str("tmp/check_mk/cache")
 data_source_cache_dir = _omd_path_str("tmp/check_mk/data_source_cache")
@@ -4,22 +4,29 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-import errno
+import bisect
 import logging
 import os
+import shutil
+import struct
 import tempfile
+import time
+from array import array
 from contextlib import suppress
 from pathlib import Path
 from typing import (
+    Collection,
     Container,
     Dict,
     Final,
     Iterable,
     Iterator,
+    List,
     Mapping,
     NamedTuple,
     Optional,
     Sequence,
+    Set,
     Tuple,
 )
 
@@ -27,6 +34,7 @@ import cmk.utils
 import cmk.utils.paths
 import cmk.utils.store as store
 import cmk.utils.translations
+from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import VERBOSE
 from cmk.utils.regex import regex
 from cmk.utils.render import Age
@@ -55,21 +63,233 @@ PiggybackTimeSettings = Sequence[_PiggybackTimeSetting]
 _PiggybackTimeSettingsMap = Mapping[Tuple[Optional[str], str], int]
 
 # ***** Terminology *****
-# "piggybacked_host_folder":
-# - tmp/check_mk/piggyback/HOST
+# "piggyback_index":
+# - tmp/check_mk/piggyback/.index
 #
-# "piggybacked_hostname":
-# - Path(tmp/check_mk/piggyback/HOST).name
+# "source_index":
+# - tmp/check_mk/piggyback/.sources/SOURCE
 #
-# "piggybacked_host_source":
-# - tmp/check_mk/piggyback/HOST/SOURCE
+# "piggyback_data_file":
+# - tmp/check_mk/piggyback/.data/SOURCE.SERIAL
 #
 # "source_state_file":
 # - tmp/check_mk/piggyback_sources/SOURCE
 #
 # "source_hostname":
-# - Path(tmp/check_mk/piggyback/HOST/SOURCE).name
 # - Path(tmp/check_mk/piggyback_sources/SOURCE).name
+#
+# Each time a source sends piggyback data, the data of all its piggybacked hosts is
+# written to one data file. The serial of the data file is the time of the update in
+# nanoseconds (see _SERIAL_RESOLUTION), it is also the modification time of the source
+# status file. The source index tells the piggybacked hosts where to find their data: It
+# has one entry per piggybacked host of the source with the serial of the data file and
+# the offset and length of the data. An update only replaces the index of its source.
+# The piggyback index lists the sources of each piggybacked host, its entries have no
+# data. It is only replaced when a source sends data of a new piggybacked host or when
+# data is removed.
+# Data of piggybacked hosts which were not part of the latest update of a source stays
+# in the older data files of the source, until it is removed by the cleanup.
+
+
+class _IndexEntry(NamedTuple):
+    piggybacked_hostname: HostName
+    source_hostname: HostName
+    serial: int
+    offset: int
+    length: int
+
+    @property
+    def timestamp(self) -> float:
+        return self.serial / 1e9
+
+
+# Serials are milliseconds (in nanoseconds): modification times may be rounded when they
+# are written, or restored from the tmpfs dump.
+_SERIAL_RESOLUTION = 1000000
+
+_INDEX_MAGIC = b"CMKPIGG\x01"
+# Written in native byte order, an index of another byte order is invalid
+_INDEX_BYTE_ORDER_MARK = 0x0102030405060708
+# magic, byte order mark, entries, size of the keys
+_INDEX_HEADER = struct.Struct("=8sQQQ")
+
+
+class _PiggybackIndex:
+    """Entries of piggybacked hosts, sorted by piggybacked host and source
+
+    After the header, the index consists of the sections
+
+    * start of each key in the keys (unsigned 64 bit, one more than entries),
+    * serials, offsets and lengths of the entries (unsigned 64 bit each),
+    * keys of the entries, the piggybacked host and the source separated by a null byte.
+
+    Each section starts at a multiple of 8 bytes. The entries of a piggybacked host are
+    found by a binary search on the keys, no other entry has to be read for a lookup.
+    """
+
+    _loaded: Dict[Path, Tuple[Tuple[int, ...], "_PiggybackIndex"]] = {}
+
+    def __init__(self, buf: bytes) -> None:
+        if not buf:
+            buf = self.serialize([])
+        if len(buf) < _INDEX_HEADER.size:
+            raise MKGeneralException("Invalid piggyback index")
+        magic, mark, num_entries, keys_size = _INDEX_HEADER.unpack_from(buf)
+        sections, size = self._sections(num_entries, keys_size)
+        if magic != _INDEX_MAGIC or mark != _INDEX_BYTE_ORDER_MARK or len(buf) != size:
+            raise MKGeneralException("Invalid piggyback index")
+        view = memoryview(buf)
+        self._num_entries = num_entries
+        self._key_starts = view[sections[0]].cast("Q")
+        self._serials = view[sections[1]].cast("Q")
+        self._offsets = view[sections[2]].cast("Q")
+        self._lengths = view[sections[3]].cast("Q")
+        # Copied once, slicing bytes is faster than slicing the view
+        self._keys = view[sections[4]].tobytes()
+
+    @staticmethod
+    def _sections(num_entries: int, keys_size: int) -> Tuple[Sequence[slice], int]:
+        sections = []
+        offset = _INDEX_HEADER.size
+        for size in [8 * (num_entries + 1)] + 3 * [8 * num_entries] + [keys_size]:
+            sections.append(slice(offset, offset + size))
+            offset += size + -size % 8
+        return sections, offset
+
+    @classmethod
+    def load(cls, path: Path) -> "_PiggybackIndex":
+        index = cls.load_if_exists(path)
+        return cls(b"") if index is None else index
+
+    @classmethod
+    def load_if_exists(cls, path: Path) -> Optional["_PiggybackIndex"]:
+        """The current index, the index of this process is reused as long as it is current
+
+        The index is replaced, never changed: the identity of the file tells whether it is
+        current. It is read as a whole, no file stays open for the indexes of the process.
+        An empty file (e.g. created by locking the index) is no index."""
+        try:
+            if (loaded := cls._loaded.get(path)) is not None and loaded[0] == _file_identity(
+                os.stat(path)
+            ):
+                return loaded[1]
+
+            with path.open("rb") as f:
+                identity = _file_identity(os.fstat(f.fileno()))
+                if identity[-1] == 0:
+                    return None
+                index = cls(f.read())
+        except FileNotFoundError:
+            return None
+
+        cls._loaded[path] = identity, index
+        return index
+
+    @staticmethod
+    def serialize(entries: Iterable[_IndexEntry]) -> bytes:
+        sorted_entries = sorted(
+            (b"%s\0%s" % (e.piggybacked_hostname.encode(), e.source_hostname.encode()), e)
+            for e in entries
+        )
+        key_starts = array("Q", [0])
+        for key, _entry in sorted_entries:
+            key_starts.append(key_starts[-1] + len(key))
+        keys = b"".join(key for key, _entry in sorted_entries)
+
+        sections = [
+            key_starts.tobytes(),
+            array("Q", [e.serial for _key, e in sorted_entries]).tobytes(),
+            array("Q", [e.offset for _key, e in sorted_entries]).tobytes(),
+            array("Q", [e.length for _key, e in sorted_entries]).tobytes(),
+            keys,
+        ]
+        return _INDEX_HEADER.pack(
+            _INDEX_MAGIC, _INDEX_BYTE_ORDER_MARK, len(sorted_entries), len(keys)
+        ) + b"".join(section + bytes(-len(section) % 8) for section in sections)
+
+    def _key(self, nr: int) -> bytes:
+        return self._keys[self._key_starts[nr] : self._key_starts[nr + 1]]
+
+    def _entry(self, nr: int) -> _IndexEntry:
+        piggybacked_hostname, source_hostname = self._key(nr).decode().split("\0")
+        return _IndexEntry(
+            HostName(piggybacked_hostname),
+            HostName(source_hostname),
+            self._serials[nr],
+            self._offsets[nr],
+            self._lengths[nr],
+        )
+
+    def __iter__(self) -> Iterator[_IndexEntry]:
+        return (self._entry(nr) for nr in range(self._num_entries))
+
+    def entries(self, piggybacked_hostname: HostName) -> Sequence[_IndexEntry]:
+        prefix = b"%s\0" % piggybacked_hostname.encode()
+        low = bisect.bisect_left(range(self._num_entries), prefix, key=self._key)
+        entries = []
+        while low < self._num_entries and self._key(low).startswith(prefix):
+            entries.append(self._entry(low))
+            low += 1
+        return entries
+
+
+def _file_identity(stat_result: os.stat_result) -> Tuple[int, ...]:
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _save_piggyback_index(path: Path, entries: Iterable[_IndexEntry]) -> None:
+    store.save_bytes_to_file(path, _PiggybackIndex.serialize(entries))
+
+
+def _load_piggyback_index() -> _PiggybackIndex:
+    """The piggyback index, it is created if it does not exist yet"""
+    path = _get_piggyback_index_path()
+    if (index := _PiggybackIndex.load_if_exists(path)) is not None:
+        return index
+
+    # Like everywhere else, the locks of the sources are not taken while the piggyback
+    # index is locked
+    store.makedirs(_get_source_index_dir())
+    source_hostnames = _migrate_legacy_piggybacked_host_folders()
+    with store.locked(path):
+        # The lock creates an empty file
+        if not path.stat().st_size:
+            _create_piggyback_index()
+            source_hostnames = []
+    # Another process has created the index in the meantime
+    if source_hostnames:
+        _update_piggyback_index(source_hostnames)
+    return _PiggybackIndex.load(path)
+
+
+def _update_piggyback_index(source_hostnames: Collection[HostName]) -> None:
+    """Replace the entries of the sources by the piggybacked hosts of their source index"""
+    path = _get_piggyback_index_path()
+    with store.locked(path):
+        entries = [
+            e for e in _PiggybackIndex.load(path) if e.source_hostname not in source_hostnames
+        ]
+        for source_hostname in source_hostnames:
+            entries.extend(
+                _IndexEntry(e.piggybacked_hostname, source_hostname, 0, 0, 0)
+                for e in _PiggybackIndex.load(_get_source_index_path(source_hostname))
+            )
+        _save_piggyback_index(path, entries)
+
+
+def _get_entries(piggybacked_hostname: HostName) -> Sequence[_IndexEntry]:
+    return [
+        entry
+        for source_entry in _load_piggyback_index().entries(piggybacked_hostname)
+        for entry in _PiggybackIndex.load(
+            _get_source_index_path(source_entry.source_hostname)
+        ).entries(piggybacked_hostname)
+    ]
+
+
+def _get_all_entries() -> Iterator[_IndexEntry]:
+    for source_hostname in sorted({e.source_hostname for e in _load_piggyback_index()}):
+        yield from _PiggybackIndex.load(_get_source_index_path(source_hostname))
 
 
 def get_piggyback_raw_data(
@@ -85,24 +305,44 @@ def get_piggyback_raw_data(
     if not piggybacked_hostname:
         return []
 
-    piggyback_file_infos = _get_piggyback_processed_file_infos(piggybacked_hostname, time_settings)
-    if not piggyback_file_infos:
-        logger.log(
-            VERBOSE,
-            "No piggyback files for '%s'. Skip processing.",
-            piggybacked_hostname,
+    for attempt in range(2):
+        piggyback_file_infos = _get_piggyback_processed_file_infos(
+            piggybacked_hostname, time_settings
         )
-        return []
+        if not piggyback_file_infos:
+            logger.log(
+                VERBOSE,
+                "No piggyback files for '%s'. Skip processing.",
+                piggybacked_hostname,
+            )
+            return []
 
+        try:
+            return _read_piggyback_raw_data(piggyback_file_infos, raise_vanished=attempt == 0)
+        except FileNotFoundError:
+            # A source has sent new data since the index was read and the data file has been
+            # removed, the new index points to the new data file.
+            continue
+    return []
+
+
+def _read_piggyback_raw_data(
+    piggyback_file_infos: Iterable[Tuple[PiggybackFileInfo, _IndexEntry]],
+    *,
+    raise_vanished: bool,
+) -> Sequence[PiggybackRawDataInfo]:
     piggyback_data = []
-    for file_info in piggyback_file_infos:
+    for file_info, entry in piggyback_file_infos:
         try:
             # Raw data is always stored as bytes. Later the content is
             # converted to unicode in abstact.py:_parse_info which respects
             # 'encoding' in section options.
-            raw_data = AgentRawData(store.load_bytes_from_file(file_info.file_path))
+            with file_info.file_path.open("rb") as f:
+                raw_data = AgentRawData(os.pread(f.fileno(), entry.length, entry.offset))
 
         except IOError as e:
+            if raise_vanished and isinstance(e, FileNotFoundError):
+                raise
             reason = "Cannot read piggyback raw data from source '%s'" % file_info.source_hostname
             piggyback_raw_data = PiggybackRawDataInfo(
                 PiggybackFileInfo(
@@ -149,16 +389,15 @@ def get_source_and_piggyback_hosts(
     time_settings: PiggybackTimeSettings,
 ) -> Iterator[Tuple[HostName, HostName]]:
     """Generates all piggyback pig/piggybacked host pairs that have up-to-date data"""
-
-    # Pylint bug (https://github.com/PyCQA/pylint/issues/1660). Fixed with pylint 2.x
-    for piggybacked_host_folder in _get_piggybacked_host_folders():
-        for file_info in _get_piggyback_processed_file_infos(
-            HostName(piggybacked_host_folder.name),
-            time_settings,
+    for piggybacked_hostname, entries in _get_entries_by_piggybacked_host(
+        _get_all_entries()
+    ).items():
+        for file_info, _entry in _get_processed_file_infos_of(
+            piggybacked_hostname, entries, time_settings
         ):
             if not file_info.successfully_processed:
                 continue
-            yield HostName(file_info.source_hostname), HostName(piggybacked_host_folder.name)
+            yield HostName(file_info.source_hostname), piggybacked_hostname
 
 
 def has_piggyback_raw_data(
@@ -167,7 +406,7 @@ def has_piggyback_raw_data(
 ) -> bool:
     return any(
         fi.successfully_processed
-        for fi in _get_piggyback_processed_file_infos(piggybacked_hostname, time_settings)
+        for fi, _entry in _get_piggyback_processed_file_infos(piggybacked_hostname, time_settings)
     )
 
 
@@ -232,41 +471,52 @@ class _TimeSettingsMap:
 def _get_piggyback_processed_file_infos(
     piggybacked_hostname: HostName,
     time_settings: PiggybackTimeSettings,
-) -> Sequence[PiggybackFileInfo]:
-    """Gather a list of piggyback files to read for further processing.
+) -> Sequence[Tuple[PiggybackFileInfo, _IndexEntry]]:
+    """Gather a list of piggyback data to read for further processing.
 
     Please note that there may be multiple parallel calls executing the
     _get_piggyback_processed_file_infos(), store_piggyback_raw_data() or cleanup_piggyback_files()
-    functions. Therefor all these functions needs to deal with suddenly vanishing or
-    updated files/directories.
+    functions. The index is replaced atomically, but the data files it refers to may vanish
+    before they are read.
     """
-    source_hostnames = get_source_hostnames(piggybacked_hostname)
-    expanded_time_settings = _TimeSettingsMap(source_hostnames, piggybacked_hostname, time_settings)
+    return _get_processed_file_infos_of(
+        piggybacked_hostname,
+        _get_entries(piggybacked_hostname),
+        time_settings,
+    )
+
+
+def _get_processed_file_infos_of(
+    piggybacked_hostname: HostName,
+    entries: Sequence[_IndexEntry],
+    time_settings: PiggybackTimeSettings,
+) -> Sequence[Tuple[PiggybackFileInfo, _IndexEntry]]:
+    expanded_time_settings = _TimeSettingsMap(
+        [entry.source_hostname for entry in entries], piggybacked_hostname, time_settings
+    )
     return [
-        _get_piggyback_processed_file_info(
-            source_hostname,
-            piggybacked_hostname,
-            _get_piggybacked_file_path(source_hostname, piggybacked_hostname),
-            expanded_time_settings,
-        )
-        for source_hostname in source_hostnames
-        if not source_hostname.startswith(".")
+        (_get_piggyback_processed_file_info(entry, expanded_time_settings), entry)
+        for entry in entries
     ]
 
 
+def _get_entries_by_piggybacked_host(
+    entries: Iterable[_IndexEntry],
+) -> Mapping[HostName, Sequence[_IndexEntry]]:
+    entries_by_piggybacked_host: Dict[HostName, List[_IndexEntry]] = {}
+    for entry in entries:
+        entries_by_piggybacked_host.setdefault(entry.piggybacked_hostname, []).append(entry)
+    return entries_by_piggybacked_host
+
+
 def _get_piggyback_processed_file_info(
-    source_hostname: HostName,
-    piggybacked_hostname: HostName,
-    piggyback_file_path: Path,
+    entry: _IndexEntry,
     settings: _TimeSettingsMap,
 ) -> PiggybackFileInfo:
-
-    try:
-        file_age = cmk.utils.cachefile_age(piggyback_file_path)
-    except FileNotFoundError:
-        return PiggybackFileInfo(
-            source_hostname, piggyback_file_path, False, "Piggyback file is missing", 0
-        )
+    source_hostname = entry.source_hostname
+    piggybacked_hostname = entry.piggybacked_hostname
+    piggyback_file_path = _get_piggyback_data_file_path(source_hostname, entry.serial)
+    file_age = time.time() - entry.timestamp
 
     if (outdated := file_age - settings.max_cache_age(source_hostname, piggybacked_hostname)) > 0:
         return PiggybackFileInfo(
@@ -280,8 +530,9 @@ def _get_piggyback_processed_file_info(
     validity_period = settings.validity_period(source_hostname, piggybacked_hostname)
     validity_state = settings.validity_state(source_hostname, piggybacked_hostname)
 
-    status_file_path = _get_source_status_file_path(source_hostname)
-    if not status_file_path.exists():
+    try:
+        status_file_serial = os.stat(_get_source_status_file_path(source_hostname)).st_mtime_ns
+    except FileNotFoundError:
         valid_msg = _validity_period_message(file_age, validity_period)
         return PiggybackFileInfo(
             source_hostname,
@@ -291,7 +542,7 @@ def _get_piggyback_processed_file_info(
             validity_state if valid_msg else 0,
         )
 
-    if _is_piggyback_file_outdated(status_file_path, piggyback_file_path):
+    if round(status_file_serial / _SERIAL_RESOLUTION) > entry.serial // _SERIAL_RESOLUTION:
         valid_msg = _validity_period_message(file_age, validity_period)
         return PiggybackFileInfo(
             source_hostname,
@@ -319,20 +570,6 @@ def _validity_period_message(
     return f" (still valid, {Age(time_left)} left)"
 
 
-def _is_piggyback_file_outdated(
-    status_file_path: Path,
-    piggyback_file_path: Path,
-) -> bool:
-    try:
-        # TODO use Path.stat() but be aware of:
-        # On POSIX platforms Python reads atime and mtime at nanosecond resolution
-        # but only writes them at microsecond resolution.
-        # (We're using os.utime() in _store_status_file_of())
-        return os.stat(str(status_file_path))[8] > os.stat(str(piggyback_file_path))[8]
-    except FileNotFoundError:
-        return True
-
-
 def _remove_piggyback_file(piggyback_file_path: Path) -> bool:
     try:
         piggyback_file_path.unlink()
@@ -352,47 +589,82 @@ def store_piggyback_raw_data(
     source_hostname: HostName,
     piggybacked_raw_data: Mapping[HostName, Sequence[bytes]],
 ) -> None:
-    piggyback_file_paths = []
-    for piggybacked_hostname, lines in piggybacked_raw_data.items():
-        piggyback_file_path = _get_piggybacked_file_path(source_hostname, piggybacked_hostname)
-        logger.log(
-            VERBOSE,
-            "Storing piggyback data for: %s",
-            piggybacked_hostname,
-        )
-        # Raw data is always stored as bytes. Later the content is
-        # converted to unicode in abstact.py:_parse_info which respects
-        # 'encoding' in section options.
-        store.save_bytes_to_file(piggyback_file_path, b"%s\n" % b"\n".join(lines))
-        piggyback_file_paths.append(piggyback_file_path)
-
     # Store the last contact with this piggyback source to be able to filter outdated data later
     # We use the mtime of this file later for comparison.
     # Only do this for hosts that sent piggyback data this turn, cleanup the status file when no
     # piggyback data was sent this turn.
-    if piggybacked_raw_data:
-        logger.log(VERBOSE, "Received piggyback data for %d hosts", len(piggybacked_raw_data))
-
-        status_file_path = _get_source_status_file_path(source_hostname)
-        _store_status_file_of(status_file_path, piggyback_file_paths)
-    else:
+    if not piggybacked_raw_data:
         logger.debug("Received no piggyback data")
         remove_source_status_file(source_hostname)
+        return
+
+    _load_piggyback_index()
+    source_index_path = _get_source_index_path(source_hostname)
+    store.makedirs(source_index_path.parent)
+    with store.locked(source_index_path):
+        entries = list(_PiggybackIndex.load(source_index_path))
+        serial = max(
+            [int(time.time() * 1e9) // _SERIAL_RESOLUTION * _SERIAL_RESOLUTION]
+            + [e.serial + _SERIAL_RESOLUTION for e in entries]
+        )
 
+        updated_entries = []
+        chunks = []
+        offset = 0
+        for piggybacked_hostname, lines in piggybacked_raw_data.items():
+            logger.log(
+                VERBOSE,
+                "Storing piggyback data for: %s",
+                piggybacked_hostname,
+            )
+            # Raw data is always stored as bytes. Later the content is
+            # converted to unicode in abstact.py:_parse_info which respects
+            # 'encoding' in section options.
+            chunk = b"%s\n" % b"\n".join(lines)
+            updated_entries.append(
+                _IndexEntry(piggybacked_hostname, source_hostname, serial, offset, len(chunk))
+            )
+            chunks.append(chunk)
+            offset += len(chunk)
+
+        store.makedirs(_get_piggyback_data_dir())
+        store.save_bytes_to_file(
+            _get_piggyback_data_file_path(source_hostname, serial), b"".join(chunks)
+        )
+        _save_source_index(
+            source_hostname,
+            entries,
+            updated_entries
+            + [e for e in entries if e.piggybacked_hostname not in piggybacked_raw_data],
+        )
+
+        logger.log(VERBOSE, "Received piggyback data for %d hosts", len(piggybacked_raw_data))
+        _store_status_file_of(_get_source_status_file_path(source_hostname), serial)
 
-def _store_status_file_of(
-    status_file_path: Path,
-    piggyback_file_paths: Iterable[Path],
+
+def _save_source_index(
+    source_hostname: HostName,
+    entries: Sequence[_IndexEntry],
+    updated_entries: Sequence[_IndexEntry],
 ) -> None:
+    """Replace the entries of the source index, the data files of the replaced entries are
+    removed
+
+    The piggyback index is only updated if the piggybacked hosts of the source changed."""
+    _save_piggyback_index(_get_source_index_path(source_hostname), updated_entries)
+    if {e.piggybacked_hostname for e in entries} != {
+        e.piggybacked_hostname for e in updated_entries
+    }:
+        _update_piggyback_index([source_hostname])
+    for serial in {e.serial for e in entries} - {e.serial for e in updated_entries}:
+        _remove_piggyback_file(_get_piggyback_data_file_path(source_hostname, serial))
+
+
+def _store_status_file_of(status_file_path: Path, serial: int) -> None:
     store.makedirs(status_file_path.parent)
 
-    # Cannot use store.save_bytes_to_file like:
-    # 1. store.save_bytes_to_file(status_file_path, b"")
-    # 2. set utime of piggybacked host files
-    # Between 1. and 2.:
-    # - the piggybacked host may check its files
-    # - status file is newer (before utime of piggybacked host files is set)
-    # => piggybacked host file is outdated
+    # The modification time of the status file is the serial of the latest data of the source.
+    # Set it before the status file is visible, data of older serials is outdated.
     with tempfile.NamedTemporaryFile(
         "wb",
         dir=str(status_file_path.parent),
@@ -402,21 +674,84 @@ def _store_status_file_of(
         tmp_path = tmp.name
         os.chmod(tmp_path, 0o660)
         tmp.write(b"")
-
-        tmp_stats = os.stat(tmp_path)
-        status_file_times = (tmp_stats.st_atime, tmp_stats.st_mtime)
-        for piggyback_file_path in piggyback_file_paths:
-            try:
-                # TODO use Path.stat() but be aware of:
-                # On POSIX platforms Python reads atime and mtime at nanosecond resolution
-                # but only writes them at microsecond resolution.
-                # (We're using os.utime() in _store_status_file_of())
-                os.utime(str(piggyback_file_path), status_file_times)
-            except FileNotFoundError:
-                continue
+    os.utime(tmp_path, ns=(serial, serial))
     os.rename(tmp_path, str(status_file_path))
 
 
+def remove_piggybacked_host_data(piggybacked_hostname: HostName) -> None:
+    """Remove the piggyback data of a host from all sources, e.g. when the host is deleted"""
+    for source_entry in _load_piggyback_index().entries(piggybacked_hostname):
+        source_index_path = _get_source_index_path(source_entry.source_hostname)
+        with store.locked(source_index_path):
+            entries = list(_PiggybackIndex.load(source_index_path))
+            _save_source_index(
+                source_entry.source_hostname,
+                entries,
+                [e for e in entries if e.piggybacked_hostname != piggybacked_hostname],
+            )
+
+
+def rename_piggyback_host(oldname: HostName, newname: HostName) -> Tuple[bool, int]:
+    """Move the piggyback data of a renamed host, it replaces the data of the new name
+
+    Returns whether there was piggyback data for the host and the number of piggybacked
+    hosts the host was the source of."""
+    index = _load_piggyback_index()
+    has_piggyback_data = bool(index.entries(oldname))
+    source_entries = list(_PiggybackIndex.load(_get_source_index_path(oldname)))
+    if not has_piggyback_data and not source_entries:
+        return False, 0
+
+    def rename(entries: Iterable[_IndexEntry]) -> Sequence[_IndexEntry]:
+        return [
+            entry._replace(
+                piggybacked_hostname=(
+                    newname if entry.piggybacked_hostname == oldname else entry.piggybacked_hostname
+                )
+            )
+            for entry in entries
+            if not has_piggyback_data or entry.piggybacked_hostname != newname
+        ]
+
+    # The data of the host as a source is moved below
+    sources_of_host = (
+        {e.source_hostname for e in [*index.entries(oldname), *index.entries(newname)]}
+        if has_piggyback_data
+        else set()
+    )
+    for source_hostname in sorted(
+        sources_of_host - ({oldname, newname} if source_entries else set())
+    ):
+        source_index_path = _get_source_index_path(source_hostname)
+        with store.locked(source_index_path):
+            entries = list(_PiggybackIndex.load(source_index_path))
+            _save_source_index(source_hostname, entries, rename(entries))
+
+    if source_entries:
+        old_index_path = _get_source_index_path(oldname)
+        new_index_path = _get_source_index_path(newname)
+        with store.locked(min(old_index_path, new_index_path)), store.locked(
+            max(old_index_path, new_index_path)
+        ):
+            source_entries = list(_PiggybackIndex.load(old_index_path))
+            for serial in {e.serial for e in _PiggybackIndex.load(new_index_path)}:
+                _remove_piggyback_file(_get_piggyback_data_file_path(newname, serial))
+            for serial in {e.serial for e in source_entries}:
+                with suppress(FileNotFoundError):
+                    os.rename(
+                        _get_piggyback_data_file_path(oldname, serial),
+                        _get_piggyback_data_file_path(newname, serial),
+                    )
+            _save_piggyback_index(
+                new_index_path,
+                [e._replace(source_hostname=newname) for e in rename(source_entries)],
+            )
+            _save_piggyback_index(old_index_path, [])
+            _update_piggyback_index([oldname, newname])
+
+    return has_piggyback_data, len(source_entries)
+
+
 #   .--folders/files-------------------------------------------------------.
 #   |         __       _     _                  ____ _ _                   |
 #   |        / _| ___ | | __| | ___ _ __ ___   / / _(_) | ___  ___         |
@@ -428,19 +763,10 @@ def _store_status_file_of(
 
 
 def get_source_hostnames(piggybacked_hostname: Optional[HostName] = None) -> Sequence[HostName]:
+    index = _load_piggyback_index()
     if piggybacked_hostname is None:
-        return [
-            HostName(source_host.name)
-            for piggybacked_host_folder in _get_piggybacked_host_folders()
-            for source_host in _files_in(piggybacked_host_folder)
-        ]
-
-    piggybacked_host_folder = cmk.utils.paths.piggyback_dir / Path(piggybacked_hostname)
-    return [HostName(source_host.name) for source_host in _files_in(piggybacked_host_folder)]
-
-
-def _get_piggybacked_host_folders() -> Sequence[Path]:
-    return _files_in(cmk.utils.paths.piggyback_dir)
+        return [entry.source_hostname for entry in index]
+    return [entry.source_hostname for entry in index.entries(piggybacked_hostname)]
 
 
 def _get_source_state_files() -> Sequence[Path]:
@@ -458,11 +784,24 @@ def _get_source_status_file_path(source_hostname: HostName) -> Path:
     return cmk.utils.paths.piggyback_source_dir / str(source_hostname)
 
 
-def _get_piggybacked_file_path(
-    source_hostname: HostName,
-    piggybacked_hostname: HostName,
-) -> Path:
-    return cmk.utils.paths.piggyback_dir / piggybacked_hostname / source_hostname
+def _get_piggyback_index_path() -> Path:
+    return cmk.utils.paths.piggyback_dir / ".index"
+
+
+def _get_source_index_dir() -> Path:
+    return cmk.utils.paths.piggyback_dir / ".sources"
+
+
+def _get_source_index_path(source_hostname: HostName) -> Path:
+    return cmk.utils.paths.piggyback_dir.joinpath(".sources", source_hostname)
+
+
+def _get_piggyback_data_dir() -> Path:
+    return cmk.utils.paths.piggyback_dir / ".data"
+
+
+def _get_piggyback_data_file_path(source_hostname: HostName, serial: int) -> Path:
+    return cmk.utils.paths.piggyback_dir.joinpath(".data", f"{source_hostname}.{serial}")
 
 
 # .
@@ -480,7 +819,7 @@ def cleanup_piggyback_files(time_settings: PiggybackTimeSettings) -> None:
     """This is a housekeeping job to clean up different old files from the
     piggyback directories.
 
-    # Source status files and/or piggybacked data files are cleaned up/deleted
+    # Source status files and/or piggybacked data are cleaned up/deleted
     # if and only if they have exceeded the maximum cache age configured in the
     # global settings or in the rule 'Piggybacked Host Files'."""
 
@@ -490,50 +829,47 @@ def cleanup_piggyback_files(time_settings: PiggybackTimeSettings) -> None:
         time_settings,
     )
 
-    piggybacked_hosts_settings = _get_piggybacked_hosts_settings(time_settings)
+    # Folders of the former layout are moved when the index is created. Move the ones of
+    # processes which were still running since then.
+    _load_piggyback_index()
+    if source_hostnames := _migrate_legacy_piggybacked_host_folders():
+        _update_piggyback_index(source_hostnames)
+
+    entries_by_piggybacked_host = _get_entries_by_piggybacked_host(_get_all_entries())
+    piggybacked_hosts_settings = [
+        (
+            entries,
+            _TimeSettingsMap([e.source_hostname for e in entries], hostname, time_settings),
+        )
+        for hostname, entries in entries_by_piggybacked_host.items()
+    ]
 
     _cleanup_old_source_status_files(piggybacked_hosts_settings)
-    _cleanup_old_piggybacked_files(piggybacked_hosts_settings)
-
-
-def _get_piggybacked_hosts_settings(
-    time_settings: PiggybackTimeSettings,
-) -> Sequence[Tuple[Path, Sequence[Path], _TimeSettingsMap]]:
-    piggybacked_hosts_settings = []
-    for piggybacked_host_folder in _get_piggybacked_host_folders():
-        source_hosts = _files_in(piggybacked_host_folder)
-        time_settings_map = _TimeSettingsMap(
-            [HostName(source_host.name) for source_host in source_hosts],
-            HostName(piggybacked_host_folder.name),
-            time_settings,
-        )
-        piggybacked_hosts_settings.append(
-            (piggybacked_host_folder, source_hosts, time_settings_map)
-        )
-    return piggybacked_hosts_settings
+    _cleanup_old_piggybacked_data(piggybacked_hosts_settings)
+    _cleanup_unreferenced_data_files()
 
 
 def _cleanup_old_source_status_files(
-    piggybacked_hosts_settings: Iterable[Tuple[Path, Iterable[Path], _TimeSettingsMap]]
+    piggybacked_hosts_settings: Iterable[Tuple[Iterable[_IndexEntry], _TimeSettingsMap]]
 ) -> None:
     """Remove source status files which exceed configured maximum cache age.
     There may be several 'Piggybacked Host Files' rules where the max age is configured.
     We simply use the greatest one per source."""
 
     max_cache_age_by_sources: Dict[str, int] = {}
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for source_host in source_hosts:
+    for entries, time_settings in piggybacked_hosts_settings:
+        for entry in entries:
             max_cache_age = time_settings.max_cache_age(
-                HostName(source_host.name),
-                HostName(piggybacked_host_folder.name),
+                entry.source_hostname,
+                entry.piggybacked_hostname,
             )
 
-            max_cache_age_of_source = max_cache_age_by_sources.get(source_host.name)
+            max_cache_age_of_source = max_cache_age_by_sources.get(entry.source_hostname)
             if max_cache_age_of_source is None:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[entry.source_hostname] = max_cache_age
 
             elif max_cache_age >= max_cache_age_of_source:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[entry.source_hostname] = max_cache_age
 
     for source_state_file in _get_source_state_files():
         try:
@@ -561,39 +897,133 @@ def _cleanup_old_source_status_files(
             _remove_piggyback_file(source_state_file)
 
 
-def _cleanup_old_piggybacked_files(
-    piggybacked_hosts_settings: Iterable[Tuple[Path, Iterable[Path], _TimeSettingsMap]]
+def _cleanup_old_piggybacked_data(
+    piggybacked_hosts_settings: Iterable[Tuple[Iterable[_IndexEntry], _TimeSettingsMap]]
 ) -> None:
-    """Remove piggybacked data files which exceed configured maximum cache age."""
-
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for piggybacked_host_source in source_hosts:
-            file_info = _get_piggyback_processed_file_info(
-                HostName(piggybacked_host_source.name),
-                HostName(piggybacked_host_folder.name),
-                piggybacked_host_source,
-                time_settings,
-            )
+    """Remove piggybacked data which exceeds configured maximum cache age.
 
-            if not file_info.successfully_processed:
-                logger.log(
-                    VERBOSE,
-                    "Piggyback file '%s' is outdated (%s). Remove it.",
-                    piggybacked_host_source,
-                    file_info.message,
-                )
-                _remove_piggyback_file(piggybacked_host_source)
+    The data is removed from the index of its source, data files without any data of the
+    index are deleted."""
 
-        # Remove empty backed host directory
-        try:
-            piggybacked_host_folder.rmdir()
-        except OSError as e:
-            if e.errno == errno.ENOTEMPTY:
+    outdated_entries_by_source: Dict[HostName, Set[_IndexEntry]] = {}
+    for entries, time_settings in piggybacked_hosts_settings:
+        for entry in entries:
+            file_info = _get_piggyback_processed_file_info(entry, time_settings)
+            if file_info.successfully_processed:
                 continue
-            raise
-        else:
             logger.log(
                 VERBOSE,
-                "Piggyback folder '%s' is empty. Removed it.",
-                piggybacked_host_folder,
+                "Piggyback data of '%s' from '%s' is outdated (%s). Remove it.",
+                entry.piggybacked_hostname,
+                entry.source_hostname,
+                file_info.message,
             )
+            outdated_entries_by_source.setdefault(entry.source_hostname, set()).add(entry)
+
+    for source_hostname, outdated_entries in outdated_entries_by_source.items():
+        source_index_path = _get_source_index_path(source_hostname)
+        with store.locked(source_index_path):
+            # Data sent since the index was read is kept
+            entries = list(_PiggybackIndex.load(source_index_path))
+            _save_source_index(
+                source_hostname, entries, [e for e in entries if e not in outdated_entries]
+            )
+
+
+def _cleanup_unreferenced_data_files() -> None:
+    """Remove the data files the index of their source does not refer to
+
+    They are left behind when the data of a source could not be stored completely."""
+    data_file_paths_by_source: Dict[HostName, List[Path]] = {}
+    for data_file_path in _files_in(_get_piggyback_data_dir()):
+        data_file_paths_by_source.setdefault(
+            HostName(data_file_path.name.rsplit(".", 1)[0]), []
+        ).append(data_file_path)
+
+    for source_hostname, data_file_paths in data_file_paths_by_source.items():
+        source_index_path = _get_source_index_path(source_hostname)
+        with store.locked(source_index_path):
+            referenced = {
+                _get_piggyback_data_file_path(source_hostname, e.serial)
+                for e in _PiggybackIndex.load(source_index_path)
+            }
+            for data_file_path in data_file_paths:
+                if data_file_path in referenced:
+                    continue
+                logger.log(
+                    VERBOSE, "Piggyback data file '%s' is not used. Remove it.", data_file_path
+                )
+                _remove_piggyback_file(data_file_path)
+
+
+def _migrate_legacy_piggybacked_host_folders() -> Collection[HostName]:
+    """Move the piggyback data of the former layout to the index of its source
+
+    The data of each piggybacked host and source was stored in
+    tmp/check_mk/piggyback/PIGGYBACKED_HOST/SOURCE, with the modification time of the
+    source status file of its update. Data of the index is newer and is kept. Returns the
+    sources of the moved data."""
+    legacy_data: Dict[HostName, Dict[int, Dict[HostName, bytes]]] = {}
+    piggybacked_host_folders = _files_in(cmk.utils.paths.piggyback_dir)
+    for piggybacked_host_folder in piggybacked_host_folders:
+        for source_file in _files_in(piggybacked_host_folder):
+            with suppress(FileNotFoundError):
+                serial = round(source_file.stat().st_mtime_ns / _SERIAL_RESOLUTION)
+                legacy_data.setdefault(HostName(source_file.name), {}).setdefault(
+                    serial * _SERIAL_RESOLUTION, {}
+                )[HostName(piggybacked_host_folder.name)] = source_file.read_bytes()
+
+    store.makedirs(_get_piggyback_data_dir())
+    for source_hostname, data_by_serial in legacy_data.items():
+        logger.log(VERBOSE, "Move the piggyback data of source '%s' to the index", source_hostname)
+        source_index_path = _get_source_index_path(source_hostname)
+        with store.locked(source_index_path):
+            entries = list(_PiggybackIndex.load(source_index_path))
+            piggybacked_hostnames = {e.piggybacked_hostname for e in entries}
+            serials = {e.serial for e in entries}
+            updated_entries = list(entries)
+            for serial, raw_data in sorted(data_by_serial.items()):
+                chunks = []
+                offset = 0
+                if serial in serials:
+                    # The serial is the time of the data, the data is added to the data file
+                    # of the index with the same serial
+                    try:
+                        chunks.append(
+                            _get_piggyback_data_file_path(source_hostname, serial).read_bytes()
+                        )
+                        offset = len(chunks[0])
+                    except FileNotFoundError:
+                        updated_entries = [e for e in updated_entries if e.serial != serial]
+                num_entries = len(updated_entries)
+                for piggybacked_hostname, chunk in raw_data.items():
+                    if piggybacked_hostname in piggybacked_hostnames:
+                        continue
+                    updated_entries.append(
+                        _IndexEntry(
+                            piggybacked_hostname, source_hostname, serial, offset, len(chunk)
+                        )
+                    )
+                    chunks.append(chunk)
+                    offset += len(chunk)
+                if len(updated_entries) > num_entries:
+                    store.save_bytes_to_file(
+                        _get_piggyback_data_file_path(source_hostname, serial), b"".join(chunks)
+                    )
+            _save_piggyback_index(source_index_path, updated_entries)
+
+    for piggybacked_host_folder in piggybacked_host_folders:
+        shutil.rmtree(piggybacked_host_folder, ignore_errors=True)
+    return list(legacy_data)
+
+
+def _create_piggyback_index() -> None:
+    """Create the piggyback index from the source indexes"""
+    _save_piggyback_index(
+        _get_piggyback_index_path(),
+        [
+            _IndexEntry(e.piggybacked_hostname, HostName(source_index_path.name), 0, 0, 0)
+            for source_index_path in _files_in(_get_source_index_dir())
+            for e in _PiggybackIndex.load(source_index_path)
+        ],
+    )
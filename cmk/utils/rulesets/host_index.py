@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Precomputed host lookup structures for the ruleset matching
+
+Each host is assigned a bit position. All host sets are then represented as
+plain Python integers, which makes the intersection of the different rule
+conditions (folder, tags, labels, explicit host names) a matter of a few
+bitwise operations instead of a per host evaluation of every rule condition.
+"""
+
+import bisect
+from itertools import compress
+from typing import Callable, cast, Dict, Iterable, List, Set, Tuple
+
+from cmk.utils.regex import regex
+from cmk.utils.type_defs import (
+    HostName,
+    HostOrServiceConditionsSimple,
+    Labels,
+    TagConditionNE,
+    TagConditionNOR,
+    TagConditionOR,
+    TaggroupID,
+    TaggroupIDToTagCondition,
+    TagID,
+)
+
+HostMask = int
+
+# Used to convert the binary representation of a mask into a selector for itertools.compress
+_BIN_TO_SELECTOR = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class HostConditionIndex:
+    """Inverted indexes from the host attributes used in rule conditions to host masks
+
+    * tag index: (tag group, tag) -> hosts having this tag
+    * folder index: the folder paths sorted lexicographically, which makes the hosts of a
+      folder (including its subfolders) a contiguous range of paths
+    * label index: label name -> label value -> hosts, filled lazily because computing the
+      effective labels of a host is expensive
+    * name index: host name -> bit
+    """
+
+    def __init__(
+        self,
+        host_tags: Dict[HostName, Set[Tuple[TaggroupID, TagID]]],
+        host_paths: Dict[HostName, str],
+        labels_of_host: Callable[[HostName], Labels],
+    ) -> None:
+        super().__init__()
+        self._host_tags = host_tags
+        self._host_paths = host_paths
+        self._labels_of_host = labels_of_host
+
+        self._hosts: List[HostName] = []
+        self._bit_of_host: Dict[HostName, int] = {}
+
+        self._tag_masks: Dict[Tuple[TaggroupID, TagID], HostMask] = {}
+        self._path_masks: Dict[str, HostMask] = {}
+        self._sorted_paths: List[str] = []
+        self._folder_masks: Dict[str, HostMask] = {}
+
+        self._label_masks: Dict[str, Dict[str, HostMask]] = {}
+        self._labels_indexed: HostMask = 0
+
+        self.add_hosts(sorted(host_tags))
+
+    def add_hosts(self, hostnames: Iterable[HostName]) -> None:
+        """Assign bits to hosts which are not known to the index yet"""
+        added = False
+        for hostname in hostnames:
+            if hostname in self._bit_of_host:
+                continue
+
+            bit = 1 << len(self._hosts)
+            self._bit_of_host[hostname] = len(self._hosts)
+            self._hosts.append(hostname)
+            added = True
+
+            for tag in self._host_tags.get(hostname, ()):
+                self._tag_masks[tag] = self._tag_masks.get(tag, 0) | bit
+
+            path = self._host_paths.get(hostname, "/")
+            self._path_masks[path] = self._path_masks.get(path, 0) | bit
+
+        if added:
+            self._sorted_paths = sorted(self._path_masks)
+            self._folder_masks.clear()
+
+    def clear_label_index(self) -> None:
+        self._label_masks.clear()
+        self._labels_indexed = 0
+
+    def mask_of(self, hostnames: Iterable[HostName]) -> HostMask:
+        hostnames = list(hostnames)
+        self.add_hosts(hostnames)
+        mask = 0
+        for hostname in hostnames:
+            mask |= 1 << self._bit_of_host[hostname]
+        return mask
+
+    def hosts_of(self, mask: HostMask) -> Set[HostName]:
+        if not mask:
+            return set()
+        selector = bin(mask)[:1:-1].encode("ascii").translate(_BIN_TO_SELECTOR)
+        return set(compress(self._hosts, selector))
+
+    def folder_mask(self, folder_path: str) -> HostMask:
+        """Hosts whose path starts with the given folder path"""
+        try:
+            return self._folder_masks[folder_path]
+        except KeyError:
+            pass
+
+        mask = 0
+        paths = self._sorted_paths
+        for idx in range(bisect.bisect_left(paths, folder_path), len(paths)):
+            path = paths[idx]
+            if not path.startswith(folder_path):
+                break
+            mask |= self._path_masks[path]
+
+        self._folder_masks[folder_path] = mask
+        return mask
+
+    def tags_mask(self, tag_conditions: TaggroupIDToTagCondition, candidates: HostMask) -> HostMask:
+        for taggroup_id, tag_condition in tag_conditions.items():
+            if not candidates:
+                break
+
+            if not isinstance(tag_condition, dict):
+                candidates &= self._tag_masks.get((taggroup_id, tag_condition), 0)
+                continue
+
+            if "$ne" in tag_condition:
+                candidates &= ~self._tag_masks.get(
+                    (taggroup_id, cast(TagConditionNE, tag_condition)["$ne"]), 0
+                )
+                continue
+
+            if "$or" in tag_condition:
+                candidates &= self._tag_union(
+                    taggroup_id, cast(TagConditionOR, tag_condition)["$or"]
+                )
+                continue
+
+            if "$nor" in tag_condition:
+                candidates &= ~self._tag_union(
+                    taggroup_id, cast(TagConditionNOR, tag_condition)["$nor"]
+                )
+                continue
+
+            raise NotImplementedError()
+
+        return candidates
+
+    def _tag_union(self, taggroup_id: TaggroupID, tag_ids: Iterable[TagID]) -> HostMask:
+        mask = 0
+        for tag_id in tag_ids:
+            mask |= self._tag_masks.get((taggroup_id, tag_id), 0)
+        return mask
+
+    def labels_mask(self, label_conditions: Dict, candidates: HostMask) -> HostMask:
+        if not label_conditions or not candidates:
+            return candidates
+
+        self._index_labels(candidates)
+
+        for label_id, label_spec in label_conditions.items():
+            values = self._label_masks.get(label_id, {})
+            if isinstance(label_spec, dict):
+                candidates &= ~values.get(label_spec["$ne"], 0)
+            else:
+                candidates &= values.get(label_spec, 0)
+        return candidates
+
+    def _index_labels(self, mask: HostMask) -> None:
+        missing = mask & ~self._labels_indexed
+        if not missing:
+            return
+
+        for hostname in self.hosts_of(missing):
+            bit = 1 << self._bit_of_host[hostname]
+            for label_id, label_value in self._labels_of_host(hostname).items():
+                values = self._label_masks.setdefault(label_id, {})
+                values[label_value] = values.get(label_value, 0) | bit
+
+        self._labels_indexed |= missing
+
+    def host_names_mask(
+        self, negate: bool, host_entries: HostOrServiceConditionsSimple, candidates: HostMask
+    ) -> HostMask:
+        """Apply a host name condition (explicit names and / or regexes, maybe negated)"""
+        if not candidates:
+            return candidates
+
+        matching = 0
+        patterns = []
+        for entry in host_entries:
+            if isinstance(entry, dict):
+                patterns.append(regex(entry["$regex"]))
+                continue
+            bit = self._bit_of_host.get(entry)
+            if bit is not None:
+                matching |= 1 << bit
+
+        if patterns:
+            for hostname in self.hosts_of(candidates & ~matching):
+                if any(pattern.match(hostname) is not None for pattern in patterns):
+                    matching |= 1 << self._bit_of_host[hostname]
+
+        if negate:
+            return candidates & ~matching
+        return candidates & matching
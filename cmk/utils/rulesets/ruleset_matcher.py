@@ -11,6 +11,7 @@ from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.labels import BuiltinHostLabelsStore, DiscoveredHostLabelsStore, LabelManager
 from cmk.utils.parameters import boil_down_parameters
 from cmk.utils.regex import regex
+from cmk.utils.rulesets.host_index import HostConditionIndex, HostMask
 from cmk.utils.rulesets.tuple_rulesets import (
     ALL_HOSTS,
     ALL_SERVICES,
@@ -203,8 +204,11 @@ class RulesetMatcher:
         with_foreign_hosts = (
             match_object.host_name not in self.ruleset_optimizer.all_processed_hosts()
         )
-        optimized_ruleset = self.ruleset_optimizer.get_service_ruleset(
-            ruleset, with_foreign_hosts, is_binary=is_binary
+        if match_object.host_name is None:
+            return
+
+        optimized_ruleset = self.ruleset_optimizer.get_service_ruleset_of_host(
+            ruleset, with_foreign_hosts, is_binary, match_object.host_name
         )
 
         for (
@@ -334,33 +338,28 @@ class RulesetOptimizer:
         # may contain a reduced set of hosts, since each process handles a subset
         self._all_processed_hosts = self._all_configured_hosts
 
-        # A factor which indicates how much hosts share the same host tag configuration (excluding folders).
-        # len(all_processed_hosts) / len(different tag combinations)
-        # It is used to determine the best rule evualation method
-        self._all_processed_hosts_similarity = 1.0
-
         self._service_ruleset_cache: Dict = {}
         self._host_ruleset_cache: Dict = {}
         self._all_matching_hosts_match_cache: Dict = {}
 
-        # Reference dirname -> hosts in this dir including subfolders
-        self._folder_host_lookup: Dict[Tuple[bool, str], Set[HostName]] = {}
-
-        # Provides a list of hosts with the same hosttags, excluding the folder
-        self._hosts_grouped_by_tags: Dict[Tuple[Tuple[TaggroupID, TagID], ...], Set[HostName]] = {}
-        # Reference hostname -> tag group reference
-        self._host_grouped_ref: Dict[HostName, Tuple[Tuple[TaggroupID, TagID], ...]] = {}
+        # The rules of a service ruleset which are relevant for the last requested host.
+        # Most lookups are made for all services of a host in a row.
+        self._service_rules_of_host_cache: Dict = {}
 
-        # TODO: Clean this one up?
-        self._initialize_host_lookup()
+        # Host attributes used in rule conditions -> matching hosts (as bitmask)
+        self._host_index = HostConditionIndex(self._host_tags, host_paths, self.labels_of_host)
+        self._all_configured_hosts_mask = self._host_index.mask_of(self._all_configured_hosts)
+        self._all_processed_hosts_mask = self._all_configured_hosts_mask
 
     def clear_ruleset_caches(self) -> None:
         self._host_ruleset_cache.clear()
         self._service_ruleset_cache.clear()
+        self._service_rules_of_host_cache.clear()
 
     def clear_caches(self) -> None:
         self._host_ruleset_cache.clear()
         self._all_matching_hosts_match_cache.clear()
+        self._host_index.clear_label_index()
 
     def all_processed_hosts(self) -> Set[HostName]:
         """Returns a set of all processed hosts"""
@@ -379,29 +378,7 @@ class RulesetOptimizer:
 
         self._all_processed_hosts.update(nodes_and_clusters)
 
-        # The folder host lookup includes a list of all -processed- hosts within a given
-        # folder. Any update with set_all_processed hosts invalidates this cache, because
-        # the scope of relevant hosts has changed. This is -good-, since the values in this
-        # lookup are iterated one by one later on in all_matching_hosts
-        self._folder_host_lookup = {}
-
-        self._adjust_processed_hosts_similarity()
-
-    def _adjust_processed_hosts_similarity(self) -> None:
-        """This function computes the tag similarities between of the processed hosts
-        The result is a similarity factor, which helps finding the most perfomant operation
-        for the current hostset"""
-        used_groups = {
-            self._host_grouped_ref.get(hostname, ()) for hostname in self._all_processed_hosts
-        }
-
-        if not used_groups:
-            self._all_processed_hosts_similarity = 1.0
-            return
-
-        self._all_processed_hosts_similarity = (
-            1.0 * len(self._all_processed_hosts) / len(used_groups)
-        )
+        self._all_processed_hosts_mask = self._host_index.mask_of(self._all_processed_hosts)
 
     def get_host_ruleset(
         self, ruleset: Ruleset, with_foreign_hosts: bool, is_binary: bool
@@ -447,6 +424,26 @@ class RulesetOptimizer:
         self._service_ruleset_cache[cache_id] = cached_ruleset
         return cached_ruleset
 
+    def get_service_ruleset_of_host(
+        self, ruleset: Ruleset, with_foreign_hosts: bool, is_binary: bool, hostname: HostName
+    ) -> PreprocessedServiceRuleset:
+        """The rules of a service ruleset having host conditions matching the given host"""
+        cache_id = id(ruleset), with_foreign_hosts
+        try:
+            cached_hostname, rules_of_host = self._service_rules_of_host_cache[cache_id]
+            if cached_hostname == hostname:
+                return rules_of_host
+        except KeyError:
+            pass
+
+        rules_of_host = [
+            rule
+            for rule in self.get_service_ruleset(ruleset, with_foreign_hosts, is_binary)
+            if hostname in rule[1]
+        ]
+        self._service_rules_of_host_cache[cache_id] = (hostname, rules_of_host)
+        return rules_of_host
+
     def _convert_service_ruleset(
         self, ruleset: Ruleset, with_foreign_hosts: bool, is_binary: bool
     ) -> PreprocessedServiceRuleset:
@@ -525,69 +522,49 @@ class RulesetOptimizer:
         except KeyError:
             pass
 
-        if with_foreign_hosts:
-            valid_hosts = self._all_configured_hosts
-        else:
-            valid_hosts = self._all_processed_hosts
-
-        # Thin out the valid hosts further. If the rule is located in a folder
-        # we only need the intersection of the folders hosts and the previously determined valid_hosts
-        valid_hosts = self.get_hosts_within_folder(rule_path, with_foreign_hosts).intersection(
-            valid_hosts
-        )
-
-        if tag_conditions and hostlist is None and not labels:
-            # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tag_conditions)
-            if matched_by_tags is not None:
-                return matched_by_tags
-
-        matching: Set[HostName] = set()
-        only_specific_hosts = (
-            hostlist is not None
-            and not isinstance(hostlist, dict)
-            and all(not isinstance(x, dict) for x in hostlist)
-        )
-
         if hostlist == []:
-            pass  # Empty host list -> Nothing matches
-
-        elif not tag_conditions and not labels and not hostlist:
-            # If no tags are specified and the hostlist only include @all (all hosts)
-            matching = valid_hosts
+            matching: Set[HostName] = set()  # Empty host list -> Nothing matches
+        else:
+            matching = self._host_index.hosts_of(
+                self._matching_hosts_mask(
+                    hostlist, tag_conditions, labels, rule_path, with_foreign_hosts
+                )
+            )
 
-        elif not tag_conditions and not labels and only_specific_hosts and hostlist is not None:
-            # If no tags are specified and there are only specific hosts we already have the matches
-            matching = valid_hosts.intersection(hostlist)
+        self._all_matching_hosts_match_cache[cache_id] = matching
+        return matching
 
+    def _matching_hosts_mask(
+        self,
+        hostlist: Optional[HostOrServiceConditions],
+        tag_conditions: TaggroupIDToTagCondition,
+        labels: LabelConditions,
+        rule_path: str,
+        with_foreign_hosts: bool,
+    ) -> HostMask:
+        """Narrow down the valid hosts condition by condition
+
+        The cheap conditions are applied first. Regex host name conditions and labels
+        only need to be evaluated for the hosts remaining after that."""
+        if with_foreign_hosts:
+            mask = self._all_configured_hosts_mask
         else:
-            # If the rule has only exact host restrictions, we can thin out the list of hosts to check
-            if only_specific_hosts and hostlist is not None:
-                hosts_to_check = valid_hosts.intersection(hostlist)
-            else:
-                hosts_to_check = valid_hosts
-
-            for hostname in hosts_to_check:
-                # When no tag matching is requested, do not filter by tags. Accept all hosts
-                # and filter only by hostlist
-                if tag_conditions and not self.matches_host_tags(
-                    self._host_tags[hostname],
-                    tag_conditions,
-                ):
-                    continue
+            mask = self._all_processed_hosts_mask
 
-                if labels:
-                    host_labels = self.labels_of_host(hostname)
-                    if not matches_labels(host_labels, labels):
-                        continue
+        if rule_path != "/":
+            mask &= self._host_index.folder_mask(rule_path)
 
-                if not self.matches_host_name(hostlist, hostname):
-                    continue
+        if tag_conditions:
+            mask = self._host_index.tags_mask(tag_conditions, mask)
 
-                matching.add(hostname)
+        if hostlist:
+            negate, host_entries = parse_negated_condition_list(hostlist)
+            mask = self._host_index.host_names_mask(negate, host_entries, mask)
 
-        self._all_matching_hosts_match_cache[cache_id] = matching
-        return matching
+        if labels:
+            mask = self._host_index.labels_mask(labels, mask)
+
+        return mask
 
     def matches_host_name(
         self, host_entries: Optional[HostOrServiceConditions], hostname: HostName
@@ -655,98 +632,11 @@ class RulesetOptimizer:
             rule_path,
         )
 
-    # TODO: Generalize this optimization: Build some kind of key out of the tag conditions
-    # (positive, negative, ...). Make it work with the new tag group based "$or" handling.
-    def _match_hosts_by_tags(
-        self,
-        cache_id,
-        valid_hosts: Set[HostName],
-        tag_conditions: TaggroupIDToTagCondition,
-    ):
-        matching = set()
-        negative_match_tags = set()
-        positive_match_tags = set()
-        for taggroup_id, tag_condition in tag_conditions.items():
-            if isinstance(tag_condition, dict):
-                if "$ne" in tag_condition:
-                    negative_match_tags.add(
-                        (
-                            taggroup_id,
-                            cast(TagConditionNE, tag_condition)["$ne"],
-                        )
-                    )
-                    continue
-
-                if "$or" in tag_condition:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
-
-                if "$nor" in tag_condition:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
-
-                raise NotImplementedError()
-
-            positive_match_tags.add((taggroup_id, tag_condition))
-
-        # TODO:
-        # if has_specific_folder_tag or self._all_processed_hosts_similarity < 3.0:
-        if self._all_processed_hosts_similarity < 3.0:
-            # Without shared folders
-            for hostname in valid_hosts:
-                if positive_match_tags <= self._host_tags[
-                    hostname
-                ] and not negative_match_tags.intersection(self._host_tags[hostname]):
-                    matching.add(hostname)
-
-            self._all_matching_hosts_match_cache[cache_id] = matching
-            return matching
-
-        # With shared folders
-        checked_hosts: Set[str] = set()
-        for hostname in valid_hosts:
-            if hostname in checked_hosts:
-                continue
-
-            hosts_with_same_tag = self._filter_hosts_with_same_tags_as_host(hostname, valid_hosts)
-            checked_hosts.update(hosts_with_same_tag)
-
-            if positive_match_tags <= self._host_tags[
-                hostname
-            ] and not negative_match_tags.intersection(self._host_tags[hostname]):
-                matching.update(hosts_with_same_tag)
-
-        self._all_matching_hosts_match_cache[cache_id] = matching
-        return matching
-
-    def _filter_hosts_with_same_tags_as_host(
-        self,
-        hostname: HostName,
-        hosts: Set[HostName],
-    ):
-        return self._hosts_grouped_by_tags[self._host_grouped_ref[hostname]].intersection(hosts)
-
     def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
-        cache_id = with_foreign_hosts, folder_path
-        if cache_id not in self._folder_host_lookup:
-            hosts_in_folder = set()
-            relevant_hosts = (
-                self._all_configured_hosts if with_foreign_hosts else self._all_processed_hosts
-            )
-
-            for hostname in relevant_hosts:
-                host_path = self._host_paths.get(hostname, "/")
-                if host_path.startswith(folder_path):
-                    hosts_in_folder.add(hostname)
-
-            self._folder_host_lookup[cache_id] = hosts_in_folder
-            return hosts_in_folder
-
-        return self._folder_host_lookup[cache_id]
-
-    def _initialize_host_lookup(self):
-        for hostname in self._all_configured_hosts:
-            group_ref = tuple(sorted(self._host_tags[hostname]))
-            self._hosts_grouped_by_tags.setdefault(group_ref, set()).add(hostname)
-            self._host_grouped_ref[hostname] = group_ref
+        mask = self._host_index.folder_mask(folder_path)
+        if with_foreign_hosts:
+            return self._host_index.hosts_of(mask & self._all_configured_hosts_mask)
+        return self._host_index.hosts_of(mask & self._all_processed_hosts_mask)
 
     def labels_of_host(self, hostname: HostName) -> Labels:
         """Returns the effective set of host labels from all available sources
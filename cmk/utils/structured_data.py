@@ -12,14 +12,18 @@ from __future__ import annotations
 
 import gzip
 import io
+import os
+import pickle
 import pprint
+import struct
 from collections import Counter
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, BinaryIO, Callable
 from typing import Counter as TCounter
 from typing import (
     Dict,
     Iterable,
+    Iterator,
     List,
     Literal,
     Mapping,
@@ -32,6 +36,8 @@ from typing import (
 )
 
 from cmk.utils import store
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.i18n import _
 from cmk.utils.type_defs import HostName
 
 # TODO Cleanup path in utils, base, gui, find ONE place (type defs or similar)
@@ -159,16 +165,100 @@ class UpdateResult(NamedTuple):
 # TODO cleanup store: better method names for saving/loading current tree,
 # archive files or delta caches.
 
+# The indexed tree files start with a header (magic, size of the index), followed by the
+# index and the records of all nodes. The index maps the path of each node to the offset
+# and size of its record, a record is the pickled pair of the serialized attributes and
+# table of the node. This way single nodes or tables are loaded without reading the rest.
+# The current inventory trees stay repr files, Livestatus provides them (mk_inventory).
+# Their indexed file is written next to them (.HOSTNAME.index) with the same modification
+# time, it is only read as long as the times match.
+_INDEXED_FILE_MAGIC = b"CMKSDT01"
+_INDEXED_FILE_HEADER = struct.Struct("!8sQ")
+
+SDIndex = Dict[SDPath, Tuple[int, int]]
+
 
 class StructuredDataStore:
     @staticmethod
-    def load_file(file_path: Path) -> StructuredDataNode:
+    def load_file(
+        file_path: Path, *, paths: Optional[Sequence[SDPath]] = None
+    ) -> StructuredDataNode:
+        """Load the tree or, if paths are given, only the nodes below these paths
+
+        Indexed and repr files are both supported, repr files are read completely. The
+        indexed file of a repr file is read instead, if it is current."""
+        if _is_current_index_file(index_file_path := _index_file_path(file_path), file_path):
+            file_path = index_file_path
+        try:
+            with file_path.open("rb") as f:
+                header = f.read(_INDEXED_FILE_HEADER.size)
+                if header.startswith(_INDEXED_FILE_MAGIC):
+                    return _load_indexed_file(f, file_path, header, paths)
+        except FileNotFoundError:
+            return StructuredDataNode()
+
         if raw_tree := store.load_object_from_file(file_path, default=None):
-            return StructuredDataNode.deserialize(raw_tree)
+            tree = StructuredDataNode.deserialize(raw_tree)
+            if paths is None:
+                return tree
+            return tree.get_filtered_node([make_filter((path, None)) for path in paths])
         return StructuredDataNode()
 
-    def __init__(self, path: Union[Path, str]) -> None:
+    @staticmethod
+    def save_file(file_path: Path, tree: StructuredDataNode) -> None:
+        index: SDIndex = {}
+        records = io.BytesIO()
+        for node in tree.iter_nodes():
+            record = pickle.dumps(
+                (node.attributes.serialize(), node.table.serialize()),
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            index[node.path] = (records.tell(), len(record))
+            records.write(record)
+
+        raw_index = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+        store.save_bytes_to_file(
+            file_path,
+            _INDEXED_FILE_HEADER.pack(_INDEXED_FILE_MAGIC, len(raw_index))
+            + raw_index
+            + records.getvalue(),
+        )
+
+    @staticmethod
+    def is_indexed_file(file_path: Path) -> bool:
+        with file_path.open("rb") as f:
+            return f.read(len(_INDEXED_FILE_MAGIC)) == _INDEXED_FILE_MAGIC
+
+    @classmethod
+    def write_index_file(cls, file_path: Path) -> bool:
+        """Write the indexed file of a repr file, returns whether it was written"""
+        index_file_path = _index_file_path(file_path)
+        if cls.is_indexed_file(file_path) or _is_current_index_file(index_file_path, file_path):
+            return False
+
+        stat = file_path.stat()
+        cls.save_file(index_file_path, cls.load_file(file_path))
+        os.utime(index_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return True
+
+    @classmethod
+    def migrate_file(cls, file_path: Path) -> bool:
+        """Convert a repr file to an indexed file, returns whether the file was converted
+
+        The modification time is kept, it is the time of the tree in the inventory history."""
+        if cls.is_indexed_file(file_path):
+            return False
+
+        stat = file_path.stat()
+        cls.save_file(file_path, cls.load_file(file_path))
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return True
+
+    def __init__(self, path: Union[Path, str], *, indexed: bool = False) -> None:
         self._path = Path(path)
+        # The status data files are provided by Livestatus and are read with
+        # ast.literal_eval, only the inventory files get an indexed file.
+        self._indexed = indexed
 
     def _host_file(self, host_name: HostName) -> Path:
         return self._path / str(host_name)
@@ -183,8 +273,14 @@ class StructuredDataStore:
         filepath = self._host_file(host_name)
 
         output = tree.serialize()
+        if self._indexed:
+            self.save_file(_index_file_path(filepath), tree)
         store.save_object_to_file(filepath, output, pretty=pretty)
+        if self._indexed:
+            stat = filepath.stat()
+            os.utime(_index_file_path(filepath), ns=(stat.st_atime_ns, stat.st_mtime_ns))
 
+        # The gzipped repr of the tree is provided by Livestatus (mk_inventory_gz)
         buf = io.BytesIO()
         with gzip.GzipFile(fileobj=buf, mode="wb") as f:
             f.write((repr(output) + "\n").encode("utf-8"))
@@ -193,11 +289,14 @@ class StructuredDataStore:
         # Inform Livestatus about the latest inventory update
         store.save_text_to_file(filepath.with_name(".last"), "")
 
-    def load(self, *, host_name: HostName) -> StructuredDataNode:
-        return self.load_file(self._host_file(host_name))
+    def load(
+        self, *, host_name: HostName, paths: Optional[Sequence[SDPath]] = None
+    ) -> StructuredDataNode:
+        return self.load_file(self._host_file(host_name), paths=paths)
 
     def remove_files(self, *, host_name: HostName) -> None:
         self._host_file(host_name).unlink(missing_ok=True)
+        _index_file_path(self._host_file(host_name)).unlink(missing_ok=True)
         self._gz_file(host_name).unlink(missing_ok=True)
 
     def archive(self, *, host_name: HostName, archive_dir: Union[Path, str]) -> None:
@@ -205,7 +304,59 @@ class StructuredDataStore:
         target_dir.mkdir(parents=True, exist_ok=True)
 
         filepath = self._host_file(host_name)
-        filepath.rename(target_dir / str(int(filepath.stat().st_mtime)))
+        target_path = target_dir / str(int(filepath.stat().st_mtime))
+        # The archived trees are not provided by Livestatus, the indexed file is archived
+        if _is_current_index_file(index_file_path := _index_file_path(filepath), filepath):
+            index_file_path.rename(target_path)
+            filepath.unlink()
+        else:
+            filepath.rename(target_path)
+            index_file_path.unlink(missing_ok=True)
+
+
+def _index_file_path(file_path: Path) -> Path:
+    return file_path.with_name(f".{file_path.name}.index")
+
+
+def _is_current_index_file(index_file_path: Path, file_path: Path) -> bool:
+    try:
+        return index_file_path.stat().st_mtime_ns == file_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _load_indexed_file(
+    f: BinaryIO,
+    file_path: Path,
+    header: bytes,
+    paths: Optional[Sequence[SDPath]],
+) -> StructuredDataNode:
+    try:
+        _magic, index_size = _INDEXED_FILE_HEADER.unpack(header)
+        index: SDIndex = pickle.loads(f.read(index_size))
+        data_offset = _INDEXED_FILE_HEADER.size + index_size
+
+        if paths is None:
+            data = memoryview(f.read())
+            raw_nodes = [
+                (path, pickle.loads(data[offset : offset + size]))
+                for path, (offset, size) in index.items()
+            ]
+        else:
+            raw_nodes = []
+            for path, (offset, size) in index.items():
+                if any(path[: len(p)] == tuple(p) for p in paths):
+                    f.seek(data_offset + offset)
+                    raw_nodes.append((path, pickle.loads(f.read(size))))
+    except (struct.error, pickle.UnpicklingError, EOFError, ValueError, TypeError) as e:
+        raise MKGeneralException(_('Cannot read file "%s": %s') % (file_path, e))
+
+    tree = StructuredDataNode()
+    for path, (raw_attributes, raw_table) in raw_nodes:
+        node = tree.setdefault_node(path)
+        node.add_attributes(Attributes.deserialize(path=path, raw_pairs=raw_attributes))
+        node.add_table(Table.deserialize(path=path, raw_rows=raw_table))
+    return tree
 
 
 # .
@@ -410,6 +561,12 @@ class StructuredDataNode:
     def get_node(self, path: SDPath) -> Optional[StructuredDataNode]:
         return self._get_node(path)
 
+    def iter_nodes(self) -> Iterator[StructuredDataNode]:
+        """This node and all nodes below it, depth first"""
+        yield self
+        for node in self._nodes.values():
+            yield from node.iter_nodes()
+
     def get_table(self, path: SDPath) -> Optional[Table]:
         node = self._get_node(path)
         return None if node is None else node.table
@@ -979,6 +1136,9 @@ class Table:
             delta_table.add_row(key, removed_row)
 
         for key in compared_keys.both:
+            if not keep_identical and self._rows[key] == other._rows[key]:
+                # Most rows are unchanged, these are not part of the delta
+                continue
             delta_dict_result = _compare_dicts(
                 old_dict=other._rows[key],
                 new_dict=self._rows[key],
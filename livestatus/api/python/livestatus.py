@@ -10,10 +10,12 @@ import json
 import os
 import re
 import select
+import selectors
 import socket
 import ssl
 import threading
 import time
+from array import array
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import lru_cache
@@ -21,9 +23,12 @@ from io import BytesIO
 from typing import (
     Any,
     AnyStr,
+    Callable,
     Dict,
+    Iterable,
     Iterator,
     List,
+    Mapping,
     NamedTuple,
     NewType,
     Optional,
@@ -43,6 +48,8 @@ SiteConfigurations = NewType("SiteConfigurations", Dict[SiteId, SiteConfiguratio
 LivestatusColumn = Any
 LivestatusRow = NewType("LivestatusRow", List[LivestatusColumn])
 LivestatusResponse = NewType("LivestatusResponse", List[LivestatusRow])
+# The values of one column of a response, numeric columns may be stored in arrays
+LivestatusColumnValues = Union[List[LivestatusColumn], array]
 
 
 # Note: If you want to use JSON as OutputFormat, then note that there are subtle differences
@@ -200,11 +207,62 @@ def intercept_queries():
 
 
 class Helpers:
+    prepend_site: bool
+
     def query(
         self, query: "QueryTypes", add_headers: Union[str, bytes] = ""
     ) -> "LivestatusResponse":
         raise NotImplementedError()
 
+    def _query_row_blocks(
+        self, query: "Query", add_headers: str = ""
+    ) -> Iterator["LivestatusResponse"]:
+        """Yields the rows of the response in blocks while it is received"""
+        raise NotImplementedError()
+
+    def query_rows(
+        self, query: "QueryTypes", add_headers: Union[str, bytes] = ""
+    ) -> Iterator[LivestatusRow]:
+        """Issues a query and yields the rows of the response while it is received
+
+        In contrast to query() the raw response is never kept in memory as a whole, the
+        rows are decoded as soon as a part of the response arrives. When the iteration
+        is stopped early, the rest of the response is discarded."""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        for rows in self._query_row_blocks(normalized_query, _ensure_unicode(add_headers)):
+            yield from rows
+
+    def query_columns(
+        self, query: "QueryTypes", typecodes: Optional[Mapping[str, str]] = None
+    ) -> Dict[str, LivestatusColumnValues]:
+        """Issues a query and returns the values of each column of the Columns: header
+        as a sequence, e.g. {"name": ["heute", ...], "state": array("b", [0, ...])}
+
+        The values of the columns given in typecodes are stored in arrays of the
+        given type, which need much less memory than lists of numbers. The rows are
+        decoded and stored in the columns while the response is received."""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        names = _requested_columns(normalized_query)
+        if self.prepend_site:
+            names.insert(0, "site")
+        typecodes = typecodes or {}
+        columns: List[LivestatusColumnValues] = [
+            array(typecodes[name]) if name in typecodes else [] for name in names
+        ]
+        for rows in self._query_row_blocks(normalized_query, "ColumnHeaders: off\n"):
+            if any(len(row) != len(names) for row in rows):
+                raise MKLivestatusQueryError(
+                    "Response rows do not match the columns %s" % " ".join(names)
+                )
+            for name, values, column in zip(names, zip(*rows), columns):
+                try:
+                    column.extend(values)
+                except TypeError as e:
+                    raise MKLivestatusQueryError("Invalid value of column %s: %s" % (name, e))
+        return dict(zip(names, columns))
+
     def query_value(self, query: "QueryTypes", deflt: Any = NO_DEFAULT) -> LivestatusColumn:
         """Issues a query that returns exactly one line and one columns and returns
         the response as a single value"""
@@ -377,6 +435,19 @@ QueryTypes = Union[str, bytes, Query]
 OnlySites = Optional[List[SiteId]]
 DeadSite = Dict[str, Union[str, int, Exception, SiteConfiguration]]
 
+
+def _requested_columns(query: Query) -> List[str]:
+    names = [
+        name
+        for line in str(query).splitlines()
+        if line.startswith("Columns:")
+        for name in line[len("Columns:") :].split()
+    ]
+    if not names:
+        raise MKLivestatusQueryError("The query has no Columns: header: %s" % query)
+    return names
+
+
 # .
 #   .--SingleSiteConn------------------------------------------------------.
 #   |  ____  _             _      ____  _ _        ____                    |
@@ -433,6 +504,98 @@ def _parse_socket_url(url: str) -> Tuple[socket.AddressFamily, Union[str, tuple]
     )
 
 
+# Apply a lower timeout for the content because the data is already available
+# in the socket. The liveproxyd (same system) has the complete data available
+# while the data from a standard connection can still take some time.
+# 30 seconds should be more than enough for the maximum telegram size of 100MB
+_CONTENT_TIMEOUT = 30
+
+
+def _check_response_code(code: str, data: bytes) -> None:
+    if code == "200":
+        return
+
+    error_info = data.decode("utf-8")
+    if code == "404":
+        raise MKLivestatusTableNotFoundError("Not Found (%s): %r" % (code, error_info))
+
+    if code == "502":
+        raise MKLivestatusBadGatewayError(error_info)
+
+    raise MKLivestatusQueryError("%s: %s" % (code, error_info))
+
+
+# Maximum number of bytes read from a socket at once
+_RECEIVE_SIZE = 64 * 1024
+
+
+class ResponseParser:
+    """Decodes the rows of a response while it is received
+
+    Livestatus writes the rows of the python and JSON output formats on lines of their
+    own and escapes all control characters in the values. So the rows on the complete
+    lines received so far can be decoded while the rest of the response is still on its
+    way and only a small part of the raw response has to be kept in memory. Responses
+    which are not written this way are decoded once they are complete.
+    """
+
+    def __init__(self, length: int, use_json: bool) -> None:
+        self._missing = length
+        self._decode: Callable[[str], Any] = json.loads if use_json else ast.literal_eval
+        self._buffer = bytearray()
+        self._started = False
+        # Don't try to decode the lines again until the buffer has grown to this size
+        self._retry_size = 0
+
+    @property
+    def complete(self) -> bool:
+        return self._missing <= 0
+
+    def feed(self, data: bytes) -> LivestatusResponse:
+        """Add the next part of the response, returns the rows completed by it"""
+        self._missing -= len(data)
+        self._buffer += data
+        if self.complete:
+            rows = self._decode_lines(self._buffer, last=True)
+            self._buffer.clear()
+            return rows
+
+        end = self._buffer.rfind(b"\n") + 1
+        if not end or end < self._retry_size:
+            return LivestatusResponse([])
+        try:
+            rows = self._decode_lines(self._buffer[:end], last=False)
+        except MKLivestatusQueryError:
+            # The lines end in the middle of a row, wait for more of them
+            self._retry_size = 2 * end
+            return LivestatusResponse([])
+        del self._buffer[:end]
+        self._retry_size = 0
+        return rows
+
+    def _decode_lines(self, data: bytearray, last: bool) -> LivestatusResponse:
+        text = data.decode("utf-8").strip()
+        if not self._started:
+            if not text:
+                return LivestatusResponse([])
+            if not text.startswith("["):
+                raise MKLivestatusQueryError("Malformed raw response output")
+            text = text[1:]
+        if last:
+            if not text.endswith("]"):
+                raise MKLivestatusQueryError("Malformed raw response output")
+            text = text[:-1]
+        elif text.endswith(","):
+            text = text[:-1]
+
+        try:
+            rows = self._decode("[%s]" % text)
+        except (ValueError, SyntaxError):
+            raise MKLivestatusQueryError("Malformed raw response output")
+        self._started = True
+        return rows
+
+
 class SingleSiteConnection(Helpers):
 
     # So we only collect in a specific thread, and not in all of them. We also use
@@ -464,6 +627,7 @@ class SingleSiteConnection(Helpers):
         self.socketurl = socketurl
         self.socket: Optional[socket.socket] = None
         self.timeout: Optional[int] = None
+        self.response_timeout: Optional[float] = None
         self.successful_persistence = False
         self._output_format = LivestatusOutputFormat.PYTHON
 
@@ -491,6 +655,10 @@ class SingleSiteConnection(Helpers):
         if self.socket:
             self.socket.settimeout(float(timeout))
 
+    def set_response_timeout(self, timeout: Optional[float]) -> None:
+        """Time to wait for the response to a parallel query, None waits until it arrives"""
+        self.response_timeout = timeout
+
     def _try_get_persisted_connection(self) -> Optional[socket.socket]:
         if self.persist and self.socketurl in persistent_connections:
             self.successful_persistence = True
@@ -591,28 +759,90 @@ class SingleSiteConnection(Helpers):
                 pass
 
     def receive_data(self, size: int, timeout: Optional[float] = None) -> bytes:
+        data = BytesIO()
+        for packet in self._receive_packets(size, timeout):
+            data.write(packet)
+        return data.getvalue()
+
+    def _receive_packets(self, size: int, timeout: Optional[float] = None) -> Iterator[bytes]:
         if self.socket is None:
             raise MKLivestatusSocketError("Socket to '%s' is not connected" % self.socketurl)
 
-        data = BytesIO()
         self.socket.settimeout(timeout)
-        receive_start = time.time()
-        while size > 0:
+        # Only the time spent in here counts, not the time the caller processes the packets
+        receive_duration = 0.0
+        received = 0
+        while received < size:
+            receive_start = time.time()
+            packet = b""
             if is_socket_readable(self.socket, 0.1):
-                packet = self.socket.recv(size)
+                packet = self.socket.recv(min(size - received, _RECEIVE_SIZE))
                 if not packet:
                     raise MKLivestatusSocketClosed(
                         "Read zero data from socket, remote peer closed connection."
                     )
-                size -= len(packet)
-                data.write(packet)
-            if timeout is not None and (time.time() - receive_start) > timeout:
+                received += len(packet)
+            receive_duration += time.time() - receive_start
+            if timeout is not None and receive_duration > timeout:
                 raise MKLivestatusSocketError(
                     f"{timeout}s while reading data from socket. "
-                    "Received data: {data.getbuffer().nbytes}/{size} bytes"
+                    f"Received data: {received}/{size} bytes"
                 )
+            if packet:
+                yield packet
+
+    def _query_row_blocks(
+        self, query: Query, add_headers: str = ""
+    ) -> Iterator[LivestatusResponse]:
+        limited_query = self._limited_query(query)
+        with _livestatus_output_format_switcher(limited_query, self):
+            str_query = self.build_query(limited_query, add_headers)
+            self.send_query(str_query)
+            for rows in self._receive_row_blocks(str_query, limited_query):
+                if self.prepend_site:
+                    for row in rows:
+                        row.insert(0, b"")
+                yield rows
 
-        return data.getvalue()
+    def _receive_row_blocks(self, query: str, query_obj: Query) -> Iterator[LivestatusResponse]:
+        """Like parse_raw_response(receive_raw_response(...)), but decodes the response while
+        it is received"""
+        parser: Optional[ResponseParser] = None
+        try:
+            try:
+                code, length = self._receive_header()
+            except (MKLivestatusSocketClosed, IOError):
+                # The other side may have closed the kept alive connection in the meantime,
+                # reconnect and try again once
+                self.disconnect()
+                time.sleep(0.1)
+                self.connect()
+                self.send_query(query)
+                code, length = self._receive_header()
+
+            if code != "200":
+                _check_response_code(code, self.receive_data(length, _CONTENT_TIMEOUT))
+
+            parser = ResponseParser(length, query_obj.supports_json_format())
+            for packet in self._receive_packets(length, _CONTENT_TIMEOUT):
+                if rows := parser.feed(packet):
+                    yield rows
+
+        except (MKLivestatusSocketClosed, IOError) as e:
+            raise MKLivestatusSocketError(str(e))
+
+        except query_obj.suppress_exceptions:
+            raise
+
+        except Exception as e:
+            if parser is not None and isinstance(e, MKLivestatusQueryError):
+                raise  # Malformed rows, like parse_raw_response()
+            raise MKLivestatusSocketError("Unhandled exception: %s" % e)
+
+        finally:
+            # Don't read the rest of an unfinished response with the next query
+            if parser is None or not parser.complete:
+                self.disconnect()
 
     def do_query(self, query: Query, add_headers: str = "") -> LivestatusResponse:
         with _livestatus_output_format_switcher(query, self):
@@ -675,35 +905,10 @@ class SingleSiteConnection(Helpers):
         timeout_at: Optional[float] = None,
     ) -> bytes:
         try:
-            # Headers are always ASCII encoded
-            resp = self.receive_data(16)
-            code = resp[0:3].decode("ascii")
-            try:
-                length = int(resp[4:15].lstrip())
-            except Exception:
-                self.disconnect()
-                raise MKLivestatusSocketError(
-                    "Malformed output. Livestatus TCP socket might be unreachable or wrong"
-                    "encryption settings are used."
-                )
-
-            # Apply a lower timeout for the content because the data is already available
-            # in the socket. The liveproxyd (same system) has the complete data available
-            # while the data from a standard connection can still take some time.
-            # 30 seconds should be more than enough for the maximum telegram size of 100MB
-            data = self.receive_data(length, 30)
-
-            if code == "200":
-                return data
-
-            error_info = data.decode("utf-8")
-            if code == "404":
-                raise MKLivestatusTableNotFoundError("Not Found (%s): %r" % (code, error_info))
-
-            if code == "502":
-                raise MKLivestatusBadGatewayError(error_info)
-
-            raise MKLivestatusQueryError("%s: %s" % (code, error_info))
+            code, length = self._receive_header()
+            data = self.receive_data(length, _CONTENT_TIMEOUT)
+            _check_response_code(code, data)
+            return data
 
         except (MKLivestatusSocketClosed, IOError) as e:
             # In case of an IO error or the other side having
@@ -743,6 +948,20 @@ class SingleSiteConnection(Helpers):
             # FIXME: ? self.disconnect()
             raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
+    def _receive_header(self) -> Tuple[str, int]:
+        # Headers are always ASCII encoded
+        resp = self.receive_data(16)
+        code = resp[0:3].decode("ascii")
+        try:
+            length = int(resp[4:15].lstrip())
+        except Exception:
+            self.disconnect()
+            raise MKLivestatusSocketError(
+                "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                "encryption settings are used."
+            )
+        return code, length
+
     def parse_raw_response(self, raw_response: bytes, query: Query) -> LivestatusResponse:
         data = raw_response.decode("utf-8")
         try:
@@ -772,18 +991,17 @@ class SingleSiteConnection(Helpers):
         normalized_add_headers = _ensure_unicode(add_headers)
         normalized_query = Query(query) if not isinstance(query, Query) else query
 
-        if self.limit is not None:
-            normalized_query = Query(
-                "%sLimit: %d\n" % (normalized_query, self.limit),
-                normalized_query.suppress_exceptions,
-            )
-
-        response = self.do_query(normalized_query, normalized_add_headers)
+        response = self.do_query(self._limited_query(normalized_query), normalized_add_headers)
         if self.prepend_site:
             for row in response:
                 row.insert(0, b"")
         return response
 
+    def _limited_query(self, query: Query) -> Query:
+        if self.limit is None:
+            return query
+        return Query("%sLimit: %d\n" % (query, self.limit), query.suppress_exceptions)
+
     # TODO: Cleanup all call sites to hand over str types
     def command(self, command: AnyStr, site: Optional[SiteId] = None) -> None:
         command_str = _ensure_unicode(command).rstrip("\n")
@@ -849,6 +1067,110 @@ class ConnectedSite(NamedTuple):
 ConnectedSites = List[ConnectedSite]
 
 
+class _SiteResponse:
+    """The response of a site to a parallel query, received piecewise as data arrives
+
+    See MultiSiteConnection.query_streamed(): The responses of all sites are read by one
+    selector loop, so a slow site does not delay the responses of the other sites.
+    """
+
+    def __init__(
+        self, connected_site: ConnectedSite, query: str, use_json: bool, now: float
+    ) -> None:
+        self.connected_site = connected_site
+        self.query = query
+        self._use_json = use_json
+        connection = connected_site.connection
+        self.deadline: Optional[float] = None
+        if connection.response_timeout is not None:
+            self.deadline = now + connection.response_timeout
+        # Like receive_raw_response(): Reconnect once or until the connect timeout is over
+        self.retried = False
+        self.retry_until = now + (connection.timeout or 0)
+        self.retry_at: Optional[float] = None
+        self._start()
+
+    def _start(self) -> None:
+        self._code = ""
+        self._length: Optional[int] = None
+        self._missing = 16
+        self._chunks: List[bytes] = []
+        # The rows of successful responses are decoded while they are received
+        self._parser: Optional[ResponseParser] = None
+        self.rows = LivestatusResponse([])
+
+    @property
+    def site_id(self) -> SiteId:
+        return self.connected_site.id
+
+    @property
+    def socket(self) -> socket.socket:
+        if (site_socket := self.connected_site.connection.socket) is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" % self.site_id)
+        return site_socket
+
+    @property
+    def decoding_rows(self) -> bool:
+        return self._parser is not None
+
+    def has_pending_data(self) -> bool:
+        # See is_socket_readable(): Data of SSL sockets may linger around in pending
+        site_socket = self.connected_site.connection.socket
+        return isinstance(site_socket, ssl.SSLSocket) and site_socket.pending() > 0
+
+    def retry(self, now: float) -> None:
+        """Send the query again on a new connection"""
+        self.retried = True
+        self.retry_at = None
+        self.connected_site.connection.connect()
+        self.connected_site.connection.send_query(self.query)
+        self._start()
+        if self.deadline is not None:
+            self.deadline = max(self.deadline, now)
+
+    def receive(self, now: float) -> bool:
+        """Read the available data, returns whether the response is complete"""
+        site_socket = self.socket
+        while True:
+            packet = site_socket.recv(min(self._missing, _RECEIVE_SIZE))
+            if not packet:
+                raise MKLivestatusSocketClosed(
+                    "Read zero data from socket, remote peer closed connection."
+                )
+            self._missing -= len(packet)
+            if self._parser is not None:
+                self.rows.extend(self._parser.feed(packet))
+            else:
+                self._chunks.append(packet)
+
+            if self._length is None and not self._missing:
+                self._parse_header(now)
+            if self._length is not None and not self._missing:
+                _check_response_code(self._code, b"".join(self._chunks))
+                return True
+
+            if not self.has_pending_data():
+                return False
+
+    def _parse_header(self, now: float) -> None:
+        # Headers are always ASCII encoded
+        header = b"".join(self._chunks)
+        self._chunks = []
+        try:
+            self._code = header[0:3].decode("ascii")
+            self._length = self._missing = int(header[4:15].lstrip())
+        except Exception:
+            raise MKLivestatusSocketError(
+                "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                "encryption settings are used."
+            )
+        if self._code == "200":
+            self._parser = ResponseParser(self._length, self._use_json)
+        content_deadline = now + _CONTENT_TIMEOUT
+        self.deadline = content_deadline if self.deadline is None else self.deadline
+        self.deadline = min(self.deadline, content_deadline)
+
+
 class MultiSiteConnection(Helpers):
     def __init__(
         self, sites: SiteConfigurations, disabled_sites: Optional[SiteConfigurations] = None
@@ -1116,11 +1438,48 @@ class MultiSiteConnection(Helpers):
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
     def query_parallel(self, query: Query, add_headers: str = "") -> LivestatusResponse:
-        stillalive = []
+        site_ids = [connected_site.id for connected_site in self.connections]
+        site_rows = dict(self._query_sites(query, add_headers))
+        # The rows are returned in the order of the sites, not in the order of their arrival
+        result = LivestatusResponse([])
+        for site_id in site_ids:
+            result.extend(site_rows.get(site_id, []))
+        return result
+
+    def query_streamed(
+        self, query: "QueryTypes", add_headers: Union[str, bytes] = ""
+    ) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        """Query the sites in parallel and yield the rows of each site as soon as they arrive
+
+        The sites are yielded in the order their responses are complete, sites which fail
+        to respond are added to the dead sites like with query(). When the iteration is
+        stopped early, the connections to the sites which did not respond yet are closed.
+        """
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        with _livestatus_output_format_switcher(normalized_query, self):
+            yield from self._query_sites(normalized_query, normalized_add_headers)
+
+    def _query_row_blocks(
+        self, query: Query, add_headers: str = ""
+    ) -> Iterator[LivestatusResponse]:
+        for _site_id, rows in self.query_streamed(query, add_headers):
+            yield rows
+
+    def set_response_timeout(
+        self, timeout: Optional[float], sites: Optional[Iterable[SiteId]] = None
+    ) -> None:
+        """Set the time to wait for the responses of (some of the) sites to parallel queries"""
+        for connected_site in self.connections:
+            if sites is None or connected_site.id in sites:
+                connected_site.connection.set_response_timeout(timeout)
+
+    def _query_sites(
+        self, query: Query, add_headers: str
+    ) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
         if self.only_sites is not None:
-            connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
-            # Unused sites are assumed to be alive
-            stillalive.extend([c for c in self.connections if c[0] not in self.only_sites])
+            connect_to_sites = [c for c in self.connections if c.id in self.only_sites]
         else:
             connect_to_sites = self.connections
 
@@ -1130,70 +1489,118 @@ class MultiSiteConnection(Helpers):
         else:
             limit_header = ""
 
+        dead: Set[SiteId] = set()
+
+        def mark_dead(connected_site: ConnectedSite, exception: Exception) -> None:
+            dead.add(connected_site.id)
+            self.deadsites[connected_site.id] = {
+                "exception": exception,
+                "site": connected_site.config,
+            }
+
         # First send all queries
-        retrieve_responses: List[Tuple[str, ConnectedSite]] = []
+        now = time.time()
+        pending: List[_SiteResponse] = []
         for connected_site in connect_to_sites:
             try:
                 str_query = connected_site.connection.build_query(query, add_headers + limit_header)
                 connected_site.connection.send_query(str_query)
-                retrieve_responses.append((str_query, connected_site))
-            except LivestatusTestingError:
-                raise
-            except Exception as e:
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
-
-        # Then retrieve all raw responses. We will be as slow as the slowest of all connections.
-        site_responses: List[Tuple[ConnectedSite, bytes]] = []
-        for str_query, connected_site in retrieve_responses:
-            try:
-                site_responses.append(
-                    (
-                        connected_site,
-                        connected_site.connection.receive_raw_response(
-                            str_query, query.suppress_exceptions
-                        ),
-                    )
+                pending.append(
+                    _SiteResponse(connected_site, str_query, query.supports_json_format(), now)
                 )
-            except query.suppress_exceptions:
-                # Mostly handles exception types MKLivestatusTableNotFoundError
-                stillalive.append(connected_site)
-                continue
             except LivestatusTestingError:
                 raise
             except Exception as e:
-                connected_site.connection.disconnect()
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
+                mark_dead(connected_site, e)
 
-        # Convert responses to python format
-        result = LivestatusResponse([])
-        for connected_site, raw_response in site_responses:
-            try:
-                rows = connected_site.connection.parse_raw_response(raw_response, query)
-                stillalive.append(connected_site)
-                if self.prepend_site:
-                    for row in rows:
-                        row.insert(0, connected_site.id)
-                result.extend(rows)
-            except query.suppress_exceptions:
-                stillalive.append(connected_site)
-                continue
-            except LivestatusTestingError:
-                raise
-            except Exception as e:
-                connected_site.connection.disconnect()
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
+        # Then read the responses of all sites as soon as data arrives on their sockets
+        selector = selectors.DefaultSelector()
 
-        self.connections = stillalive
-        return result
+        def finish(response: _SiteResponse, exception: Optional[Exception] = None) -> None:
+            pending.remove(response)
+            if response.retry_at is None:
+                selector.unregister(response.socket)
+            if exception is not None:
+                response.connected_site.connection.disconnect()
+                mark_dead(response.connected_site, exception)
+
+        try:
+            for response in pending:
+                selector.register(response.socket, selectors.EVENT_READ, response)
+
+            while pending:
+                now = time.time()
+                for response in list(pending):
+                    if response.deadline is not None and response.deadline <= now:
+                        finish(
+                            response,
+                            MKLivestatusSocketError(
+                                "Timeout while waiting for the response of site %s"
+                                % response.site_id
+                            ),
+                        )
+                    elif response.retry_at is not None and response.retry_at <= now:
+                        try:
+                            response.retry(now)
+                            selector.register(response.socket, selectors.EVENT_READ, response)
+                        except LivestatusTestingError:
+                            raise
+                        except Exception as e:
+                            pending.remove(response)
+                            response.connected_site.connection.disconnect()
+                            mark_dead(response.connected_site, MKLivestatusSocketError(str(e)))
+                if not pending:
+                    break
+
+                ready = [r for r in pending if r.retry_at is None and r.has_pending_data()]
+                wake_ups = [t for r in pending for t in (r.deadline, r.retry_at) if t is not None]
+                timeout = 0.0 if ready else (min(wake_ups) - now if wake_ups else None)
+                for key, _mask in selector.select(timeout):
+                    if key.data not in ready:
+                        ready.append(key.data)
+
+                now = time.time()
+                for response in ready:
+                    try:
+                        complete = response.receive(now)
+                    except LivestatusTestingError:
+                        raise
+                    except (MKLivestatusSocketClosed, IOError) as e:
+                        # In case of an IO error or the other side having closed the socket,
+                        # reconnect and send the query again without blocking the other sites
+                        if not response.retried or now < response.retry_until:
+                            selector.unregister(response.socket)
+                            response.connected_site.connection.disconnect()
+                            response.retry_at = now + 0.1
+                        else:
+                            finish(response, MKLivestatusSocketError(str(e)))
+                        continue
+                    except query.suppress_exceptions:
+                        # Mostly handles exception types MKLivestatusTableNotFoundError
+                        finish(response)
+                        continue
+                    except Exception as e:
+                        if response.decoding_rows and isinstance(e, MKLivestatusQueryError):
+                            finish(response, e)  # Malformed rows, like parse_raw_response()
+                        else:
+                            finish(response, MKLivestatusSocketError("Unhandled exception: %s" % e))
+                        continue
+
+                    if not complete:
+                        continue  # Wait for the rest of the response
+                    finish(response)
+
+                    rows = response.rows
+                    if self.prepend_site:
+                        for row in rows:
+                            row.insert(0, response.site_id)
+                    yield response.site_id, rows
+        finally:
+            selector.close()
+            # The responses of these sites are incomplete, the connections can not be reused
+            for response in pending:
+                response.connected_site.connection.disconnect()
+            self.connections = [c for c in self.connections if c.id not in dead]
 
     # TODO: Is this SiteId(...) the way to go? Without this mypy complains about incompatible bytes
     # vs. Optional[SiteId]
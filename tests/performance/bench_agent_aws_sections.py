@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Wall time of the AWS special agent querying many regions one section after the other
+and concurrently
+
+The sections of the regions use the fake clients of the unit tests. Each API call takes
+some time, like a call to the AWS API does. The sections are run one after the other like
+before the sections were run concurrently, then with several workers: the sections of all
+regions run concurrently, each after the sections it receives results from, and the
+GetMetricData queries of the CloudWatch sections of a region are packed into as few calls
+as possible.
+"""
+
+import argparse
+import contextlib
+import io
+import re
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from tests.unit.cmk.special_agents.agent_aws.agent_aws_fake_clients import FakeCloudwatchClient
+from tests.unit.cmk.special_agents.agent_aws.test_agent_aws_ebs import (
+    FakeEC2Client as FakeEBSClient,
+)
+from tests.unit.cmk.special_agents.agent_aws.test_agent_aws_ec2 import FakeEC2Client
+from tests.unit.cmk.special_agents.agent_aws.test_agent_aws_elb import FakeELBClient
+from tests.unit.cmk.special_agents.agent_aws.test_agent_aws_rds import FakeRDSClient
+
+from cmk.special_agents import agent_aws
+
+_SERVICES = ["ebs", "ec2", "elb", "rds"]
+
+
+class _FakeEC2Client(FakeEC2Client):
+    describe_snapshots = FakeEBSClient.describe_snapshots
+    describe_volumes = FakeEBSClient.describe_volumes
+    describe_volume_status = FakeEBSClient.describe_volume_status
+
+
+class _SlowClient:
+    """Each call of the fake client takes some time"""
+
+    def __init__(self, client: Any, latency: float, calls: Counter) -> None:
+        self._client = client
+        self._latency = latency
+        self._calls = calls
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._client, name)
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            self._calls[name] += 1
+            time.sleep(self._latency)
+            return method(*args, **kwargs)
+
+        return call
+
+
+class _FakeSession:
+    def __init__(self, latency: float, calls: Counter) -> None:
+        self._latency = latency
+        self._calls = calls
+
+    def client(self, client_key: str, config: Any = None) -> _SlowClient:
+        return _SlowClient(
+            {
+                "cloudwatch": FakeCloudwatchClient,
+                "ec2": _FakeEC2Client,
+                "elb": FakeELBClient,
+                "rds": FakeRDSClient,
+            }[client_key](),
+            self._latency,
+            self._calls,
+        )
+
+
+def _run(regions: List[str], latency: float, workers: int) -> Tuple[float, str, Dict[str, int]]:
+    config = agent_aws.AWSConfig("hostname", [], (None, None))
+    for service in _SERVICES:
+        config.add_single_service_config("%s_names" % service, None)
+        config.add_service_tags("%s_tags" % service, (None, None))
+        config.add_single_service_config("%s_limits" % service, False)
+
+    calls: Counter = Counter()
+    s3_limits_distributor = agent_aws.ResultDistributorS3Limits()
+    all_sections = []
+    for region in regions:
+        sections = agent_aws.AWSSectionsGeneric(
+            "hostname", _FakeSession(latency, calls), max_workers=workers
+        )
+        sections.init_sections(_SERVICES, region, config, s3_limits_distributor)
+        all_sections.append(sections)
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        agent_aws.run_aws_sections(all_sections, use_cache=False, max_workers=workers)
+    return time.perf_counter() - start, output.getvalue(), dict(calls)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--regions", type=int, default=15)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API call")
+    parser.add_argument("--workers", type=int, default=[1, 10], nargs="+")
+    args = parser.parse_args()
+
+    regions = ["region-%d" % nr for nr in range(args.regions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        agent_aws.AWSCacheFilePath = Path(tmp)
+        print(
+            "%d regions, services %s, %.0f ms per API call"
+            % (len(regions), ", ".join(_SERVICES), 1000 * args.latency)
+        )
+        outputs = []
+        for workers in args.workers:
+            duration, output, calls = _run(regions, args.latency, workers)
+            outputs.append(output)
+            print(
+                "  %2d workers %8.1f ms, %4d API calls, %4d GetMetricData calls"
+                % (workers, 1000 * duration, sum(calls.values()), calls["get_metric_data"])
+            )
+
+    # All runs write the same sections in the same order. The fake clients create random
+    # contents, so only the headers are compared.
+    headers = [
+        [
+            re.sub(r"cached\(\d+,", "cached(", line)
+            for line in output.split("\n")
+            if line[:3] == "<<<"
+        ]
+        for output in outputs
+    ]
+    assert all(h == headers[0] for h in headers)
+
+
+if __name__ == "__main__":
+    main()
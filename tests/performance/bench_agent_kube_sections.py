@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Building and writing the API sections of the Kubernetes special agent for a large cluster
+
+The API objects of a synthetic cluster are built in memory. The pods of each namespace are
+looked up like before the pods were indexed (by filtering all pods of the cluster for every
+namespace) and with the pod index. Then the piggyback sections of the nodes, deployments,
+namespaces and pods are written by one and by several processes.
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import time
+from typing import Callable, List, Sequence, TypeVar
+
+from cmk.special_agents import agent_kube as agent
+from cmk.special_agents.utils_kubernetes.schemata import api
+
+_T = TypeVar("_T")
+
+_CLUSTER = "cluster"
+
+# Most pods of a cluster are running
+_PHASES = [api.Phase.RUNNING] * 8 + [api.Phase.PENDING, api.Phase.SUCCEEDED]
+
+_RESOURCES = api.ContainerResources(
+    limits=api.ResourcesRequirements(memory=2.0 * 1024**3, cpu=1.0),
+    requests=api.ResourcesRequirements(memory=1024.0**3, cpu=0.5),
+)
+
+
+def _namespace_name(nr: int) -> api.NamespaceName:
+    return api.NamespaceName("namespace-%03d" % nr)
+
+
+def _pod(nr: int, namespace: api.NamespaceName, node: api.NodeName) -> api.Pod:
+    return api.Pod(
+        uid=api.PodUID("pod-%06d" % nr),
+        metadata=api.PodMetaData(
+            name="pod-%06d" % nr,
+            namespace=namespace,
+            creation_timestamp=api.CreationTimestamp(1600000000.0),
+            labels={},
+            annotations={},
+        ),
+        status=api.PodStatus(
+            conditions=None,
+            phase=_PHASES[nr % len(_PHASES)],
+            start_time=api.Timestamp(1600000000.0),
+            qos_class="burstable",
+        ),
+        spec=api.PodSpec(
+            node=node,
+            restart_policy="Always",
+            containers=[
+                api.ContainerSpec(resources=_RESOURCES, name="app", image_pull_policy="Always")
+            ],
+            init_containers=[],
+        ),
+        containers={},
+        init_containers={},
+    )
+
+
+def _node(nr: int) -> api.Node:
+    health = api.HealthZ(status_code=200, response="ok", verbose_response=None)
+    return api.Node(
+        metadata=api.NodeMetaData(
+            name="node-%04d" % nr,
+            creation_timestamp=api.CreationTimestamp(1600000000.0),
+            labels={},
+            annotations={},
+        ),
+        status=api.NodeStatus(
+            conditions=[],
+            node_info=api.NodeInfo(
+                architecture="amd64",
+                kernel_version="5.15",
+                os_image="Ubuntu 22.04",
+                operating_system="linux",
+                container_runtime_version="containerd://1.6",
+            ),
+            addresses=[],
+        ),
+        roles=["worker"],
+        resources={
+            "allocatable": api.NodeResources(cpu=16.0, memory=64.0 * 1024**3, pods=110),
+            "capacity": api.NodeResources(cpu=16.0, memory=64.0 * 1024**3, pods=110),
+        },
+        kubelet_info=api.KubeletInfo(version="1.24", proxy_version="1.24", health=health),
+    )
+
+
+def _deployment(nr: int, namespace: api.NamespaceName, pods: Sequence[api.Pod]) -> api.Deployment:
+    return api.Deployment(
+        metadata=api.MetaData(
+            name="deployment-%05d" % nr,
+            namespace=namespace,
+            creation_timestamp=api.CreationTimestamp(1600000000.0),
+            labels={},
+            annotations={},
+        ),
+        spec=api.DeploymentSpec(
+            strategy=api.Recreate(), selector=api.Selector(match_labels={}, match_expressions=[])
+        ),
+        status=api.DeploymentStatus(
+            replicas=api.Replicas(
+                replicas=len(pods),
+                updated=len(pods),
+                available=len(pods),
+                ready=len(pods),
+                unavailable=0,
+            ),
+            conditions={},
+        ),
+        pods=[pod.uid for pod in pods],
+    )
+
+
+def _namespace(nr: int) -> api.Namespace:
+    return api.Namespace(
+        metadata=api.NamespaceMetaData(
+            name=_namespace_name(nr),
+            labels={},
+            annotations={},
+            creation_timestamp=api.CreationTimestamp(1600000000.0),
+        )
+    )
+
+
+def _resource_quota(nr: int) -> api.ResourceQuota:
+    return api.ResourceQuota(
+        metadata=api.MetaData(
+            name="quota",
+            namespace=_namespace_name(nr),
+            creation_timestamp=api.CreationTimestamp(1600000000.0),
+            labels={},
+            annotations={},
+        ),
+        spec=api.ResourceQuotaSpec(hard=None, scope_selector=None, scopes=None),
+    )
+
+
+def _cluster(
+    api_pods: Sequence[api.Pod], api_nodes: Sequence[api.Node], pods_per_deployment: int
+) -> agent.Cluster:
+    return agent.Cluster.from_api_resources(
+        excluded_node_roles=[],
+        pods=api_pods,
+        nodes=api_nodes,
+        statefulsets=[],
+        deployments=[
+            _deployment(
+                nr,
+                api_pods[nr * pods_per_deployment].metadata.namespace,
+                # The pods of the deployment are all in the same namespace
+                api_pods[nr * pods_per_deployment : (nr + 1) * pods_per_deployment],
+            )
+            for nr in range(len(api_pods) // pods_per_deployment)
+        ],
+        cron_jobs=[],
+        daemon_sets=[],
+        cluster_details=api.ClusterDetails(
+            api_health=api.APIHealth(
+                ready=api.HealthZ(status_code=200, response="ok", verbose_response=None),
+                live=api.HealthZ(status_code=200, response="ok", verbose_response=None),
+            ),
+            version=api.GitVersion("v1.24.0"),
+        ),
+    )
+
+
+def _namespace_pods_filtered(
+    api_namespaces: Sequence[api.Namespace],
+    api_pods: Sequence[api.Pod],
+    api_resource_quotas: Sequence[api.ResourceQuota],
+) -> List[object]:
+    # The lookups of the namespace sections before the pods were indexed
+    return [
+        (
+            agent.filter_pods_by_namespace(api_pods, agent.namespace_name(api_namespace)),
+            agent.filter_pods_by_phase(
+                agent.filter_pods_by_namespace(api_pods, agent.namespace_name(api_namespace)),
+                api.Phase.RUNNING,
+            ),
+            agent.filter_matching_namespace_resource_quota(
+                agent.namespace_name(api_namespace), api_resource_quotas
+            ),
+        )
+        for api_namespace in api_namespaces
+    ]
+
+
+def _namespace_pods_indexed(
+    api_namespaces: Sequence[api.Namespace],
+    api_pods: Sequence[api.Pod],
+    api_resource_quotas: Sequence[api.ResourceQuota],
+) -> List[object]:
+    pod_index = agent.PodIndex(api_pods)
+    resource_quotas = agent.resource_quotas_by_namespace(api_resource_quotas)
+    return [
+        (
+            pod_index.pods(namespace=agent.namespace_name(api_namespace)),
+            pod_index.pods(namespace=agent.namespace_name(api_namespace), phase=api.Phase.RUNNING),
+            resource_quotas.get(agent.namespace_name(api_namespace)),
+        )
+        for api_namespace in api_namespaces
+    ]
+
+
+def _write_sections(
+    cluster: agent.Cluster,
+    api_namespaces: Sequence[api.Namespace],
+    api_pods: Sequence[api.Pod],
+    api_resource_quotas: Sequence[api.ResourceQuota],
+    processes: int,
+) -> str:
+    piggyback_formatter = functools.partial(agent.cluster_piggyback_formatter, _CLUSTER)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        agent.write_nodes_api_sections(
+            _CLUSTER,
+            agent.AnnotationNonPatternOption.ignore_all,
+            cluster.nodes(),
+            functools.partial(piggyback_formatter, "node"),
+            processes=processes,
+        )
+        agent.write_deployments_api_sections(
+            _CLUSTER,
+            agent.AnnotationNonPatternOption.ignore_all,
+            cluster.deployments(),
+            functools.partial(piggyback_formatter, "deployment"),
+            processes=processes,
+        )
+        agent.write_namespaces_api_sections(
+            _CLUSTER,
+            agent.AnnotationNonPatternOption.ignore_all,
+            api_namespaces,
+            api_resource_quotas,
+            agent.PodIndex(api_pods),
+            functools.partial(piggyback_formatter, "namespace"),
+            processes=processes,
+        )
+        agent.write_pods_api_sections(
+            _CLUSTER,
+            agent.AnnotationNonPatternOption.ignore_all,
+            cluster.pods(),
+            functools.partial(piggyback_formatter, "pod"),
+            processes=processes,
+        )
+    return output.getvalue()
+
+
+def _measure(title: str, func: Callable[[], _T]) -> _T:
+    start = time.perf_counter()
+    result = func()
+    print("  %-32s %8.1f ms" % (title, 1000 * (time.perf_counter() - start)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pods", type=int, default=50000)
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--namespaces", type=int, default=200)
+    parser.add_argument("--pods-per-deployment", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=[1, 4], nargs="+")
+    args = parser.parse_args()
+
+    api_pods = [
+        _pod(
+            nr,
+            _namespace_name(nr // args.pods_per_deployment % args.namespaces),
+            api.NodeName("node-%04d" % (nr % args.nodes)),
+        )
+        for nr in range(args.pods)
+    ]
+    api_nodes = [_node(nr) for nr in range(args.nodes)]
+    api_namespaces = [_namespace(nr) for nr in range(args.namespaces)]
+    api_resource_quotas = [_resource_quota(nr) for nr in range(args.namespaces)]
+
+    print(
+        "%d pods, %d nodes, %d namespaces, %d pods per deployment"
+        % (args.pods, args.nodes, args.namespaces, args.pods_per_deployment)
+    )
+    cluster = _measure(
+        "build cluster", lambda: _cluster(api_pods, api_nodes, args.pods_per_deployment)
+    )
+    filtered = _measure(
+        "namespace pods, filtered",
+        lambda: _namespace_pods_filtered(api_namespaces, api_pods, api_resource_quotas),
+    )
+    indexed = _measure(
+        "namespace pods, indexed",
+        lambda: _namespace_pods_indexed(api_namespaces, api_pods, api_resource_quotas),
+    )
+    outputs = [
+        _measure(
+            "write sections, %d processes" % processes,
+            functools.partial(
+                _write_sections, cluster, api_namespaces, api_pods, api_resource_quotas, processes
+            ),
+        )
+        for processes in args.processes
+    ]
+    print("  %-32s %8.1f MB" % ("output", len(outputs[0]) / 1024**2))
+
+    # The index finds the same pods and quotas, and all processes write the same output
+    assert indexed == filtered
+    assert all(output == outputs[0] for output in outputs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare parsing large agent outputs line by line and by scanning for the markers
+
+The agent output is a recorded Linux agent output followed by the same output for a
+number of piggybacked hosts, like the output of a hypervisor.  The line by line parser
+is a condensed version of the parser before the marker scanning was introduced: It
+looks at every line, stores every line and decodes all sections before the selection
+is applied.
+"""
+
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from unittest import mock
+
+from cmk.utils.type_defs import AgentRawData, HostName, SectionName
+
+from cmk.core_helpers._markers import PiggybackMarker, SectionMarker
+from cmk.core_helpers.agent import AgentParser
+from cmk.core_helpers.cache import PersistedSections, SectionStore
+from cmk.core_helpers.type_defs import AgentRawDataSection, NO_SELECTION, SectionNameCollection
+
+_RECORDED = Path(__file__).parents[1] / "integration/cmk/base/test-files/linux-agent-output"
+_HOSTNAME = HostName("hypervisor")
+_CACHE_FOR = 90
+
+_Section = List[Tuple[SectionMarker, List[bytes]]]
+
+
+class _NoStore(SectionStore[AgentRawDataSection]):
+    def store(self, sections: PersistedSections[AgentRawDataSection]) -> None:
+        pass
+
+    def load(self) -> PersistedSections[AgentRawDataSection]:
+        return PersistedSections[AgentRawDataSection]({})
+
+
+def _agent_output(num_piggybacked: int) -> AgentRawData:
+    recorded = _RECORDED.read_bytes()
+    return AgentRawData(
+        recorded
+        + b"".join(
+            b"<<<<vm%04d>>>>\n%s<<<<>>>>\n" % (nr, recorded) for nr in range(num_piggybacked)
+        )
+    )
+
+
+def _parse_line_by_line(
+    raw_data: AgentRawData,
+    *,
+    selection: SectionNameCollection,
+) -> Tuple[Dict[SectionName, List[AgentRawDataSection]], Dict[HostName, List[bytes]]]:
+    now = int(time.time())
+    host_sections: _Section = []
+    piggybacked_sections: Dict[HostName, _Section] = {}
+    piggybacked_host: Optional[HostName] = None
+    content: Optional[List[bytes]] = None
+    strip = False
+    for line in raw_data.split(b"\n"):
+        line = line.rstrip(b"\r")
+        if not line.strip():
+            continue
+        if PiggybackMarker.is_header(line):
+            hostname = PiggybackMarker.from_headerline(line, {}, encoding_fallback="ascii").hostname
+            piggybacked_host = None if hostname == _HOSTNAME else hostname
+            if piggybacked_host is not None:
+                piggybacked_sections.setdefault(piggybacked_host, [])
+            content = None
+        elif PiggybackMarker.is_footer(line):
+            piggybacked_host = None
+            content = None
+        elif SectionMarker.is_header(line):
+            header = SectionMarker.from_headerline(line)
+            sections = (
+                host_sections
+                if piggybacked_host is None
+                else piggybacked_sections[piggybacked_host]
+            )
+            if not sections or sections[-1][0] != header:
+                sections.append((header, []))
+            content = sections[-1][1]
+            strip = piggybacked_host is None and not header.nostrip
+        elif SectionMarker.is_footer(line):
+            content = None
+        elif content is not None:
+            content.append(line.strip() if strip else line)
+
+    decoded: Dict[SectionName, List[AgentRawDataSection]] = {}
+    for header, lines in host_sections:
+        decoded.setdefault(header.name, []).extend(header.parse_line(line) for line in lines)
+
+    def flatten(sections: _Section) -> List[bytes]:
+        flat = []
+        for header, lines in sections:
+            if not (selection is NO_SELECTION or header.name in selection):
+                continue
+            if header.cached is None and header.persist is None:
+                header = header._replace(cached=(now, _CACHE_FOR))
+            flat.append(str(header).encode(header.encoding))
+            flat.extend(lines)
+        return flat
+
+    return (
+        {
+            name: lines
+            for name, lines in decoded.items()
+            if selection is NO_SELECTION or name in selection
+        },
+        {hostname: flatten(sections) for hostname, sections in piggybacked_sections.items()},
+    )
+
+
+def _measure(parse, repeat: int) -> float:
+    start = time.perf_counter()
+    for _nr in range(repeat):
+        parse()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--piggybacked", type=int, default=50, help="number of piggybacked hosts")
+    parser.add_argument("--repeat", type=int, default=5, help="parses of each scenario")
+    args = parser.parse_args()
+
+    raw_data = _agent_output(args.piggybacked)
+    agent_parser = AgentParser(
+        _HOSTNAME,
+        _NoStore(Path("/nonexistent"), logger=logging.getLogger("bench")),
+        check_interval=1,
+        keep_outdated=True,
+        translation={},
+        encoding_fallback="ascii",
+        simulation=False,
+        logger=logging.getLogger("bench"),
+    )
+    selections: Sequence[Tuple[str, SectionNameCollection]] = [
+        ("all sections", NO_SELECTION),
+        (
+            "3 sections selected",
+            {SectionName("df"), SectionName("mem"), SectionName("cpu")},
+        ),
+    ]
+
+    print(
+        "%.1f MB agent output, %d lines, %d piggybacked hosts"
+        % (len(raw_data) / 1024.0**2, raw_data.count(b"\n"), args.piggybacked)
+    )
+    for title, selection in selections:
+        line_by_line = _measure(
+            lambda: _parse_line_by_line(raw_data, selection=selection), args.repeat
+        )
+        by_markers = _measure(
+            lambda: agent_parser.parse(raw_data, selection=selection), args.repeat
+        )
+        print(
+            "  %-22s line by line %7.1f ms, markers %7.1f ms"
+            % (title, 1000 * line_by_line, 1000 * by_markers)
+        )
+
+        # Both parsers produce the same sections and piggybacked data
+        with mock.patch("time.time", return_value=1650000000.0):
+            sections, piggybacked_raw_data = _parse_line_by_line(raw_data, selection=selection)
+            host_sections = agent_parser.parse(raw_data, selection=selection)
+        assert host_sections.sections == sections
+        assert host_sections.piggybacked_raw_data == piggybacked_raw_data
+
+
+if __name__ == "__main__":
+    main()
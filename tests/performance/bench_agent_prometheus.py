@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Querying the node exporter sections of the Prometheus special agent from a slow server
+
+A local fake Prometheus server answers every instant query after a fixed latency, with one
+sample per device of every node. Combined queries (label_replace(...) or ...) are answered
+like Prometheus answers them. The memory, filesystem and diskstat sections of the node
+exporter are queried like before (one query after the other, each response parsed as a whole)
+and concurrently over a bounded connection pool with combined queries and streamed responses.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from urllib.parse import parse_qs, quote, urlparse
+
+from cmk.special_agents import agent_prometheus as agent
+from cmk.special_agents.utils.prometheus import generate_api_session
+
+_T = TypeVar("_T")
+
+_BATCH = re.compile(r'label_replace\(\((.*?)\), "[^"]*", "(\d+)", "", ""\)')
+
+
+class FakePrometheus:
+    def __init__(self, nodes: int, devices: int, latency: float) -> None:
+        self._nodes = nodes
+        self._devices = devices
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "FakePrometheus":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @functools.lru_cache(maxsize=None)
+    def _samples(self, promql: str) -> List[Dict[str, Any]]:
+        value = str(sum(promql.encode()) % 1000)
+        return [
+            {
+                "metric": {
+                    "instance": "node-%04d" % node,
+                    "device": "sd%d" % device,
+                    "fstype": "ext4",
+                    "mountpoint": "/mnt/%d" % device,
+                },
+                "value": [1600000000.0, value],
+            }
+            for node in range(self._nodes)
+            for device in range(self._devices)
+        ]
+
+    def _result(self, promql: str) -> List[Dict[str, Any]]:
+        if not (batch := _BATCH.findall(promql)):
+            return self._samples(promql)
+        return [
+            {**sample, "metric": {**sample["metric"], agent.BATCH_LABEL: batch_nr}}
+            for expression, batch_nr in batch
+            for sample in self._samples(expression)
+        ]
+
+    def _handler(self) -> Callable[..., BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                url = urlparse(self.path)
+                with fake._lock:
+                    fake.requests += 1
+                time.sleep(fake._latency)
+                if url.path.endswith("/targets"):
+                    data: Dict[str, Any] = {"activeTargets": []}
+                else:
+                    promql = parse_qs(url.query)["query"][0]
+                    data = {"resultType": "vector", "result": fake._result(promql)}
+                body = json.dumps({"status": "success", "data": data}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+class SequentialPrometheusAPI(agent.PrometheusAPI):
+    """The queries like before: one after the other, each response parsed as a whole"""
+
+    @contextlib.contextmanager
+    def prefetched_promql(self, promql_expressions: Any) -> Iterator[None]:
+        yield
+
+    def _query(self, promql: str) -> List[agent.PromQLMetric]:
+        response = self.session.get("query?query=%s" % quote(promql))
+        response.raise_for_status()
+        return response.json()["data"]["result"]
+
+
+def _node_exporter_sections(api_client: agent.PrometheusAPI) -> Tuple[object, ...]:
+    exporter = agent.NodeExporter(api_client)
+    return (
+        exporter.memory_summary(),
+        exporter.df_summary(),
+        exporter.df_inodes_summary(),
+        # Without the timestamp of the section
+        {node: lines[1:] for node, lines in exporter.diskstat_summary().items()},
+    )
+
+
+def _run(port: int, max_connections: Optional[int], sequential: bool) -> Tuple[object, ...]:
+    session = generate_api_session(
+        {"protocol": "http", "address": "127.0.0.1", "port": port, "verify-cert": False},
+        max_connections=max_connections,
+    )
+    if sequential:
+        return _node_exporter_sections(SequentialPrometheusAPI(session))
+    return _node_exporter_sections(
+        agent.PrometheusAPI(session, max_connections=max_connections or 1)
+    )
+
+
+def _measure(title: str, func: Callable[[], _T]) -> _T:
+    start = time.perf_counter()
+    result = func()
+    print("  %-32s %8.1f ms" % (title, 1000 * (time.perf_counter() - start)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--max-connections", type=int, default=[1, 8], nargs="+")
+    args = parser.parse_args()
+
+    print("%d nodes, %d devices, %.0f ms latency" % (args.nodes, args.devices, 1000 * args.latency))
+    with FakePrometheus(args.nodes, args.devices, args.latency) as prometheus:
+        sequential = _measure(
+            "sequential", functools.partial(_run, prometheus.port, None, sequential=True)
+        )
+        print("  %-32s %8d" % ("requests", prometheus.requests))
+        outputs = []
+        for max_connections in args.max_connections:
+            prometheus.requests = 0
+            outputs.append(
+                _measure(
+                    "concurrent, %d connections" % max_connections,
+                    functools.partial(_run, prometheus.port, max_connections, sequential=False),
+                )
+            )
+            print("  %-32s %8d" % ("requests", prometheus.requests))
+
+    # Combining the queries and performing them concurrently does not change the sections
+    assert all(output == sequential for output in outputs)
+
+
+if __name__ == "__main__":
+    main()
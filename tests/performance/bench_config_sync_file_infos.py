@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Scanning a large configuration tree for the config sync with and without the file hashes
+
+The tree looks like a large etc/check_mk/conf.d: many folders with rules and hosts files.
+It is scanned like before the file hashes were remembered (every file is hashed one after
+the other), with the parallel hashing of all files, for the first sync to a site, for a
+sync without changes and after some files have been changed.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import cmk.utils.paths
+
+from cmk.gui.watolib import activate_changes
+from cmk.gui.watolib.activate_changes import ConfigSyncFileHashes, ConfigSyncFileInfo
+from cmk.gui.watolib.config_sync import ReplicationPath
+
+_REPLICATION_PATHS = [ReplicationPath("dir", "check_mk", "etc/check_mk/conf.d/wato/", [])]
+
+
+def _create_tree(base_dir: Path, num_files: int) -> List[Path]:
+    rnd = random.Random(42)
+    files = []
+    for nr in range(num_files):
+        folder = base_dir / "etc/check_mk/conf.d/wato" / ("folder%d" % (nr // 100))
+        if nr % 100 == 0:
+            folder.mkdir(parents=True)
+        path = folder / ("rules%d.mk" % (nr % 100))
+        path.write_bytes(os.urandom(rnd.randrange(200, 8000)))
+        files.append(path)
+    return files
+
+
+def _sequential(base_dir: Path) -> Dict[str, ConfigSyncFileInfo]:
+    # Hash every file in this thread, like before
+    hash_files = activate_changes._create_config_sync_file_hashes
+    activate_changes._create_config_sync_file_hashes = lambda file_paths: [
+        activate_changes._create_config_sync_file_hash(p) for p in file_paths
+    ]
+    try:
+        return activate_changes._get_config_sync_file_infos(_REPLICATION_PATHS, base_dir)
+    finally:
+        activate_changes._create_config_sync_file_hashes = hash_files
+
+
+def _measure(title: str, scan: Callable[[], Dict[str, ConfigSyncFileInfo]]) -> Dict:
+    start = time.perf_counter()
+    infos = scan()
+    print("  %-28s %8.1f ms" % (title, 1000 * (time.perf_counter() - start)))
+    return infos
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--changed", type=int, default=100, help="files changed before a sync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = Path(tmp, "site")
+        cmk.utils.paths.var_dir = str(Path(tmp, "var"))
+        files = _create_tree(base_dir, args.files)
+
+        def scan() -> Dict[str, ConfigSyncFileInfo]:
+            return activate_changes._get_config_sync_file_infos(
+                _REPLICATION_PATHS,
+                base_dir,
+                ConfigSyncFileHashes(activate_changes.SiteId("remote")),
+            )
+
+        print("%d files, %.1f MB" % (len(files), sum(f.stat().st_size for f in files) / 1024**2))
+        expected = _measure("sequential hashing", lambda: _sequential(base_dir))
+        infos = _measure(
+            "parallel hashing",
+            lambda: activate_changes._get_config_sync_file_infos(_REPLICATION_PATHS, base_dir),
+        )
+        assert infos == expected
+        assert _measure("first sync", scan) == expected
+        assert _measure("no changes", scan) == expected
+
+        for path in random.Random(23).sample(files, args.changed):
+            path.write_bytes(os.urandom(1000))
+        infos = _measure("%d files changed" % args.changed, scan)
+
+        # Only the changed files have new hashes
+        assert infos == _sequential(base_dir)
+
+
+if __name__ == "__main__":
+    main()
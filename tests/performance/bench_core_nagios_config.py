@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare creating the Nagios configuration host by host and from the host fragments
+
+The configuration is created like the loop before the host fragments were introduced,
+then with the host fragments: without stored fragments, with the fragments of the last
+configuration and after the IP addresses of some hosts have been changed.
+
+The fragments are created by worker processes if there are enough hosts and CPUs.
+"""
+
+import argparse
+import io
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from _pytest.monkeypatch import MonkeyPatch
+
+from tests.testlib.base import Scenario
+
+import cmk.utils.paths
+from cmk.utils.type_defs import HostName
+
+import cmk.base.config as config
+import cmk.base.core_config as core_config
+import cmk.base.core_nagios as core_nagios
+
+
+def _host_by_host() -> str:
+    config_cache = config.get_config_cache()
+    outfile = io.StringIO()
+    hostnames = sorted(config_cache.all_active_hosts())
+    cfg = core_nagios.NagiosConfig(outfile, hostnames)
+    for hostname in hostnames:
+        cfg.write("\n# ----------------------------------------------------\n")
+        cfg.write("# %s\n" % hostname)
+        cfg.write("# ----------------------------------------------------\n")
+        host_attrs = core_config.get_host_attributes(hostname, config_cache)
+        host_spec = core_nagios._create_nagios_host_spec(cfg, config_cache, hostname, host_attrs)
+        cfg.write(core_nagios._format_nagios_object("host", host_spec))
+        core_nagios._create_nagios_servicedefs(cfg, config_cache, hostname, host_attrs)
+    return outfile.getvalue()
+
+
+def _from_fragments() -> str:
+    outfile = io.StringIO()
+    core_nagios.create_config(outfile, None)
+    # Only the host objects are compared, they are followed by the host groups or the other
+    # sections, which are separated by longer lines than the host objects
+    return re.split(r"define hostgroup {|\n# -{60}\n", outfile.getvalue().split("#\n\n", 1)[1])[0]
+
+
+def _measure(create: Callable[[], str]) -> float:
+    start = time.perf_counter()
+    create()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=5000)
+    parser.add_argument("--changed", type=int, default=10, help="hosts changed between runs")
+    args = parser.parse_args()
+
+    monkeypatch = MonkeyPatch()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The password store (var_dir/stored_passwords) and its secret key
+        # (omd_root/etc/password_store.secret) must not end up in the working directory
+        monkeypatch.setattr(cmk.utils.paths, "omd_root", Path(tmp))
+        monkeypatch.setattr(cmk.utils.paths, "var_dir", tmp)
+        monkeypatch.setattr(cmk.utils.paths, "autochecks_dir", tmp + "/autochecks")
+        scenario = Scenario()
+        for nr in range(args.hosts):
+            scenario.add_host(
+                HostName("host%06d" % nr),
+                ipaddress="10.%d.%d.%d" % (nr >> 16, (nr >> 8) & 255, nr & 255),
+            )
+        scenario.apply(monkeypatch)
+
+        print("%d hosts" % args.hosts)
+        print("  %-28s %7.1f ms" % ("host by host", 1000 * _measure(_host_by_host)))
+        print("  %-28s %7.1f ms" % ("fragments, none stored", 1000 * _measure(_from_fragments)))
+        print("  %-28s %7.1f ms" % ("fragments, all stored", 1000 * _measure(_from_fragments)))
+        for nr in range(args.changed):
+            config.ipaddresses[HostName("host%06d" % nr)] = "192.168.0.%d" % nr
+        print(
+            "  %-28s %7.1f ms"
+            % ("fragments, %d hosts changed" % args.changed, 1000 * _measure(_from_fragments))
+        )
+
+        # The configuration of the changed hosts has been created again
+        assert _from_fragments() == _host_by_host()
+
+    monkeypatch.undo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Message throughput of the open event handling of the Event Console during an event storm
+
+The Event Console already has the given number of open events when a storm of messages
+arrives. Each message either creates a new event (removing the oldest event of its host
+or rule when the event limit is reached), is counted on an existing event, cancels the
+events of its rule or deletes an event via a command.
+
+Only the public interface of EventStatus is used, so the script can also be used to
+compare the throughput of different revisions.
+"""
+
+import argparse
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Any
+
+import cmk.ec.export as ec
+from cmk.ec.main import EventStatus, Perfcounters
+from cmk.ec.query import MKClientError
+
+_NUM_HOSTS = 500
+_NUM_RULES = 50
+
+
+class _NullHistory:
+    """The history is not of interest here, don't let writing it dominate the timings"""
+
+    def add(self, event: Any, what: str, who: str = "", addinfo: str = "") -> None:
+        pass
+
+
+class _EventServer:
+    def __init__(self, event_status: EventStatus) -> None:
+        self._event_status = event_status
+
+    def new_event_respecting_limits(self, event: Any) -> bool:
+        self._event_status.new_event(event)
+        return True
+
+
+def _event(rng: random.Random, now: float) -> dict[str, Any]:
+    host = "host%03d" % rng.randrange(_NUM_HOSTS)
+    return {
+        "rule_id": "rule%02d" % rng.randrange(_NUM_RULES),
+        "text": "Something happened",
+        "phase": "open",
+        "count": 1,
+        "time": now,
+        "first": now,
+        "last": now,
+        "host": host,
+        "core_host": host,
+        "application": "app%d" % rng.randrange(10),
+        "facility": 1,
+        "priority": 3,
+        "match_groups": (),
+        "host_in_downtime": False,
+    }
+
+
+def _storm(event_status: EventStatus, num_messages: int, limit: int, rng: random.Random) -> None:
+    event_server = _EventServer(event_status)
+    count = {
+        "count": 10,
+        "count_ack": False,
+        "separate_host": True,
+        "separate_application": False,
+        "separate_match_groups": False,
+    }
+    for nr in range(num_messages):
+        now = time.time()
+        event = _event(rng, now)
+        kind = nr % 20
+        if kind == 0:
+            rule = {"id": event["rule_id"], "pack": "default", "cancel_actions": []}
+            event_status.cancel_events(event_server, [], event, {}, rule)  # type: ignore[arg-type]
+        elif kind == 1:
+            event["rule_id"] = "counting"
+            event_status.count_event(event_server, event, "counting", count)  # type: ignore[arg-type]
+        elif kind == 2:
+            try:
+                event_status.delete_event(rng.randrange(1, nr + 2), "")
+            except MKClientError:
+                pass  # already removed
+        else:
+            with event_status.lock:
+                ty = "by_host" if kind % 2 else "by_rule"
+                while event_status.get_num_existing_events_by(ty, event) >= limit:
+                    event_status.remove_oldest_event(ty, event)
+                event_status.new_event(event)
+
+
+def _run(num_events: int, num_messages: int) -> None:
+    rng = random.Random(num_events)
+    event_status = EventStatus(
+        ec.settings("1.2.3i45", Path("/tmp"), Path("/tmp"), ["mkeventd"]),
+        ec.default_config(),
+        Perfcounters(logging.getLogger("bench")),
+        _NullHistory(),  # type: ignore[arg-type]
+        logging.getLogger("bench"),
+    )
+
+    start = time.perf_counter()
+    now = time.time()
+    for _nr in range(num_events):
+        event_status.new_event(_event(rng, now))  # type: ignore[arg-type]
+    fill_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _storm(event_status, num_messages, num_events // _NUM_HOSTS, rng)
+    storm_time = time.perf_counter() - start
+
+    print(
+        "%7d open events: creation %7.0f events/s, storm of %d messages %7.0f messages/s"
+        % (num_events, num_events / fill_time, num_messages, num_messages / storm_time)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    for num_events in args.events:
+        _run(num_events, args.messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare history queries of the archive modes "file" (grep) and "file_indexed"
+
+Writes a synthetic history file with the requested number of lines and runs some
+typical queries of the GUI history views against both archive modes.
+"""
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import cmk.ec.export as ec
+from cmk.ec.history import _current_history_period, History, quote_tab
+from cmk.ec.main import StatusTableEvents, StatusTableHistory
+from cmk.ec.query import QueryGET
+
+_QUERIES = {
+    "host filter": ["Filter: event_host = host00042"],
+    "host + application": ["Filter: event_host = host00042", "Filter: event_application = sshd"],
+    "rule_id filter, limit 1000": ["Filter: event_rule_id = rule7", "Limit: 1001"],
+    "no filter, limit 1000": ["Limit: 1001"],
+    "text regex (not indexed)": ["Filter: event_text ~ message 12345$"],
+}
+
+
+class _StatusServer:
+    def __init__(self, history: History) -> None:
+        self._table = StatusTableHistory(logging.getLogger("bench"), history)
+
+    def table(self, name: str) -> StatusTableHistory:
+        return self._table
+
+
+def _write_history(path: Path, num_lines: int) -> None:
+    rng = random.Random(num_lines)
+    now = time.time() - num_lines
+    with path.open("wb") as f:
+        for nr in range(num_lines):
+            event: dict[str, Any] = {
+                "id": nr,
+                "host": "host%05d" % rng.randrange(5000),
+                "application": rng.choice(["sshd", "cron", "kernel", "postfix", "systemd"]),
+                "rule_id": "rule%d" % rng.randrange(50),
+                "text": "message %d" % nr,
+                "first": now + nr,
+                "last": now + nr,
+            }
+            columns = [quote_tab(str(now + nr)), b"NEW", b"", b""] + [
+                quote_tab(event.get(name[6:], default))
+                for name, default in StatusTableEvents.columns
+            ]
+            f.write(b"\t".join(columns) + b"\n")
+
+
+def _query(history: History, headers: list[str]) -> int:
+    query = QueryGET(_StatusServer(history), ["GET history", *headers], logging.getLogger("bench"))
+    return len(list(history.get(query)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = ec.default_config()
+        settings = ec.settings("bench", Path(tmp_dir), Path(tmp_dir) / "etc", ["mkeventd"])
+        history = History(
+            settings,
+            config,
+            logging.getLogger("bench"),
+            StatusTableEvents.columns,
+            StatusTableHistory.columns,
+        )
+        history_dir = settings.paths.history_dir.value
+        history_dir.mkdir(parents=True)
+        log_path = history_dir / ("%d.log" % _current_history_period(config))
+        _write_history(log_path, args.lines)
+        print("%d lines, %d MB" % (args.lines, log_path.stat().st_size // 1024**2))
+
+        config_indexed = config.copy()
+        config_indexed["archive_mode"] = "file_indexed"
+        indexed_history = History(
+            settings,
+            config_indexed,
+            logging.getLogger("bench"),
+            StatusTableEvents.columns,
+            StatusTableHistory.columns,
+        )
+        start = time.perf_counter()
+        _query(indexed_history, ["Filter: event_host = nothing"])
+        print("Initial indexing: %.2fs" % (time.perf_counter() - start))
+
+        indexed_history = History(
+            settings,
+            config_indexed,
+            logging.getLogger("bench"),
+            StatusTableEvents.columns,
+            StatusTableHistory.columns,
+        )
+        start = time.perf_counter()
+        _query(indexed_history, ["Filter: event_host = nothing"])
+        print("Loading index file: %.2fs" % (time.perf_counter() - start))
+
+        for title, headers in _QUERIES.items():
+            timings = []
+            for h in (history, indexed_history):
+                start = time.perf_counter()
+                rows = _query(h, headers)
+                timings.append((time.perf_counter() - start, rows))
+            (grep_time, grep_rows), (indexed_time, indexed_rows) = timings
+            assert grep_rows == indexed_rows, (title, grep_rows, indexed_rows)
+            print(
+                "%-28s %6d rows: grep %6.3fs, indexed %6.3fs"
+                % (title, grep_rows, grep_time, indexed_time)
+            )
+
+
+if __name__ == "__main__":
+    main()
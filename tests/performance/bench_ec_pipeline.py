@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Message throughput of the Event Console with and without the worker pipeline
+
+A set of rules with regular expressions on the message text is matched against a stream
+of syslog messages, most of which are not hit by any rule, which is the expensive case.
+The messages are either processed synchronously by the EventServer or parsed and matched
+by the given numbers of pipeline worker processes. The pipeline can only be faster when
+there are enough CPU cores for the workers and the EventServer thread.
+"""
+
+import argparse
+import logging
+import random
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+logger = logging.getLogger("cmk.mkeventd")
+
+
+def _rule(nr: int) -> dict[str, Any]:
+    return {
+        "id": "rule%03d" % nr,
+        "match": r"^(?:\S+ ){2}service%03d (?:failed|crashed) with code (\d+)$" % nr,
+        "state": 2,
+        "sl": {"value": 0, "precedence": "message"},
+        "actions": [],
+        "autodelete": False,
+        "cancel_actions": [],
+        "cancel_action_phases": "always",
+    }
+
+
+def _event_server(path: Path, num_rules: int, pipeline_workers: int) -> cmk.ec.main.EventServer:
+    settings = ec.settings("1.2.3i45", path, path / "etc", ["mkeventd"])
+    wato_config = ec.default_config()
+    wato_config["pipeline_workers"] = pipeline_workers
+    wato_config["rule_packs"] = [
+        {
+            "id": "default",
+            "title": "Default",
+            "disabled": False,
+            "rules": [_rule(nr) for nr in range(num_rules)],
+        }
+    ]
+    config = cmk.ec.main.make_config(wato_config)
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    history = cmk.ec.history.History(
+        settings,
+        config,
+        logger,
+        cmk.ec.main.StatusTableEvents.columns,
+        cmk.ec.main.StatusTableHistory.columns,
+    )
+    event_server = cmk.ec.main.EventServer(
+        logging.getLogger("cmk.mkeventd.EventServer"),
+        settings,
+        config,
+        cmk.ec.main.default_slave_status_master(),
+        perfcounters,
+        cmk.ec.main.ECLock(logging.getLogger("cmk.mkeventd.configuration")),
+        history,
+        cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger),
+        cmk.ec.main.StatusTableEvents.columns,
+        False,
+    )
+    # Don't ask a monitoring core for the hosts of the events
+    event_server._add_core_host_to_new_event = lambda event: None  # type: ignore[assignment]
+    event_server.compile_rules(wato_config["rule_packs"])
+    return event_server
+
+
+def _messages(num_messages: int, num_rules: int) -> list[bytes]:
+    rng = random.Random(num_messages)
+    return [
+        b"<78>Dec 24 11:00:00 host%03d app[123]: unit service%03d %s with code %d"
+        % (
+            rng.randrange(100),
+            rng.randrange(num_rules * 10),
+            b"failed" if rng.randrange(100) else b"crashed",
+            rng.randrange(10),
+        )
+        for _nr in range(num_messages)
+    ]
+
+
+def _run(num_rules: int, pipeline_workers: int, messages: list[bytes]) -> list[Any]:
+    with TemporaryDirectory() as tmp_dir:
+        event_server = _event_server(Path(tmp_dir), num_rules, pipeline_workers)
+        # Start the worker processes before measuring
+        event_server.process_raw_lines(messages[0], ("1.2.3.4", 514))
+        event_server.process_pipeline_results(drain=True)
+
+        start = time.perf_counter()
+        # Like EventServer.serve(), which reads a batch of pending datagrams at once
+        for nr in range(1, len(messages), cmk.ec.main._PIPELINE_BATCH_SIZE):
+            for data in messages[nr : nr + cmk.ec.main._PIPELINE_BATCH_SIZE]:
+                event_server.process_raw_lines(data, ("1.2.3.4", 514))
+            event_server.process_pipeline_results()
+        event_server.process_pipeline_results(drain=True)
+        duration = time.perf_counter() - start
+
+        if event_server._pipeline is not None:
+            event_server._pipeline.close()
+
+    print(
+        "%4d rules, %2d pipeline workers: %7.0f messages/s"
+        % (num_rules, pipeline_workers, (len(messages) - 1) / duration)
+    )
+    return [
+        (event["rule_id"], event["host"], event["text"])
+        for event in event_server._event_status.events()
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    for num_rules in args.rules:
+        messages = _messages(args.messages, num_rules)
+        expected = _run(num_rules, 0, messages)
+        for pipeline_workers in args.workers:
+            assert _run(num_rules, pipeline_workers, messages) == expected
+
+
+if __name__ == "__main__":
+    main()
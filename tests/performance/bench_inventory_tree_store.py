@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Loading and comparing large inventory trees stored as repr and as indexed files
+
+The trees look like the inventory of a host with many software packages and interfaces.
+Each tree is loaded completely, only one table is loaded like the inventory table views
+do, and two trees of the inventory history are loaded and compared like the history
+does. The newer tree differs from the older one in some packages.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from cmk.utils.structured_data import SDPath, StructuredDataNode, StructuredDataStore
+from cmk.utils.type_defs import HostName
+
+_T = TypeVar("_T")
+
+_PACKAGES: SDPath = ("software", "packages")
+
+
+def _raw_tree(num_rows: int, num_changed: int) -> dict:
+    rnd = random.Random(42)
+    packages = [
+        {
+            "name": "package%06d" % nr,
+            "version": "1.%d.%d" % (nr % 7, rnd.randrange(20)),
+            "arch": "amd64",
+            "package_type": "deb",
+            "summary": "Package number %d" % nr,
+            "size": rnd.randrange(10**7),
+        }
+        for nr in range(num_rows)
+    ]
+    for package in rnd.sample(packages, num_changed):
+        package["version"] = "2.0.0"
+    return {
+        "hardware": {
+            "cpu": {"arch": "x86_64", "cores": 16, "model": "Intel(R) Xeon(R) Gold 6248"},
+            "memory": {"total_ram_usable": 135088615424, "total_swap": 0},
+        },
+        "networking": {
+            "interfaces": [
+                {"index": nr, "description": "eth%d" % nr, "speed": 10**9, "oper_status": 1}
+                for nr in range(num_rows // 100)
+            ]
+        },
+        "software": {
+            "os": {"name": "Ubuntu 22.04 LTS", "kernel_version": "5.15.0-25-generic"},
+            "packages": packages,
+        },
+    }
+
+
+def _measure(title: str, func: Callable[[], _T]) -> _T:
+    start = time.perf_counter()
+    result = func()
+    print("  %-32s %8.1f ms" % (title, 1000 * (time.perf_counter() - start)))
+    return result
+
+
+def _compare(tree_store: StructuredDataStore) -> StructuredDataNode:
+    return (
+        tree_store.load(host_name=HostName("new"))
+        .compare_with(tree_store.load(host_name=HostName("old")))
+        .delta
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--changed", type=int, default=100, help="packages changed in the history")
+    args = parser.parse_args()
+
+    old_tree = StructuredDataNode.deserialize(_raw_tree(args.rows, 0))
+    new_tree = StructuredDataNode.deserialize(_raw_tree(args.rows, args.changed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for title, indexed in [("repr", False), ("indexed", True)]:
+            tree_store = StructuredDataStore(Path(tmp, title), indexed=indexed)
+            print(title)
+            _measure("save", lambda: tree_store.save(host_name=HostName("old"), tree=old_tree))
+            tree_store.save(host_name=HostName("new"), tree=new_tree)
+            print(
+                "  %-32s %8.1f MB"
+                % (
+                    "file size",
+                    Path(tmp, title, ".old.index" if indexed else "old").stat().st_size
+                    / 1024.0**2,
+                )
+            )
+            tree = _measure("load", lambda: tree_store.load(host_name=HostName("old")))
+            table = _measure(
+                "load %s" % ".".join(_PACKAGES),
+                lambda: tree_store.load(host_name=HostName("old"), paths=[_PACKAGES]),
+            )
+            delta = _measure("load and compare", lambda: _compare(tree_store))
+            results.append((tree, table, delta))
+
+        # Both formats contain the same trees, tables and deltas
+        expected_delta = new_tree.compare_with(old_tree).delta
+        for tree, table, delta in results:
+            assert tree.is_equal(old_tree)
+            assert table.get_node(_PACKAGES).is_equal(old_tree.get_node(_PACKAGES))
+            assert table.get_node(("hardware",)) is None
+            assert delta.is_equal(expected_delta)
+
+
+if __name__ == "__main__":
+    main()
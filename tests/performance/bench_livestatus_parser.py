@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Memory and latency of decoding large livestatus responses
+
+A canned services response is served by a fake livestatus on a local socket pair and
+decoded by a SingleSiteConnection in one piece with query(), while it is received with
+query_rows() and into column arrays with query_columns(). Each measurement is done in a
+fresh process with limited address space. The peak memory is measured with tracemalloc
+in a separate run, because tracing slows down the decoding.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import resource
+import socket
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import livestatus
+
+_COLUMNS = ["host_name", "description", "state", "execution_time", "plugin_output"]
+
+
+def _rows(num_rows: int) -> Iterator[List[Any]]:
+    for nr in range(num_rows):
+        yield [
+            "host%05d" % (nr // 50),
+            "Service %02d" % (nr % 50),
+            nr % 4,
+            (nr % 1000) / 100.0,
+            "OK - Everything is fine, value %d" % nr,
+        ]
+
+
+def _response(num_rows: int, use_json: bool) -> bytes:
+    # Like livestatus: One row per line
+    encode = json.dumps if use_json else repr
+    data = ("[%s]\n" % ",\n".join(map(encode, _rows(num_rows)))).encode("utf-8")
+    return b"%-3d %11d\n" % (200, len(data)) + data
+
+
+def _checksum(rows: Iterator[List[Any]]) -> str:
+    digest = hashlib.md5()
+    for row in rows:
+        digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FakeLivestatus(threading.Thread):
+    def __init__(self, response: bytes) -> None:
+        super().__init__(daemon=True)
+        self.response = response
+        self.client, self._server = socket.socketpair()
+
+    def run(self) -> None:
+        with self._server, contextlib.suppress(OSError):  # The client may run out of memory
+            buf = b""
+            while b"\n\n" not in buf:
+                buf += self._server.recv(4096)
+            self._server.sendall(self.response)
+
+
+def _query_complete(connection, query, first_row):
+    rows = connection.query(query)
+    first_row()
+    return rows
+
+
+def _query_rows(connection, query, first_row):
+    rows = []
+    for row in connection.query_rows(query):
+        if not rows:
+            first_row()
+        rows.append(row)
+    return rows
+
+
+def _query_columns(connection, query, first_row):
+    columns = connection.query_columns(query, {"state": "b", "execution_time": "d"})
+    first_row()
+    return (list(row) for row in zip(*columns.values()))
+
+
+_MODES: dict[str, Callable[..., Any]] = {
+    "query()": _query_complete,
+    "query_rows()": _query_rows,
+    "query_columns()": _query_columns,
+}
+
+Measurement = Tuple[float, float, float, str]
+
+
+def _measure(mode: str, num_rows: int, use_json: bool, memory_limit: int) -> Optional[Measurement]:
+    """Duration, latency of the first row, peak memory and checksum of the rows"""
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    response = _response(num_rows, use_json)
+    if use_json:
+        query = livestatus.Query(livestatus.QuerySpecification("services", _COLUMNS))
+    else:
+        query = livestatus.Query("GET services\nColumns: %s\n" % " ".join(_COLUMNS))
+
+    def run(trace: bool) -> Tuple[float, float, float, Any]:
+        fake_livestatus = FakeLivestatus(response)
+        fake_livestatus.start()
+        connection = livestatus.SingleSiteConnection("unix:/not/existing")
+        connection.socket = fake_livestatus.client
+        first_row: List[float] = []
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = _MODES[mode](
+            connection, query, lambda: first_row.append(time.perf_counter() - start)
+        )
+        duration = time.perf_counter() - start
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        connection.disconnect()
+        return duration, first_row[0], peak, result
+
+    try:
+        duration, latency, _peak, result = run(trace=False)
+        checksum = _checksum(result)
+        del result
+        _duration, _latency, peak, _result = run(trace=True)
+    except MemoryError:
+        return None
+    return duration, latency, peak, checksum
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--memory-limit", type=int, default=4096, help="MB per measurement")
+    args = parser.parse_args()
+
+    expected = _checksum(_rows(args.rows))
+    context = multiprocessing.get_context("fork")
+    for use_json in [False, True]:
+        response_size = len(_response(args.rows, use_json))
+        print("Response of %d rows: %.1f MB" % (args.rows, response_size / 1024.0**2))
+        for mode in _MODES:
+            with context.Pool(1) as pool:
+                measurement = pool.apply(
+                    _measure, (mode, args.rows, use_json, args.memory_limit * 1024**2)
+                )
+            output_format = "json" if use_json else "python"
+            if measurement is None:
+                print("%-6s %-15s: out of memory" % (output_format, mode))
+                continue
+            duration, latency, peak, checksum = measurement
+            assert checksum == expected, mode
+            print(
+                "%-6s %-15s: %6.2f s, first row after %6.2f s, peak memory %7.1f MB"
+                % (output_format, mode, duration, latency, peak / 1024.0**2)
+            )
+
+
+if __name__ == "__main__":
+    main()
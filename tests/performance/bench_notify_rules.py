@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Throughput of matching the notification rules when replaying a notification backlog
+
+The notifications of the backlog are matched against all rules, like the rule based
+notifications did before the rule index was introduced, and against the candidates of
+the rule index. The backlog is a recorded backlog.mk (see notification_backlog) or a
+generated one of an outage: notifications of many hosts and their services.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import cmk.utils.store as store
+from cmk.utils.type_defs import EventContext, EventRule
+
+from cmk.base.notify import NotificationRuleIndex, rbn_match_rule
+
+_NUM_HOSTS = 5000
+_TAGS = ["prod", "test", "lan", "wan", "dmz", "linux", "windows", "snmp"]
+
+
+def _hostname(nr: int) -> str:
+    return "host%05d" % nr
+
+
+def _contactgroup(nr: int) -> str:
+    return "team%02d" % nr
+
+
+def _rules(num_rules: int) -> List[EventRule]:
+    rnd = random.Random(42)
+    rules: List[EventRule] = []
+    for nr in range(num_rules):
+        rule: EventRule = {
+            "description": "Rule %d" % nr,
+            "contact_groups": [_contactgroup(nr % 50)],
+            "notify_plugin": ("mail", {}),
+        }
+        kind = nr % 4
+        if kind == 0:
+            rule["match_hosts"] = [_hostname(rnd.randrange(_NUM_HOSTS)) for _nr in range(5)]
+        elif kind == 1:
+            rule["match_hosttags"] = [rnd.choice(_TAGS[:2]), rnd.choice(_TAGS[2:])]
+        elif kind == 2:
+            rule["match_contactgroups"] = [_contactgroup(nr % 50)]
+        if nr % 3 == 0:
+            rule["match_service_event"] = ["?c", "?w", "?r"]
+            rule["match_services"] = ["CPU", "Filesystem /$", "Interface %d$" % (nr % 10)]
+        elif nr % 3 == 1:
+            rule["match_host_event"] = ["?d", "?r"]
+        rule["match_plugin_output"] = "(error|timeout|critical)"
+        rules.append(rule)
+    return rules
+
+
+def _backlog(num_notifications: int) -> List[EventContext]:
+    rnd = random.Random(23)
+    backlog: List[EventContext] = []
+    for _nr in range(num_notifications):
+        host_nr = rnd.randrange(_NUM_HOSTS)
+        context: EventContext = {
+            "OMD_SITE": "heute",
+            "NOTIFICATIONTYPE": "PROBLEM",
+            "HOSTNAME": _hostname(host_nr),
+            "HOSTTAGS": " ".join(rnd.sample(_TAGS, 3) + ["/wato/folder%d/" % (host_nr % 20)]),
+            "HOSTCONTACTGROUPNAMES": _contactgroup(host_nr % 50),
+            "HOSTOUTPUT": "connection timeout",
+        }
+        if rnd.random() < 0.2:
+            context.update(
+                {
+                    "WHAT": "HOST",
+                    "HOSTSTATE": "DOWN",
+                    "PREVIOUSHOSTHARDSTATE": "UP",
+                }
+            )
+        else:
+            context.update(
+                {
+                    "WHAT": "SERVICE",
+                    "SERVICEDESC": rnd.choice(["CPU load", "Filesystem /", "Interface 3"]),
+                    "SERVICESTATE": "CRITICAL",
+                    "PREVIOUSSERVICEHARDSTATE": "OK",
+                    "SERVICECONTACTGROUPNAMES": _contactgroup(host_nr % 50),
+                    "SERVICEOUTPUT": "critical: load too high",
+                }
+            )
+        backlog.append(context)
+    return backlog
+
+
+def _replay(
+    backlog: Sequence[EventContext], candidates: Callable[[EventContext], Sequence[EventRule]]
+) -> List[List[str]]:
+    return [
+        [
+            rule["description"]
+            for rule in candidates(context)
+            if rbn_match_rule(rule, context) is None
+        ]
+        for context in backlog
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--backlog", type=Path, help="replay a recorded backlog.mk")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.backlog
+        if path is None:
+            path = Path(tmp, "backlog.mk")
+            store.save_object_to_file(path, _backlog(args.notifications), pretty=False)
+        backlog = store.load_object_from_file(path, default=[])
+
+    rules = _rules(args.rules)
+    start = time.perf_counter()
+    rule_index = NotificationRuleIndex(rules)
+    build = time.perf_counter() - start
+
+    print("%d rules, %d notifications" % (len(rules), len(backlog)))
+    print("  index built in %.1f ms" % (1000 * build))
+    results = []
+    for title, candidates in [
+        ("all rules", lambda context: rules),
+        ("rule index", rule_index.candidates),
+    ]:
+        start = time.perf_counter()
+        results.append(_replay(backlog, candidates))
+        duration = time.perf_counter() - start
+        print(
+            "  %-12s %8.1f ms, %8.0f notifications/s"
+            % (title, 1000 * duration, len(backlog) / duration)
+        )
+
+    # The same rules match each notification
+    assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Startup time and memory of a helper reading the packed config
+
+The packed config of a site with many hosts and check parameter rules is read like
+load_packed_config() does: All variables are put into the config module. Then the
+helper looks up the keyed variables of some hosts and check groups. The config is
+read from one pickle, like before the packed config was indexed, and from the indexed
+packed config.
+
+Each measurement is done in a fresh process. The anonymous memory is the memory the
+process allocated for itself, the file backed memory are the pages of the memory
+mapped packed config, which are shared between all helpers.
+"""
+
+import argparse
+import multiprocessing
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Tuple
+
+from cmk.base.config import PackedConfigStore
+
+
+def _helper_config(num_hosts: int, num_checkgroups: int) -> Mapping[str, Any]:
+    hosts = ["host%06d" % nr for nr in range(num_hosts)]
+    return {
+        "all_hosts": [
+            "%s|lan|prod|tcp|site:heute|wato|/wato/folder%d/" % (h, nr % 100)
+            for nr, h in enumerate(hosts)
+        ],
+        "host_paths": {h: "/wato/folder%d/hosts.mk" % (nr % 100) for nr, h in enumerate(hosts)},
+        "host_attributes": {
+            h: {
+                "alias": "Host number %d" % nr,
+                "ipaddress": "10.%d.%d.%d" % (nr >> 16, (nr >> 8) & 255, nr & 255),
+                "labels": {"os": "linux", "location": "rack%d" % (nr % 40)},
+                "meta_data": {"created_at": 1650000000.0 + nr, "created_by": "cmkadmin"},
+            }
+            for nr, h in enumerate(hosts)
+        },
+        "ipaddresses": {
+            h: "10.%d.%d.%d" % (nr >> 16, (nr >> 8) & 255, nr & 255) for nr, h in enumerate(hosts)
+        },
+        "explicit_snmp_communities": {h: "secret%d" % nr for nr, h in enumerate(hosts[::4])},
+        "checkgroup_parameters": {
+            f"checkgroup{group:03d}": [
+                {
+                    "id": "%08x-rule" % (group * 100 + nr),
+                    "value": {"levels": (80.0 + nr, 90.0 + nr), "average": 15, "unit": "%"},
+                    "condition": {"host_name": hosts[nr::50][:20], "host_tags": {"prod": "prod"}},
+                    "options": {"description": "Rule %d of check group %d" % (nr, group)},
+                }
+                for nr in range(20)
+            ]
+            for group in range(num_checkgroups)
+        },
+        **{
+            f"ruleset{nr:02d}": [
+                {"id": "rule%d" % rule, "value": rule, "condition": {"host_folder": "/wato/"}}
+                for rule in range(50)
+            ]
+            for nr in range(50)
+        },
+    }
+
+
+def _write(directory: Path, num_hosts: int, num_checkgroups: int) -> Tuple[int, int]:
+    helper_config = _helper_config(num_hosts, num_checkgroups)
+    with (directory / "pickle").open("wb") as f:
+        pickle.dump(helper_config, f)
+    PackedConfigStore(directory / "packed").write(helper_config)
+    return (directory / "pickle").stat().st_size, (directory / "packed").stat().st_size
+
+
+def _memory() -> Dict[str, int]:
+    with open("/proc/self/smaps_rollup") as f:
+        return {
+            line.split(":")[0]: int(line.split()[1]) * 1024
+            for line in f
+            if line.split(":")[0] in {"Rss", "Anonymous"}
+        }
+
+
+def _load(path: Path, indexed: bool, lookups: int) -> Tuple[float, int, int, Any]:
+    """Duration, anonymous and file backed memory, and the looked up values"""
+    before = _memory()
+    start = time.perf_counter()
+    if indexed:
+        packed_config = PackedConfigStore(path).read()
+    else:
+        with path.open("rb") as f:
+            packed_config = pickle.load(f)
+    module_globals = dict(packed_config)
+    looked_up: List[Any] = []
+    for nr in range(lookups):
+        looked_up.append(module_globals["host_attributes"].get("host%06d" % nr))
+        looked_up.append(module_globals["ipaddresses"].get("host%06d" % nr))
+        looked_up.append(module_globals["checkgroup_parameters"].get("checkgroup%03d" % nr))
+    duration = time.perf_counter() - start
+    after = _memory()
+    anonymous = after["Anonymous"] - before["Anonymous"]
+    return duration, anonymous, after["Rss"] - before["Rss"] - anonymous, looked_up
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=50000)
+    parser.add_argument("--checkgroups", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=[1, 100], nargs="+")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        with context.Pool(1) as pool:
+            sizes = pool.apply(_write, (directory, args.hosts, args.checkgroups))
+        print(
+            "%d hosts, %d check groups: pickle %.1f MB, packed config %.1f MB"
+            % (args.hosts, args.checkgroups, sizes[0] / 1024.0**2, sizes[1] / 1024.0**2)
+        )
+        for lookups in args.lookups:
+            results = []
+            for name, indexed in [("pickle", False), ("packed", True)]:
+                with context.Pool(1) as pool:
+                    duration, anonymous, file_backed, looked_up = pool.apply(
+                        _load, (directory / name, indexed, lookups)
+                    )
+                results.append(looked_up)
+                print(
+                    "  %3d lookups, %-6s: %7.1f ms, anonymous %6.1f MB, file backed %6.1f MB"
+                    % (
+                        lookups,
+                        name,
+                        1000 * duration,
+                        anonymous / 1024.0**2,
+                        file_backed / 1024.0**2,
+                    )
+                )
+            # Both configs contain the same values
+            assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main()
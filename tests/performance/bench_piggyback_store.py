@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Storing and reading the piggyback data of many sources and piggybacked hosts
+
+The sources look like vCenters or cluster managers: each one sends the data of many
+piggybacked hosts. The data is stored like before the piggyback index was introduced (one
+file per piggybacked host and source) and with the index. Then the data of every
+piggybacked host is read, from the directory of the host or with the index lookups. The
+data of the former layout is moved to the index when it is read for the first time.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Sequence, Tuple, TypeVar
+
+import cmk.utils.paths
+import cmk.utils.piggyback as piggyback
+from cmk.utils.type_defs import HostName
+
+_T = TypeVar("_T")
+
+_TIME_SETTINGS: piggyback.PiggybackTimeSettings = [(None, "max_cache_age", 3600)]
+
+
+def _raw_data(num_sources: int, num_hosts: int) -> Mapping[HostName, Dict[HostName, List[bytes]]]:
+    return {
+        HostName("source%03d" % source_nr): {
+            HostName("host%06d" % host_nr): [
+                b"<<<<host%06d>>>>" % host_nr,
+                b"<<<esx_vsphere_vm>>>",
+                b"runtime.powerState poweredOn",
+                b"summary.quickStats.overallCpuUsage %d" % (host_nr * source_nr),
+                b"<<<<>>>>",
+            ]
+            for host_nr in range(source_nr, num_hosts, num_sources)
+        }
+        for source_nr in range(num_sources)
+    }
+
+
+def _legacy_store(
+    base_dir: Path, raw_data: Mapping[HostName, Mapping[HostName, Sequence[bytes]]]
+) -> None:
+    for source_hostname, piggybacked_raw_data in raw_data.items():
+        for piggybacked_hostname, lines in piggybacked_raw_data.items():
+            host_dir = base_dir / "piggyback" / piggybacked_hostname
+            host_dir.mkdir(parents=True, exist_ok=True)
+            (host_dir / source_hostname).write_bytes(b"%s\n" % b"\n".join(lines))
+        (base_dir / "piggyback_sources").mkdir(exist_ok=True)
+        (base_dir / "piggyback_sources" / source_hostname).touch()
+        os.utime(base_dir / "piggyback_sources" / source_hostname, (0, 0))
+
+
+def _legacy_read(base_dir: Path, piggybacked_hostname: HostName) -> List[Tuple[str, bytes]]:
+    # The file system accesses of the former get_piggyback_raw_data(): the folder of the
+    # host is listed, the file of each source is checked for its age and compared with
+    # the status file of the source, then it is read.
+    data = []
+    source_files = sorted((base_dir / "piggyback" / piggybacked_hostname).iterdir())
+    time_settings = piggyback._TimeSettingsMap(
+        [HostName(f.name) for f in source_files], piggybacked_hostname, _TIME_SETTINGS
+    )
+    for source_file in source_files:
+        time_settings.max_cache_age(HostName(source_file.name), piggybacked_hostname)
+        time_settings.validity_period(HostName(source_file.name), piggybacked_hostname)
+        time_settings.validity_state(HostName(source_file.name), piggybacked_hostname)
+        status_file = base_dir / "piggyback_sources" / source_file.name
+        source_file.stat()
+        if status_file.exists():
+            assert status_file.stat().st_mtime <= source_file.stat().st_mtime
+        data.append((source_file.name, source_file.read_bytes()))
+    return data
+
+
+def _read(piggybacked_hostname: HostName) -> List[Tuple[str, bytes]]:
+    return [
+        (d.info.source_hostname, d.raw_data)
+        for d in piggyback.get_piggyback_raw_data(piggybacked_hostname, _TIME_SETTINGS)
+    ]
+
+
+def _measure(title: str, func: Callable[[], _T]) -> _T:
+    start = time.perf_counter()
+    result = func()
+    print("  %-32s %8.1f ms" % (title, 1000 * (time.perf_counter() - start)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, default=20)
+    parser.add_argument("--hosts", type=int, default=20000)
+    args = parser.parse_args()
+
+    raw_data = _raw_data(args.sources, args.hosts)
+    hostnames = [HostName("host%06d" % nr) for nr in range(args.hosts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = Path(tmp, "legacy")
+        print("%d sources, %d piggybacked hosts" % (args.sources, args.hosts))
+        print("file per host and source")
+        _measure("store", lambda: _legacy_store(legacy_dir, raw_data))
+        legacy = _measure(
+            "read all hosts", lambda: [_legacy_read(legacy_dir, h) for h in hostnames]
+        )
+
+        print("index, moved from the former layout")
+        cmk.utils.paths.piggyback_dir = legacy_dir / "piggyback"
+        cmk.utils.paths.piggyback_source_dir = legacy_dir / "piggyback_sources"
+        _measure("move", lambda: _read(hostnames[0]))
+        migrated = _measure("read all hosts", lambda: [_read(h) for h in hostnames])
+
+        print("index")
+        cmk.utils.paths.piggyback_dir = Path(tmp, "piggyback")
+        cmk.utils.paths.piggyback_source_dir = Path(tmp, "piggyback_sources")
+
+        def store() -> None:
+            for source_hostname, piggybacked_raw_data in raw_data.items():
+                piggyback.store_piggyback_raw_data(source_hostname, piggybacked_raw_data)
+
+        _measure("store", store)
+        _measure("store again", store)
+        indexed = _measure("read all hosts", lambda: [_read(h) for h in hostnames])
+        _measure("cleanup", lambda: piggyback.cleanup_piggyback_files(_TIME_SETTINGS))
+        print(
+            "  %-32s %8d"
+            % (
+                "files",
+                sum(
+                    len(os.listdir(cmk.utils.paths.piggyback_dir / name))
+                    for name in [".data", ".sources"]
+                )
+                + 1,
+            )
+        )
+
+        # Both layouts contain the same data of the same sources
+        assert migrated == legacy
+        assert indexed == legacy
+        assert indexed == [_read(h) for h in hostnames]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the indexed host matching of the RulesetOptimizer with a linear rule evaluation
+
+The linear evaluation is the per host loop the RulesetOptimizer used for all rules which
+could not be resolved by exact host names: every rule condition is evaluated for every host.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Set
+
+from cmk.utils.labels import LabelManager
+from cmk.utils.rulesets.ruleset_matcher import (
+    matches_labels,
+    RulesetMatcher,
+    RulesetMatchObject,
+    RulesetOptimizer,
+)
+from cmk.utils.type_defs import HostName, Labels, RuleSpec
+
+_TAG_GROUPS = {
+    "agent": ["cmk-agent", "no-agent", "special-agents"],
+    "criticality": ["prod", "critical", "test", "offline"],
+    "networking": ["lan", "wan", "dmz"],
+    "address_family": ["ip-v4-only", "ip-v6-only", "ip-v4v6"],
+}
+
+
+def _make_config(num_hosts: int, rng: random.Random):
+    host_tags = {}
+    host_paths = {}
+    explicit_labels = {}
+    for nr in range(num_hosts):
+        hostname = HostName("host%06d" % nr)
+        host_tags[hostname] = {group: rng.choice(tags) for group, tags in _TAG_GROUPS.items()}
+        host_paths[hostname] = "/wato/dc%d/rack%d/" % (nr % 8, nr % 50)
+        explicit_labels[hostname] = {"os": rng.choice(["linux", "windows", "aix"])}
+    return host_tags, host_paths, explicit_labels
+
+
+def _make_ruleset(num_rules: int, num_hosts: int, rng: random.Random) -> List[RuleSpec]:
+    ruleset: List[RuleSpec] = []
+    for nr in range(num_rules):
+        condition: Dict = {}
+        kind = nr % 6
+        if kind in (0, 1, 5):
+            group = rng.choice(list(_TAG_GROUPS))
+            tag = rng.choice(_TAG_GROUPS[group])
+            condition["host_tags"] = {group: tag if kind != 1 else {"$ne": tag}}
+        if kind in (1, 2):
+            condition["host_folder"] = "/wato/dc%d/" % rng.randrange(8)
+        if kind == 3:
+            condition["host_name"] = [
+                HostName("host%06d" % rng.randrange(num_hosts)) for _ in range(5)
+            ]
+        if kind == 4:
+            condition["host_name"] = [{"$regex": "host0%d" % rng.randrange(10)}]
+        if kind == 5:
+            condition["host_labels"] = {"os": rng.choice(["linux", "windows"])}
+        ruleset.append({"id": str(nr), "value": nr, "condition": condition})
+    return ruleset
+
+
+def _linear_matching_hosts(
+    optimizer: RulesetOptimizer,
+    ruleset: List[RuleSpec],
+    host_tags: Dict[HostName, Set],
+    host_paths: Dict[HostName, str],
+    labels: Dict[HostName, Labels],
+) -> Dict[HostName, List]:
+    host_values: Dict[HostName, List] = {}
+    for rule in ruleset:
+        condition = rule["condition"]
+        rule_path = condition.get("host_folder", "/")
+        for hostname in host_tags:
+            if not host_paths.get(hostname, "/").startswith(rule_path):
+                continue
+            tag_conditions = condition.get("host_tags")
+            if tag_conditions and not optimizer.matches_host_tags(
+                host_tags[hostname], tag_conditions
+            ):
+                continue
+            label_conditions = condition.get("host_labels")
+            if label_conditions and not matches_labels(labels[hostname], label_conditions):
+                continue
+            if not optimizer.matches_host_name(condition.get("host_name"), hostname):
+                continue
+            host_values.setdefault(hostname, []).append(rule["value"])
+    return host_values
+
+
+def _run(num_hosts: int, num_rules: int, num_rulesets: int) -> None:
+    rng = random.Random(num_hosts)
+    host_tags, host_paths, explicit_labels = _make_config(num_hosts, rng)
+    rulesets = [_make_ruleset(num_rules, num_hosts, rng) for _ in range(num_rulesets)]
+    all_hosts = set(host_tags)
+
+    matcher = RulesetMatcher(
+        tag_to_group_map={},
+        host_tags=host_tags,
+        host_paths=host_paths,
+        labels=LabelManager(explicit_labels, [], [], lambda h, s: {}),
+        all_configured_hosts=all_hosts,
+        clusters_of={},
+        nodes_of={},
+    )
+    optimizer = matcher.ruleset_optimizer
+    labels = {hostname: matcher.labels_of_host(hostname) for hostname in all_hosts}
+    tag_sets = {hostname: set(tags.items()) for hostname, tags in host_tags.items()}
+
+    start = time.perf_counter()
+    linear = [
+        _linear_matching_hosts(optimizer, ruleset, tag_sets, host_paths, labels)
+        for ruleset in rulesets
+    ]
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [
+        {
+            hostname: list(
+                matcher.get_host_ruleset_values(
+                    RulesetMatchObject(hostname), ruleset, is_binary=False
+                )
+            )
+            for hostname in all_hosts
+        }
+        for ruleset in rulesets
+    ]
+    indexed_time = time.perf_counter() - start
+
+    for linear_result, indexed_result in zip(linear, indexed):
+        for hostname in all_hosts:
+            assert sorted(linear_result.get(hostname, [])) == sorted(indexed_result[hostname])
+
+    print(
+        "%6d hosts, %d rulesets a %d rules: linear %7.2fs, indexed %7.2fs (x%.1f)"
+        % (
+            num_hosts,
+            num_rulesets,
+            num_rules,
+            linear_time,
+            indexed_time,
+            linear_time / indexed_time,
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--rules", type=int, default=60)
+    parser.add_argument("--rulesets", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The builtin / discovered host labels are looked up in the site
+        os.environ.setdefault("OMD_SITE", "bench")
+        os.environ.setdefault("OMD_ROOT", tmp_dir)
+        for num_hosts in args.hosts:
+            _run(num_hosts, args.rules, args.rulesets)
+
+
+if __name__ == "__main__":
+    main()
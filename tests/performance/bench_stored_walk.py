@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare lookups in stored SNMP walks as text lines and in the binary walk index
+
+Writes a synthetic walk with a large interface table and walks some of its columns and
+scalars, like the SNMP sections of a simulated host do. The text lookup is the one the
+StoredWalkSNMPBackend used before the walk index was introduced.
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import cmk.utils.agent_simulator as agent_simulator
+from cmk.utils.type_defs import AgentRawData
+
+from cmk.snmplib.type_defs import SNMPRowInfo
+
+from cmk.core_helpers.snmp_backend._utils import strip_snmp_value
+from cmk.core_helpers.snmp_backend._walk_index import (
+    compile_walk,
+    iter_walk_lines,
+    load_walk_index,
+    parse_oid,
+    WalkIndex,
+)
+
+_IF_TABLE = ".1.3.6.1.2.1.2.2.1"
+_IF_X_TABLE = ".1.3.6.1.2.1.31.1.1.1"
+
+
+def _write_walk(path: Path, num_interfaces: int) -> None:
+    with path.open("w") as f:
+        f.write('.1.3.6.1.2.1.1.1.0 "Linux switch 5.10"\n')
+        f.write(".1.3.6.1.2.1.1.3.0 123456789\n")
+        for table, columns in [(_IF_TABLE, 22), (_IF_X_TABLE, 19)]:
+            for column in range(1, columns + 1):
+                for nr in range(1, num_interfaces + 1):
+                    if column == 2:
+                        value = '"Ethernet port %d"' % nr
+                    elif column == 6:
+                        value = '"00 1B 21 %02X %02X %02X "' % (nr >> 16, nr >> 8 & 255, nr & 255)
+                    else:
+                        value = str(nr * column)
+                    f.write("%s.%d.%d %s\n" % (table, column, nr, value))
+
+
+def _walked_oids() -> List[str]:
+    return [
+        ".1.3.6.1.2.1.1.1.0",
+        ".1.3.6.1.2.1.1.3.0",
+        ".1.3.6.1.2.1.1.*",
+        *("%s.%d" % (_IF_TABLE, column) for column in [2, 3, 5, 6, 7, 8, 10, 14, 16, 20]),
+        *("%s.%d" % (_IF_X_TABLE, column) for column in [1, 6, 10, 15, 18]),
+    ]
+
+
+def _compare_oids(a: str, b: str) -> int:
+    aa = tuple(map(int, a.strip(".").split(".")))
+    bb = tuple(map(int, b.strip(".").split(".")))
+    if len(aa) <= len(bb) and bb[: len(aa)] == aa:
+        return 0
+    return (aa > bb) - (aa < bb)
+
+
+def _collect_until(
+    oid: str, oid_prefix: str, lines: List[str], index: int, direction: int
+) -> SNMPRowInfo:
+    rows = []
+    if index >= len(lines):
+        if direction > 0:
+            return []
+        index -= 1
+    while True:
+        parts = lines[index].split(None, 1)
+        o = parts[0][1:] if parts[0].startswith(".") else parts[0]
+        if not (o == oid or o.startswith(oid_prefix + ".")):
+            break
+        value = (
+            agent_simulator.process(AgentRawData(parts[1].encode())).decode()
+            if len(parts) > 1
+            else ""
+        )
+        rows.append(("." + o, strip_snmp_value(value)))
+        index += direction
+        if index < 0 or index >= len(lines):
+            break
+    return rows
+
+
+def _text_walk(lines: List[str], oid: str) -> SNMPRowInfo:
+    oid = oid[1:] if oid.startswith(".") else oid
+    oid_prefix = oid[:-2] if oid.endswith(".*") else oid
+    begin, end, hit, current = 0, len(lines), None, 0
+    while end - begin > 0:
+        current = (begin + end) // 2
+        hit = _compare_oids(oid_prefix, lines[current].split(None, 1)[0])
+        if hit == 0:
+            break
+        if hit == 1:
+            begin = current + 1
+        else:
+            end = current
+    if hit != 0:
+        return []
+    rowinfo = _collect_until(oid, oid_prefix, lines, current, -1)
+    rowinfo.reverse()
+    rowinfo += _collect_until(oid, oid_prefix, lines, current + 1, 1)
+    return rowinfo[:1] if oid.endswith(".*") else rowinfo
+
+
+def _index_walk(index: WalkIndex, oid: str) -> SNMPRowInfo:
+    if oid.endswith(".*"):
+        return index.rows(index.lookup(parse_oid(oid[:-2]))[:1])
+    return index.rows(index.lookup(parse_oid(oid)))
+
+
+def _measure(load: Callable[[], object]) -> Tuple[float, float, object]:
+    """Duration and memory allocated by Python objects of loading a walk"""
+    start = time.perf_counter()
+    loaded = load()
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    traced = load()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if isinstance(traced, WalkIndex):
+        traced.close()
+    return duration, size, loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interfaces", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5, help="walks of each OID")
+    args = parser.parse_args()
+
+    oids = _walked_oids()
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_interfaces in args.interfaces:
+            walk_path = Path(tmp) / ("walk%d" % num_interfaces)
+            index_path = Path(tmp) / ("index%d" % num_interfaces)
+            _write_walk(walk_path, num_interfaces)
+            print(
+                "%d interfaces, walk of %.1f MB"
+                % (num_interfaces, walk_path.stat().st_size / 1024.0**2)
+            )
+
+            load_text, peak_text, lines = _measure(lambda: list(iter_walk_lines(walk_path)))
+            assert isinstance(lines, list)
+            start = time.perf_counter()
+            compile_walk(walk_path, index_path).close()
+            compile_time = time.perf_counter() - start
+            load_index, peak_index, index = _measure(lambda: load_walk_index(walk_path, index_path))
+            assert isinstance(index, WalkIndex)
+            print(
+                "  load:   text %7.3f s (%6.1f MB), index %7.3f s (%6.1f MB), "
+                "compiling the index %6.2f s"
+                % (
+                    load_text,
+                    peak_text / 1024.0**2,
+                    load_index,
+                    peak_index / 1024.0**2,
+                    compile_time,
+                )
+            )
+
+            for name, lookup in [
+                ("text", lambda oid: _text_walk(lines, oid)),
+                ("index", lambda oid: _index_walk(index, oid)),
+            ]:
+                start = time.perf_counter()
+                for _nr in range(args.repeat):
+                    results = [lookup(oid) for oid in oids]
+                duration = time.perf_counter() - start
+                print(
+                    "  walks:  %-5s %7.3f s for %d walks"
+                    % (name, duration, args.repeat * len(oids))
+                )
+            assert results == [_text_walk(lines, oid) for oid in oids]
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare check cycles with the value store of one dict per host and the service records
+
+The host has many interface services, each one storing a few counters. A cycle loads
+the value store, reads the values of some services, changes the values of some of them
+and saves the value store. The host wide dict is handled like the value store did before
+the service records were introduced: Load and deserialize everything, rewrite everything.
+"""
+
+import argparse
+import tempfile
+import time
+from ast import literal_eval
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import cmk.utils.store as store
+
+from cmk.base.api.agent_based.value_store._utils import _DiskSyncedMapping
+
+_Key = Tuple[str, str, str]
+_COUNTERS = ["in_octets", "out_octets", "in_ucast", "out_ucast", "in_errors", "out_errors"]
+
+
+def _services(num_services: int) -> List[str]:
+    return ["Ethernet%d" % nr for nr in range(num_services)]
+
+
+def _values(item: str, cycle: int) -> Dict[_Key, Any]:
+    return {
+        ("interfaces", item, counter): (1650000000.0 + 60 * cycle, 123456789 * nr + cycle)
+        for nr, counter in enumerate(_COUNTERS)
+    }
+
+
+def _host_dict_cycle(path: Path, read: Sequence[str], changed: Sequence[str], cycle: int) -> None:
+    store.aquire_lock(path)
+    try:
+        data = literal_eval(store.load_text_from_file(path, default="{}", lock=False))
+        for item in read:
+            for counter in _COUNTERS:
+                _ = data.get(("interfaces", item, counter))
+        if changed:
+            for item in changed:
+                data.update(_values(item, cycle))
+            store.save_text_to_file(path, repr(data))
+    finally:
+        store.release_lock(path)
+
+
+def _records_cycle(path: Path, read: Sequence[str], changed: Sequence[str], cycle: int) -> None:
+    value_store: _DiskSyncedMapping[Any] = _DiskSyncedMapping.make(
+        path=path,
+        log_debug=lambda msg: None,
+        serializer=repr,
+        deserializer=literal_eval,
+    )
+    for item in read:
+        for counter in _COUNTERS:
+            _ = value_store.get(("interfaces", item, counter))
+    for item in changed:
+        value_store.update(_values(item, cycle))
+    value_store.commit()
+
+
+def _measure(
+    cycle: Callable[[Path, Sequence[str], Sequence[str], int], None],
+    path: Path,
+    read: Sequence[str],
+    changed: Sequence[str],
+    repeat: int,
+) -> float:
+    start = time.perf_counter()
+    for nr in range(repeat):
+        cycle(path, read, changed, nr + 1)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=10, help="cycles of each scenario")
+    args = parser.parse_args()
+
+    items = _services(args.services)
+    scenarios = [
+        ("all services read and changed", items, items),
+        ("all services read, 1% changed", items, items[::100]),
+        ("all services read, none changed", items, []),
+        ("one service read and changed", items[:1], items[:1]),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        print("%d services with %d values each" % (args.services, len(_COUNTERS)))
+        for title, read, changed in scenarios:
+            timings = []
+            for name, cycle in [("host dict", _host_dict_cycle), ("records", _records_cycle)]:
+                path = Path(tmp) / name.replace(" ", "_")
+                path.unlink(missing_ok=True)
+                cycle(path, [], items, 0)
+                timings.append(_measure(cycle, path, read, changed, args.repeat))
+                size = path.stat().st_size / 1024.0**2
+            print(
+                "  %-32s host dict %7.1f ms, records %7.1f ms (%.1f MB)"
+                % (title, 1000 * timings[0], 1000 * timings[1], size)
+            )
+
+        # Both value stores end up with the same values
+        host_dict = literal_eval((Path(tmp) / "host_dict").read_text())
+        records: _DiskSyncedMapping[Any] = _DiskSyncedMapping.make(
+            path=Path(tmp) / "records",
+            log_debug=lambda msg: None,
+            serializer=repr,
+            deserializer=literal_eval,
+        )
+        assert dict(records) == host_dict
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@
 
 from ast import literal_eval
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Tuple
 
 # pylint: disable=protected-access
 import pytest
@@ -100,7 +100,7 @@ class Test_StaticDiskSyncedMapping:
     @staticmethod
     def _get_sdsm(
         tmp_path: Path,
-    ) -> _StaticDiskSyncedMapping[Tuple[str, Optional[str], str], object]:
+    ) -> _StaticDiskSyncedMapping[object]:
         return _StaticDiskSyncedMapping(
             path=tmp_path / "test-host",
             log_debug=lambda msg: None,
@@ -141,10 +141,88 @@ class Test_StaticDiskSyncedMapping:
             ("check1", None, "stored-user-key-1"): 23,
             ("check3", "el Barto", "Ay caramba"): "ASDF",
         }
+        # The values of the previous format are converted to service records
         written = store.save_text_to_file.call_args.args[1]  # type: ignore[attr-defined]
-        assert written == repr(expected_values)
+        assert written == (
+            "('check1', None)\t{'stored-user-key-1': 23}\n"
+            "('check3', 'el Barto')\t{'Ay caramba': 'ASDF'}\n"
+        )
         assert list(sdsm.items()) == list(expected_values.items())
 
+    def test_append_changed_services(self, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        sdsm.disksync(
+            updated=[
+                (("check1", None, "key1"), 1),
+                (("check1", None, "key2"), 2),
+                (("check2", "item", "key1"), 3),
+            ]
+        )
+        sdsm.disksync(
+            removed=[("check1", None, "key2")],
+            updated=[(("check2", "item", "key1"), 3)],
+        )
+        assert (tmp_path / "test-host").read_text() == (
+            "('check1', None)\t{'key1': 1, 'key2': 2}\n"
+            "('check2', 'item')\t{'key1': 3}\n"
+            "('check1', None)\t{'key1': 1}\n"
+        )
+        assert dict(sdsm) == {("check1", None, "key1"): 1, ("check2", "item", "key1"): 3}
+
+    def test_compact(self, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        for value in range(3):
+            sdsm.disksync(updated=[(("check1", None, "key"), value)])
+        assert (tmp_path / "test-host").read_text() == "('check1', None)\t{'key': 2}\n"
+
+        sdsm.disksync(removed=[("check1", None, "key")])
+        assert (tmp_path / "test-host").read_text() == ""
+        assert not sdsm
+
+    def test_load_lazily(self, tmp_path: Path) -> None:
+        (tmp_path / "test-host").write_text(
+            "('check1', None)\t{'key': 1}\n"
+            "('check2', None)\t{'key': 2}\n"
+            "('check1', None)\t{'key': 3}\n"
+        )
+        deserialized = []
+
+        def deserializer(text: str) -> object:
+            deserialized.append(text)
+            return literal_eval(text)
+
+        sdsm: _StaticDiskSyncedMapping[object] = _StaticDiskSyncedMapping(
+            path=tmp_path / "test-host",
+            log_debug=lambda msg: None,
+            serializer=repr,
+            deserializer=deserializer,
+        )
+        assert sdsm[("check1", None, "key")] == 3
+        assert sdsm[("check1", None, "key")] == 3
+        assert deserialized == ["{'key': 3}"]
+
+    def test_load_appended_records(self, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        other = self._get_sdsm(tmp_path)
+        sdsm.disksync(updated=[(("check1", None, "key"), 1), (("check2", None, "key"), 2)])
+        other.disksync(updated=[(("check2", None, "key"), 3)])
+        sdsm.disksync(updated=[(("check3", None, "key"), 4)])
+        assert dict(sdsm) == dict(other) | {("check3", None, "key"): 4}
+        assert dict(sdsm) == {
+            ("check1", None, "key"): 1,
+            ("check2", None, "key"): 3,
+            ("check3", None, "key"): 4,
+        }
+
+    def test_partial_line(self, tmp_path: Path) -> None:
+        (tmp_path / "test-host").write_text("('check1', None)\t{'key': 1}\n('check2', No")
+        sdsm = self._get_sdsm(tmp_path)
+        assert dict(sdsm) == {("check1", None, "key"): 1}
+        sdsm.disksync(updated=[(("check2", None, "key"), 2)])
+        assert (tmp_path / "test-host").read_text() == (
+            "('check1', None)\t{'key': 1}\n('check2', None)\t{'key': 2}\n"
+        )
+
 
 class Test_DiskSyncedMapping:
     @staticmethod
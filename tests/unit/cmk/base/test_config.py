@@ -4,6 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import pickle
 import re
 import shutil
 from pathlib import Path
@@ -2803,6 +2804,37 @@ class TestPackedConfigStore:
         assert precompiled_check_config.exists()
         assert store.read() == {"abc": 1}
 
+    def test_read_keyed_variables(self, store: config.PackedConfigStore) -> None:
+        host_attributes = {"host1": {"alias": "Host 1"}, "host2": {"alias": "Host 2"}}
+        store.write({"abc": 1, "host_attributes": host_attributes, "ipaddresses": {}})
+
+        packed_config = store.read()
+        assert isinstance(packed_config, config.PackedConfig)
+        assert set(packed_config) == {"abc", "host_attributes", "ipaddresses"}
+
+        packed_host_attributes = packed_config["host_attributes"]
+        assert isinstance(packed_host_attributes, config.PackedSection)
+        assert packed_host_attributes is packed_config["host_attributes"]
+        assert "host3" not in packed_host_attributes
+        assert packed_host_attributes.get("host2") == {"alias": "Host 2"}
+        assert packed_host_attributes["host2"] is packed_host_attributes["host2"]
+        assert packed_host_attributes == host_attributes
+        assert packed_config["ipaddresses"] == {}
+
+    def test_pickle_keyed_variables(self, store: config.PackedConfigStore) -> None:
+        store.write({"ipaddresses": {"host1": "127.0.0.1"}})
+
+        ipaddresses = pickle.loads(pickle.dumps(store.read()["ipaddresses"]))
+        assert type(ipaddresses) is dict
+        assert ipaddresses == {"host1": "127.0.0.1"}
+
+    def test_read_unindexed_file(self, store: config.PackedConfigStore) -> None:
+        store.path.parent.mkdir(parents=True, exist_ok=True)
+        with store.path.open("wb") as f:
+            pickle.dump({"abc": 1, "ipaddresses": {"host1": "127.0.0.1"}}, f)
+
+        assert store.read() == {"abc": 1, "ipaddresses": {"host1": "127.0.0.1"}}
+
 
 def test__extract_check_plugins(monkeypatch: MonkeyPatch) -> None:
     duplicate_plugin = {
@@ -20,6 +20,7 @@ from _pytest.monkeypatch import MonkeyPatch
 from tests.testlib.base import Scenario
 
 import cmk.utils.exceptions as exceptions
+import cmk.utils.paths
 import cmk.utils.version as cmk_version
 from cmk.utils.config_path import VersionedConfigPath
 from cmk.utils.type_defs import CheckPluginName, HostName
@@ -322,6 +323,107 @@ class TestHostCheckStore:
         assert os.access(store.host_check_file_path(config_path, hostname), os.X_OK)
 
 
+def _host_fragment(hostname: str, hostcheck_command: str) -> core_nagios.HostFragment:
+    return core_nagios.HostFragment(
+        key="key-%s" % hostname,
+        hostname=HostName(hostname),
+        objects=core_nagios._format_nagios_object(
+            "host", {"host_name": hostname, "check_command": "check-mk-host-custom-1"}
+        ),
+        hostgroups={"check_mk"},
+        servicegroups=set(),
+        contactgroups={"admins"},
+        checknames={CheckPluginName("uptime")},
+        active_checks=set(),
+        custom_commands=set(),
+        hostcheck_commands=[("check-mk-host-custom-1", hostcheck_command)],
+        warnings=[],
+    )
+
+
+def test_add_host_fragment_renumbers_host_check_commands() -> None:
+    outfile = io.StringIO()
+    cfg = core_nagios.NagiosConfig(outfile, [HostName("a"), HostName("b")])
+
+    core_nagios._add_host_fragment(cfg, _host_fragment("a", "check_a"), is_cached=False)
+    core_nagios._add_host_fragment(cfg, _host_fragment("b", "check_b"), is_cached=True)
+
+    assert cfg.hostcheck_commands_to_define == [
+        ("check-mk-host-custom-1", "check_a"),
+        ("check-mk-host-custom-2", "check_b"),
+    ]
+    assert cfg.hostgroups_to_define == {"check_mk"}
+    assert cfg.checknames_to_define == {CheckPluginName("uptime")}
+    host_a, host_b = outfile.getvalue().split("# b\n")
+    assert "check-mk-host-custom-1" in host_a
+    assert "check-mk-host-custom-2" in host_b
+    assert "check-mk-host-custom-1" not in host_b
+
+
+def test_add_host_fragment_warnings(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(core_config, "g_configuration_warnings", [])
+    cfg = core_nagios.NagiosConfig(io.StringIO(), [HostName("a"), HostName("b")])
+
+    core_nagios._add_host_fragment(
+        cfg, _host_fragment("a", "check_a")._replace(warnings=["fresh"]), is_cached=False
+    )
+    core_nagios._add_host_fragment(
+        cfg, _host_fragment("b", "check_b")._replace(warnings=["cached"]), is_cached=True
+    )
+
+    assert core_config.g_configuration_warnings == ["fresh", "cached"]
+
+
+def test_canonical_repr() -> None:
+    assert core_nagios._canonical_repr({"a": {"z", "x", "y"}}) == core_nagios._canonical_repr(
+        {"a": {"y", "z", "x"}}
+    )
+    assert core_nagios._canonical_repr(["a", ("b", 1)]) == "['a', ['b', 1]]"
+
+
+def test_config_inputs_digest_password_store(monkeypatch: MonkeyPatch) -> None:
+    def digest(stored_passwords: Mapping[str, str]) -> str:
+        monkeypatch.setattr(core_nagios.password_store, "load", lambda: dict(stored_passwords))
+        return core_nagios._config_inputs_digest()
+
+    # The command lines contain the stored passwords replaced by as many "*"
+    assert digest({"pw": "secret"}) == digest({"pw": "public"})
+    assert digest({"pw": "secret"}) != digest({"pw": "secret!"})
+    assert digest({"pw": "secret"}) != digest({"other": "secret"})
+    assert digest({"pw": "secret"}) != digest({})
+
+
+class TestHostFragmentStore:
+    @pytest.fixture(autouse=True)
+    def var_dir(self, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+
+    def test_save_load(self) -> None:
+        store = core_nagios.HostFragmentStore()
+        fragment = _host_fragment("a", "check_a")
+
+        assert store.load(HostName("a")) is None
+        store.save(fragment)
+        assert store.load(HostName("a")) == fragment
+
+    def test_load_broken(self) -> None:
+        store = core_nagios.HostFragmentStore()
+        store.directory.mkdir(parents=True)
+        (store.directory / "a").write_bytes(b"broken")
+
+        assert store.load(HostName("a")) is None
+
+    def test_cleanup(self) -> None:
+        store = core_nagios.HostFragmentStore()
+        store.save(_host_fragment("a", "check_a"))
+        store.save(_host_fragment("b", "check_b"))
+
+        store.cleanup([HostName("b")])
+
+        assert store.load(HostName("a")) is None
+        assert store.load(HostName("b")) is not None
+
+
 def test_dump_precompiled_hostcheck(
     monkeypatch: MonkeyPatch, config_path: VersionedConfigPath
 ) -> None:
@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import os
+import time
 
 import pytest
 
@@ -68,3 +69,195 @@ def test_raw_context_from_env_pipe_decoding(environ, expected):
 )
 def test_create_plugin_context(raw_context, params, expected):
     assert notify.create_plugin_context(raw_context, params) == expected
+
+
+_RULES = [
+    {"description": "all"},
+    {"description": "disabled", "disabled": True},
+    {"description": "host events", "match_host_event": ["?d"]},
+    {"description": "service events", "match_service_event": ["?c"]},
+    {"description": "both events", "match_host_event": ["?d"], "match_service_event": ["?c"]},
+    {"description": "services", "match_services": ["CPU"]},
+    {"description": "hosts", "match_hosts": ["heute", "morgen"]},
+    {"description": "tags", "match_hosttags": ["!test", "prod", "lan"]},
+    {"description": "negated tags", "match_hosttags": ["!test"]},
+    {"description": "contact groups", "match_contactgroups": ["admins", "ops"]},
+    {"description": "no contact groups", "match_contactgroups": []},
+]
+
+
+@pytest.mark.parametrize(
+    "raw_context,expected",
+    [
+        (
+            {
+                "WHAT": "HOST",
+                "HOSTNAME": "heute",
+                "HOSTTAGS": "prod lan",
+                "HOSTCONTACTGROUPNAMES": "ops",
+            },
+            [
+                "all",
+                "host events",
+                "both events",
+                "hosts",
+                "tags",
+                "negated tags",
+                "contact groups",
+            ],
+        ),
+        (
+            {
+                "WHAT": "SERVICE",
+                "HOSTNAME": "gestern",
+                "HOSTTAGS": "test",
+                "SERVICECONTACTGROUPNAMES": "",
+            },
+            ["all", "service events", "both events", "services", "negated tags"],
+        ),
+        (
+            {"WHAT": "SERVICE", "HOSTNAME": "morgen", "HOSTTAGS": ""},
+            [
+                "all",
+                "service events",
+                "both events",
+                "services",
+                "hosts",
+                "negated tags",
+                "contact groups",
+                "no contact groups",
+            ],
+        ),
+    ],
+)
+def test_notification_rule_index_candidates(raw_context, expected):
+    rule_index = notify.NotificationRuleIndex(_RULES)
+    assert [rule["description"] for rule in rule_index.candidates(raw_context)] == expected
+
+
+@pytest.mark.parametrize(
+    "raw_context",
+    [
+        {
+            "WHAT": "HOST",
+            "HOSTNAME": "heute",
+            "HOSTTAGS": "prod lan",
+            "HOSTSTATE": "DOWN",
+            "PREVIOUSHOSTHARDSTATE": "UP",
+            "HOSTCONTACTGROUPNAMES": "admins",
+            "HOSTOUTPUT": "",
+        },
+        {
+            "WHAT": "SERVICE",
+            "HOSTNAME": "morgen",
+            "HOSTTAGS": "test",
+            "SERVICEDESC": "CPU load",
+            "SERVICESTATE": "CRITICAL",
+            "PREVIOUSSERVICEHARDSTATE": "OK",
+            "SERVICECONTACTGROUPNAMES": "ops",
+            "SERVICEOUTPUT": "",
+        },
+    ],
+)
+def test_notification_rule_index_keeps_matching_rules(raw_context):
+    raw_context = {**raw_context, "NOTIFICATIONTYPE": "PROBLEM", "OMD_SITE": "heute"}
+    matching = [rule for rule in _RULES if notify.rbn_match_rule(rule, raw_context) is None]
+    candidates = notify.NotificationRuleIndex(_RULES).candidates(raw_context)
+    assert matching
+    assert [rule for rule in candidates if notify.rbn_match_rule(rule, raw_context) is None] == (
+        matching
+    )
+
+
+@pytest.fixture(name="bulk_dir")
+def fixture_bulk_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(notify, "notification_bulkdir", str(tmp_path))
+    return tmp_path
+
+
+def _bulk(bulk_dir, bulk):
+    path = bulk_dir / "hh" / "mail" / bulk
+    path.mkdir(parents=True)
+    return str(path)
+
+
+def test_bulk_index_interval(bulk_dir):
+    bulk_index = notify.BulkIndex()
+    by_interval = _bulk(bulk_dir, "60,3,host,heute")
+    by_count = _bulk(bulk_dir, "3600,2,host,morgen")
+    bulk_index.add(by_interval, "a" * 36, 1000.0)
+    bulk_index.add(by_count, "b" * 36, 1010.0)
+
+    assert not bulk_index.find(True, 1059.0)
+    assert [bulk[0] for bulk in bulk_index.find(False, 1059.0)] == sorted([by_interval, by_count])
+    assert [bulk[0] for bulk in bulk_index.find(True, 1060.0)] == [by_interval]
+
+    bulk_index.add(by_count, "c" * 36, 1020.0)
+    assert [bulk[0] for bulk in bulk_index.find(True, 1030.0)] == [by_count]
+
+    bulk_index.remove(by_count, [(1010.0, "b" * 36), (1020.0, "c" * 36)])
+    bulk_index.remove(by_interval, [(1000.0, "a" * 36)])
+    assert not notify.BulkIndex().find(False, 5000.0)
+
+
+def test_bulk_index_timeperiod(monkeypatch, bulk_dir):
+    timeperiods = {"day": True, "night": False}
+    lookups = []
+
+    def timeperiod_active(timeperiod):
+        lookups.append(timeperiod)
+        return timeperiods.get(timeperiod)
+
+    monkeypatch.setattr(notify.cmk.base.core, "timeperiod_active", timeperiod_active)
+    bulk_index = notify.BulkIndex()
+    day = _bulk(bulk_dir, "timeperiod:day,2,host,heute")
+    night = [_bulk(bulk_dir, "timeperiod:night,10,host,host%d" % nr) for nr in range(3)]
+    unknown = _bulk(bulk_dir, "timeperiod:gone,10,host,heute")
+    for nr, bulk in enumerate([day, unknown] + night):
+        bulk_index.add(bulk, "%036d" % nr, 1000.0)
+
+    assert [bulk[0] for bulk in bulk_index.find(True, 2000.0)] == sorted(night + [unknown])
+    # Each time period is looked up once
+    assert sorted(lookups) == ["day", "gone", "night"]
+
+    bulk_index.add(day, "%036d" % 10, 1010.0)
+    assert day in [bulk[0] for bulk in bulk_index.find(True, 2000.0)]
+
+
+def test_bulk_index_created_from_bulk_dirs(bulk_dir):
+    bulk = _bulk(bulk_dir, "60,10,host,heute")
+    (bulk_dir / "hh" / "mail" / "60,10,host,heute" / ("a" * 36)).write_text("")
+    (bulk_dir / "hh" / "mail" / "60,10,host,heute" / ("b" * 36 + ".new")).write_text("")
+
+    bulks = notify.BulkIndex().find(False, time.time())
+
+    assert [(found[0], [notify_uuid for _mtime, notify_uuid in found[-1]]) for found in bulks] == [
+        (bulk, ["a" * 36])
+    ]
+    assert (bulk_dir / ".index").exists()
+
+
+def test_bulk_index_rescanned(monkeypatch, bulk_dir):
+    bulk = _bulk(bulk_dir, "60,10,host,heute")
+    (bulk_dir / "hh" / "mail" / "60,10,host,heute" / ("a" * 36)).write_text("")
+    orphaned = _bulk(bulk_dir, "60,10,host,morgen")
+    os.utime(orphaned, (time.time() - 120, time.time() - 120))
+    assert [found[0] for found in notify.BulkIndex().find(False, time.time())] == [bulk]
+    assert not os.path.exists(orphaned)
+
+    # Stored without updating the index
+    (bulk_dir / "hh" / "mail" / "60,10,host,heute" / ("b" * 36)).write_text("")
+    assert len(notify.BulkIndex().find(False, time.time())[0][-1]) == 1
+
+    monkeypatch.setattr(notify, "_RESCAN_INTERVAL", 0)
+    assert len(notify.BulkIndex().find(False, time.time())[0][-1]) == 2
+
+
+def test_bulk_index_add_scanned_notification(bulk_dir):
+    bulk = _bulk(bulk_dir, "60,10,host,heute")
+    path = bulk_dir / "hh" / "mail" / "60,10,host,heute" / ("a" * 36)
+    path.write_text("")
+
+    notify.BulkIndex().add(bulk, "a" * 36, os.stat(path).st_mtime)
+
+    assert len(notify.BulkIndex().find(False, time.time())[0][-1]) == 1
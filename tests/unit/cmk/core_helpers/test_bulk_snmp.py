@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import bisect
+import logging
+import re
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import pytest
+
+import cmk.utils.cleanup
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.type_defs import HostName
+
+from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
+
+from cmk.core_helpers.snmp_backend import _ber as ber
+from cmk.core_helpers.snmp_backend import BulkSNMPBackend, StoredWalkSNMPBackend, walk_hosts
+from cmk.core_helpers.snmp_backend._walk_index import compile_walk, parse_oid
+
+_WALK: Sequence[Tuple[ber.OIDTuple, int, bytes]] = [
+    ((1, 3, 6, 1, 2, 1, 1, 1, 0), ber.Tag.OCTET_STRING, b"Linux switch"),
+    ((1, 3, 6, 1, 2, 1, 1, 3, 0), ber.Tag.TIMETICKS, ber.encode_integer(4294967295, False)),
+    ((1, 3, 6, 1, 2, 1, 1, 5, 0), ber.Tag.OCTET_STRING, b"switch"),
+    *(
+        ((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, nr), ber.Tag.INTEGER, ber.encode_integer(nr))
+        for nr in range(1, 31)
+    ),
+    *(
+        ((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, nr), ber.Tag.OCTET_STRING, b"port %d" % nr)
+        for nr in range(1, 31)
+    ),
+    *(
+        ((1, 3, 6, 1, 2, 1, 2, 2, 1, 8, nr), ber.Tag.INTEGER, ber.encode_integer(-nr))
+        for nr in range(1, 31)
+    ),
+    ((1, 3, 6, 1, 2, 1, 4, 20, 1, 1, 10, 0, 0, 1), ber.Tag.IP_ADDRESS, bytes([10, 0, 0, 1])),
+    ((1, 3, 6, 1, 2, 1, 4, 20, 1, 2), ber.Tag.OBJECT_IDENTIFIER, ber.encode_oid((1, 3, 6, 1))),
+]
+
+
+class Responder:
+    """An SNMP agent on localhost serving the walk above"""
+
+    def __init__(
+        self,
+        walk: Sequence[Tuple[ber.OIDTuple, int, bytes]] = _WALK,
+        *,
+        drop: int = 0,
+        delay: float = 0.0,
+        max_varbinds: int = 1000,
+    ) -> None:
+        self.walk = walk
+        self.drop = drop
+        self.delay = delay
+        self.max_varbinds = max_varbinds
+        self.requests: List[ber.Message] = []
+        self._oids = [oid for oid, _tag, _value in walk]
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.settimeout(0.05)
+        self.port = self._sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sock.close()
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, address = self._sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            request = ber.decode_message(data)
+            self.requests.append(request)
+            if self.drop:
+                self.drop -= 1
+                continue
+            if request.community != b"public":
+                continue
+            time.sleep(self.delay)
+            self._sock.sendto(ber.encode_message(self._response(request)), address)
+
+    def _get(self, oid: ber.OIDTuple) -> ber.VarBind:
+        index = bisect.bisect_left(self._oids, oid)
+        if index < len(self.walk) and self._oids[index] == oid:
+            return ber.VarBind(*self.walk[index])
+        return ber.VarBind(oid, ber.Tag.NO_SUCH_OBJECT, b"")
+
+    def _next(self, oid: ber.OIDTuple) -> ber.VarBind:
+        index = bisect.bisect_right(self._oids, oid)
+        if index < len(self.walk):
+            return ber.VarBind(*self.walk[index])
+        return ber.VarBind(oid, ber.Tag.END_OF_MIB_VIEW, b"")
+
+    def _response(self, request: ber.Message) -> ber.Message:
+        varbinds: List[ber.VarBind] = []
+        if request.pdu_type == ber.PDUType.GET_REQUEST:
+            varbinds = [self._get(varbind.oid) for varbind in request.varbinds]
+        elif request.pdu_type == ber.PDUType.GET_NEXT_REQUEST:
+            varbinds = [self._next(varbind.oid) for varbind in request.varbinds]
+        else:
+            last = [varbind.oid for varbind in request.varbinds]
+            if len(request.varbinds) * request.error_index > self.max_varbinds:
+                return request._replace(
+                    pdu_type=ber.PDUType.RESPONSE, error_status=1, error_index=0, varbinds=[]
+                )
+            for _repetition in range(request.error_index):
+                varbinds.extend(self._next(oid) for oid in last)
+                last = [varbind.oid for varbind in varbinds[-len(last) :]]
+
+        if request.version == 0:
+            for nr, varbind in enumerate(varbinds):
+                if varbind.tag in (ber.Tag.NO_SUCH_OBJECT, ber.Tag.END_OF_MIB_VIEW):
+                    return request._replace(
+                        pdu_type=ber.PDUType.RESPONSE, error_status=2, error_index=nr + 1
+                    )
+        return request._replace(
+            pdu_type=ber.PDUType.RESPONSE, error_status=0, error_index=0, varbinds=varbinds
+        )
+
+
+def _load_walk(path: Path) -> Sequence[Tuple[ber.OIDTuple, int, bytes]]:
+    """The rows of a stored walk, the numbers as integers and the rest as octet strings"""
+    index = compile_walk(path, None)
+    return [
+        (
+            tuple(parse_oid(oid)),
+            *(
+                (ber.Tag.INTEGER, ber.encode_integer(int(value)))
+                if re.fullmatch(rb"-?[0-9]+", value)
+                else (ber.Tag.OCTET_STRING, value)
+            ),
+        )
+        for oid, value in index.rows(range(index.num_rows))
+    ]
+
+
+@pytest.fixture(name="responder")
+def fixture_responder() -> Iterator[Responder]:
+    responder = Responder()
+    yield responder
+    responder.close()
+
+
+def _snmp_config(
+    port: int,
+    *,
+    bulk: bool = True,
+    v2c: bool = True,
+    credentials: str = "public",
+    timing: Optional[dict] = None,
+) -> SNMPHostConfig:
+    return SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname=HostName("switch"),
+        ipaddress="127.0.0.1",
+        credentials=credentials,
+        port=port,
+        is_bulkwalk_host=bulk,
+        is_snmpv2or3_without_bulkwalk_host=not bulk and v2c,
+        bulk_walk_size_of=4,
+        timing=timing or {"timeout": 0.2, "retries": 1},
+        oid_range_limits={},
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        snmp_backend=SNMPBackendEnum.BULK,
+    )
+
+
+def _interfaces(column: int, value=lambda nr: b"%d" % nr):
+    return [(".1.3.6.1.2.1.2.2.1.%d.%d" % (column, nr), value(nr)) for nr in range(1, 31)]
+
+
+def test_encode_message() -> None:
+    message = ber.Message(
+        version=1,
+        community=b"public",
+        pdu_type=ber.PDUType.GET_REQUEST,
+        request_id=1,
+        error_status=0,
+        error_index=0,
+        varbinds=[ber.VarBind((1, 3, 6, 1, 2, 1, 1, 1, 0), ber.Tag.NULL, b"")],
+    )
+    data = bytes.fromhex(
+        "30 26 02 01 01 04 06 70 75 62 6c 69 63 a0 19 02 01 01 02 01 00 02 01 00"
+        "30 0e 30 0c 06 08 2b 06 01 02 01 01 01 00 05 00"
+    )
+    assert ber.encode_message(message) == data
+    assert ber.decode_message(data) == message
+
+
+@pytest.mark.parametrize(
+    "value", [0, 1, 127, 128, 255, 256, -1, -128, -129, 2**31 - 1, -(2**31), 2**63]
+)
+def test_encode_integer(value: int) -> None:
+    contents = ber.encode_integer(value)
+    assert int.from_bytes(contents, "big", signed=True) == value
+    # The shortest encoding
+    assert len(contents) == 1 or int.from_bytes(contents[1:], "big", signed=True) != value
+
+
+@pytest.mark.parametrize("oid", [(1, 3), (1, 3, 6, 1, 4, 1, 2**32 - 1, 0), (2, 999, 3)])
+def test_encode_oid(oid: ber.OIDTuple) -> None:
+    assert ber.decode_oid(ber.encode_oid(oid)) == oid
+
+
+@pytest.mark.parametrize("data", [b"", b"\x30", b"\x30\x05\x02\x01", b"\x04\x00"])
+def test_decode_invalid_message(data: bytes) -> None:
+    with pytest.raises(ber.SNMPBERError):
+        ber.decode_message(data)
+
+
+@pytest.mark.parametrize(
+    "bulk,v2c,pdu_type",
+    [
+        (True, True, ber.PDUType.GET_BULK_REQUEST),
+        (False, True, ber.PDUType.GET_NEXT_REQUEST),
+        (False, False, ber.PDUType.GET_NEXT_REQUEST),
+    ],
+)
+def test_walk_columns(responder: Responder, bulk: bool, v2c: bool, pdu_type: int) -> None:
+    backend = BulkSNMPBackend(_snmp_config(responder.port, bulk=bulk, v2c=v2c), logging.getLogger())
+    assert backend.walk_columns(
+        [
+            ".1.3.6.1.2.1.2.2.1.1",
+            ".1.3.6.1.2.1.2.2.1.2",
+            ".1.3.6.1.2.1.2.2.1.8",
+            ".1.3.6.1.2.1.2.2.1.9",
+        ]
+    ) == [
+        _interfaces(1),
+        _interfaces(2, lambda nr: b"port %d" % nr),
+        _interfaces(8, lambda nr: b"%d" % -nr),
+        [],
+    ]
+    assert all(request.version == (1 if v2c else 0) for request in responder.requests)
+    assert responder.requests[0].pdu_type == pdu_type
+    # All columns are fetched with common requests
+    assert len(responder.requests) < (10 if bulk else 40)
+
+
+def test_walk_like_stored_walk(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "walks").mkdir()
+    (tmp_path / "walks" / "switch").write_text(
+        '.1.3.6.1.2.1.1.1.0 "Linux switch 5.10"\n'
+        ".1.3.6.1.2.1.1.3.0 123456789\n"
+        '.1.3.6.1.2.1.1.4.0 "line one\nline two"\n'
+        + "".join('.1.3.6.1.2.1.2.2.1.2.%d "Ethernet %d"\n' % (nr, nr) for nr in range(1, 50))
+        + "".join(
+            '.1.3.6.1.2.1.2.2.1.6.%d "00 1B 21 00 00 %02X "\n' % (nr, nr) for nr in range(1, 50)
+        )
+        + "".join(".1.3.6.1.2.1.2.2.1.8.%d %d\n" % (nr, nr % 3) for nr in range(1, 50))
+    )
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path / "walks"))
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_index_dir", str(tmp_path / "index"))
+    oids = [
+        ".1.3.6.1.2.1.1",
+        ".1.3.6.1.2.1.2.2.1.2",
+        ".1.3.6.1.2.1.2.2.1.6",
+        ".1.3.6.1.2.1.2.2.1.7",
+        ".1.3.6.1.2.1.2.2.1.8",
+    ]
+
+    responder = Responder(_load_walk(tmp_path / "walks" / "switch"))
+    try:
+        config = _snmp_config(responder.port)
+        stored = StoredWalkSNMPBackend(config._replace(is_usewalk_host=True), logging.getLogger())
+        assert BulkSNMPBackend(config, logging.getLogger()).walk_columns(oids) == [
+            stored.walk(oid) for oid in oids
+        ]
+    finally:
+        responder.close()
+        cmk.utils.cleanup.cleanup_globals()
+
+
+def test_walk_value_types(responder: Responder) -> None:
+    backend = BulkSNMPBackend(_snmp_config(responder.port), logging.getLogger())
+    assert backend.walk(".1.3.6.1.2.1.1") == [
+        (".1.3.6.1.2.1.1.1.0", b"Linux switch"),
+        (".1.3.6.1.2.1.1.3.0", b"4294967295"),
+        (".1.3.6.1.2.1.1.5.0", b"switch"),
+    ]
+    assert backend.walk(".1.3.6.1.2.1.4.20") == [
+        (".1.3.6.1.2.1.4.20.1.1.10.0.0.1", b"10.0.0.1"),
+        (".1.3.6.1.2.1.4.20.1.2", b".1.3.6.1"),
+    ]
+
+
+def test_walk_of_leaf(responder: Responder) -> None:
+    backend = BulkSNMPBackend(_snmp_config(responder.port), logging.getLogger())
+    assert backend.walk(".1.3.6.1.2.1.1.5.0") == [(".1.3.6.1.2.1.1.5.0", b"switch")]
+    assert responder.requests[-1].pdu_type == ber.PDUType.GET_REQUEST
+
+
+def test_walk_too_big(responder: Responder) -> None:
+    responder.max_varbinds = 2
+    backend = BulkSNMPBackend(_snmp_config(responder.port), logging.getLogger())
+    assert backend.walk(".1.3.6.1.2.1.2.2.1.1") == _interfaces(1)
+    assert responder.requests[-1].error_index == 2
+
+
+def test_get(responder: Responder) -> None:
+    backend = BulkSNMPBackend(_snmp_config(responder.port), logging.getLogger())
+    assert backend.get(".1.3.6.1.2.1.1.5.0") == b"switch"
+    assert backend.get(".1.3.6.1.2.1.1.4.0") is None
+    assert backend.get(".1.3.6.1.2.1.1.*") == b"Linux switch"
+    assert backend.get(".1.3.6.1.2.1.3.*") is None
+
+
+def test_retransmit(responder: Responder) -> None:
+    responder.drop = 1
+    backend = BulkSNMPBackend(_snmp_config(responder.port), logging.getLogger())
+    assert backend.get(".1.3.6.1.2.1.1.5.0") == b"switch"
+    assert len(responder.requests) == 2
+    assert responder.requests[0].request_id == responder.requests[1].request_id
+
+
+def test_timeout(responder: Responder) -> None:
+    backend = BulkSNMPBackend(
+        _snmp_config(responder.port, credentials="private"), logging.getLogger()
+    )
+    with pytest.raises(MKSNMPError, match="Timeout"):
+        backend.walk(".1.3.6.1.2.1.1")
+    assert len(responder.requests) == 2
+    assert backend.get(".1.3.6.1.2.1.1.5.0") is None
+
+
+def test_no_ip_address(responder: Responder) -> None:
+    config = _snmp_config(responder.port)._replace(ipaddress=None)
+    with pytest.raises(MKSNMPError, match="no IP address"):
+        BulkSNMPBackend(config, logging.getLogger()).walk(".1.3.6.1.2.1.1")
+
+    results = walk_hosts(
+        [(config, [".1.3.6.1.2.1.1"]), (_snmp_config(responder.port), [".1.3.6.1.2.1.1"])]
+    )
+    assert isinstance(results[0], MKSNMPError)
+    assert not isinstance(results[1], Exception) and len(results[1]) == 1
+
+
+def test_walk_hosts_concurrently() -> None:
+    responders = [Responder(delay=0.1) for _nr in range(5)]
+    try:
+        start = time.monotonic()
+        results = walk_hosts(
+            [
+                (_snmp_config(responder.port), [".1.3.6.1.2.1.1", ".1.3.6.1.2.1.4.20"])
+                for responder in responders
+            ]
+        )
+        duration = time.monotonic() - start
+    finally:
+        for responder in responders:
+            responder.close()
+
+    assert all(len(result) == 2 and len(result[0]) == 3 for result in results)
+    # Each host needs two round trips of 0.1 seconds (walk and end of the walk)
+    assert duration < 0.1 * 2 * len(responders)
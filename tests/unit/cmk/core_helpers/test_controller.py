@@ -5,12 +5,26 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import logging
+import os
+import time
+from pathlib import Path
 
 import pytest
 
-from cmk.core_helpers.controller import GlobalConfig
-from cmk.core_helpers.protocol import CMCMessage
+from cmk.utils.exceptions import MKFetcherError, MKTimeout
+from cmk.utils.type_defs import HostName, result
+
+from cmk.core_helpers import Fetcher, ProgramFetcher
+from cmk.core_helpers.agent import AgentFileCache
+from cmk.core_helpers.cache import MaxAge
+from cmk.core_helpers.controller import (
+    _run_fetchers_concurrently,
+    _run_fetchers_sequentially,
+    GlobalConfig,
+)
+from cmk.core_helpers.protocol import CMCMessage, PayloadType
 from cmk.core_helpers.snmp import SNMPPluginStore
+from cmk.core_helpers.type_defs import Mode
 
 
 class TestGlobalConfig:
@@ -25,6 +39,21 @@ class TestGlobalConfig:
     def test_deserialization(self, global_config):
         assert GlobalConfig.deserialize(global_config.serialize()) == global_config
 
+    def test_deserialization_concurrent_fetchers(self, global_config):
+        global_config = global_config._replace(concurrent_fetchers=True)
+        assert GlobalConfig.deserialize(global_config.serialize()) == global_config
+
+    def test_deserialization_fetcher_timeouts(self, global_config):
+        global_config = global_config._replace(fetcher_timeouts={"SNMP": 30})
+        assert GlobalConfig.deserialize(global_config.serialize()) == global_config
+
+    def test_deserialization_default(self, global_config):
+        serialized = global_config.serialize()
+        del serialized["fetcher_config"]["concurrent_fetchers"]
+        del serialized["fetcher_config"]["fetcher_timeouts"]
+        assert GlobalConfig.deserialize(serialized).concurrent_fetchers is False
+        assert GlobalConfig.deserialize(serialized).fetcher_timeouts == {}
+
 
 class TestControllerApi:
     def test_controller_log(self):
@@ -38,3 +67,86 @@ class TestControllerApi:
 
     def test_controller_end_of_reply(self):
         assert CMCMessage.end_of_reply() == b"fetch:ENDREPL:        :0       :"
+
+
+class TestRunFetchers:
+    @staticmethod
+    def _fetcher(cmdline: str) -> ProgramFetcher:
+        return ProgramFetcher(
+            AgentFileCache(
+                HostName("hostname"),
+                base_path=Path(os.devnull),
+                max_age=MaxAge.none(),
+                disabled=True,
+                use_outdated=False,
+                simulation=False,
+                use_only_cache=False,
+            ),
+            cmdline=cmdline,
+            stdin=None,
+            is_cmc=True,
+        )
+
+    def test_concurrently(self) -> None:
+        fetchers = [self._fetcher("sleep 0.5; echo %d" % nr) for nr in range(3)]
+        start = time.monotonic()
+        messages = _run_fetchers_concurrently(
+            fetchers, Mode.CHECKING, timeout=10, timeout_message="timeout"
+        )
+        assert time.monotonic() - start < 1.4
+        assert [msg.raw_data for msg in messages] == [result.OK(b"%d\n" % nr) for nr in range(3)]
+        assert all(0.5 <= msg.stats.wall_time < 1.4 for msg in messages)
+
+    def test_concurrently_partial_results(self) -> None:
+        fetchers = [self._fetcher("sleep 30"), self._fetcher("echo fast")]
+        start = time.monotonic()
+        messages = _run_fetchers_concurrently(
+            fetchers, Mode.CHECKING, timeout=1, timeout_message="timeout"
+        )
+        assert time.monotonic() - start < 2
+        assert messages[0].header.payload_type is PayloadType.ERROR
+        assert isinstance(messages[0].raw_data.error, MKTimeout)
+        assert messages[0].stats.wall_time >= 1
+        assert messages[1].raw_data == result.OK(b"fast\n")
+
+    def test_concurrently_fetcher_timeouts(self) -> None:
+        fetchers = [self._fetcher("sleep 30"), self._fetcher("sleep 30")]
+        start = time.monotonic()
+        messages = _run_fetchers_concurrently(
+            fetchers,
+            Mode.CHECKING,
+            timeout=10,
+            timeout_message="timeout",
+            fetcher_timeouts={"PROGRAM": 1},
+        )
+        assert time.monotonic() - start < 2
+        assert [str(msg.raw_data.error) for msg in messages] == [
+            "PROGRAM fetcher timed out after 1 seconds"
+        ] * 2
+
+    def test_concurrently_not_cancellable(self, monkeypatch) -> None:
+        # Run in the main thread and interrupted by the alarm signal
+        monkeypatch.setattr(ProgramFetcher, "cancel", Fetcher.cancel)
+        fetchers = [self._fetcher("echo fast"), self._fetcher("sleep 30")]
+        start = time.monotonic()
+        messages = _run_fetchers_concurrently(
+            fetchers, Mode.CHECKING, timeout=1, timeout_message="timeout"
+        )
+        assert time.monotonic() - start < 2
+        assert messages[0].raw_data == result.OK(b"fast\n")
+        assert messages[1].header.payload_type is PayloadType.ERROR
+
+    def test_cancelled_before_fetch(self) -> None:
+        fetcher = self._fetcher("echo fast")
+        fetcher.cancel()
+        with fetcher:
+            raw_data = fetcher.fetch(Mode.CHECKING)
+        assert isinstance(raw_data.error, MKFetcherError)
+        assert str(raw_data.error) == "Fetch cancelled"
+
+    def test_sequentially(self) -> None:
+        fetchers = [self._fetcher("echo %d" % nr) for nr in range(2)]
+        messages = _run_fetchers_sequentially(
+            fetchers, Mode.CHECKING, timeout=10, timeout_message="timeout"
+        )
+        assert [msg.raw_data for msg in messages] == [result.OK(b"0\n"), result.OK(b"1\n")]
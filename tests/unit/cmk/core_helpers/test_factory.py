@@ -13,7 +13,7 @@ from cmk.utils.type_defs import HostAddress, HostName
 from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
 
 import cmk.core_helpers.factory as factory
-from cmk.core_helpers.snmp_backend import ClassicSNMPBackend
+from cmk.core_helpers.snmp_backend import BulkSNMPBackend, ClassicSNMPBackend
 
 try:
     from cmk.core_helpers.cee.snmp_backend import inline  # type: ignore[import]
@@ -65,3 +65,16 @@ def test_factory_snmp_backend_unknown_backend(snmp_config: SNMPHostConfig) -> No
                 factory.backend(snmp_config, logging.getLogger()),
                 ClassicSNMPBackend,
             )
+
+
+def test_factory_snmp_backend_bulk(snmp_config: SNMPHostConfig) -> None:
+    snmp_config = snmp_config._replace(snmp_backend=SNMPBackendEnum.BULK)
+    assert isinstance(factory.backend(snmp_config, logging.getLogger()), BulkSNMPBackend)
+
+
+def test_factory_snmp_backend_bulk_snmpv3(snmp_config: SNMPHostConfig) -> None:
+    snmp_config = snmp_config._replace(
+        snmp_backend=SNMPBackendEnum.BULK,
+        credentials=("noAuthNoPriv", "user"),
+    )
+    assert isinstance(factory.backend(snmp_config, logging.getLogger()), ClassicSNMPBackend)
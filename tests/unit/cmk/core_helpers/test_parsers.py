@@ -611,6 +611,97 @@ class TestAgentParser:
         }
         assert store.load() == {}
 
+    def test_marker_like_data_is_kept_in_section(self, parser, store):
+        raw_data = AgentRawData(
+            b"\n".join(
+                (
+                    b"<<<section:sep(124)>>>",
+                    b"a|<<<b>>>",
+                    b"<<<incomplete",
+                    b" <<<>>>",
+                    b"c|3",
+                )
+            )
+        )
+
+        ahs = parser.parse(raw_data, selection=NO_SELECTION)
+        assert ahs.sections == {
+            SectionName("section"): [["a", "<<<b>>>"], ["<<<incomplete"], ["<<<>>>"], ["c", "3"]],
+        }
+
+    def test_blank_lines_and_carriage_returns_are_dropped(self, parser, store, monkeypatch):
+        monkeypatch.setattr(time, "time", lambda c=itertools.count(1000, 50): next(c))
+        monkeypatch.setattr(parser, "cache_piggybacked_data_for", 900)
+
+        raw_data = AgentRawData(
+            b"\r\n".join(
+                (
+                    b"<<<section>>>",
+                    b"",
+                    b"first line",
+                    b"   ",
+                    b"second line",
+                    b"<<<<piggy>>>>",
+                    b"<<<section>>>",
+                    b"",
+                    b" first line ",
+                    b"\t",
+                    b"<<<<>>>>",
+                    b"",
+                )
+            )
+        )
+
+        ahs = parser.parse(raw_data, selection=NO_SELECTION)
+        assert ahs.sections == {SectionName("section"): [["first", "line"], ["second", "line"]]}
+        assert ahs.piggybacked_raw_data == {
+            "piggy": [b"<<<section:cached(1000,900)>>>", b" first line "],
+        }
+
+    def test_nostrip_option_keeps_whitespace(self, parser, store):
+        raw_data = AgentRawData(
+            b"\n".join(
+                (
+                    b"<<<section:nostrip():sep(124)>>>",
+                    b"  a | b  ",
+                    b"<<<other_section:sep(124)>>>",
+                    b"  a | b  ",
+                )
+            )
+        )
+
+        ahs = parser.parse(raw_data, selection=NO_SELECTION)
+        assert ahs.sections == {
+            SectionName("section"): [["  a ", " b  "]],
+            SectionName("other_section"): [["a ", " b"]],
+        }
+
+    def test_deselected_sections_are_not_decoded(self, parser, store, monkeypatch):
+        decoded = []
+        parse_line = SectionMarker.parse_line
+
+        def parse_line_spy(self, line):
+            decoded.append(self.name)
+            return parse_line(self, line)
+
+        monkeypatch.setattr(SectionMarker, "parse_line", parse_line_spy)
+        raw_data = AgentRawData(
+            b"\n".join(
+                (
+                    b"<<<deselected>>>",
+                    b"1st line",
+                    b"<<<selected>>>",
+                    b"2nd line",
+                    b"<<<deselected>>>",
+                    b"3rd line",
+                )
+            )
+        )
+
+        ahs = parser.parse(raw_data, selection={SectionName("selected")})
+        assert ahs.sections == {SectionName("selected"): [["2nd", "line"]]}
+        assert decoded == [SectionName("selected")]
+
 
 class TestSectionMarker:
     def test_options_serialize_options(self):
@@ -4,7 +4,9 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
 import logging
+import posix
 import socket
 from itertools import repeat
 from typing import Sequence
@@ -468,6 +470,16 @@ class TestResultStats:
     def test_encode_decode(self, l3stats):
         assert ResultStats.from_bytes(bytes(l3stats)) == l3stats
 
+    def test_wall_time(self):
+        stats = ResultStats(Snapshot.null(), 4.2)
+        assert ResultStats.from_bytes(bytes(stats)).wall_time == 4.2
+
+    def test_wall_time_default(self):
+        duration = Snapshot(posix.times_result((0.1, 0.2, 0.3, 0.4, 1.5)))
+        assert ResultStats(duration).wall_time == 1.5
+        stats = json.dumps({"duration": duration.serialize()}).encode("ascii")
+        assert ResultStats.from_bytes(stats).wall_time == 1.5
+
 
 class TestFetcherMessage:
     @pytest.fixture
@@ -4,8 +4,17 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import logging
+
 import pytest
 
+import cmk.utils.cleanup
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.type_defs import HostName
+
+from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
+
 import cmk.core_helpers.snmp_backend._utils as utils
 from cmk.core_helpers.snmp_backend import StoredWalkSNMPBackend
 
@@ -26,19 +35,41 @@ def test_strip_snmp_value(value, expected):
 @pytest.mark.usefixtures("create_files")
 class TestStoredWalkSNMPBackend:
     @pytest.mark.parametrize(
-        "a, b, result",
+        "oid, expected",
         [
-            ("1.2.3", "1.2.3", 0),
-            ("1.2.3", ".1.2.3", 0),
-            (".1.2.3", "1.2.3", 0),
-            (".1.2.3", ".1.2.3", 0),
-            ("1.2.3", "1.2.3.4", 0),
-            ("1.2.3.4", "1.2.3", 1),
-            ("1.2.3", "4.5.6", -1),
+            ("1.2.3", [(".1.2.3", b"foo")]),
+            (".1.2.3", [(".1.2.3", b"foo")]),
+            (".1.2", [(".1.2.3", b"foo"), (".1.2.4", b"bar\nfoobar"), (".1.2.10", b"ten")]),
+            (".1.2.*", [(".1.2.3", b"foo")]),
+            (".1.2.4", [(".1.2.4", b"bar\nfoobar")]),
+            (".1.2.5", []),
+            (".1.20", []),
+            (".1", [(".1.2.3", b"foo"), (".1.2.4", b"bar\nfoobar"), (".1.2.10", b"ten")]),
         ],
     )
-    def test_compare_oids(self, a, b, result):
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
+    def test_walk(self, backend, oid, expected):
+        assert backend.walk(oid) == expected
+
+    def test_get(self, backend):
+        assert backend.get(".1.2.3") == b"foo"
+        assert backend.get(".1.2") is None
+        assert backend.get(".1.2.*") == b"foo"
+
+    def test_walk_below_prefix(self, backend, tmpdir):
+        (tmpdir / "walkdata").join("2.txt").write(".1.2 prefix\n.1.2.3 foo\n.1.2.4 bar\n")
+        backend.config = backend.config._replace(hostname=HostName("2.txt"))
+        assert backend.walk(".1.2.*") == [(".1.2.3", b"foo")]
+        assert backend.walk(".1.2.3.*") == []
+        assert backend.get(".1.2.*") == b"foo"
+
+    def test_walk_index_is_stored(self, backend, tmpdir):
+        backend.walk(".1.2.3")
+        assert (tmpdir / "walkindex" / "1.txt").exists()
+
+    def test_walk_of_missing_host(self, backend):
+        backend.config = backend.config._replace(hostname=HostName("missing"))
+        with pytest.raises(MKSNMPError):
+            backend.walk(".1.2.3")
 
     def test_read_walk_data(self, tmpdir):
         assert StoredWalkSNMPBackend.read_walk_data(tmpdir / "walkdata" / "1.txt") == [
@@ -58,3 +89,30 @@ def create_files(tmpdir):
     p1.write(".1.2.3 foo\n.1.2.4 bar\nfoobar\n")
     p2 = (tmpdir / "walkdata").join("2.txt")
     p2.write(".1.2.3 foo\n\n\n.1.2.5 test\n")
+
+
+@pytest.fixture
+def backend(tmpdir, monkeypatch):
+    (tmpdir / "walkdata").join("1.txt").write(".1.2.3 foo\n.1.2.10 ten\n.1.2.4 bar\nfoobar\n")
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmpdir / "walkdata"))
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_index_dir", str(tmpdir / "walkindex"))
+    yield StoredWalkSNMPBackend(
+        SNMPHostConfig(
+            is_ipv6_primary=False,
+            hostname=HostName("1.txt"),
+            ipaddress="1.2.3.4",
+            credentials="",
+            port=42,
+            is_bulkwalk_host=False,
+            is_snmpv2or3_without_bulkwalk_host=False,
+            bulk_walk_size_of=0,
+            timing={},
+            oid_range_limits={},
+            snmpv3_contexts=[],
+            character_encoding="ascii",
+            is_usewalk_host=True,
+            snmp_backend=SNMPBackendEnum.CLASSIC,
+        ),
+        logging.getLogger("test"),
+    )
+    cmk.utils.cleanup.cleanup_globals()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import os
+from pathlib import Path
+
+import pytest
+
+from cmk.utils.exceptions import MKGeneralException
+
+from cmk.core_helpers.snmp_backend import _walk_index
+from cmk.core_helpers.snmp_backend._walk_index import compile_walk, load_walk_index, WalkIndex
+
+_WALK = """.1.3.6.1.2.1.2.2.1.2.10 "eth10"
+.1.3.6.1.2.1.1.1.0 Linux
+.1.3.6.1.2.1.2.2.1.2.2 "eth2 with
+a line break"
+.1.3.6.1.2.1.2.2.1.2.1 "lö"
+.1.3.6.1.2.1.2.2.1.3.1 6
+.1.3.6.1.2.1.2.2.1.5.1
+"""
+
+
+@pytest.fixture
+def walk_path(tmp_path: Path) -> Path:
+    path = tmp_path / "walk"
+    path.write_text(_WALK)
+    return path
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_compile_walk(walk_path: Path, in_memory: bool) -> None:
+    index = compile_walk(walk_path, None if in_memory else walk_path.parent / "index")
+    assert [index.oid(row) for row in range(index.num_rows)] == [
+        [1, 3, 6, 1, 2, 1, 1, 1, 0],
+        [1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1],
+        [1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2],
+        [1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 10],
+        [1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 1],
+        [1, 3, 6, 1, 2, 1, 2, 2, 1, 5, 1],
+    ]
+    assert index.rows(range(index.num_rows)) == [
+        (".1.3.6.1.2.1.1.1.0", b"Linux"),
+        (".1.3.6.1.2.1.2.2.1.2.1", "lö".encode("utf-8")),
+        (".1.3.6.1.2.1.2.2.1.2.2", b"eth2 with\na line break"),
+        (".1.3.6.1.2.1.2.2.1.2.10", b"eth10"),
+        (".1.3.6.1.2.1.2.2.1.3.1", b"6"),
+        (".1.3.6.1.2.1.2.2.1.5.1", b""),
+    ]
+    assert index.rows(range(2, 4)) == [
+        (".1.3.6.1.2.1.2.2.1.2.2", b"eth2 with\na line break"),
+        (".1.3.6.1.2.1.2.2.1.2.10", b"eth10"),
+    ]
+    assert index.rows(range(3, 3)) == []
+    index.close()
+
+
+@pytest.mark.parametrize(
+    "prefix, rows",
+    [
+        ([], range(6)),
+        ([1, 3, 6, 1, 2, 1], range(6)),
+        ([1, 3, 6, 1, 2, 1, 2, 2, 1, 2], range(1, 4)),
+        ([1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1], range(1, 2)),
+        ([1, 3, 6, 1, 2, 1, 2, 2, 1, 4], range(5, 5)),
+        ([1, 3, 6, 1, 2, 1, 2, 2, 1, 5, 1, 1], range(6, 6)),
+        ([0], range(0, 0)),
+        ([2], range(6, 6)),
+    ],
+)
+def test_lookup(walk_path: Path, prefix: list[int], rows: range) -> None:
+    index = compile_walk(walk_path, None)
+    assert index.lookup(prefix) == rows
+
+
+def test_lookup_many_rows(tmp_path: Path) -> None:
+    walk_path = tmp_path / "walk"
+    walk_path.write_text(
+        "".join(".1.%d.%d %d\n" % (a, b, a * b) for a in range(50) for b in range(50))
+    )
+    index = compile_walk(walk_path, None)
+    for a in range(50):
+        assert index.rows(index.lookup([1, a])) == [
+            (".1.%d.%d" % (a, b), b"%d" % (a * b)) for b in range(50)
+        ]
+
+
+def test_load_walk_index_recompiles_outdated_index(walk_path: Path) -> None:
+    index_path = walk_path.parent / "index" / "walk"
+    load_walk_index(walk_path, index_path).close()
+    stat = index_path.stat()
+
+    index = load_walk_index(walk_path, index_path)
+    assert index.num_rows == 6
+    index.close()
+    assert index_path.stat().st_ino == stat.st_ino
+
+    walk_path.write_text(".1.2.3 changed\n")
+    index = load_walk_index(walk_path, index_path)
+    assert index.rows(index.lookup([1])) == [(".1.2.3", b"changed")]
+    index.close()
+    assert index_path.stat().st_ino != stat.st_ino
+
+
+def test_load_walk_index_replaces_invalid_index(walk_path: Path) -> None:
+    index_path = walk_path.parent / "index"
+    index_path.write_bytes(b"CMKWALK\x01" + b"\xff" * 100)
+    index = load_walk_index(walk_path, index_path)
+    assert index.num_rows == 6
+    index.close()
+    WalkIndex.open(index_path).close()
+
+
+def test_load_walk_index_without_permission(
+    walk_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def makedirs(*args: object, **kwargs: object) -> None:
+        raise PermissionError()
+
+    monkeypatch.setattr(_walk_index.os, "makedirs", makedirs)
+    index = load_walk_index(walk_path, walk_path.parent / "index" / "walk")
+    assert index.num_rows == 6
+    assert not os.path.exists(walk_path.parent / "index")
+
+
+def test_load_walk_index_of_missing_walk(tmp_path: Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        load_walk_index(tmp_path / "walk", tmp_path / "index")
+
+
+def test_agent_simulator_tags_are_processed(tmp_path: Path) -> None:
+    walk_path = tmp_path / "walk"
+    walk_path.write_text('.1.2.3 "%{uptime()}"\n.1.2.4 "%{"\n')
+    index = compile_walk(walk_path, None)
+    assert index.rows(range(1, 2)) == [(".1.2.4", b"%{")]
+    with pytest.raises(MKGeneralException):
+        index.rows(range(1))
+
+
+@pytest.mark.parametrize("walk", [".1.2.x foo\n", ".1.2.4294967296 foo\n"])
+def test_compile_invalid_walk(tmp_path: Path, walk: str) -> None:
+    walk_path = tmp_path / "walk"
+    walk_path.write_text(walk)
+    with pytest.raises(MKGeneralException):
+        compile_walk(walk_path, tmp_path / "index")
+    assert os.listdir(tmp_path) == ["walk"]
@@ -258,3 +258,35 @@ def test_mkevent_query_filters(
     status_server.handle_client(status_socket, True, "127.0.0.1")
     response = status_socket.get_response()
     assert (len(response) == 2) is is_match
+
+
+def test_event_limit_removes_oldest_event_of_host(event_status):
+    for num in range(4):
+        event_status.new_event(
+            CMKEventConsole.new_event(
+                {"host": "host-%d" % (num % 2), "core_host": "host-%d" % (num % 2)}
+            )
+        )
+    new_event = CMKEventConsole.new_event({"host": "host-1", "core_host": "host-1"})
+
+    assert event_status.get_num_existing_events_by("by_host", new_event) == 2
+    event_status.remove_oldest_event("by_host", new_event)
+
+    assert [event["id"] for event in event_status.events()] == [1, 3, 4]
+    assert event_status.num_existing_events_by_host == {
+        ("host-0", "host-0"): 2,
+        ("host-1", "host-1"): 1,
+    }
+
+
+def test_delete_event(event_status):
+    for num in range(3):
+        event_status.new_event(CMKEventConsole.new_event({"core_host": "test-host"}))
+
+    event_status.delete_event(2, "me")
+
+    assert event_status.event(2) is None
+    assert [event["id"] for event in event_status.pack_status()["events"]] == [1, 3]
+    assert event_status.num_existing_events == 2
+    with pytest.raises(cmk.ec.main.MKClientError):
+        event_status.delete_event(2, "me")
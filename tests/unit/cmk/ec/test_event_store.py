@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+from typing import Optional
+
+import pytest
+
+from cmk.ec.event import Event
+from cmk.ec.event_store import EventStore
+
+
+def _event(event_id: int, rule_id: Optional[str], host: str, core_host: Optional[str]) -> Event:
+    return {"id": event_id, "rule_id": rule_id, "host": host, "core_host": core_host}
+
+
+@pytest.fixture(name="store")
+def fixture_store() -> EventStore:
+    return EventStore(
+        [
+            _event(1, "r1", "h1", "h1"),
+            _event(2, "r2", "h2", None),
+            _event(3, "r1", "h2", "h2"),
+            _event(4, None, "h1", None),
+            _event(5, "r2", "h1", "h1"),
+        ]
+    )
+
+
+def _ids(events) -> list[int]:
+    return [event["id"] for event in events]
+
+
+def test_events_keep_order_of_creation(store: EventStore) -> None:
+    store.add(_event(6, "r1", "h3", "h3"))
+    store.remove(store.get(3))
+    assert _ids(store) == [1, 2, 4, 5, 6]
+    assert len(store) == 5
+
+
+def test_get(store: EventStore) -> None:
+    assert store.get(3) == _event(3, "r1", "h2", "h2")
+    assert store.get(42) is None
+
+
+def test_remove_unknown_event(store: EventStore) -> None:
+    with pytest.raises(KeyError):
+        store.remove(_event(42, "r1", "h1", "h1"))
+    assert len(store) == 5
+
+
+def test_rule_index(store: EventStore) -> None:
+    assert _ids(store.of_rule("r1")) == [1, 3]
+    assert _ids(store.of_rule(None)) == [4]
+    assert store.of_rule("unknown") == []
+    assert store.num_by_rule() == {"r1": 2, "r2": 2, None: 1}
+
+    store.remove(store.get(1))
+    assert store.oldest_of_rule("r1") == store.get(3)
+    store.remove(store.get(3))
+    assert store.oldest_of_rule("r1") is None
+    assert store.num_of_rule("r1") == 0
+    assert "r1" not in store.num_by_rule()
+
+
+def test_host_index(store: EventStore) -> None:
+    assert store.num_of_host(("h1", "h1")) == 2
+    assert store.num_of_host(("h1", None)) == 1
+    assert store.num_by_host() == {
+        ("h1", "h1"): 2,
+        ("h2", None): 1,
+        ("h2", "h2"): 1,
+        ("h1", None): 1,
+    }
+
+
+def test_oldest_of_host_ignores_core_host(store: EventStore) -> None:
+    assert _ids([store.oldest_of_host("h2")]) == [2]
+    store.remove(store.get(1))
+    assert _ids([store.oldest_of_host("h1")]) == [4]
+    assert store.oldest_of_host("unknown") is None
+
+
+def test_oldest(store: EventStore) -> None:
+    assert _ids([store.oldest()]) == [1]
+    assert EventStore().oldest() is None
+
+
+def test_reindex_changed_event(store: EventStore) -> None:
+    event = store.get(1)
+    assert event is not None
+    event["host"] = "h2"
+    event["core_host"] = "h2"
+    store.reindex(event)
+
+    assert store.num_of_host(("h1", "h1")) == 1
+    # The event is still older than the other events of the host
+    assert _ids([store.oldest_of_host("h2")]) == [1]
+    assert [store.num_of_host(("h2", "h2")), store.oldest_of_rule("r1")] == [2, event]
+
+    store.remove(event)
+    assert store.num_of_host(("h2", "h2")) == 1
+
+
+def test_add_event_twice(store: EventStore) -> None:
+    store.add(_event(1, "r3", "h3", None))
+    assert len(store) == 5
+    assert store.num_of_rule("r1") == 1
+    assert _ids(store.of_rule("r3")) == [1]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import cmk.ec.export as ec
+from cmk.ec.history import History
+from cmk.ec.history_index import HistoryIndex, index_path_of
+from cmk.ec.main import StatusTableEvents, StatusTableHistory
+from cmk.ec.query import QueryGET
+
+
+class FakeStatusServer:
+    def __init__(self, history: History) -> None:
+        self._table = StatusTableHistory(logging.getLogger("cmk.mkeventd"), history)
+
+    def table(self, name: str) -> StatusTableHistory:
+        assert name == "history"
+        return self._table
+
+
+@pytest.fixture(name="history")
+def fixture_history(tmp_path: Path) -> History:
+    config = ec.default_config()
+    config["archive_mode"] = "file_indexed"
+    return History(
+        ec.settings("1.2.3i45", tmp_path, tmp_path / "etc", ["mkeventd"]),
+        config,
+        logging.getLogger("cmk.mkeventd"),
+        StatusTableEvents.columns,
+        StatusTableHistory.columns,
+    )
+
+
+def _add_events(history: History, count: int) -> None:
+    for nr in range(count):
+        event: dict[str, Any] = {
+            "id": nr,
+            "host": "Host%d" % (nr % 5),
+            "application": ("sshd", "cron", "kernel")[nr % 3],
+            "rule_id": "rule%d" % (nr % 4),
+            "text": "message %d" % nr,
+        }
+        history.add(event, "NEW")
+
+
+def _query(history: History, *headers: str) -> list[Any]:
+    query = QueryGET(
+        FakeStatusServer(history),
+        ["GET history", "Columns: history_line event_id event_host", *headers],
+        logging.getLogger("cmk.mkeventd"),
+    )
+    return list(history.get(query))
+
+
+def _set_archive_mode(history: History, archive_mode: str) -> None:
+    config = history._config.copy()
+    config["archive_mode"] = archive_mode  # type: ignore[typeddict-item]
+    history.reload_configuration(config)
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        (),
+        ("Filter: event_host = Host3",),
+        ("Filter: event_host =~ host3",),
+        ("Filter: event_host in Host1 host2",),
+        ("Filter: event_host = Host3", "Filter: event_application = cron"),
+        ("Filter: event_rule_id = rule1", "Filter: event_text ~ 1"),
+        ("Filter: event_host = unknown",),
+        ("Filter: event_host = Host3", "Limit: 2"),
+    ],
+)
+def test_indexed_history_matches_file_history(history: History, headers: tuple[str, ...]) -> None:
+    _add_events(history, 60)
+    indexed = _query(history, *headers)
+
+    _set_archive_mode(history, "file")
+    # The grep based lookup counts the history_line within the lines found by grep
+    assert [row[1:] for row in indexed] == [row[1:] for row in _query(history, *headers)]
+
+
+def test_history_line_is_position_from_end_of_file(history: History) -> None:
+    _add_events(history, 10)
+    rows = _query(history, "Filter: event_host = Host2")
+    assert [(row[0], row[5]) for row in rows] == [(3, 7), (8, 2)]
+
+
+def test_index_is_written_next_to_history_file(history: History) -> None:
+    _add_events(history, 3)
+    (log_path,) = history._settings.paths.history_dir.value.glob("*.log")
+    assert index_path_of(log_path).exists()
+
+
+def test_index_catches_up_with_unindexed_lines(history: History) -> None:
+    _set_archive_mode(history, "file")
+    _add_events(history, 20)
+    _set_archive_mode(history, "file_indexed")
+    _add_events(history, 20)
+
+    rows = _query(history, "Filter: event_host = Host2")
+    assert len(rows) == 8
+    assert all(row[7 + 5] == "Host2" for row in rows)
+
+
+def test_index_is_recovered_from_index_file(history: History) -> None:
+    _add_events(history, 30)
+    expected = _query(history, "Filter: event_application = kernel")
+
+    history._index = HistoryIndex(StatusTableEvents.columns, logging.getLogger())
+    assert _query(history, "Filter: event_application = kernel") == expected
+
+
+def test_truncated_index_file_is_completed(history: History) -> None:
+    _add_events(history, 30)
+    (log_path,) = history._settings.paths.history_dir.value.glob("*.log")
+    index_path = index_path_of(log_path)
+    index_path.write_bytes(index_path.read_bytes()[:-7])
+
+    history._index = HistoryIndex(StatusTableEvents.columns, logging.getLogger())
+    _add_events(history, 5)
+    assert len(_query(history, "Filter: event_host = Host0")) == 7
+
+
+def test_housekeeping_removes_index(history: History) -> None:
+    _add_events(history, 3)
+    history.flush()
+    assert not list(history._settings.paths.history_dir.value.iterdir())
+
+
+def test_lines_are_read_after_index_is_forgotten(history: History) -> None:
+    _add_events(history, 10)
+    (log_path,) = history._settings.paths.history_dir.value.glob("*.log")
+    line_nrs = history._index.lookup(log_path, (None, None), {"event_host": {"Host2"}})
+    lines = history._index.read_lines(log_path, line_nrs)
+
+    # E.g. by a concurrent housekeeping, after the lookup released the lock of the history
+    history._index.forget(log_path)
+    assert [line_no for line_no, _line in lines] == [3, 8]
@@ -128,6 +128,10 @@ def test_perfcounters_correct_status_values():
             counter_name = column_name.split("_")[-2]
             assert column_value == c._rates.get(counter_name, 0.0)
 
+        elif column_name.startswith("status_") and column_name.endswith("_queue_length"):
+            queue_name = column_name[len("status_") : -len("_queue_length")]
+            assert column_value == c._queue_lengths[queue_name]
+
         elif column_name.startswith("status_"):
             counter_name = "_".join(column_name.split("_")[1:])
             assert column_value == c._counters[counter_name], "Invalid value %r: %r" % (
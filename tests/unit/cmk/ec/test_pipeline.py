@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from cmk.utils.type_defs import HostName
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.host_config
+import cmk.ec.main
+from cmk.ec.core_queries import HostInfo
+from cmk.ec.main import find_rule_hits, MatchFailure, MatchSuccess
+
+logger = logging.getLogger("cmk.mkeventd")
+
+
+def _rule(rule_id: str, pack: str, **kwargs: Any) -> dict[str, Any]:
+    return {"id": rule_id, "pack": pack, **kwargs}
+
+
+def _rule_matches(hit_rules: set[str]):
+    def matches(rule, event):
+        if rule["id"] == "broken":
+            raise ValueError("broken")
+        if rule["id"] in hit_rules:
+            return MatchSuccess(cancelling=False, match_groups={})
+        return MatchFailure()
+
+    return matches
+
+
+@pytest.mark.parametrize(
+    "hit_rules,expected",
+    [
+        ({"a1", "b1"}, ["a1"]),
+        ({"b1"}, ["b1"]),
+        # Only the skipping rule of the first pack is hit, the second pack is matched
+        ({"a1", "b1"} | {"skip"}, ["skip", "b1"]),
+        ({"skip", "a2"}, ["skip"]),
+        (set(), []),
+    ],
+)
+def test_find_rule_hits(hit_rules: set[str], expected: list[str]) -> None:
+    rules = [
+        _rule("skip", "a", drop="skip_pack"),
+        _rule("broken", "a"),
+        _rule("a1", "a"),
+        _rule("a2", "a"),
+        _rule("b1", "b"),
+    ]
+    if "skip" not in hit_rules:
+        rules = rules[1:]
+    hits = find_rule_hits(rules, {}, _rule_matches(hit_rules), logger)
+    assert [rule["id"] for rule, _result in hits] == expected
+
+
+def test_perfcounters_queue_lengths() -> None:
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    perfcounters.set_queue_length("pipeline_worker", 42)
+    status = dict(
+        zip([name for name, _default in perfcounters.status_columns()], perfcounters.get_status())
+    )
+    assert status["status_pipeline_worker_queue_length"] == 42
+    assert status["status_pipeline_state_queue_length"] == 0
+
+
+def _ec_rule(rule_id: str, **kwargs: Any) -> dict[str, Any]:
+    return {
+        "id": rule_id,
+        "sl": {"value": 0, "precedence": "message"},
+        "actions": [],
+        "autodelete": False,
+        "cancel_actions": [],
+        "cancel_action_phases": "always",
+        **kwargs,
+    }
+
+
+def _event_server(tmp_path: Path, pipeline_workers: int) -> cmk.ec.main.EventServer:
+    settings = ec.settings("1.2.3i45", tmp_path, tmp_path / "etc", ["mkeventd"])
+    wato_config = ec.default_config()
+    wato_config["pipeline_workers"] = pipeline_workers
+    wato_config["rule_packs"] = [
+        {
+            "id": "default",
+            "title": "Default",
+            "disabled": False,
+            "rules": [
+                _ec_rule("ignore", drop=True, match="ignore"),
+                _ec_rule(
+                    "counting",
+                    match="count (.*)",
+                    count={
+                        "count": 3,
+                        "period": 3600,
+                        "algorithm": "interval",
+                        "count_ack": False,
+                        "separate_host": True,
+                        "separate_application": False,
+                        "separate_match_groups": True,
+                    },
+                    state=1,
+                ),
+                _ec_rule("cancelling", match="(.*) down", match_ok="(.*) up", state=2),
+            ],
+        }
+    ]
+    config = cmk.ec.main.make_config(wato_config)
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    history = cmk.ec.history.History(
+        settings,
+        config,
+        logger,
+        cmk.ec.main.StatusTableEvents.columns,
+        cmk.ec.main.StatusTableHistory.columns,
+    )
+    event_server = cmk.ec.main.EventServer(
+        logging.getLogger("cmk.mkeventd.EventServer"),
+        settings,
+        config,
+        cmk.ec.main.default_slave_status_master(),
+        perfcounters,
+        cmk.ec.main.ECLock(logging.getLogger("cmk.mkeventd.configuration")),
+        history,
+        cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger),
+        cmk.ec.main.StatusTableEvents.columns,
+        False,
+    )
+    event_server.compile_rules(config["rule_packs"])
+    return event_server
+
+
+_MESSAGES = [
+    b"<78>Dec 24 11:00:00 host1 app: eth0 down",
+    b"<78>Dec 24 11:00:01 host2 app: ignore me",
+    b"<78>Dec 24 11:00:02 host1 app: count a\n<78>Dec 24 11:00:03 host1 app: count b",
+    b"<78>Dec 24 11:00:04 host2 app: eth1 down",
+    b"<78>Dec 24 11:00:05 host1 app: eth0 up",
+    b"<78>Dec 24 11:00:06 host1 app: count a",
+    b"<78>Dec 24 11:00:07 host1 app: count a",
+    b"\xff\xfe",
+]
+
+
+def _open_events(event_server: cmk.ec.main.EventServer) -> list[tuple[Any, ...]]:
+    return [
+        (
+            event["rule_id"],
+            event["host"],
+            event["core_host"],
+            event["text"],
+            event.get("count"),
+            event["phase"],
+        )
+        for event in event_server._event_status.events()
+    ]
+
+
+@pytest.fixture(name="core_hosts")
+def fixture_core_hosts(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The hosts of the core, without a livestatus connection"""
+    monkeypatch.setattr(cmk.ec.host_config, "query_status_program_start", lambda: 1)
+    monkeypatch.setattr(cmk.ec.main, "query_hosts_scheduled_downtime_depth", lambda host_name: 0)
+    monkeypatch.setattr(
+        cmk.ec.host_config,
+        "query_hosts_infos",
+        lambda: [
+            HostInfo(
+                name=HostName("host1"),
+                alias="host1 alias",
+                address="1.2.3.4",
+                custom_variables={},
+                contacts=set(),
+                contact_groups=set(),
+            )
+        ],
+    )
+
+
+@pytest.mark.usefixtures("core_hosts")
+def test_pipeline_processes_messages_like_event_server(tmp_path: Path) -> None:
+    event_server = _event_server(tmp_path / "sync", 0)
+    for data in _MESSAGES:
+        event_server.process_raw_lines(data, ("1.2.3.4", 514))
+
+    pipelined_event_server = _event_server(tmp_path / "pipeline", 2)
+    assert pipelined_event_server._pipeline is not None
+    try:
+        for data in _MESSAGES:
+            pipelined_event_server.process_raw_lines(data, ("1.2.3.4", 514))
+        assert pipelined_event_server._event_status.events() == []
+        pipelined_event_server.process_pipeline_results(drain=True)
+    finally:
+        pipelined_event_server._pipeline.close()
+
+    assert _open_events(pipelined_event_server) == _open_events(event_server)
+    assert _open_events(event_server) == [
+        ("counting", "host1", "host1", "count a", 3, "open"),
+        ("counting", "host1", "host1", "count b", 1, "counting"),
+        ("cancelling", "host2", None, "eth1 down", None, "open"),
+    ]
+    for counter in ["messages", "rule_tries", "rule_hits", "drops", "events"]:
+        assert (
+            pipelined_event_server._perfcounters._counters[counter]
+            == event_server._perfcounters._counters[counter]
+        ), counter
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import random
+import re
+from typing import Any, Optional
+
+import pytest
+
+from cmk.ec.main import EventServer, match
+from cmk.ec.prefilter import LiteralAutomaton, normalize, required_literals, RulePrefilter
+
+_PATTERNS = [
+    "sshd.*failed for (.*)",
+    "(foo|barbaz) down",
+    "(foo|.*) down",
+    "a?bc",
+    "x(?:abc)+y",
+    r"host\d+ (crit|warn)ical",
+    r"^\S+ down$",
+    "Grüße OK",
+    "grüsse ok",
+    "kernel: (?i:PANIC)",
+    "[ab]+",
+    "(?=abc)",
+    "ſtop",
+]
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("sshd.*failed for (.*)", {"failed for "}),
+        ("(foo|barbaz) down", {" down"}),
+        ("(foo|barbaz)", {"foo", "barbaz"}),
+        ("(foo|.*)", None),
+        ("a?bc", {"bc"}),
+        ("x(?:abc)+y", {"abc"}),
+        ("x(?:abc)*y", None),
+        (r"host\d+ (crit|warn)ical", {"host"}),
+        ("Grüße OK", {"e ok"}),
+        ("[ab]+", None),
+        ("a", None),
+    ],
+)
+def test_required_literals_of_regex(pattern: str, expected: Optional[set[str]]) -> None:
+    assert required_literals(EventServer._compile_matching_value("match", pattern)) == (
+        None if expected is None else frozenset(expected)
+    )
+
+
+def test_required_literals_of_text() -> None:
+    assert required_literals(EventServer._compile_matching_value("match", "Grüße Welt")) == {
+        "e welt"
+    }
+    assert required_literals(None) is None
+
+
+def test_normalize_case_equivalents() -> None:
+    ascii_letter = re.compile("[a-z]", re.IGNORECASE)
+    for code in range(0x80, 0x10000):
+        char = chr(code)
+        if ascii_letter.fullmatch(char):
+            assert re.fullmatch(normalize(char), char, re.IGNORECASE), repr(char)
+
+
+def test_required_literals_are_found_in_matching_texts() -> None:
+    rng = random.Random(42)
+    alphabet = "abcdefoklrstxyz ſİK:"
+    texts = [
+        "".join(rng.choice(alphabet) for _nr in range(rng.randrange(20))) for _t in range(2000)
+    ]
+    texts += [
+        "sshd: Failed for root",
+        "BARBAZ down",
+        "HOST12 WARNical",
+        "kernel: panic",
+        "GRÜSSE OK",
+    ]
+    for pattern in _PATTERNS:
+        compiled = EventServer._compile_matching_value("match", pattern)
+        requirement = required_literals(compiled)
+        for text in texts:
+            if match(compiled, text, complete=False) is not False and requirement is not None:
+                assert any(literal in normalize(text) for literal in requirement), (pattern, text)
+
+
+def test_literal_automaton() -> None:
+    automaton = LiteralAutomaton({"he": 1, "she": 2, "his": 4, "hers": 8, "sh": 16})
+    assert automaton.search("ushers") == 1 | 2 | 8 | 16
+    assert automaton.search("xhis") == 4
+    assert automaton.search("hhe") == 1
+    assert automaton.search("") == 0
+    assert automaton.search("nothing") == 0
+
+
+def test_literal_automaton_finds_same_literals_as_substring_search() -> None:
+    rng = random.Random(23)
+    literals = sorted(
+        {"".join(rng.choice("abc") for _nr in range(rng.randrange(1, 6))) for _l in range(30)}
+    )
+    automaton = LiteralAutomaton({literal: 1 << nr for nr, literal in enumerate(literals)})
+    for _nr in range(500):
+        text = "".join(rng.choice("abcd") for _nr in range(rng.randrange(15)))
+        expected = sum(1 << nr for nr, literal in enumerate(literals) if literal in text)
+        assert automaton.search(text) == expected, text
+
+
+def _rule(rule_id: str, **patterns: Any) -> dict[str, Any]:
+    rule: dict[str, Any] = {"id": rule_id}
+    for key, value in patterns.items():
+        rule[key] = (
+            EventServer._compile_matching_value(key, value) if isinstance(value, str) else value
+        )
+    return rule
+
+
+@pytest.fixture(name="rules")
+def fixture_rules() -> list[dict[str, Any]]:
+    return [
+        _rule("sshd", match="sshd.*failed"),
+        _rule("link", match="link (.*) down", match_ok="link (.*) up"),
+        _rule("cron", match_application="cron", match="job (.*)"),
+        _rule("host", match_host="db(.*)", match="disk full"),
+        _rule("inverted", match="disk full", invert_matching=True),
+        _rule("any", match=".*"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "text,application,host,expected",
+    [
+        ("sshd[123]: authentication FAILED", "sshd", "web01", ["sshd", "inverted", "any"]),
+        ("Link eth0 up", "kernel", "sw01", ["link", "inverted", "any"]),
+        ("job backup done", "CRON", "web01", ["cron", "inverted", "any"]),
+        ("job backup done", "anacron", "web01", ["cron", "inverted", "any"]),
+        ("job backup done", "systemd", "web01", ["inverted", "any"]),
+        ("Disk full", "kernel", "DB01", ["host", "inverted", "any"]),
+        ("Disk full", "kernel", "web01", ["inverted", "any"]),
+    ],
+)
+def test_rule_prefilter(
+    rules: list[dict[str, Any]], text: str, application: str, host: str, expected: list[str]
+) -> None:
+    prefilter = RulePrefilter(rules)  # type: ignore[arg-type]
+    candidates = prefilter.filter(
+        rules[::-1], {"text": text, "application": application, "host": host}  # type: ignore[arg-type]
+    )
+    assert [rule["id"] for rule in candidates] == expected[::-1]
+
+
+def test_rule_prefilter_keeps_rules_when_nothing_can_be_eliminated(
+    rules: list[dict[str, Any]]
+) -> None:
+    prefilter = RulePrefilter(rules[-2:])  # type: ignore[arg-type]
+    assert prefilter.num_unfiltered == 2
+    assert prefilter.num_literals == 0
+    candidates = rules[-2:]
+    assert (
+        prefilter.filter(candidates, {"text": "", "application": "", "host": ""})  # type: ignore[arg-type]
+        is candidates
+    )
@@ -270,6 +270,7 @@ def test_automation_get_config_sync_state():
             ),
         },
         0,
+        ["gzip", "block_deltas"],
     )
 
 
@@ -352,6 +353,48 @@ def test_get_config_sync_file_infos():
     }
 
 
+def test_get_config_sync_file_infos_with_file_hashes(monkeypatch, tmp_path):
+    base_dir = tmp_path / "replication"
+    _create_get_config_sync_file_infos_test_config(base_dir)
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path / "var"))
+    replication_paths = [
+        ReplicationPath("dir", "d4-multiple-files", "etc/d4", []),
+        ReplicationPath("dir", "links", "links", []),
+    ]
+    expected = activate_changes._get_config_sync_file_infos(replication_paths, base_dir)
+
+    hashed = []
+    create_hash = activate_changes._create_config_sync_file_hash
+    monkeypatch.setattr(
+        activate_changes,
+        "_create_config_sync_file_hash",
+        lambda file_path: hashed.append(file_path.name) or create_hash(file_path),
+    )
+    file_hashes = activate_changes.ConfigSyncFileHashes(SiteId("remote"))
+
+    sync_infos = activate_changes._get_config_sync_file_infos(
+        replication_paths, base_dir, file_hashes
+    )
+    assert sync_infos == expected
+    assert sorted(hashed) == ["x1", "x2", "x3.xyz", "x4.xyz"]
+
+    hashed.clear()
+    base_dir.joinpath("etc/d4/x1").write_text("Däng-3")
+    sync_infos = activate_changes._get_config_sync_file_infos(
+        replication_paths, base_dir, file_hashes
+    )
+    assert hashed == ["x1"]
+    assert sync_infos == {
+        **expected,
+        "etc/d4/x1": ConfigSyncFileInfo(
+            st_mode=expected["etc/d4/x1"].st_mode,
+            st_size=7,
+            link_target=None,
+            file_hash=activate_changes._create_config_sync_file_hash(base_dir / "etc/d4/x1"),
+        ),
+    }
+
+
 def _create_get_config_sync_file_infos_test_config(base_dir):
     base_dir.joinpath("etc/d1").mkdir(parents=True, exist_ok=True)
 
@@ -544,9 +587,10 @@ def _get_test_file_infos():
     return remote, central
 
 
-def test_get_sync_archive(tmp_path):
-    sync_archive = _get_test_sync_archive(tmp_path)
-    with tarfile.TarFile(mode="r", fileobj=io.BytesIO(sync_archive)) as f:
+@pytest.mark.parametrize("compress", [False, True])
+def test_get_sync_archive(tmp_path, compress):
+    sync_archive = _get_test_sync_archive(tmp_path, compress)
+    with tarfile.open(sync_archive, mode="r") as f:
         assert sorted(f.getnames()) == sorted(
             [
                 "etc/abc",
@@ -559,7 +603,42 @@ def test_get_sync_archive(tmp_path):
         )
 
 
-def _get_test_sync_archive(tmp_path):
+def test_get_sync_archive_shared(tmp_path):
+    for site_id in ["site1", "site2"]:
+        site_config_dir = tmp_path / site_id
+        site_config_dir.joinpath("etc").mkdir(parents=True)
+        site_config_dir.joinpath("etc/abc").write_text("gä")
+        site_config_dir.joinpath("etc/site").write_text(site_id)
+    file_infos = {
+        site_id: activate_changes._get_config_sync_file_infos(
+            [ReplicationPath("dir", "etc", "etc", [])], tmp_path / site_id
+        )
+        for site_id in ["site1", "site2"]
+    }
+
+    def get_sync_archive(site_id, to_sync):
+        return activate_changes._get_sync_archive(
+            to_sync, tmp_path / site_id, file_infos[site_id], tmp_path / "archives", True
+        )
+
+    # The archive is created once for all sites needing the same files
+    archive = get_sync_archive("site1", ["etc/abc"])
+    assert get_sync_archive("site2", ["etc/abc"]) == archive
+    assert get_sync_archive("site1", ["etc/abc", "etc/site"]) != archive
+    assert get_sync_archive("site2", ["etc/abc", "etc/site"]) != get_sync_archive(
+        "site1", ["etc/abc", "etc/site"]
+    )
+    assert sorted(p.name for p in tmp_path.joinpath("archives").glob("*.tar.gz")) == sorted(
+        p.name
+        for p in [
+            archive,
+            get_sync_archive("site1", ["etc/abc", "etc/site"]),
+            get_sync_archive("site2", ["etc/abc", "etc/site"]),
+        ]
+    )
+
+
+def _get_test_sync_archive(tmp_path: Path, compress: bool = False) -> Path:
     tmp_path.joinpath("etc").mkdir(parents=True, exist_ok=True)
     with tmp_path.joinpath("etc/abc").open("w", encoding="utf-8") as f:
         f.write("gä")
@@ -577,24 +656,32 @@ def _get_test_sync_archive(tmp_path):
     tmp_path.joinpath("broken-symlink").symlink_to("eeg")
     tmp_path.joinpath("working-symlink").symlink_to("ding")
 
+    to_sync = [
+        "etc/abc",
+        "file-to-dir/aaa",
+        "ding",
+        "dir-to-file",
+        "broken-symlink",
+        "working-symlink",
+    ]
     return activate_changes._get_sync_archive(
-        [
-            "etc/abc",
-            "file-to-dir/aaa",
-            "ding",
-            "dir-to-file",
-            "broken-symlink",
-            "working-symlink",
-        ],
+        to_sync,
         tmp_path,
+        activate_changes._get_config_sync_file_infos(
+            [ReplicationPath("dir", "all", "", [])], tmp_path
+        ),
+        tmp_path / ".sync_archives",
+        compress,
     )
 
 
 class TestAutomationReceiveConfigSync:
+    @pytest.mark.parametrize("compressed", [False, True])
     def test_automation_receive_config_sync(
         self,
         monkeypatch: pytest.MonkeyPatch,
         tmp_path: Path,
+        compressed: bool,
     ) -> None:
         remote_path = tmp_path / "remote"
         monkeypatch.setattr(cmk.utils.paths, "omd_root", remote_path)
@@ -631,18 +718,20 @@ class TestAutomationReceiveConfigSync:
         assert not remote_path.joinpath("ding").exists()
 
         automation = activate_changes.AutomationReceiveConfigSync()
-        automation.execute(
-            activate_changes.ReceiveConfigSyncRequest(
-                site_id=SiteId("remote"),
-                sync_archive=_get_test_sync_archive(tmp_path.joinpath("central")),
-                to_delete=[
-                    "to_delete",
-                    "working-symlink/file",
-                    "file-to-dir",
-                ],
-                config_generation=0,
+        with _get_test_sync_archive(tmp_path.joinpath("central"), compressed).open("rb") as f:
+            automation.execute(
+                activate_changes.ReceiveConfigSyncRequest(
+                    site_id=SiteId("remote"),
+                    sync_archive=f,
+                    to_delete=[
+                        "to_delete",
+                        "working-symlink/file",
+                        "file-to-dir",
+                    ],
+                    config_generation=0,
+                    compressed=compressed,
+                )
             )
-        )
 
         assert not to_delete_path.exists()
         assert remote_path.joinpath("etc/abc").exists()
@@ -665,6 +754,7 @@ class TestAutomationReceiveConfigSync:
         request.set_var("site_id", "NO_SITE")
         request.set_var("to_delete", "['x/y/z.txt', 'abc.ending', '/ä/☃/☕']")
         request.set_var("config_generation", "123")
+        request.set_var("compressed", "1")
         request.files = werkzeug_datastructures.ImmutableMultiDict(
             {
                 "sync_archive": werkzeug_datastructures.FileStorage(
@@ -679,15 +769,16 @@ class TestAutomationReceiveConfigSync:
             "_request",
             request,
         )
-        assert (
-            activate_changes.AutomationReceiveConfigSync().get_request()
-            == activate_changes.ReceiveConfigSyncRequest(
-                site_id=SiteId("NO_SITE"),
-                sync_archive=b"some data",
-                to_delete=["x/y/z.txt", "abc.ending", "/ä/☃/☕"],
-                config_generation=123,
-            )
+        api_request = activate_changes.AutomationReceiveConfigSync().get_request()
+        assert api_request._replace(sync_archive=None) == activate_changes.ReceiveConfigSyncRequest(
+            site_id=SiteId("NO_SITE"),
+            sync_archive=None,  # type: ignore[arg-type]
+            to_delete=["x/y/z.txt", "abc.ending", "/ä/☃/☕"],
+            config_generation=123,
+            compressed=True,
+            block_deltas=None,
         )
+        assert api_request.sync_archive.read() == b"some data"
 
 
 def test_get_current_config_generation():
@@ -4,7 +4,10 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import hashlib
+import io
 import shutil
+import stat
 import tarfile
 import time
 from pathlib import Path
@@ -28,6 +31,7 @@ import cmk.gui.watolib.activate_changes as activate_changes
 import cmk.gui.watolib.config_sync as config_sync
 import cmk.gui.watolib.utils as utils
 from cmk.gui.config import active_config
+from cmk.gui.exceptions import MKGeneralException
 
 
 @pytest.fixture(name="mocked_responses")
@@ -709,3 +713,91 @@ def test_synchronize_site(
 
     site_activation._time_started = time.time()
     site_activation._synchronize_site()
+
+
+def _block_delta_test_files(tmp_path: Path, changed_blocks: int) -> bytes:
+    block_size = config_sync._BLOCK_SIZE
+    blocks = [bytes([nr]) * block_size for nr in range(20)]
+    tmp_path.joinpath("remote/etc").mkdir(parents=True)
+    tmp_path.joinpath("remote/etc/file").write_bytes(b"".join(blocks))
+
+    # Changed in place and appended
+    new = b"".join([b"x" * block_size] * changed_blocks + blocks[changed_blocks:] + [b"appended"])
+    tmp_path.joinpath("central/etc").mkdir(parents=True)
+    tmp_path.joinpath("central/etc/file").write_bytes(new)
+    return new
+
+
+def _write_block_delta(tmp_path: Path, delta_file: io.BytesIO, new: bytes) -> bool:
+    return config_sync.write_block_delta(
+        delta_file,
+        "etc/file",
+        tmp_path / "central/etc/file",
+        config_sync.get_block_signatures(tmp_path / "remote/etc/file"),
+        0o100640,
+        hashlib.sha256(new).hexdigest(),
+    )
+
+
+def test_block_deltas(tmp_path: Path) -> None:
+    new = _block_delta_test_files(tmp_path, changed_blocks=2)
+
+    delta_file = io.BytesIO()
+    assert _write_block_delta(tmp_path, delta_file, new)
+    assert len(delta_file.getvalue()) < 3 * config_sync._BLOCK_SIZE
+
+    delta_file.seek(0)
+    config_sync.apply_block_deltas(delta_file, tmp_path / "remote")
+    assert tmp_path.joinpath("remote/etc/file").read_bytes() == new
+    assert stat.S_IMODE(tmp_path.joinpath("remote/etc/file").stat().st_mode) == 0o640
+    assert [p.name for p in tmp_path.joinpath("remote/etc").iterdir()] == ["file"]
+
+
+def test_block_deltas_most_blocks_changed(tmp_path: Path) -> None:
+    new = _block_delta_test_files(tmp_path, changed_blocks=11)
+
+    delta_file = io.BytesIO()
+    assert not _write_block_delta(tmp_path, delta_file, new)
+    assert delta_file.getvalue() == b""
+
+
+def test_apply_block_deltas_to_changed_file(tmp_path: Path) -> None:
+    new = _block_delta_test_files(tmp_path, changed_blocks=2)
+    delta_file = io.BytesIO()
+    assert _write_block_delta(tmp_path, delta_file, new)
+
+    tmp_path.joinpath("remote/etc/file").write_bytes(b"changed" * config_sync._BLOCK_SIZE)
+    delta_file.seek(0)
+    with pytest.raises(MKGeneralException, match="The file has changed"):
+        config_sync.apply_block_deltas(delta_file, tmp_path / "remote")
+    assert [p.name for p in tmp_path.joinpath("remote/etc").iterdir()] == ["file"]
+    assert tmp_path.joinpath("remote/etc/file").read_bytes() == b"changed" * config_sync._BLOCK_SIZE
+
+
+def test_apply_block_deltas_truncated(tmp_path: Path) -> None:
+    new = _block_delta_test_files(tmp_path, changed_blocks=2)
+    delta_file = io.BytesIO()
+    assert _write_block_delta(tmp_path, delta_file, new)
+
+    with pytest.raises(MKGeneralException, match="Truncated record"):
+        config_sync.apply_block_deltas(io.BytesIO(delta_file.getvalue()[:-10]), tmp_path / "remote")
+    assert [p.name for p in tmp_path.joinpath("remote/etc").iterdir()] == ["file"]
+
+
+@pytest.mark.parametrize("site_path", ["/etc/file", "../central/etc/file", "etc/../../central/etc/file"])
+def test_apply_block_deltas_outside_of_site(tmp_path: Path, site_path: str) -> None:
+    new = _block_delta_test_files(tmp_path, changed_blocks=2)
+    delta_file = io.BytesIO()
+    assert config_sync.write_block_delta(
+        delta_file,
+        site_path,
+        tmp_path / "central/etc/file",
+        config_sync.get_block_signatures(tmp_path / "remote/etc/file"),
+        0o100640,
+        hashlib.sha256(new).hexdigest(),
+    )
+
+    delta_file.seek(0)
+    with pytest.raises(MKGeneralException, match="Invalid site path"):
+        config_sync.apply_block_deltas(delta_file, tmp_path / "remote")
+    assert [p.name for p in tmp_path.joinpath("central/etc").iterdir()] == ["file"]
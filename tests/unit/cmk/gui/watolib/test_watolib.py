@@ -56,6 +56,7 @@ def test_registered_automation_commands():
         "network-scan",
         "ping",
         "get-config-sync-state",
+        "get-config-sync-signatures",
         "receive-config-sync",
         "service-discovery-job",
         "checkmk-remote-automation-start",
@@ -87,6 +88,7 @@ def test_registered_configvars():
         "bulk_discovery_default_settings",
         "check_mk_perfdata_with_times",
         "cluster_max_cachefile_age",
+        "concurrent_fetchers",
         "crash_report_target",
         "crash_report_url",
         "custom_service_attributes",
@@ -103,6 +105,7 @@ def test_registered_configvars():
         "event_limit",
         "eventsocket_queue_len",
         "failed_notification_horizon",
+        "fetcher_timeouts",
         "hard_query_limit",
         "history_lifetime",
         "history_rotation",
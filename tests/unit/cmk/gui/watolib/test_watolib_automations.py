@@ -4,11 +4,13 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import io
 from dataclasses import dataclass
 from typing import Any, Optional, Sequence, Tuple
 from unittest.mock import MagicMock
 
 import pytest
+from werkzeug.formparser import parse_form_data
 
 from cmk.automations.results import ABCAutomationResult, ResultTypeRegistry
 
@@ -136,3 +138,24 @@ class TestCheckmkAutomationBackgroundJob:
             api_request,
         )
         assert RESULT == (2, None)
+
+
+def test_multipart_form_data() -> None:
+    sync_archive = io.BytesIO(b"\x00archive\r\n--data" * 10000)
+    sync_archive.seek(7)
+    body = automations._MultipartFormData(
+        {"site_id": "remote", "to_delete": "['ä']"}, {"sync_archive": sync_archive}
+    )
+    data = b"".join(body)
+    assert len(data) == len(body)
+
+    _stream, form, files = parse_form_data(
+        {
+            "REQUEST_METHOD": "POST",
+            "CONTENT_TYPE": body.content_type,
+            "CONTENT_LENGTH": str(len(data)),
+            "wsgi.input": io.BytesIO(data),
+        }
+    )
+    assert form.to_dict() == {"site_id": "remote", "to_delete": "['ä']"}
+    assert files["sync_archive"].read() == (b"\x00archive\r\n--data" * 10000)[7:]
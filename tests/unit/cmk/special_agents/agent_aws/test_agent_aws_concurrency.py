@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pytest
+
+from cmk.special_agents.agent_aws import (
+    AWSSectionResult,
+    AWSSectionResults,
+    AWSSectionsGeneric,
+    CloudwatchMetricDataBatcher,
+    ResultDistributor,
+    run_aws_sections,
+)
+
+
+class FakeMetricDataClient:
+    def __init__(self) -> None:
+        self.calls: List[Sequence[Dict[str, Any]]] = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime):
+        assert len(MetricDataQueries) <= 500
+        assert len({q["Id"] for q in MetricDataQueries}) == len(MetricDataQueries)
+        self.calls.append(MetricDataQueries)
+        return {
+            "MetricDataResults": [
+                {"Id": q["Id"], "Label": q["Label"], "Values": [float(q["Label"])]}
+                # The results are not in the order of the queries
+                for q in reversed(MetricDataQueries)
+            ]
+        }
+
+
+def _queries(offset: int, amount: int) -> List[Dict[str, Any]]:
+    # The IDs are only unique within a section
+    return [{"Id": "id_%d" % nr, "Label": str(offset + nr)} for nr in range(amount)]
+
+
+def _values(response: Dict[str, Any]) -> List[Tuple[str, float]]:
+    return [(r["Id"], r["Values"][0]) for r in response["MetricDataResults"]]
+
+
+def test_metric_data_batcher_splits_queries() -> None:
+    client = FakeMetricDataClient()
+    batcher = CloudwatchMetricDataBatcher(client)
+
+    response = batcher.get_metric_data(_queries(0, 1200), StartTime=1.0, EndTime=2.0)
+
+    assert [len(queries) for queries in client.calls] == [500, 500, 200]
+    assert _values(response) == [("id_%d" % nr, float(nr)) for nr in range(1200)]
+
+
+def test_metric_data_batcher_packs_queries_of_concurrent_sections() -> None:
+    client = FakeMetricDataClient()
+    batcher = CloudwatchMetricDataBatcher(client, linger=1.0)
+    responses: Dict[int, Dict[str, Any]] = {}
+
+    def query(offset: int) -> None:
+        responses[offset] = batcher.get_metric_data(
+            _queries(offset, 200), StartTime=1.0, EndTime=2.0
+        )
+
+    threads = [threading.Thread(target=query, args=(offset,)) for offset in (0, 1000, 2000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The third section does not fit into the first call anymore
+    assert sorted(len(queries) for queries in client.calls) == [200, 400]
+    assert batcher.calls == 2
+    for offset, response in responses.items():
+        assert _values(response) == [("id_%d" % nr, float(offset + nr)) for nr in range(200)]
+
+
+def test_metric_data_batcher_does_not_pack_different_time_ranges() -> None:
+    client = FakeMetricDataClient()
+    batcher = CloudwatchMetricDataBatcher(client)
+
+    batcher.get_metric_data(_queries(0, 10), StartTime=1.0, EndTime=2.0)
+    batcher.get_metric_data(_queries(0, 10), StartTime=0.0, EndTime=2.0)
+
+    assert [len(queries) for queries in client.calls] == [10, 10]
+
+
+def test_metric_data_batcher_error() -> None:
+    class FailingClient:
+        def get_metric_data(self, MetricDataQueries, StartTime, EndTime):
+            raise ValueError("throttled")
+
+    with pytest.raises(ValueError, match="throttled"):
+        CloudwatchMetricDataBatcher(FailingClient()).get_metric_data(
+            _queries(0, 10), StartTime=1.0, EndTime=2.0
+        )
+
+
+def test_metric_data_batcher_error_of_other_section() -> None:
+    class RejectingClient(FakeMetricDataClient):
+        def get_metric_data(self, MetricDataQueries, StartTime, EndTime):
+            if any(q["Label"] == "invalid" for q in MetricDataQueries):
+                self.calls.append(MetricDataQueries)
+                raise ValueError("invalid query")
+            return super().get_metric_data(MetricDataQueries, StartTime, EndTime)
+
+    client = RejectingClient()
+    batcher = CloudwatchMetricDataBatcher(client, linger=1.0)
+    responses: Dict[str, Any] = {}
+
+    def query(name: str, queries: List[Dict[str, Any]]) -> None:
+        try:
+            responses[name] = batcher.get_metric_data(queries, StartTime=1.0, EndTime=2.0)
+        except ValueError as e:
+            responses[name] = e
+
+    threads = [
+        threading.Thread(target=query, args=("valid", _queries(0, 10))),
+        threading.Thread(target=query, args=("invalid", [{"Id": "id_0", "Label": "invalid"}])),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The batch and then the queries of each section on their own
+    assert sorted(len(queries) for queries in client.calls) == [1, 10, 11]
+    # Like the results of the client, which are not in the order of the queries
+    assert sorted(_values(responses["valid"])) == sorted(
+        ("id_%d" % nr, float(nr)) for nr in range(10)
+    )
+    assert isinstance(responses["invalid"], ValueError)
+
+
+class FakeSectionError(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+class FakeSection:
+    cache_interval = 300
+
+    def __init__(self, name: str, events: List[Tuple[str, str]], fail: bool = False) -> None:
+        self.name = name
+        self.distributor = ResultDistributor()
+        self._events = events
+        self._fail = fail
+
+    def run(self, use_cache: bool) -> AWSSectionResults:
+        self._events.append(("start", self.name))
+        self._events.append(("end", self.name))
+        if self._fail:
+            raise FakeSectionError("%s failed" % self.name)
+        return AWSSectionResults([AWSSectionResult("", [{"name": self.name}])], 0.0)
+
+
+def test_run_aws_sections_in_dependency_order(capsys) -> None:
+    events: List[Tuple[str, str]] = []
+    limits = FakeSection("limits", events)
+    summary = FakeSection("summary", events, fail=True)
+    metrics = FakeSection("metrics", events)
+    health = FakeSection("health", events)
+    other_region_summary = FakeSection("other_summary", events)
+    limits.distributor.add(summary)
+    # Like the S3 limits, which are only queried for the first region
+    limits.distributor.add(other_region_summary)
+    summary.distributor.add(metrics)
+    summary.distributor.add(health)
+
+    region = AWSSectionsGeneric("hostname", None, max_workers=4)
+    region._sections = [limits, summary, metrics, health]
+    other_region = AWSSectionsGeneric("hostname", None, max_workers=4)
+    other_region._sections = [other_region_summary]
+
+    run_aws_sections([region, other_region], use_cache=False, max_workers=4)
+
+    for sender, receiver in [
+        ("limits", "summary"),
+        ("limits", "other_summary"),
+        ("summary", "metrics"),
+        ("summary", "health"),
+    ]:
+        assert events.index(("end", sender)) < events.index(("start", receiver))
+    assert sorted(events) == sorted(
+        (event, section.name)
+        for event in ("start", "end")
+        for section in (limits, summary, metrics, health, other_region_summary)
+    )
+
+    # The results are written region by region, in the order of the sections
+    assert capsys.readouterr().out.split("\n") == [
+        "<<<aws_exceptions>>>",
+        "AWSSectionsGeneric: summary failed",
+        "<<<aws_limits:cached(0,360)>>>",
+        '[{"name": "limits"}]',
+        "<<<aws_metrics:cached(0,360)>>>",
+        '[{"name": "metrics"}]',
+        "<<<aws_health:cached(0,360)>>>",
+        '[{"name": "health"}]',
+        "<<<aws_exceptions>>>",
+        "AWSSectionsGeneric: No exceptions",
+        "<<<aws_other_summary:cached(0,360)>>>",
+        '[{"name": "other_summary"}]',
+        "",
+    ]
@@ -264,3 +264,24 @@ def _pod_with_scopes_factory(
             active_deadline_seconds=1 if terminating else None,
         ),
     )
+
+
+def test_resource_quotas_by_namespace():
+    namespace_name = api.NamespaceName("namespace")
+    resource_quotas = [
+        APIResourceQuotaFactory.build(metadata=MetaDataFactory.build(namespace=namespace_name)),
+        APIResourceQuotaFactory.build(
+            metadata=MetaDataFactory.build(namespace=api.NamespaceName("other-namespace"))
+        ),
+        APIResourceQuotaFactory.build(metadata=MetaDataFactory.build(namespace=namespace_name)),
+    ]
+
+    resource_quotas_by_namespace = agent.resource_quotas_by_namespace(resource_quotas)
+
+    assert resource_quotas_by_namespace == {
+        namespace_name: resource_quotas[0],
+        api.NamespaceName("other-namespace"): resource_quotas[1],
+    }
+    assert resource_quotas_by_namespace[
+        namespace_name
+    ] == agent.filter_matching_namespace_resource_quota(namespace_name, resource_quotas)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import functools
+import os
+
+import pytest
+
+from cmk.special_agents import agent_kube as agent
+
+
+def _write_object(nr: int) -> None:
+    print("<<<<object_%d>>>>" % nr)
+    print("<<<section>>>")
+    print('{"pid": %d}' % os.getpid())
+    print("<<<<>>>>")
+
+
+def _objects(output: str) -> list:
+    return [line for line in output.split("\n") if line.startswith("<<<<object")]
+
+
+@pytest.mark.parametrize("processes", [1, 4])
+def test_write_object_sections_in_order(capsys, monkeypatch, processes) -> None:
+    monkeypatch.setattr(agent, "MIN_OBJECTS_PER_PROCESS", 10)
+
+    agent.write_object_sections(
+        [functools.partial(_write_object, nr) for nr in range(100)], processes
+    )
+
+    output = capsys.readouterr().out
+    assert _objects(output) == ["<<<<object_%d>>>>" % nr for nr in range(100)]
+    pids = {line for line in output.split("\n") if line.startswith('{"pid"')}
+    assert (pids == {'{"pid": %d}' % os.getpid()}) is (processes == 1)
+
+
+def test_write_object_sections_few_objects_in_process(capsys) -> None:
+    agent.write_object_sections([functools.partial(_write_object, nr) for nr in range(3)], 4)
+
+    output = capsys.readouterr().out
+    assert _objects(output) == ["<<<<object_%d>>>>" % nr for nr in range(3)]
+    assert '{"pid": %d}' % os.getpid() in output
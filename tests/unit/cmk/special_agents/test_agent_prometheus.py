@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import json
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Mapping, Sequence
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from cmk.special_agents.agent_prometheus import BATCH_LABEL, parse_promql_result, PrometheusAPI
+
+_VECTOR = {
+    "status": "success",
+    "data": {
+        "resultType": "vector",
+        "result": [
+            {"metric": {"instance": "node-1"}, "value": [1600000000.0, "1"]},
+            {"metric": {"instance": "node-2"}, "value": [1600000000.0, "2"]},
+        ],
+    },
+}
+
+
+def _chunks(raw: bytes, size: int) -> Iterator[bytes]:
+    for start in range(0, len(raw), size):
+        yield raw[start : start + size]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_parse_promql_result_chunked(chunk_size: int) -> None:
+    raw = json.dumps(_VECTOR, indent=1).encode("utf-8")
+    assert list(parse_promql_result(_chunks(raw, chunk_size))) == _VECTOR["data"]["result"]
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ({"status": "success", "data": {"resultType": "scalar", "result": [1, "2"]}}, [1, "2"]),
+        ({"status": "success", "data": {"result": [], "resultType": "vector"}}, []),
+    ],
+)
+def test_parse_promql_result_not_streamed(
+    response: Mapping[str, Any], expected: Sequence[Any]
+) -> None:
+    raw = json.dumps(response).encode("utf-8")
+    assert list(parse_promql_result(_chunks(raw, 5))) == expected
+
+
+def test_parse_promql_result_error() -> None:
+    raw = json.dumps({"status": "error", "errorType": "bad_data", "error": "parse error"})
+    with pytest.raises(KeyError):
+        list(parse_promql_result([raw.encode("utf-8")]))
+
+
+def test_parse_promql_result_truncated() -> None:
+    raw = json.dumps(_VECTOR).encode("utf-8")
+    with pytest.raises(ValueError):
+        list(parse_promql_result(_chunks(raw[:-30], 10)))
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: Mapping[str, Any]) -> None:
+        self.status_code = status_code
+        self._raw = json.dumps(content).encode("utf-8")
+
+    def raise_for_status(self) -> None:
+        if self.status_code != 200:
+            raise requests.exceptions.HTTPError("%d Error" % self.status_code)
+
+    def json(self) -> Any:
+        return json.loads(self._raw)
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        return _chunks(self._raw, chunk_size)
+
+    def close(self) -> None:
+        pass
+
+
+class FakePrometheus:
+    """Answers instant queries of metric names with one sample per node, like a Prometheus
+    server with a metric of the same name. Combined queries are answered like Prometheus
+    answers them, unless they are not supported."""
+
+    def __init__(self, metrics: Mapping[str, int], supports_batches: bool = True) -> None:
+        self._metrics = metrics
+        self._supports_batches = supports_batches
+        self._lock = threading.Lock()
+        self.queries: List[str] = []
+
+    def get(self, url: str, **kwargs: Any) -> FakeResponse:
+        if url == "targets":
+            return FakeResponse(200, {"status": "success", "data": {"activeTargets": []}})
+        promql = parse_qs(urlparse(url).query)["query"][0]
+        with self._lock:
+            self.queries.append(promql)
+        if " or " not in promql:
+            return self._answer([(promql, None)])
+        if not self._supports_batches:
+            return FakeResponse(400, {"status": "error", "error": "parse error"})
+        return self._answer(re.findall(r'label_replace\(\((.*?)\), "[^"]*", "(\d+)"', promql))
+
+    def _answer(self, queries: Sequence[Any]) -> FakeResponse:
+        result: List[Dict[str, Any]] = []
+        for metric, batch_nr in queries:
+            if metric not in self._metrics:
+                return FakeResponse(400, {"status": "error", "error": "unknown %s" % metric})
+            for node in range(self._metrics[metric]):
+                labels = {"__name__": metric, "instance": "node-%d" % node}
+                if batch_nr is not None:
+                    labels[BATCH_LABEL] = batch_nr
+                result.append({"metric": labels, "value": [1600000000.0, str(node)]})
+        return FakeResponse(
+            200, {"status": "success", "data": {"resultType": "vector", "result": result}}
+        )
+
+
+def _expected(metric: str, nodes: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "metric": {"__name__": metric, "instance": "node-%d" % node},
+            "value": [1600000000.0, str(node)],
+        }
+        for node in range(nodes)
+    ]
+
+
+def test_prefetched_promql_batches() -> None:
+    metrics = {"metric_%d" % nr: nr % 3 for nr in range(10)}
+    prometheus = FakePrometheus(metrics)
+    api = PrometheusAPI(prometheus, max_connections=2)
+
+    with api.prefetched_promql(list(metrics) + ["metric_0"]):
+        assert len(prometheus.queries) == 2
+        for metric, nodes in metrics.items():
+            # pylint: disable=protected-access
+            assert api._perform_promql_query(metric) == _expected(metric, nodes)
+    assert len(prometheus.queries) == 2
+
+    api._perform_promql_query("metric_1")  # pylint: disable=protected-access
+    assert len(prometheus.queries) == 3
+
+
+@pytest.mark.parametrize("supports_batches", [True, False])
+def test_prefetched_promql_failed_query(supports_batches: bool) -> None:
+    prometheus = FakePrometheus({"a": 1, "b": 2}, supports_batches=supports_batches)
+    api = PrometheusAPI(prometheus, max_connections=1)
+
+    with api.prefetched_promql(["a", "unknown", "b"]):
+        # pylint: disable=protected-access
+        assert api._perform_promql_query("a") == _expected("a", 1)
+        assert api._perform_promql_query("b") == _expected("b", 2)
+        with pytest.raises(requests.exceptions.HTTPError):
+            api._perform_promql_query("unknown")
+        # The batch and then each query on its own
+        assert len(prometheus.queries) == 4
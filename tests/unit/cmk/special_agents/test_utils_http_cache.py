@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import pytest
+import requests
+
+import cmk.utils.store as store
+
+from cmk.special_agents.utils.http_cache import HTTPCache
+from cmk.special_agents.utils.request_helper import ApiSession
+
+
+class FakeServer:
+    def __init__(self, headers: Optional[Mapping[str, str]] = None, latency: float = 0.0) -> None:
+        self.content = b'{"version": 1}'
+        self.headers = dict(headers or {})
+        self.latency = latency
+        self.requests: List[Dict[str, Any]] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        self.requests.append(dict(request.headers))
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.url = request.url
+        response.headers.update(self.headers)
+        if (
+            self.headers.get("ETag")
+            and request.headers.get("If-None-Match") == self.headers["ETag"]
+        ):
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = self.content
+        return response
+
+
+def _get(
+    cache: HTTPCache, server: FakeServer, url: str = "http://server/api", auth: str = "secret"
+) -> requests.Response:
+    request = requests.Request("GET", url, headers={"Authorization": auth}).prepare()
+    return cache.send(server.send, request, timeout=10)
+
+
+def test_http_cache_ttl(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = HTTPCache(tmp_path, ttl=60, url_ttls=[("/status$", 0)])
+    server = FakeServer()
+
+    assert _get(cache, server).json() == {"version": 1}
+    server.content = b'{"version": 2}'
+    assert _get(cache, server).json() == {"version": 1}
+    assert _get(cache, server, url="http://server/status").json() == {"version": 2}
+    assert _get(cache, server, url="http://server/status").json() == {"version": 2}
+
+    monkeypatch.setattr(time, "time", lambda: 1e11)
+    assert _get(cache, server).json() == {"version": 2}
+
+    assert len(server.requests) == 4
+    assert cache.stats == {"hits": 1, "revalidated": 0, "coalesced": 0, "misses": 4}
+
+
+def test_http_cache_revalidates(tmp_path: Path) -> None:
+    cache = HTTPCache(tmp_path)
+    server = FakeServer(headers={"ETag": '"v1"', "Last-Modified": "Mon, 10 Oct 2022 10:00:00 GMT"})
+
+    first = _get(cache, server)
+    second = _get(cache, server)
+
+    assert second.status_code == 200
+    assert second.json() == first.json() == {"version": 1}
+    assert second.headers["etag"] == '"v1"'
+    assert "If-None-Match" not in server.requests[0]
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert server.requests[1]["If-Modified-Since"] == "Mon, 10 Oct 2022 10:00:00 GMT"
+    # The conditional headers are not left behind in the request
+    assert "If-None-Match" not in second.request.headers
+
+    server.headers["ETag"] = '"v2"'
+    server.content = b'{"version": 2}'
+    assert _get(cache, server).json() == {"version": 2}
+    assert cache.stats == {"hits": 0, "revalidated": 1, "coalesced": 0, "misses": 2}
+
+
+def test_http_cache_separates_credentials(tmp_path: Path) -> None:
+    cache = HTTPCache(tmp_path, ttl=60)
+    server = FakeServer()
+
+    _get(cache, server, auth="secret")
+    server.content = b"{}"
+    assert _get(cache, server, auth="other").json() == {}
+    assert _get(cache, server, auth="secret").json() == {"version": 1}
+
+
+@pytest.mark.parametrize(
+    "status_code, headers",
+    [(500, {}), (200, {"Cache-Control": "no-store"})],
+)
+def test_http_cache_does_not_store(
+    tmp_path: Path, status_code: int, headers: Mapping[str, str]
+) -> None:
+    cache = HTTPCache(tmp_path, ttl=60)
+    server = FakeServer(headers=headers)
+    send = server.send
+
+    def send_status(request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        response = send(request, **kwargs)
+        response.status_code = status_code
+        return response
+
+    server.send = send_status  # type: ignore[assignment]
+    _get(cache, server)
+    _get(cache, server)
+
+    assert len(server.requests) == 2
+
+
+def test_http_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = HTTPCache(tmp_path, ttl=60, max_size=2500)
+    server = FakeServer()
+    server.content = b"x" * 1000
+
+    for url in ["http://server/a", "http://server/b"]:
+        _get(cache, server, url=url)
+        # The modification times of the entries have to differ
+        time.sleep(0.01)
+    _get(cache, server, url="http://server/a")
+    time.sleep(0.01)
+    _get(cache, server, url="http://server/c")
+
+    server.requests.clear()
+    _get(cache, server, url="http://server/a")
+    _get(cache, server, url="http://server/c")
+    assert not server.requests
+    _get(cache, server, url="http://server/b")
+    assert len(server.requests) == 1
+
+
+def test_http_cache_does_not_evict_locked_responses(tmp_path: Path) -> None:
+    cache = HTTPCache(tmp_path, ttl=60, max_size=2500)
+    server = FakeServer()
+    server.content = b"x" * 1000
+
+    _get(cache, server, url="http://server/a")
+    (key,) = [path.name for path in tmp_path.iterdir() if path.suffix != ".lock"]
+    time.sleep(0.01)
+    _get(cache, server, url="http://server/b")
+    time.sleep(0.01)
+
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock() -> None:
+        with store.locked(tmp_path / f"{key}.lock"):
+            locked.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    try:
+        locked.wait()
+        _get(cache, server, url="http://server/c")
+    finally:
+        release.set()
+        thread.join()
+
+    # The locked response and its lock file are kept, the next least recently used goes
+    assert (tmp_path / key).exists()
+    assert (tmp_path / f"{key}.lock").exists()
+    server.requests.clear()
+    _get(cache, server, url="http://server/a")
+    assert not server.requests
+    _get(cache, server, url="http://server/b")
+    assert len(server.requests) == 1
+
+
+def test_http_cache_tracks_size(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = HTTPCache(tmp_path, ttl=60, max_size=2500)
+    server = FakeServer()
+    server.content = b"x" * 1000
+    listed = []
+    entries = cache._entries  # pylint: disable=protected-access
+    monkeypatch.setattr(cache, "_entries", lambda: listed.append(1) or entries())
+
+    _get(cache, server, url="http://server/a")
+    _get(cache, server, url="http://server/b")
+    assert len(listed) == 1
+    _get(cache, server, url="http://server/c")
+    assert len(listed) == 2
+
+
+def test_http_cache_coalesces_concurrent_requests(tmp_path: Path) -> None:
+    cache = HTTPCache(tmp_path)
+    server = FakeServer(latency=0.2)
+    responses: List[requests.Response] = []
+
+    threads = [
+        threading.Thread(target=lambda: responses.append(_get(cache, server))) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(server.requests) == 1
+    assert [response.json() for response in responses] == [{"version": 1}] * 5
+    assert cache.stats == {"hits": 0, "revalidated": 0, "coalesced": 4, "misses": 1}
+
+
+def test_http_cache_section(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    cache = HTTPCache(tmp_path, ttl=60)
+    server = FakeServer()
+    _get(cache, server)
+    _get(cache, server)
+
+    cache.write_section()
+
+    assert capsys.readouterr().out == (
+        "<<<special_agent_http_cache:sep(0)>>>\n"
+        '{"coalesced": 0, "hits": 1, "misses": 1, "revalidated": 0}\n'
+    )
+
+
+def test_api_session_uses_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    server = FakeServer()
+    monkeypatch.setattr(
+        requests.Session, "send", lambda self, request, **kwargs: server.send(request)
+    )
+    session = ApiSession("http://server/", cache=HTTPCache(tmp_path, ttl=60))
+
+    assert session.get("api/v1").json() == {"version": 1}
+    assert session.get("api/v1").json() == {"version": 1}
+    session.post("api/v1")
+
+    assert len(server.requests) == 2
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+from kubernetes import client  # type: ignore[import]
+
+from cmk.special_agents.utils_kubernetes.api_server import CoreAPI
+from cmk.special_agents.utils_kubernetes.informer import (
+    Informer,
+    read_snapshot,
+    RESOURCES,
+    run_collector,
+    Snapshot,
+    write_snapshot,
+)
+
+PODS = "/api/v1/pods"
+
+
+def _pod(name: str, resource_version: str, phase: str = "Running") -> Dict[str, Any]:
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": "default",
+            "uid": "uid-%s" % name,
+            "resourceVersion": resource_version,
+        },
+        "status": {"phase": phase},
+    }
+
+
+def _list(items: Sequence[Mapping[str, Any]], resource_version: str, continue_token: str = ""):
+    metadata = {"resourceVersion": resource_version}
+    if continue_token:
+        metadata["continue"] = continue_token
+    return {"kind": "PodList", "apiVersion": "v1", "metadata": metadata, "items": items}
+
+
+def _event(event_type: str, raw_object: Mapping[str, Any]) -> Dict[str, Any]:
+    return {"type": event_type, "object": {"kind": "Pod", "apiVersion": "v1", **raw_object}}
+
+
+def _bookmark(resource_version: str) -> Dict[str, Any]:
+    return {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": resource_version}}}
+
+
+def _expired() -> Dict[str, Any]:
+    return {
+        "type": "ERROR",
+        "object": {
+            "kind": "Status",
+            "status": "Failure",
+            "message": "too old resource version: 10 (15)",
+            "reason": "Expired",
+            "code": 410,
+        },
+    }
+
+
+class FakeAPIServer:
+    """
+    Replays recorded responses of the API server: the list responses and the events of the
+    watch responses of a path are returned in the order they were recorded. Paths without
+    recorded responses have no objects.
+    """
+
+    def __init__(
+        self,
+        lists: Mapping[str, Sequence[Mapping[str, Any]]],
+        watches: Mapping[str, Sequence[Sequence[Mapping[str, Any]]]],
+    ) -> None:
+        self._lists = {path: list(responses) for path, responses in lists.items()}
+        self._watches = {path: list(responses) for path, responses in watches.items()}
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:%d" % self._server.server_address[1]
+
+    def __enter__(self) -> "FakeAPIServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> Callable[..., BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                url = urlparse(self.path)
+                query = dict(parse_qsl(url.query))
+                fake.requests.append((url.path, query))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                if query.get("watch", "").lower() == "true":
+                    self._watch(fake._watches.get(url.path, []))
+                else:
+                    self._list(fake._lists.get(url.path, []))
+
+            def _list(self, responses: List[Mapping[str, Any]]) -> None:
+                response = responses.pop(0) if len(responses) > 1 else None
+                if response is None:
+                    response = responses[0] if responses else _list([], "1")
+                self.wfile.write(json.dumps(response).encode("utf-8"))
+
+            def _watch(self, responses: List[Sequence[Mapping[str, Any]]]) -> None:
+                if not responses:
+                    # Nothing changed until the watch timed out
+                    time.sleep(0.05)
+                    return
+                for event in responses.pop(0):
+                    self.wfile.write(b"%s\n" % json.dumps(event).encode("utf-8"))
+                    self.wfile.flush()
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+def _api_client(fake_api_server: FakeAPIServer) -> client.ApiClient:
+    config = client.Configuration()
+    config.host = fake_api_server.url
+    return client.ApiClient(config)
+
+
+def _list_pods(fake_api_server: FakeAPIServer) -> Callable[..., Any]:
+    return client.CoreV1Api(_api_client(fake_api_server)).list_pod_for_all_namespaces
+
+
+def _names(objects: Sequence[Mapping[str, Any]]) -> Sequence[Tuple[str, str]]:
+    return [(o["metadata"]["name"], o["metadata"]["resourceVersion"]) for o in objects]
+
+
+def _wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.time() + 10
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_informer_list_and_watch() -> None:
+    with FakeAPIServer(
+        lists={
+            PODS: [
+                _list([_pod("a", "5")], "10", continue_token="page2"),
+                _list([_pod("b", "7")], "10"),
+            ]
+        },
+        watches={
+            PODS: [
+                [
+                    _event("ADDED", _pod("c", "11")),
+                    _event("MODIFIED", _pod("a", "12", phase="Succeeded")),
+                    _event("DELETED", _pod("b", "13")),
+                    _bookmark("14"),
+                ]
+            ]
+        },
+    ) as fake_api_server:
+        informer = Informer(_list_pods(fake_api_server), timeout=(10, 10), page_size=1)
+
+        informer.list()
+        assert informer.synced.is_set()
+        assert informer.resource_version == "10"
+        assert _names(informer.objects()) == [("a", "5"), ("b", "7")]
+
+        informer.watch(threading.Event())
+        assert informer.resource_version == "14"
+        assert _names(informer.objects()) == [("a", "12"), ("c", "11")]
+
+    assert [query for _path, query in fake_api_server.requests] == [
+        {"limit": "1"},
+        {"limit": "1", "continue": "page2"},
+        {
+            "allowWatchBookmarks": "True",
+            "resourceVersion": "10",
+            "timeoutSeconds": "300",
+            "watch": "True",
+        },
+    ]
+
+
+def test_informer_lists_again_if_resource_version_expired() -> None:
+    with FakeAPIServer(
+        lists={
+            PODS: [
+                _list([_pod("a", "5")], "10"),
+                _list([_pod("a", "5"), _pod("b", "16")], "20"),
+            ]
+        },
+        watches={PODS: [[_expired()], [_event("DELETED", _pod("a", "21"))]]},
+    ) as fake_api_server:
+        informer = Informer(_list_pods(fake_api_server), timeout=(10, 10))
+        stop = threading.Event()
+        thread = threading.Thread(target=informer.run, args=(stop,))
+        thread.start()
+        try:
+            _wait_for(lambda: informer.resource_version == "21")
+        finally:
+            stop.set()
+            thread.join()
+
+        assert _names(informer.objects()) == [("b", "16")]
+
+    assert [query.get("resourceVersion") for _path, query in fake_api_server.requests[:4]] == [
+        None,
+        "10",
+        None,
+        "20",
+    ]
+
+
+def test_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "snapshot"
+    snapshot = Snapshot(
+        timestamp=1.0,
+        resource_versions={resource: "1" for resource in RESOURCES},
+        objects={resource: [] for resource in RESOURCES} | {"pods": [_pod("a", "1")]},
+    )
+
+    write_snapshot(path, snapshot)
+    assert read_snapshot(path, max_age=60) == snapshot
+
+    core_api = CoreAPI(client.ApiClient(), timeout=(10, 10), snapshot=read_snapshot(path, 60))
+    assert [pod.metadata.name for pod in core_api.raw_pods] == ["a"]
+    assert core_api.raw_pods[0].status.phase == "Running"
+    assert core_api.raw_nodes == []
+
+    os.utime(path, (time.time() - 61, time.time() - 61))
+    assert read_snapshot(path, max_age=60) is None
+    assert read_snapshot(tmp_path / "missing", max_age=60) is None
+
+
+@pytest.mark.parametrize("raw_snapshot", ["{", json.dumps({"timestamp": 1.0})])
+def test_snapshot_invalid(tmp_path: Path, raw_snapshot: str) -> None:
+    path = tmp_path / "snapshot"
+    path.write_text(raw_snapshot)
+    assert read_snapshot(path, max_age=60) is None
+
+
+def test_run_collector(tmp_path: Path) -> None:
+    path = tmp_path / "snapshot"
+    with FakeAPIServer(
+        lists={PODS: [_list([_pod("a", "5")], "10")]},
+        watches={PODS: [[_event("ADDED", _pod("b", "11"))]]},
+    ) as fake_api_server:
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_collector,
+            args=(_api_client(fake_api_server), (10, 10), path, 0.01, stop),
+        )
+        thread.start()
+        try:
+            _wait_for(
+                lambda: (snapshot := read_snapshot(path, max_age=60)) is not None
+                and snapshot.resource_versions["pods"] == "11"
+            )
+        finally:
+            stop.set()
+            thread.join()
+
+    snapshot = read_snapshot(path, max_age=60)
+    assert snapshot is not None
+    assert _names(snapshot.objects["pods"]) == [("a", "5"), ("b", "11")]
+    assert snapshot.objects["nodes"] == []
+    # Each resource is listed once, then watched
+    list_requests = [path for path, query in fake_api_server.requests if "watch" not in query]
+    assert sorted(list_requests) == sorted(set(list_requests))
+    assert len(list_requests) == len(RESOURCES)
@@ -23,6 +23,7 @@ from tests.unit.cmk.gui.conftest import load_plugins  # noqa: F401 # pylint: dis
 import cmk.utils.log
 import cmk.utils.paths
 from cmk.utils import password_store, store, version
+from cmk.utils.structured_data import StructuredDataStore
 from cmk.utils.type_defs import ContactgroupName, RulesetName, RuleSpec, RuleValue
 from cmk.utils.type_defs.pluginname import CheckPluginName
 from cmk.utils.version import is_raw_edition
@@ -517,6 +518,32 @@ def test__migrate_pre_2_0_audit_log_not_migrate_already_migrated(
     assert old_audit_log.exists()
 
 
+def test__migrate_inventory_trees(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, uc: update_config.UpdateConfig
+) -> None:
+    monkeypatch.setattr(cmk.utils.paths, "inventory_output_dir", str(tmp_path / "inventory"))
+    monkeypatch.setattr(cmk.utils.paths, "inventory_archive_dir", str(tmp_path / "archive"))
+    raw_tree = {"Attributes": {"Pairs": {"foo": 1}}, "Table": {}, "Nodes": {}}
+    tree_path = tmp_path / "inventory" / "heute"
+    archive_path = tmp_path / "archive" / "heute" / "1650000000"
+    for path in [tree_path, archive_path, tree_path.with_suffix(".gz")]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(repr(raw_tree))
+        os.utime(path, (1650000000, 1650000000))
+
+    uc._migrate_inventory_trees()
+
+    # Livestatus provides the current tree
+    assert tree_path.read_text() == repr(raw_tree)
+    index_path = tree_path.with_name(".heute.index")
+    for path in [index_path, archive_path]:
+        assert StructuredDataStore.is_indexed_file(path)
+        assert StructuredDataStore.load_file(path).serialize() == raw_tree
+        assert path.stat().st_mtime == 1650000000
+    assert StructuredDataStore.load_file(tree_path).serialize() == raw_tree
+    assert tree_path.with_suffix(".gz").read_text() == repr(raw_tree)
+
+
 def test__rename_discovered_host_label_files_fix_wrong_name(
     monkeypatch: pytest.MonkeyPatch,
     uc: update_config.UpdateConfig,
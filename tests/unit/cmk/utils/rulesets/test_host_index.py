@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import itertools
+from typing import Dict, Set, Tuple
+
+import pytest
+
+from cmk.utils.rulesets.host_index import HostConditionIndex
+from cmk.utils.rulesets.ruleset_matcher import matches_labels, matches_tag_condition
+from cmk.utils.type_defs import HostName, Labels, TaggroupID, TagID
+
+_HOST_TAGS: Dict[HostName, Set[Tuple[TaggroupID, TagID]]] = {
+    HostName("host%d" % nr): {
+        ("agent", ("cmk-agent", "no-agent")[nr % 2]),
+        ("criticality", ("prod", "test", "offline")[nr % 3]),
+    }
+    for nr in range(12)
+}
+
+_HOST_PATHS = {
+    HostName("host0"): "/wato/",
+    HostName("host1"): "/wato/dc1/",
+    HostName("host2"): "/wato/dc1/rack1/",
+    HostName("host3"): "/wato/dc10/",
+    HostName("host4"): "/wato/dc2/",
+}
+
+_HOST_LABELS: Dict[HostName, Labels] = {
+    HostName("host%d" % nr): {"os": ("linux", "windows")[nr % 2], "nr": str(nr)}
+    for nr in range(0, 12, 2)
+}
+
+
+@pytest.fixture(name="index")
+def fixture_index() -> HostConditionIndex:
+    return HostConditionIndex(
+        _HOST_TAGS,
+        _HOST_PATHS,
+        lambda hostname: _HOST_LABELS.get(hostname, {}),
+    )
+
+
+def test_mask_conversion(index: HostConditionIndex) -> None:
+    hosts = {HostName("host1"), HostName("host7"), HostName("host11")}
+    assert index.hosts_of(index.mask_of(hosts)) == hosts
+    assert index.hosts_of(0) == set()
+
+
+def test_mask_of_unknown_host(index: HostConditionIndex) -> None:
+    mask = index.mask_of([HostName("unknown")])
+    assert index.hosts_of(mask) == {"unknown"}
+    assert index.tags_mask({"agent": "cmk-agent"}, mask) == 0
+
+
+@pytest.mark.parametrize(
+    "folder, expected",
+    [
+        ("/", set(_HOST_TAGS)),
+        ("/wato/dc1/", {"host1", "host2"}),
+        ("/wato/dc1", {"host1", "host2", "host3"}),
+        ("/wato/dc1/rack1/", {"host2"}),
+        ("/wato/dc3/", set()),
+    ],
+)
+def test_folder_mask(index: HostConditionIndex, folder: str, expected: Set[HostName]) -> None:
+    assert index.hosts_of(index.folder_mask(folder)) == expected
+
+
+_TAG_CONDITIONS = [
+    {"agent": "cmk-agent"},
+    {"agent": {"$ne": "cmk-agent"}},
+    {"criticality": {"$or": ["prod", "test"]}},
+    {"criticality": {"$nor": ["prod", "test"]}},
+    {"agent": "no-agent", "criticality": {"$ne": "offline"}},
+    {"agent": "unknown"},
+    {"unknown": {"$ne": "xyz"}},
+]
+
+
+@pytest.mark.parametrize("tag_conditions", _TAG_CONDITIONS)
+def test_tags_mask_equals_linear_matching(index: HostConditionIndex, tag_conditions) -> None:
+    all_hosts = index.mask_of(_HOST_TAGS)
+    assert index.hosts_of(index.tags_mask(tag_conditions, all_hosts)) == {
+        hostname
+        for hostname, tags in _HOST_TAGS.items()
+        if all(
+            matches_tag_condition(taggroup_id, tag_condition, tags)
+            for taggroup_id, tag_condition in tag_conditions.items()
+        )
+    }
+
+
+@pytest.mark.parametrize(
+    "label_conditions",
+    [
+        {"os": "linux"},
+        {"os": {"$ne": "linux"}},
+        {"os": "windows", "nr": "3"},
+        {"os": "windows", "nr": {"$ne": "3"}},
+        {"missing": {"$ne": "x"}},
+    ],
+)
+def test_labels_mask_equals_linear_matching(index: HostConditionIndex, label_conditions) -> None:
+    all_hosts = index.mask_of(_HOST_TAGS)
+    assert index.hosts_of(index.labels_mask(label_conditions, all_hosts)) == {
+        hostname
+        for hostname in _HOST_TAGS
+        if matches_labels(_HOST_LABELS.get(hostname, {}), label_conditions)
+    }
+
+
+def test_labels_are_computed_once_per_host() -> None:
+    calls = []
+
+    def labels_of_host(hostname: HostName) -> Labels:
+        calls.append(hostname)
+        return {}
+
+    index = HostConditionIndex(_HOST_TAGS, _HOST_PATHS, labels_of_host)
+    subset = index.mask_of([HostName("host1"), HostName("host2")])
+    for mask in (subset, subset, index.mask_of(_HOST_TAGS)):
+        index.labels_mask({"os": "linux"}, mask)
+
+    assert sorted(calls) == sorted(_HOST_TAGS)
+
+    index.clear_label_index()
+    index.labels_mask({"os": "linux"}, subset)
+    assert len(calls) == len(_HOST_TAGS) + 2
+
+
+@pytest.mark.parametrize(
+    "negate, entries, expected",
+    [
+        (False, ["host1", "host2", "unknown"], {"host1", "host2"}),
+        (True, ["host1", "host2"], {"host0", "host3"}),
+        (False, [{"$regex": "host1"}], {"host1"}),
+        (False, ["host0", {"$regex": ".*3$"}], {"host0", "host3"}),
+        (True, [{"$regex": "host[01]"}], {"host2", "host3"}),
+        (False, [], set()),
+        (True, [], {"host0", "host1", "host2", "host3"}),
+    ],
+)
+def test_host_names_mask(
+    index: HostConditionIndex, negate: bool, entries, expected: Set[HostName]
+) -> None:
+    candidates = index.mask_of(HostName("host%d" % nr) for nr in range(4))
+    assert index.hosts_of(index.host_names_mask(negate, entries, candidates)) == expected
+
+
+def test_combined_conditions_are_commutative(index: HostConditionIndex) -> None:
+    all_hosts = index.mask_of(_HOST_TAGS)
+    results = set()
+    for order in itertools.permutations(("folder", "tags", "names")):
+        mask = all_hosts
+        for step in order:
+            if step == "folder":
+                mask &= index.folder_mask("/wato/dc1")
+            elif step == "tags":
+                mask = index.tags_mask({"agent": "no-agent"}, mask)
+            else:
+                mask = index.host_names_mask(True, [HostName("host1")], mask)
+        results.add(mask)
+
+    assert len(results) == 1
+    assert index.hosts_of(results.pop()) == {"host3"}
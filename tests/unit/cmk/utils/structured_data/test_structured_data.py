@@ -4,7 +4,9 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import ast
 import gzip
+import os
 import shutil
 from pathlib import Path
 from typing import NamedTuple
@@ -13,6 +15,7 @@ import pytest
 
 from tests.testlib import cmk_path
 
+from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.structured_data import (
     Attributes,
     make_filter,
@@ -579,6 +582,107 @@ def test_real_save_gzip(tmp_path):
         f.read()
 
 
+def test_real_save_indexed(tmp_path):
+    host_name = HostName("heute")
+    raw_tree = {"node": {"foo": 1, "bär": 2}}
+    tree = StructuredDataNode.deserialize(raw_tree)
+    store = StructuredDataStore(tmp_path, indexed=True)
+    store.save(host_name=host_name, tree=tree)
+
+    assert StructuredDataStore.is_indexed_file(tmp_path / ".heute.index")
+    assert store.load(host_name=host_name).is_equal(tree)
+
+    # Livestatus still provides the repr of the tree
+    assert StructuredDataNode.deserialize(
+        ast.literal_eval((tmp_path / "heute").read_text())
+    ).is_equal(tree)
+    with gzip.open(str(tmp_path / "heute.gz"), "rb") as f:
+        assert StructuredDataNode.deserialize(ast.literal_eval(f.read().decode("utf-8"))).is_equal(
+            tree
+        )
+
+
+def test_real_load_outdated_index_file(tmp_path):
+    store = StructuredDataStore(tmp_path, indexed=True)
+    store.save(host_name=HostName("heute"), tree=StructuredDataNode.deserialize({"foo": 1}))
+    # E.g. the tree of a host of a remote site
+    raw_tree = {"Attributes": {"Pairs": {"foo": 2}}, "Table": {}, "Nodes": {}}
+    (tmp_path / "heute").write_text(repr(raw_tree))
+
+    assert store.load(host_name=HostName("heute")).serialize() == raw_tree
+
+
+def test_real_archive_indexed(tmp_path):
+    store = StructuredDataStore(tmp_path / "inventory", indexed=True)
+    tree = StructuredDataNode.deserialize({"foo": 1})
+    store.save(host_name=HostName("heute"), tree=tree)
+    timestamp = int((tmp_path / "inventory" / "heute").stat().st_mtime)
+
+    store.archive(host_name=HostName("heute"), archive_dir=tmp_path / "archive")
+
+    assert sorted(p.name for p in (tmp_path / "inventory").iterdir()) == [".last", "heute.gz"]
+    archived_path = tmp_path / "archive" / "heute" / str(timestamp)
+    assert StructuredDataStore.is_indexed_file(archived_path)
+    assert StructuredDataStore.load_file(archived_path).is_equal(tree)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_real_load_paths(tmp_path, indexed):
+    tree = TEST_DATA_STORE.load(host_name=HostName("tree_new_heute"))
+    store = StructuredDataStore(tmp_path, indexed=indexed)
+    store.save(host_name=HostName("heute"), tree=tree)
+    paths = [("hardware", "memory"), ("software", "packages")]
+
+    loaded_tree = store.load(host_name=HostName("heute"), paths=paths)
+
+    for path in paths:
+        node = loaded_tree.get_node(path)
+        assert node is not None
+        assert node.is_equal(tree.get_node(path))
+    assert loaded_tree.get_node(("networking",)) is None
+    assert store.load(host_name=HostName("heute"), paths=[("unknown",)]).is_empty()
+
+
+def test_real_write_index_file(tmp_path):
+    file_path = tmp_path / "heute"
+    shutil.copy(f"{TEST_DIR}/tree_new_heute", file_path)
+    os.utime(file_path, (1650000000, 1650000000))
+
+    assert StructuredDataStore.write_index_file(file_path)
+    assert not StructuredDataStore.write_index_file(file_path)
+
+    assert not StructuredDataStore.is_indexed_file(file_path)
+    assert StructuredDataStore.is_indexed_file(tmp_path / ".heute.index")
+    assert (tmp_path / ".heute.index").stat().st_mtime == 1650000000
+    assert StructuredDataStore.load_file(file_path).is_equal(
+        TEST_DATA_STORE.load(host_name=HostName("tree_new_heute"))
+    )
+
+
+def test_real_migrate_file(tmp_path):
+    file_path = tmp_path / "heute"
+    shutil.copy(f"{TEST_DIR}/tree_new_heute", file_path)
+    os.utime(file_path, (1650000000, 1650000000))
+
+    assert StructuredDataStore.migrate_file(file_path)
+    assert not StructuredDataStore.migrate_file(file_path)
+
+    assert StructuredDataStore.is_indexed_file(file_path)
+    assert file_path.stat().st_mtime == 1650000000
+    assert StructuredDataStore.load_file(file_path).is_equal(
+        TEST_DATA_STORE.load(host_name=HostName("tree_new_heute"))
+    )
+
+
+def test_real_load_corrupted_indexed_file(tmp_path):
+    file_path = tmp_path / "heute"
+    StructuredDataStore.save_file(file_path, TEST_DATA_STORE.load(host_name=tree_name_new_memory))
+    file_path.write_bytes(file_path.read_bytes()[:40])
+
+    with pytest.raises(MKGeneralException):
+        StructuredDataStore.load_file(file_path)
+
+
 tree_old_addresses_arrays_memory = TEST_DATA_STORE.load(
     host_name=HostName("tree_old_addresses_arrays_memory")
 )
@@ -646,9 +750,10 @@ def test_real_equal_tables():
     assert tree_addresses_unordered.is_equal(tree_addresses_ordered)
 
 
+@pytest.mark.parametrize("indexed", [False, True])
 @pytest.mark.parametrize("tree", trees)
-def test_real_is_equal_save_and_load(tree, tmp_path):
-    store = StructuredDataStore(tmp_path)
+def test_real_is_equal_save_and_load(tree, tmp_path, indexed):
+    store = StructuredDataStore(tmp_path, indexed=indexed)
     try:
         store.save(host_name=HostName("foo"), tree=tree)
         loaded_tree = store.load(host_name=HostName("foo"))
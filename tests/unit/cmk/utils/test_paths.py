@@ -30,6 +30,7 @@ _STR_PATHS: Final = {
     "autochecks_dir",
     "precompiled_hostchecks_dir",
     "snmpwalks_dir",
+    "snmpwalks_index_dir",
     "counters_dir",
     "tcp_cache_dir",
     "data_source_cache_dir",
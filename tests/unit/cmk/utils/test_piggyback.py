@@ -32,20 +32,18 @@ def fixture_setup_files(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
     monkeypatch.setattr("cmk.utils.paths.piggyback_dir", tmp_path / "piggyback")
     monkeypatch.setattr("cmk.utils.paths.piggyback_source_dir", tmp_path / "piggyback_source")
 
-    host_dir = cmk.utils.paths.piggyback_dir / str(_TEST_HOST_NAME)
-    host_dir.mkdir(parents=True, exist_ok=False)
+    with freeze_time(datetime.utcfromtimestamp(_REF_TIME)):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"), {_TEST_HOST_NAME: _PAYLOAD.splitlines()}
+        )
 
-    source_file = host_dir / "source1"
-    with source_file.open(mode="wb") as f2:
-        f2.write(_PAYLOAD)
 
-    cmk.utils.paths.piggyback_source_dir.mkdir(parents=True, exist_ok=False)
-    source_status_file = cmk.utils.paths.piggyback_source_dir / "source1"
-    with source_status_file.open("wb") as f3:
-        f3.write(b"")
-
-    os.utime(str(source_file), (_REF_TIME, _REF_TIME))
-    os.utime(str(source_status_file), (_REF_TIME, _REF_TIME))
+def _fake_update_without_test_host() -> None:
+    # The source has sent data without data of test-host after the data of test-host
+    os.utime(
+        str(cmk.utils.paths.piggyback_source_dir / "source1"),
+        (_REF_TIME + 5, _REF_TIME + 5),
+    )
 
 
 def test_piggyback_default_time_settings() -> None:
@@ -67,6 +65,43 @@ def test_cleanup_piggyback_files() -> None:
     assert not list(cmk.utils.paths.piggyback_source_dir.glob("*"))
 
 
+def test_cleanup_piggyback_files_outdated(setup_files) -> None:
+    legacy_host_folder = cmk.utils.paths.piggyback_dir / "legacy-host"
+    legacy_host_folder.mkdir()
+    (legacy_host_folder / "source1").write_bytes(_PAYLOAD)
+
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.cleanup_piggyback_files([(None, "max_cache_age", -1)])
+
+    assert not legacy_host_folder.exists()
+    assert not list((cmk.utils.paths.piggyback_dir / ".data").glob("*"))
+    assert not list(cmk.utils.paths.piggyback_source_dir.glob("*"))
+    assert not piggyback.get_source_hostnames()
+
+
+def test_cleanup_piggyback_files_up_to_date(setup_files) -> None:
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.cleanup_piggyback_files([(None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)])
+
+    assert len(list((cmk.utils.paths.piggyback_dir / ".data").glob("*"))) == 1
+    assert piggyback.get_source_hostnames(_TEST_HOST_NAME) == ["source1"]
+
+
+def test_cleanup_piggyback_files_unreferenced(setup_files) -> None:
+    data_dir = cmk.utils.paths.piggyback_dir / ".data"
+    (data_dir / "source1.1").write_bytes(_PAYLOAD)
+    (data_dir / "source2.1").write_bytes(_PAYLOAD)
+
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.cleanup_piggyback_files([(None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)])
+
+    assert [p.name for p in data_dir.glob("*")] == [
+        piggyback.get_piggyback_raw_data(
+            _TEST_HOST_NAME, [(None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)]
+        )[0].info.file_path.name
+    ]
+
+
 def test_get_piggyback_raw_data_no_data() -> None:
     time_settings: piggyback.PiggybackTimeSettings = [
         (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)
@@ -154,7 +189,7 @@ def test_get_piggyback_raw_data_successful(
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is True
     assert raw_data.info.message == "Successfully processed from source 'source1'"
     assert raw_data.info.status == 0
@@ -166,16 +201,12 @@ def test_get_piggyback_raw_data_not_updated(setup_files) -> None:
         (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)
     ]
 
-    # Fake age the test-host piggyback file
-    os.utime(
-        str(cmk.utils.paths.piggyback_dir / str(_TEST_HOST_NAME) / "source1"),
-        (_REF_TIME - 10, _REF_TIME - 10),
-    )
+    _fake_update_without_test_host()
 
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is False
     assert raw_data.info.message == "Piggyback file not updated by source 'source1'"
     assert raw_data.info.status == 0
@@ -194,7 +225,7 @@ def test_get_piggyback_raw_data_not_sending(setup_files) -> None:
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is False
     assert raw_data.info.message == "Source 'source1' not sending piggyback data"
     assert raw_data.info.status == 0
@@ -207,7 +238,7 @@ def test_get_piggyback_raw_data_too_old_global(setup_files) -> None:
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is False
     assert raw_data.info.message.startswith("Piggyback file too old:")
     assert raw_data.info.status == 0
@@ -223,7 +254,7 @@ def test_get_piggyback_raw_data_too_old_source(setup_files) -> None:
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is False
     assert raw_data.info.message.startswith("Piggyback file too old:")
     assert raw_data.info.status == 0
@@ -240,7 +271,7 @@ def test_get_piggyback_raw_data_too_old_piggybacked_host(setup_files) -> None:
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is False
     assert raw_data.info.message.startswith("Piggyback file too old:")
     assert raw_data.info.status == 0
@@ -288,7 +319,7 @@ def test_store_piggyback_raw_data_new_host() -> None:
     raw_data = _get_only_raw_data_element(HostName("pig"), time_settings)
 
     assert raw_data.info.source_hostname == "source2"
-    assert raw_data.info.file_path.parts[-2:] == ("pig", "source2")
+    assert raw_data.info.file_path.name.startswith("source2.")
     assert raw_data.info.successfully_processed is True
     assert raw_data.info.message.startswith("Successfully processed from source 'source2'")
     assert raw_data.info.status == 0
@@ -319,75 +350,217 @@ def test_store_piggyback_raw_data_second_source(setup_files) -> None:
 
     raw_data1, raw_data2 = raw_data_map["source1"], raw_data_map["source2"]
 
-    assert raw_data1.info.file_path.parts[-2:] == (str(_TEST_HOST_NAME), "source1")
+    assert raw_data1.info.file_path.name.startswith("source1.")
     assert raw_data1.info.successfully_processed is True
     assert raw_data1.info.message.startswith("Successfully processed from source 'source1'")
     assert raw_data1.info.status == 0
     assert raw_data1.raw_data == _PAYLOAD
 
-    assert raw_data2.info.file_path.parts[-2:] == (str(_TEST_HOST_NAME), "source2")
+    assert raw_data2.info.file_path.name.startswith("source2.")
     assert raw_data2.info.successfully_processed is True
     assert raw_data2.info.message.startswith("Successfully processed from source 'source2'")
     assert raw_data2.info.status == 0
     assert raw_data2.raw_data == b"<<<check_mk>>>\nlulu\n"
 
 
-def test_get_source_and_piggyback_hosts() -> None:
+def test_store_piggyback_raw_data_update(setup_files) -> None:
     time_settings: piggyback.PiggybackTimeSettings = [
-        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE),
     ]
 
-    piggyback.store_piggyback_raw_data(
-        HostName("source1"),
-        {
-            HostName("test-host2"): [
-                b"<<<check_mk>>>",
-                b"source1",
-            ],
-            HostName("test-host"): [
-                b"<<<check_mk>>>",
-                b"source1",
-            ],
-        },
-    )
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"), {_TEST_HOST_NAME: [b"<<<check_mk>>>", b"lulu"]}
+        )
+        raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
-    # Fake age the test-host piggyback file
-    os.utime(
-        str(cmk.utils.paths.piggyback_dir / "test-host" / "source1"),
-        (_REF_TIME - 10, _REF_TIME - 10),
-    )
+    assert raw_data.info.successfully_processed is True
+    assert raw_data.raw_data == b"<<<check_mk>>>\nlulu\n"
+    # The data file of the former update is not referenced anymore
+    assert list((cmk.utils.paths.piggyback_dir / ".data").glob("*")) == [raw_data.info.file_path]
 
-    piggyback.store_piggyback_raw_data(
-        HostName("source1"),
-        {
-            HostName("test-host2"): [
-                b"<<<check_mk>>>",
-                b"source1",
-            ]
-        },
-    )
 
-    piggyback.store_piggyback_raw_data(
-        HostName("source2"),
-        {
-            HostName("test-host2"): [
-                b"<<<check_mk>>>",
-                b"source2",
-            ],
-            HostName("test-host"): [
-                b"<<<check_mk>>>",
-                b"source2",
-            ],
-        },
+def test_store_piggyback_raw_data_same_hosts(setup_files) -> None:
+    index_path = cmk.utils.paths.piggyback_dir / ".index"
+    index_stat = index_path.stat()
+
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"), {_TEST_HOST_NAME: [b"<<<check_mk>>>", b"lulu"]}
+        )
+
+    # Only the index of the source is written, the piggybacked hosts have not changed
+    assert (index_path.stat().st_ino, index_path.stat().st_mtime_ns) == (
+        index_stat.st_ino,
+        index_stat.st_mtime_ns,
     )
 
-    assert sorted(list(piggyback.get_source_and_piggyback_hosts(time_settings))) == sorted(
-        [
-            (HostName("source1"), HostName("test-host2")),
-            (HostName("source2"), HostName("test-host")),
-            (HostName("source2"), HostName("test-host2")),
-        ]
+
+def test_get_piggyback_raw_data_former_layout(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("cmk.utils.paths.piggyback_dir", tmp_path / "piggyback")
+    monkeypatch.setattr("cmk.utils.paths.piggyback_source_dir", tmp_path / "piggyback_source")
+    for host_name, source_hostname in [(_TEST_HOST_NAME, "source1"), ("test-host2", "source2")]:
+        piggyback_file_path = cmk.utils.paths.piggyback_dir / host_name / source_hostname
+        piggyback_file_path.parent.mkdir(parents=True)
+        piggyback_file_path.write_bytes(_PAYLOAD)
+        os.utime(piggyback_file_path, (_REF_TIME, _REF_TIME))
+    cmk.utils.paths.piggyback_source_dir.mkdir()
+    for source_hostname in ["source1", "source2"]:
+        (cmk.utils.paths.piggyback_source_dir / source_hostname).touch()
+        os.utime(cmk.utils.paths.piggyback_source_dir / source_hostname, (_REF_TIME, _REF_TIME))
+
+    with freeze_time(_FREEZE_DATETIME):
+        raw_data = _get_only_raw_data_element(
+            _TEST_HOST_NAME, [(None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)]
+        )
+
+    assert raw_data.info.source_hostname == "source1"
+    assert raw_data.info.successfully_processed is True
+    assert raw_data.raw_data == _PAYLOAD
+    assert not (cmk.utils.paths.piggyback_dir / _TEST_HOST_NAME).exists()
+    assert piggyback.get_source_hostnames() == ["source1", "source2"]
+    assert piggyback.get_source_hostnames(HostName("test-host2")) == ["source2"]
+
+
+def test_get_piggyback_raw_data_former_layout_same_serial(setup_files) -> None:
+    time_settings: piggyback.PiggybackTimeSettings = [
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE),
+    ]
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"), {HostName("test-host2"): _PAYLOAD.splitlines()}
+        )
+    # Data of the former layout from the update of the data of test-host
+    legacy_file_path = cmk.utils.paths.piggyback_dir / "legacy-host" / "source1"
+    legacy_file_path.parent.mkdir()
+    legacy_file_path.write_bytes(b"<<<check_mk>>>\nlegacy\n")
+    os.utime(legacy_file_path, (_REF_TIME, _REF_TIME))
+    (cmk.utils.paths.piggyback_dir / ".index").unlink()
+
+    legacy_raw_data = _get_only_raw_data_element(HostName("legacy-host"), time_settings)
+    raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
+
+    assert legacy_raw_data.raw_data == b"<<<check_mk>>>\nlegacy\n"
+    assert legacy_raw_data.info.file_path == raw_data.info.file_path
+    assert legacy_raw_data.info.message == raw_data.info.message
+    assert raw_data.info.message == "Piggyback file not updated by source 'source1'"
+    assert raw_data.raw_data == _PAYLOAD
+
+
+def test_get_piggyback_raw_data_no_open_files(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("cmk.utils.paths.piggyback_dir", tmp_path / "piggyback")
+    monkeypatch.setattr("cmk.utils.paths.piggyback_source_dir", tmp_path / "piggyback_source")
+    time_settings: piggyback.PiggybackTimeSettings = [
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE),
+    ]
+    with freeze_time(_FREEZE_DATETIME):
+        for nr in range(20):
+            piggyback.store_piggyback_raw_data(
+                HostName("source%d" % nr), {HostName("host%d" % nr): _PAYLOAD.splitlines()}
+            )
+
+    open_files = len(os.listdir("/proc/self/fd"))
+    for nr in range(20):
+        assert _get_only_raw_data_element(HostName("host%d" % nr), time_settings).raw_data
+    assert len(os.listdir("/proc/self/fd")) == open_files
+
+
+def test_remove_piggybacked_host_data(setup_files) -> None:
+    with freeze_time(_FREEZE_DATETIME):
+        piggyback.store_piggyback_raw_data(
+            HostName("source2"),
+            {
+                _TEST_HOST_NAME: [b"<<<check_mk>>>", b"source2"],
+                HostName("test-host2"): [b"<<<check_mk>>>", b"source2"],
+            },
+        )
+
+    piggyback.remove_piggybacked_host_data(_TEST_HOST_NAME)
+
+    assert not piggyback.get_source_hostnames(_TEST_HOST_NAME)
+    assert piggyback.get_source_hostnames() == ["source2"]
+    assert [p.name.split(".")[0] for p in (cmk.utils.paths.piggyback_dir / ".data").glob("*")] == [
+        "source2"
+    ]
+
+
+def test_rename_piggyback_host(setup_files) -> None:
+    time_settings: piggyback.PiggybackTimeSettings = [
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE),
+    ]
+
+    assert piggyback.rename_piggyback_host(HostName("source1"), HostName("new-source")) == (
+        False,
+        1,
     )
+    assert piggyback.rename_piggyback_host(_TEST_HOST_NAME, HostName("new-host")) == (True, 0)
+    assert piggyback.rename_piggyback_host(HostName("no-host"), HostName("new-host")) == (
+        False,
+        0,
+    )
+
+    assert not piggyback.get_source_hostnames(_TEST_HOST_NAME)
+    raw_data = _get_only_raw_data_element(HostName("new-host"), time_settings)
+    assert raw_data.info.source_hostname == "new-source"
+    assert raw_data.info.file_path.name.startswith("new-source.")
+    assert raw_data.info.message == "Source 'new-source' not sending piggyback data"
+    assert raw_data.raw_data == _PAYLOAD
+
+
+def test_get_source_and_piggyback_hosts(setup_files) -> None:
+    time_settings: piggyback.PiggybackTimeSettings = [
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)
+    ]
+
+    with freeze_time(datetime.utcfromtimestamp(_REF_TIME + 1)):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"),
+            {
+                HostName("test-host2"): [
+                    b"<<<check_mk>>>",
+                    b"source1",
+                ],
+                HostName("test-host"): [
+                    b"<<<check_mk>>>",
+                    b"source1",
+                ],
+            },
+        )
+
+    # The data of test-host from source1 is not updated
+    with freeze_time(datetime.utcfromtimestamp(_REF_TIME + 2)):
+        piggyback.store_piggyback_raw_data(
+            HostName("source1"),
+            {
+                HostName("test-host2"): [
+                    b"<<<check_mk>>>",
+                    b"source1",
+                ]
+            },
+        )
+
+        piggyback.store_piggyback_raw_data(
+            HostName("source2"),
+            {
+                HostName("test-host2"): [
+                    b"<<<check_mk>>>",
+                    b"source2",
+                ],
+                HostName("test-host"): [
+                    b"<<<check_mk>>>",
+                    b"source2",
+                ],
+            },
+        )
+
+    with freeze_time(_FREEZE_DATETIME):
+        assert sorted(list(piggyback.get_source_and_piggyback_hosts(time_settings))) == sorted(
+            [
+                (HostName("source1"), HostName("test-host2")),
+                (HostName("source2"), HostName("test-host")),
+                (HostName("source2"), HostName("test-host2")),
+            ]
+        )
 
 
 @pytest.mark.parametrize(
@@ -424,7 +597,7 @@ def test_get_piggyback_raw_data_source_validity(
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is successfully_processed
     assert raw_data.info.message.startswith(reason)
     assert raw_data.info.status == reason_status
@@ -455,7 +628,7 @@ def test_get_piggyback_raw_data_source_validity2(
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is successfully_processed
     assert raw_data.info.message == reason
     assert raw_data.info.status == reason_status
@@ -492,16 +665,12 @@ def test_get_piggyback_raw_data_source_validity2(
 def test_get_piggyback_raw_data_piggybacked_host_validity(
     setup_files, time_settings, successfully_processed, reason, reason_status
 ) -> None:
-    # Fake age the test-host piggyback file
-    os.utime(
-        str(cmk.utils.paths.piggyback_dir / "test-host" / "source1"),
-        (_REF_TIME - 10, _REF_TIME - 10),
-    )
+    _fake_update_without_test_host()
 
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is successfully_processed
     assert raw_data.info.message.startswith(reason)
     assert raw_data.info.status == reason_status
@@ -528,16 +697,12 @@ def test_get_piggyback_raw_data_piggybacked_host_validity(
 def test_get_piggyback_raw_data_piggybacked_host_validity2(
     setup_files, time_settings, successfully_processed, reason, reason_status
 ) -> None:
-    # Fake age the test-host piggyback file
-    os.utime(
-        str(cmk.utils.paths.piggyback_dir / "test-host" / "source1"),
-        (_REF_TIME - 10, _REF_TIME - 10),
-    )
+    _fake_update_without_test_host()
 
     raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
 
     assert raw_data.info.source_hostname == "source1"
-    assert raw_data.info.file_path.parts[-2:] == ("test-host", "source1")
+    assert raw_data.info.file_path.name.startswith("source1.")
     assert raw_data.info.successfully_processed is successfully_processed
     assert raw_data.info.message.startswith(reason)
     assert raw_data.info.status == reason_status
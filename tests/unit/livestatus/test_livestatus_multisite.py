@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import contextlib
+import socket
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import livestatus
+
+
+# Override top level fixture to make livestatus connects possible here
+@pytest.fixture(autouse=True)
+def prevent_livestatus_connect():
+    pass
+
+
+class FakeSite(threading.Thread):
+    """Answers each query on a unix socket with the given rows after the given delay"""
+
+    def __init__(
+        self, path: Path, rows: List[List[Any]], delay: float = 0.0, code: int = 200
+    ) -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        self.rows = rows
+        self.delay = delay
+        self.code = code
+        # Close the connection instead of answering the next query
+        self.drop_next_query = False
+        self.queries: List[str] = []
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(str(path))
+        self._server.listen(5)
+
+    def run(self) -> None:
+        while True:
+            connection, _address = self._server.accept()
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: socket.socket) -> None:
+        with connection, contextlib.suppress(OSError):  # The client may give up waiting
+            buf = b""
+            while True:
+                while b"\n\n" not in buf:
+                    if not (data := connection.recv(4096)):
+                        return
+                    buf += data
+                query, buf = buf.split(b"\n\n", 1)
+                self.queries.append(query.decode("utf-8"))
+                if self.drop_next_query:
+                    self.drop_next_query = False
+                    return
+                time.sleep(self.delay)
+                # Like livestatus: One row per line
+                response = ("[%s]\n" % ",\n".join(map(repr, self.rows))).encode("utf-8")
+                connection.sendall(b"%-3d %11d\n" % (self.code, len(response)) + response)
+
+
+@pytest.fixture
+def fake_sites(tmp_path: Path) -> Iterator[Dict[str, FakeSite]]:
+    sites = {
+        "slow": FakeSite(tmp_path / "slow", [["slow", 1]], delay=0.5),
+        "fast": FakeSite(tmp_path / "fast", [["fast", 2], ["fast", 3]]),
+        "other": FakeSite(tmp_path / "other", [["other", 4]]),
+    }
+    for site in sites.values():
+        site.start()
+    yield sites
+
+
+@pytest.fixture
+def connection(fake_sites: Dict[str, FakeSite]) -> Iterator[livestatus.MultiSiteConnection]:
+    connection = livestatus.MultiSiteConnection(
+        livestatus.SiteConfigurations(
+            {
+                livestatus.SiteId(site_id): livestatus.SiteConfiguration(
+                    {"socket": "unix:%s" % site.path}
+                )
+                for site_id, site in fake_sites.items()
+            }
+        )
+    )
+    yield connection
+    connection.disconnect()
+
+
+def test_query_parallel_keeps_order_of_sites(connection: livestatus.MultiSiteConnection) -> None:
+    connection.set_prepend_site(True)
+    assert connection.query("GET hosts\nColumns: name\n") == [
+        ["slow", "slow", 1],
+        ["fast", "fast", 2],
+        ["fast", "fast", 3],
+        ["other", "other", 4],
+    ]
+    assert connection.alive_sites() == ["slow", "fast", "other"]
+
+
+def test_query_streamed_yields_sites_as_they_respond(
+    connection: livestatus.MultiSiteConnection,
+) -> None:
+    start = time.time()
+    site_rows = connection.query_streamed("GET hosts\nColumns: name\n")
+    assert sorted([next(site_rows), next(site_rows)]) == [
+        ("fast", [["fast", 2], ["fast", 3]]),
+        ("other", [["other", 4]]),
+    ]
+    assert time.time() - start < 0.4
+    assert list(site_rows) == [("slow", [["slow", 1]])]
+
+
+def test_query_streamed_stopped_early(
+    connection: livestatus.MultiSiteConnection, fake_sites: Dict[str, FakeSite]
+) -> None:
+    for _site_id, _rows in connection.query_streamed("GET hosts\nColumns: name\n"):
+        break
+    # The incomplete response of the slow site must not be read by the next query
+    assert connection.get_connection(livestatus.SiteId("slow")).socket is None
+    assert connection.alive_sites() == ["slow", "fast", "other"]
+    assert connection.query("GET hosts\nColumns: name\n")[0] == ["slow", 1]
+
+
+def test_response_timeout(connection: livestatus.MultiSiteConnection) -> None:
+    connection.set_response_timeout(0.1, [livestatus.SiteId("slow")])
+    start = time.time()
+    assert connection.query("GET hosts\nColumns: name\n") == [
+        ["fast", 2],
+        ["fast", 3],
+        ["other", 4],
+    ]
+    assert time.time() - start < 0.4
+    assert connection.alive_sites() == ["fast", "other"]
+    assert "Timeout" in str(connection.dead_sites()["slow"]["exception"])
+
+
+def test_reconnect_after_closed_connection(
+    connection: livestatus.MultiSiteConnection, fake_sites: Dict[str, FakeSite]
+) -> None:
+    fake_sites["fast"].drop_next_query = True
+    assert connection.query("GET hosts\nColumns: name\n") == [
+        ["slow", 1],
+        ["fast", 2],
+        ["fast", 3],
+        ["other", 4],
+    ]
+    assert len(fake_sites["fast"].queries) == 2
+    assert not connection.dead_sites()
+
+
+def test_suppressed_error_keeps_site_alive(
+    connection: livestatus.MultiSiteConnection, fake_sites: Dict[str, FakeSite]
+) -> None:
+    fake_sites["other"].code = 404
+    fake_sites["fast"].code = 400
+    assert connection.query("GET hosts\nColumns: name\n") == [["slow", 1]]
+    assert connection.alive_sites() == ["slow", "other"]
+    assert "Unhandled exception" in str(connection.dead_sites()["fast"]["exception"])
+
+
+def test_query_columns(connection: livestatus.MultiSiteConnection) -> None:
+    connection.set_prepend_site(True)
+    columns = connection.query_columns("GET hosts\nColumns: name state\n", {"state": "d"})
+    assert list(columns) == ["site", "name", "state"]
+    assert isinstance(columns["state"], array) and columns["state"].typecode == "d"
+    # The sites are in the order of their responses
+    assert sorted(zip(*columns.values())) == [
+        ("fast", "fast", 2.0),
+        ("fast", "fast", 3.0),
+        ("other", "other", 4.0),
+        ("slow", "slow", 1.0),
+    ]
+
+
+def test_query_columns_mismatch(connection: livestatus.MultiSiteConnection) -> None:
+    with pytest.raises(livestatus.MKLivestatusQueryError):
+        connection.query_columns("GET hosts\nColumns: name\n")
+    with pytest.raises(livestatus.MKLivestatusQueryError):
+        connection.query_columns("GET hosts\nColumns: name state\n", {"name": "d"})
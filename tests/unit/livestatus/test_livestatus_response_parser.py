@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2022 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+
+import contextlib
+import json
+import socket
+import threading
+from array import array
+from typing import Iterator, List, Tuple
+
+import pytest
+
+import livestatus
+from livestatus import ResponseParser
+
+_ROWS = [
+    ["heute", 0, 1.5, ["a", "b"], {"key": "välue"}],
+    ["morgen", 2, -3.25, [], {}],
+    ["with\nline breaks\n", 1, 0.0, ["[", "]", ","], {"": "\\"}],
+]
+
+
+def _python_response(rows: List) -> bytes:
+    # Like livestatus: One row per line, control characters are escaped
+    return ("[%s]\n" % ",\n".join(map(repr, rows))).encode("utf-8")
+
+
+def _json_response(rows: List) -> bytes:
+    return ("[%s]\n" % ",\n".join(map(json.dumps, rows))).encode("utf-8")
+
+
+def _feed(parser: ResponseParser, data: bytes, size: int) -> List[List]:
+    result = []
+    for start in range(0, len(data), size):
+        result.append(parser.feed(data[start : start + size]))
+        assert parser.complete == (start + size >= len(data))
+    return result
+
+
+@pytest.mark.parametrize("size", [1, 7, 30, 10000])
+@pytest.mark.parametrize(
+    "response,use_json",
+    [
+        (_python_response(_ROWS), False),
+        (_json_response(_ROWS), True),
+        # Not one row per line
+        (repr(_ROWS).encode("utf-8"), False),
+        (json.dumps(_ROWS, indent=2).encode("utf-8"), True),
+        (b"[]\n", False),
+        (b"[]", True),
+    ],
+)
+def test_response_parser(response: bytes, use_json: bool, size: int) -> None:
+    blocks = _feed(ResponseParser(len(response), use_json), response, size)
+    assert [row for rows in blocks for row in rows] == (_ROWS if len(response) > 3 else [])
+
+
+def test_response_parser_decodes_complete_lines() -> None:
+    response = _python_response(_ROWS)
+    first_line_end = response.index(b"\n") + 1
+    parser = ResponseParser(len(response), use_json=False)
+    assert parser.feed(response[: first_line_end - 1]) == []
+    assert parser.feed(response[first_line_end - 1 : first_line_end + 1]) == _ROWS[:1]
+    assert parser.feed(response[first_line_end + 1 :]) == _ROWS[1:]
+
+
+@pytest.mark.parametrize(
+    "response",
+    [b"{}\n", b"[[1],\n[2]\n", b"[[1],\n[2]]]\n", b"[[1],\n[2}]\n", b"[[1],\n[2]],\n"],
+)
+def test_response_parser_malformed(response: bytes) -> None:
+    parser = ResponseParser(len(response), use_json=True)
+    with pytest.raises(livestatus.MKLivestatusQueryError):
+        _feed(parser, response, 4)
+
+
+class FakeLivestatus(threading.Thread):
+    """Answers the queries sent to the connection with the given responses"""
+
+    def __init__(self, responses: List[bytes]) -> None:
+        super().__init__(daemon=True)
+        self.responses = responses
+        self.queries: List[str] = []
+        self.client, self._server = socket.socketpair()
+
+    def run(self) -> None:
+        with self._server, contextlib.suppress(OSError):  # The client may stop reading
+            buf = b""
+            for response in self.responses:
+                while b"\n\n" not in buf:
+                    if not (data := self._server.recv(4096)):
+                        return
+                    buf += data
+                query, buf = buf.split(b"\n\n", 1)
+                self.queries.append(query.decode("utf-8"))
+                self._server.sendall(b"%-3d %11d\n" % (200, len(response)) + response)
+
+
+# Larger than the maximum size of a received packet
+_MANY_ROWS = [["host%06d" % nr, nr] for nr in range(100000)]
+
+
+@pytest.fixture
+def connection() -> Iterator[Tuple[livestatus.SingleSiteConnection, FakeLivestatus]]:
+    fake_livestatus = FakeLivestatus(
+        [_python_response(_ROWS), _python_response(_ROWS[:1]), _python_response(_MANY_ROWS)]
+    )
+    fake_livestatus.start()
+    connection = livestatus.SingleSiteConnection("unix:/not/existing")
+    connection.socket = fake_livestatus.client
+    yield connection, fake_livestatus
+    connection.disconnect()
+
+
+def test_query_rows(connection: Tuple[livestatus.SingleSiteConnection, FakeLivestatus]) -> None:
+    live, fake_livestatus = connection
+    live.set_limit(3)
+    assert list(live.query_rows("GET hosts\nColumns: name\n", "Filter: state = 0\n")) == _ROWS
+    assert fake_livestatus.queries[0].startswith("GET hosts\nColumns: name\nLimit: 3\n")
+    assert "Filter: state = 0" in fake_livestatus.queries[0]
+    # The connection can be used for the next query
+    assert list(live.query_rows("GET hosts\nColumns: name\n")) == _ROWS[:1]
+
+
+def test_query_rows_stopped_early(
+    connection: Tuple[livestatus.SingleSiteConnection, FakeLivestatus]
+) -> None:
+    live, _fake_livestatus = connection
+    # Complete responses are read, the connection can be used for the next query
+    for _row in live.query_rows("GET hosts\nColumns: name\n"):
+        break
+    assert live.socket is not None
+    assert list(live.query_rows("GET hosts\nColumns: name\n")) == _ROWS[:1]
+
+    rows = live.query_rows("GET hosts\nColumns: name\n")
+    assert next(rows) == _MANY_ROWS[0]
+    rows.close()
+    # The rest of the response must not be read by the next query
+    assert live.socket is None
+
+
+def test_query_columns(connection: Tuple[livestatus.SingleSiteConnection, FakeLivestatus]) -> None:
+    live, _fake_livestatus = connection
+    columns = live.query_columns(
+        "GET hosts\nColumns: name state perf_data groups custom_variables\n",
+        {"state": "b", "perf_data": "d"},
+    )
+    assert columns == {
+        "name": [row[0] for row in _ROWS],
+        "state": array("b", [0, 2, 1]),
+        "perf_data": array("d", [1.5, -3.25, 0.0]),
+        "groups": [row[3] for row in _ROWS],
+        "custom_variables": [row[4] for row in _ROWS],
+    }
+
+
+def test_query_columns_without_columns_header() -> None:
+    with pytest.raises(livestatus.MKLivestatusQueryError):
+        livestatus.SingleSiteConnection("unix:/not/existing").query_columns("GET hosts\n")